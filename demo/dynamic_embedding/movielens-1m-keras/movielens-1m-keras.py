@@ -21,6 +21,8 @@ flags.DEFINE_integer('embedding_size', 32,
                      'Embedding size for users and movies')
 flags.DEFINE_integer('test_steps', 128, 'Embedding size for users and movies')
 flags.DEFINE_integer('test_batch', 1024, 'Embedding size for users and movies')
+flags.DEFINE_string('slot_dtype', None,
+                    'Dtype the optimizer slots are stored in, e.g. bfloat16.')
 FLAGS = flags.FLAGS
 
 input_spec = {
@@ -120,7 +122,8 @@ def train():
   model = DualChannelsDeepModel(FLAGS.embedding_size, FLAGS.embedding_size,
                                 tf.keras.initializers.RandomNormal(0.0, 0.5))
   optimizer = Adam(1E-3)
-  optimizer = de.DynamicEmbeddingOptimizer(optimizer)
+  optimizer = de.DynamicEmbeddingOptimizer(optimizer,
+                                           slot_dtype=FLAGS.slot_dtype)
 
   auc = tf.keras.metrics.AUC(num_thresholds=1000)
   model.compile(optimizer=optimizer,
@@ -21,6 +21,9 @@ __all__ = [
     'HkvHashTable',
     'HkvHashTableConfig',
     'HkvHashTableCreator',
+    'MmapTable',
+    'MmapTableConfig',
+    'MmapTableCreator',
     'RedisTable',
     'RedisTableConfig',
     'RedisTableCreator',
@@ -34,9 +37,12 @@ __all__ = [
     'TimestampRestrictPolicy',
     'FrequencyRestrictPolicy',
     'get_variable',
+    'jump_hash_partition_fn',
     'embedding_lookup',
     'embedding_lookup_sparse',
     'embedding_lookup_unique',
+    'embedding_lookup_shared',
+    'embedding_lookup_group',
     'safe_embedding_lookup_sparse',
     'enable_inference_mode',
     'enable_train_mode',
@@ -45,6 +51,7 @@ __all__ = [
     'train',
     'keras',
     'math',
+    'data',
     'data_flow',
     'shadow_ops',
 ]
@@ -55,12 +62,14 @@ from tensorflow_recommenders_addons.dynamic_embedding.python.ops import math_ops
 from tensorflow_recommenders_addons.dynamic_embedding.python.ops import data_flow_ops as data_flow
 from tensorflow_recommenders_addons.dynamic_embedding.python.ops.dynamic_embedding_creator import (
     KVCreator, CuckooHashTableConfig, CuckooHashTableCreator,
-    HkvHashTableConfig, HkvHashTableCreator, RedisTableConfig,
-    RedisTableCreator, FileSystemSaver)
+    HkvHashTableConfig, HkvHashTableCreator, MmapTableConfig, MmapTableCreator,
+    RedisTableConfig, RedisTableCreator, FileSystemSaver)
 from tensorflow_recommenders_addons.dynamic_embedding.python.ops.cuckoo_hashtable_ops import (
     CuckooHashTable,)
 from tensorflow_recommenders_addons.dynamic_embedding.python.ops.hkv_hashtable_ops import (
     HkvHashTable,)
+from tensorflow_recommenders_addons.dynamic_embedding.python.ops.mmap_table_ops import (
+    MmapTable,)
 from tensorflow_recommenders_addons.dynamic_embedding.python.ops.redis_table_ops import (
     RedisTable,)
 from tensorflow_recommenders_addons.dynamic_embedding.python.ops.dynamic_embedding_ops import (
@@ -69,6 +78,10 @@ from tensorflow_recommenders_addons.dynamic_embedding.python.ops.dynamic_embeddi
     embedding_lookup_sparse,)
 from tensorflow_recommenders_addons.dynamic_embedding.python.ops.dynamic_embedding_ops import (
     embedding_lookup_unique,)
+from tensorflow_recommenders_addons.dynamic_embedding.python.ops.dynamic_embedding_ops import (
+    embedding_lookup_shared,)
+from tensorflow_recommenders_addons.dynamic_embedding.python.ops.dynamic_embedding_ops import (
+    embedding_lookup_group,)
 from tensorflow_recommenders_addons.dynamic_embedding.python.ops.dynamic_embedding_ops import (
     safe_embedding_lookup_sparse,)
 from tensorflow_recommenders_addons.dynamic_embedding.python.ops.dynamic_embedding_ops import (
@@ -95,6 +108,8 @@ from tensorflow_recommenders_addons.dynamic_embedding.python.ops.dynamic_embeddi
     Variable,)
 from tensorflow_recommenders_addons.dynamic_embedding.python.ops.dynamic_embedding_variable import (
     GraphKeys,)
+from tensorflow_recommenders_addons.dynamic_embedding.python.ops.dynamic_embedding_variable import (
+    jump_hash_partition_fn,)
 from tensorflow_recommenders_addons.dynamic_embedding.python.ops.warm_start_util import (
     warm_start, WarmStartHook)
 from tensorflow_recommenders_addons.dynamic_embedding.python.ops.restrict_policies import (
@@ -107,6 +122,7 @@ from tensorflow_recommenders_addons.dynamic_embedding.python.ops.tf_patch import
 from tensorflow_recommenders_addons.dynamic_embedding.python.ops.tf_save_restore_patch import (
     patch_on_tf_save_restore,)
 from tensorflow_recommenders_addons.dynamic_embedding.python.ops import shadow_embedding_ops as shadow_ops
+from tensorflow_recommenders_addons.dynamic_embedding.python.ops import data_ops as data
 
 patch_on_tf()
 patch_on_tf_save_restore()
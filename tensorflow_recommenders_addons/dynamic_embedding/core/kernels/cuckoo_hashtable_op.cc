@@ -17,11 +17,19 @@ limitations under the License.
 
 #include "tensorflow_recommenders_addons/dynamic_embedding/core/kernels/cuckoo_hashtable_op.h"
 
+#include <algorithm>
+#include <atomic>
+#include <cmath>
+#include <functional>
 #include <string>
+#include <thread>
 #include <type_traits>
 #include <utility>
+#include <vector>
 
 #include "tensorflow/core/kernels/lookup_table_op.h"
+#include "tensorflow/core/lib/core/blocking_counter.h"
+#include "tensorflow/core/platform/env.h"
 #include "tensorflow/core/platform/path.h"
 #include "tensorflow/core/util/work_sharder.h"
 #include "tensorflow_recommenders_addons/dynamic_embedding/core/kernels/lookup_impl/lookup_table_op_cpu.h"
@@ -33,15 +41,88 @@ namespace recommenders_addons {
 namespace lookup {
 typedef Eigen::ThreadPoolDevice CPUDevice;
 
+// The table operations whose keys are split over the CPU worker threads, in
+// the order of the `min_slice_sizes` and `num_threads` table attributes.
+enum ShardedOp {
+  kShardedFind = 0,
+  kShardedInsert = 1,
+  kShardedAccum = 2,
+  kShardedRemove = 3,
+};
+constexpr size_t kNumShardedOps = 4;
+
+// A table resized incrementally starts growing at this load factor, and every
+// operation migrates at least this many buckets of the previous generation.
+constexpr double kLoadFactorToGrow = 0.75;
+constexpr size_t kMinMigrateBuckets = 1024;
+
+// How the keys of one kind of table operation are split over the CPU worker
+// threads. A non-positive `min_slice_size` keeps the original heuristic, and
+// a non-positive `num_threads` allows every worker thread.
+struct ShardingPolicy {
+  int64 min_slice_size = 0;
+  int64 num_threads = 0;
+};
+
+// Runs `fn` over the keys [0, total) split as `policy` says. With a minimal
+// slice size the keys are cut into at most `num_threads` slices of at least
+// that many keys, and the calling thread takes the first slice. Otherwise
+// Shard is given a cost of `work_total / num_threads + 1` per key, as the
+// table operations always did, where `work_total` is the number of keys or,
+// for finds, of values.
+inline void ShardKeys(OpKernelContext* context, const ShardingPolicy& policy,
+                      int64 total, int64 work_total,
+                      const std::function<void(int64, int64)>& fn) {
+  auto& worker_threads = *context->device()->tensorflow_cpu_worker_threads();
+  int64 num_threads = worker_threads.num_threads;
+  if (policy.num_threads > 0 && policy.num_threads < num_threads) {
+    num_threads = policy.num_threads;
+  }
+  if (policy.min_slice_size <= 0) {
+    int64 slices =
+        static_cast<int64>(work_total / worker_threads.num_threads) + 1;
+    Shard(num_threads, worker_threads.workers, total, slices, fn);
+    return;
+  }
+  int64 num_slices =
+      std::max<int64>(1, std::min(num_threads, total / policy.min_slice_size));
+  if (num_slices == 1) {
+    fn(0, total);
+    return;
+  }
+  const int64 slice_size = (total + num_slices - 1) / num_slices;
+  num_slices = (total + slice_size - 1) / slice_size;
+  BlockingCounter counter(static_cast<int>(num_slices - 1));
+  for (int64 i = 1; i < num_slices; ++i) {
+    const int64 begin = i * slice_size;
+    const int64 end = std::min(total, begin + slice_size);
+    worker_threads.workers->Schedule([&fn, &counter, begin, end]() {
+      fn(begin, end);
+      counter.DecrementCount();
+    });
+  }
+  fn(0, slice_size);
+  counter.Wait();
+}
+
 template <typename Device, class K, class V>
 struct LaunchTensorsFind;
 
 template <class K, class V>
 struct LaunchTensorsFind<CPUDevice, K, V> {
-  explicit LaunchTensorsFind(int64 value_dim) : value_dim_(value_dim) {}
-
+  LaunchTensorsFind(int64 value_dim, int64 batched_find_min_keys,
+                    bool lock_free, const ShardingPolicy& policy)
+      : value_dim_(value_dim),
+        batched_find_min_keys_(batched_find_min_keys),
+        lock_free_(lock_free),
+        policy_(policy) {}
+
+  // `retiring` is the previous generation of the table while it is being
+  // migrated, or nullptr. It is probed first, a key is moved out of it only
+  // after being written to `table`.
   void launch(OpKernelContext* context, cpu::TableWrapperBase<K, V>* table,
-              const Tensor& key, Tensor* value, const Tensor& default_value) {
+              cpu::TableWrapperBase<K, V>* retiring, const Tensor& key,
+              Tensor* value, const Tensor& default_value) {
     const auto key_flat = key.flat<K>();
     cpu::Tensor2D<V> value_flat = value->flat_inner_dims<V, 2>();
     cpu::ConstTensor2D<V> default_flat = default_value.flat_inner_dims<V, 2>();
@@ -49,22 +130,40 @@ struct LaunchTensorsFind<CPUDevice, K, V> {
     int64 default_total = default_flat.size();
     bool is_full_default = (total == default_total);
     int64 num_keys = key_flat.size();
-
-    auto shard = [this, table, key_flat, &value_flat, &default_flat,
-                  &is_full_default](int64 begin, int64 end) {
+    bool batched = lock_free_ || (num_keys >= batched_find_min_keys_);
+
+    auto shard = [this, table, retiring, key_flat, &value_flat, &default_flat,
+                  &is_full_default, batched](int64 begin, int64 end) {
+      if (retiring != nullptr) {
+        bool exist = false;
+        for (int64 i = begin; i < end; ++i) {
+          retiring->find(key_flat(i), value_flat, default_flat, exist,
+                         value_dim_, is_full_default, i);
+          if (!exist) {
+            table->find(key_flat(i), value_flat, default_flat, value_dim_,
+                        is_full_default, i);
+          }
+        }
+        return;
+      }
+      if (batched) {
+        table->find_batch(key_flat.data(), begin, end, value_flat, default_flat,
+                          nullptr, value_dim_, is_full_default, lock_free_);
+        return;
+      }
       for (int64 i = begin; i < end; ++i) {
         table->find(key_flat(i), value_flat, default_flat, value_dim_,
                     is_full_default, i);
       }
     };
-    auto& worker_threads = *context->device()->tensorflow_cpu_worker_threads();
-    int64 slices = static_cast<int64>(total / worker_threads.num_threads) + 1;
-    Shard(worker_threads.num_threads, worker_threads.workers, num_keys, slices,
-          shard);
+    ShardKeys(context, policy_, num_keys, total, shard);
   }
 
  private:
   const int64 value_dim_;
+  const int64 batched_find_min_keys_;
+  const bool lock_free_;
+  const ShardingPolicy policy_;
 };
 
 template <typename Device, class K, class V>
@@ -72,12 +171,16 @@ struct LaunchTensorsFindWithExists;
 
 template <class K, class V>
 struct LaunchTensorsFindWithExists<CPUDevice, K, V> {
-  explicit LaunchTensorsFindWithExists(int64 value_dim)
-      : value_dim_(value_dim) {}
+  LaunchTensorsFindWithExists(int64 value_dim, int64 batched_find_min_keys,
+                              bool lock_free, const ShardingPolicy& policy)
+      : value_dim_(value_dim),
+        batched_find_min_keys_(batched_find_min_keys),
+        lock_free_(lock_free),
+        policy_(policy) {}
 
   void launch(OpKernelContext* context, cpu::TableWrapperBase<K, V>* table,
-              const Tensor& key, Tensor* value, const Tensor& default_value,
-              Tensor& exists) {
+              cpu::TableWrapperBase<K, V>* retiring, const Tensor& key,
+              Tensor* value, const Tensor& default_value, Tensor& exists) {
     const auto key_flat = key.flat<K>();
     cpu::Tensor2D<V> value_flat = value->flat_inner_dims<V, 2>();
     cpu::ConstTensor2D<V> default_flat = default_value.flat_inner_dims<V, 2>();
@@ -87,22 +190,41 @@ struct LaunchTensorsFindWithExists<CPUDevice, K, V> {
     int64 default_total = default_flat.size();
     bool is_full_default = (total == default_total);
     int64 num_keys = key_flat.size();
-
-    auto shard = [this, table, key_flat, &value_flat, &default_flat,
-                  &exists_flat, &is_full_default](int64 begin, int64 end) {
+    bool batched = lock_free_ || (num_keys >= batched_find_min_keys_);
+
+    auto shard = [this, table, retiring, key_flat, &value_flat, &default_flat,
+                  &exists_flat, &is_full_default,
+                  batched](int64 begin, int64 end) {
+      if (retiring != nullptr) {
+        for (int64 i = begin; i < end; ++i) {
+          retiring->find(key_flat(i), value_flat, default_flat, exists_flat(i),
+                         value_dim_, is_full_default, i);
+          if (!exists_flat(i)) {
+            table->find(key_flat(i), value_flat, default_flat, exists_flat(i),
+                        value_dim_, is_full_default, i);
+          }
+        }
+        return;
+      }
+      if (batched) {
+        table->find_batch(key_flat.data(), begin, end, value_flat, default_flat,
+                          exists_flat.data(), value_dim_, is_full_default,
+                          lock_free_);
+        return;
+      }
       for (int64 i = begin; i < end; ++i) {
         table->find(key_flat(i), value_flat, default_flat, exists_flat(i),
                     value_dim_, is_full_default, i);
       }
     };
-    auto& worker_threads = *context->device()->tensorflow_cpu_worker_threads();
-    int64 slices = static_cast<int64>(total / worker_threads.num_threads) + 1;
-    Shard(worker_threads.num_threads, worker_threads.workers, num_keys, slices,
-          shard);
+    ShardKeys(context, policy_, num_keys, total, shard);
   }
 
  private:
   const int64 value_dim_;
+  const int64 batched_find_min_keys_;
+  const bool lock_free_;
+  const ShardingPolicy policy_;
 };
 
 template <typename Device, class K, class V>
@@ -110,43 +232,31 @@ struct LaunchTensorsInsert;
 
 template <class K, class V>
 struct LaunchTensorsInsert<CPUDevice, K, V> {
-  explicit LaunchTensorsInsert(int64 value_dim) : value_dim_(value_dim) {}
+  LaunchTensorsInsert(int64 value_dim, const ShardingPolicy& policy)
+      : value_dim_(value_dim), policy_(policy) {}
 
   void launch(OpKernelContext* context, cpu::TableWrapperBase<K, V>* table,
-              const Tensor& keys, const Tensor& values) {
+              cpu::TableWrapperBase<K, V>* retiring, const Tensor& keys,
+              const Tensor& values) {
     const auto key_flat = keys.flat<K>();
     int64 total = key_flat.size();
     const auto value_flat = values.flat_inner_dims<V, 2>();
 
-    auto shard = [this, &table, key_flat, &value_flat](int64 begin, int64 end) {
+    auto shard = [this, &table, retiring, key_flat, &value_flat](int64 begin,
+                                                                 int64 end) {
       for (int64 i = begin; i < end; ++i) {
         table->insert_or_assign(key_flat(i), value_flat, value_dim_, i);
+        if (retiring != nullptr) {
+          retiring->erase(key_flat(i));
+        }
       }
     };
-    auto& worker_threads = *context->device()->tensorflow_cpu_worker_threads();
-    // Only use num_worker_threads when
-    // TFRA_NUM_WORKER_THREADS_FOR_LOOKUP_TABLE_INSERT env var is set to k where
-    // k > 0 and k <current number of tf cpu worker threads. Otherwise nothing
-    // changes.
-    int64 num_worker_threads = -1;
-    Status status =
-        ReadInt64FromEnvVar("TFRA_NUM_WORKER_THREADS_FOR_LOOKUP_TABLE_INSERT",
-                            -1, &num_worker_threads);
-    if (!status.ok()) {
-      LOG(ERROR)
-          << "Error parsing TFRA_NUM_WORKER_THREADS_FOR_LOOKUP_TABLE_INSERT: "
-          << status;
-    }
-    if (num_worker_threads <= 0 ||
-        num_worker_threads > worker_threads.num_threads) {
-      num_worker_threads = worker_threads.num_threads;
-    }
-    int64 slices = static_cast<int64>(total / worker_threads.num_threads) + 1;
-    Shard(num_worker_threads, worker_threads.workers, total, slices, shard);
+    ShardKeys(context, policy_, total, total, shard);
   }
 
  private:
   const int64 value_dim_;
+  const ShardingPolicy policy_;
 };
 
 template <typename Device, class K, class V>
@@ -154,31 +264,218 @@ struct LaunchTensorsAccum;
 
 template <class K, class V>
 struct LaunchTensorsAccum<CPUDevice, K, V> {
-  explicit LaunchTensorsAccum(int64 value_dim) : value_dim_(value_dim) {}
+  LaunchTensorsAccum(int64 value_dim, const ShardingPolicy& policy)
+      : value_dim_(value_dim), policy_(policy) {}
 
   void launch(OpKernelContext* context, cpu::TableWrapperBase<K, V>* table,
-              const Tensor& keys, const Tensor& values_or_deltas,
-              const Tensor& exists) {
+              cpu::TableWrapperBase<K, V>* retiring, const Tensor& keys,
+              const Tensor& values_or_deltas, const Tensor& exists) {
     const auto key_flat = keys.flat<K>();
     int64 total = key_flat.size();
     const auto values_or_deltas_flat = values_or_deltas.flat_inner_dims<V, 2>();
     const auto exist_flat = exists.flat<bool>();
 
-    auto shard = [this, &table, key_flat, &values_or_deltas_flat, &exist_flat](
-                     int64 begin, int64 end) {
+    auto shard = [this, &table, retiring, key_flat, &values_or_deltas_flat,
+                  &exist_flat](int64 begin, int64 end) {
       for (int64 i = begin; i < end; ++i) {
+        if (retiring != nullptr) {
+          retiring->migrate_key(key_flat(i), table);
+        }
         table->insert_or_accum(key_flat(i), values_or_deltas_flat,
                                exist_flat(i), value_dim_, i);
       }
     };
-    auto& worker_threads = *context->device()->tensorflow_cpu_worker_threads();
-    int64 slices = static_cast<int64>(total / worker_threads.num_threads) + 1;
-    Shard(worker_threads.num_threads, worker_threads.workers, total, slices,
-          shard);
+    ShardKeys(context, policy_, total, total, shard);
+  }
+
+ private:
+  const int64 value_dim_;
+  const ShardingPolicy policy_;
+};
+
+template <typename Device, class K, class V>
+struct LaunchTensorsAccumDelta;
+
+template <class K, class V>
+struct LaunchTensorsAccumDelta<CPUDevice, K, V> {
+  LaunchTensorsAccumDelta(int64 value_dim, const ShardingPolicy& policy)
+      : value_dim_(value_dim), policy_(policy) {}
+
+  void launch(OpKernelContext* context, cpu::TableWrapperBase<K, V>* table,
+              cpu::TableWrapperBase<K, V>* retiring, const Tensor& keys,
+              const Tensor& old_values, const Tensor& new_values,
+              const Tensor& exists) {
+    const auto key_flat = keys.flat<K>();
+    int64 total = key_flat.size();
+    const V* old_data = old_values.flat<V>().data();
+    const V* new_data = new_values.flat<V>().data();
+    const auto exist_flat = exists.flat<bool>();
+
+    auto shard = [this, &table, retiring, key_flat, old_data, new_data,
+                  &exist_flat](int64 begin, int64 end) {
+      for (int64 i = begin; i < end; ++i) {
+        if (retiring != nullptr) {
+          retiring->migrate_key(key_flat(i), table);
+        }
+        table->insert_or_accum_delta(key_flat(i), old_data + i * value_dim_,
+                                     new_data + i * value_dim_, exist_flat(i));
+      }
+    };
+    ShardKeys(context, policy_, total, total, shard);
+  }
+
+ private:
+  const int64 value_dim_;
+  const ShardingPolicy policy_;
+};
+
+// The sparse optimizers CuckooHashTableApplyOptimizer applies to table rows,
+// with the number of slots a row holds after the embedding and the number of
+// hyperparameters the op takes.
+struct InTableOptimizer {
+  const char* name;
+  int64 num_slots;
+  int64 num_hyperparams;
+};
+
+constexpr InTableOptimizer kInTableOptimizers[] = {
+    {"sgd", 0, 1},      // lr
+    {"adagrad", 1, 2},  // lr, epsilon
+    {"adam", 2, 4},     // lr_t, beta1, beta2, epsilon
+    {"ftrl", 2, 4},     // lr, l1, l2, lr_power
+};
+
+inline const InTableOptimizer* FindInTableOptimizer(const string& name) {
+  for (const InTableOptimizer& optimizer : kInTableOptimizers) {
+    if (name == optimizer.name) {
+      return &optimizer;
+    }
+  }
+  return nullptr;
+}
+
+// Returns the update of `optimizer` on a row holding the `dim` embedding
+// values followed by its slots, as the dense TF training ops compute it.
+template <class V>
+cpu::RowUpdateFn<V> InTableOptimizerUpdate(const string& optimizer,
+                                           const V* hyperparams, int64 dim) {
+  const V lr = hyperparams[0];
+  if (optimizer == "adagrad") {
+    const V epsilon = hyperparams[1];
+    return [lr, epsilon, dim](V* row, const V* grad) {
+      V* accum = row + dim;
+      for (int64 i = 0; i < dim; ++i) {
+        accum[i] += grad[i] * grad[i];
+        row[i] -= lr * grad[i] / (std::sqrt(accum[i]) + epsilon);
+      }
+    };
+  }
+  if (optimizer == "adam") {
+    const V beta1 = hyperparams[1];
+    const V beta2 = hyperparams[2];
+    const V epsilon = hyperparams[3];
+    return [lr, beta1, beta2, epsilon, dim](V* row, const V* grad) {
+      V* m = row + dim;
+      V* v = row + 2 * dim;
+      for (int64 i = 0; i < dim; ++i) {
+        m[i] += (grad[i] - m[i]) * (V(1) - beta1);
+        v[i] += (grad[i] * grad[i] - v[i]) * (V(1) - beta2);
+        row[i] -= lr * m[i] / (std::sqrt(v[i]) + epsilon);
+      }
+    };
+  }
+  if (optimizer == "ftrl") {
+    const V l1 = hyperparams[1];
+    const V l2 = hyperparams[2];
+    const V lr_power = hyperparams[3];
+    return [lr, l1, l2, lr_power, dim](V* row, const V* grad) {
+      V* accum = row + dim;
+      V* linear = row + 2 * dim;
+      for (int64 i = 0; i < dim; ++i) {
+        const V new_accum = accum[i] + grad[i] * grad[i];
+        const V accum_power = std::pow(accum[i], -lr_power);
+        const V new_accum_power = std::pow(new_accum, -lr_power);
+        linear[i] += grad[i] - (new_accum_power - accum_power) / lr * row[i];
+        const V quadratic = new_accum_power / lr + V(2) * l2;
+        row[i] = std::abs(linear[i]) > l1
+                     ? (std::copysign(l1, linear[i]) - linear[i]) / quadratic
+                     : V(0);
+        accum[i] = new_accum;
+      }
+    };
+  }
+  return [lr, dim](V* row, const V* grad) {
+    for (int64 i = 0; i < dim; ++i) {
+      row[i] -= lr * grad[i];
+    }
+  };
+}
+
+template <typename Device, class K, class V>
+struct LaunchTensorsApplyOptimizer;
+
+template <class K, class V>
+struct LaunchTensorsApplyOptimizer<CPUDevice, K, V> {
+  LaunchTensorsApplyOptimizer(int64 value_dim, const ShardingPolicy& policy)
+      : value_dim_(value_dim), policy_(policy) {}
+
+  void launch(OpKernelContext* context, cpu::TableWrapperBase<K, V>* table,
+              cpu::TableWrapperBase<K, V>* retiring, const Tensor& keys,
+              const Tensor& grads, const Tensor& init_rows,
+              const cpu::RowUpdateFn<V>& update) {
+    const auto key_flat = keys.flat<K>();
+    int64 total = key_flat.size();
+    const int64 grad_dim = grads.dim_size(1);
+    const V* grad_data = grads.flat<V>().data();
+    const V* init_data = init_rows.flat<V>().data();
+
+    auto shard = [this, &table, retiring, key_flat, grad_dim, grad_data,
+                  init_data, &update](int64 begin, int64 end) {
+      for (int64 i = begin; i < end; ++i) {
+        if (retiring != nullptr) {
+          retiring->migrate_key(key_flat(i), table);
+        }
+        table->apply_or_insert(key_flat(i), update, grad_data + i * grad_dim,
+                               init_data + i * value_dim_);
+      }
+    };
+    ShardKeys(context, policy_, total, total, shard);
   }
 
  private:
   const int64 value_dim_;
+  const ShardingPolicy policy_;
+};
+
+template <typename Device, class K, class V>
+struct LaunchTensorsRemove;
+
+template <class K, class V>
+struct LaunchTensorsRemove<CPUDevice, K, V> {
+  explicit LaunchTensorsRemove(const ShardingPolicy& policy)
+      : policy_(policy) {}
+
+  void launch(OpKernelContext* context, cpu::TableWrapperBase<K, V>* table,
+              cpu::TableWrapperBase<K, V>* retiring, const Tensor& keys) {
+    const auto key_flat = keys.flat<K>();
+    int64 total = key_flat.size();
+
+    auto shard = [&table, retiring, key_flat](int64 begin, int64 end) {
+      for (int64 i = begin; i < end; ++i) {
+        const K key = tensorflow::lookup::SubtleMustCopyIfIntegral(key_flat(i));
+        // The retiring table goes first, so a key being migrated can not
+        // land in `table` after it was erased there.
+        if (retiring != nullptr) {
+          retiring->erase(key);
+        }
+        table->erase(key);
+      }
+    };
+    ShardKeys(context, policy_, total, total, shard);
+  }
+
+ private:
+  const ShardingPolicy policy_;
 };
 
 template <class K, class V>
@@ -205,19 +502,80 @@ class CuckooHashTableOfTensors final : public LookupInterface {
       init_size_ = env_var;
     }
     runtime_dim_ = value_shape_.dim_size(0);
-    cpu::CreateTable(init_size_, runtime_dim_, &table_);
+    int64 num_subtables = 1;
+    TryGetNodeAttr(kernel->def(), "num_subtables", &num_subtables);
+    OP_REQUIRES(ctx, num_subtables >= 1,
+                errors::InvalidArgument(
+                    "num_subtables must be at least 1, got ", num_subtables));
+    num_subtables_ = static_cast<size_t>(num_subtables);
+    cpu::CreateStripedTable(num_subtables_, init_size_, runtime_dim_, &table_);
+
+    // Lookups of at least this many keys prefetch buckets a block ahead.
+    Status status = ReadInt64FromEnvVar("TFRA_BATCHED_FIND_MIN_KEYS", 1024,
+                                        &batched_find_min_keys_);
+    if (!status.ok()) {
+      LOG(ERROR) << "Error parsing TFRA_BATCHED_FIND_MIN_KEYS: " << status;
+    }
+
+    std::vector<int64> min_slice_sizes;
+    std::vector<int64> num_threads;
+    TryGetNodeAttr(kernel->def(), "min_slice_sizes", &min_slice_sizes);
+    TryGetNodeAttr(kernel->def(), "num_threads", &num_threads);
+    OP_REQUIRES(
+        ctx,
+        min_slice_sizes.size() <= kNumShardedOps &&
+            num_threads.size() <= kNumShardedOps,
+        errors::InvalidArgument(
+            "min_slice_sizes and num_threads take at most ", kNumShardedOps,
+            " values, for find, insert, accum and remove."));
+    for (size_t i = 0; i < min_slice_sizes.size(); i++) {
+      sharding_[i].min_slice_size = min_slice_sizes[i];
+    }
+    for (size_t i = 0; i < num_threads.size(); i++) {
+      sharding_[i].num_threads = num_threads[i];
+    }
+    // Only use TFRA_NUM_WORKER_THREADS_FOR_LOOKUP_TABLE_INSERT for inserts
+    // when the table does not set a thread count of its own.
+    if (sharding_[kShardedInsert].num_threads <= 0) {
+      status =
+          ReadInt64FromEnvVar("TFRA_NUM_WORKER_THREADS_FOR_LOOKUP_TABLE_INSERT",
+                              -1, &sharding_[kShardedInsert].num_threads);
+      if (!status.ok()) {
+        LOG(ERROR)
+            << "Error parsing TFRA_NUM_WORKER_THREADS_FOR_LOOKUP_TABLE_INSERT: "
+            << status;
+      }
+    }
+
+    TryGetNodeAttr(kernel->def(), "incremental_resize", &incremental_resize_);
   }
 
-  ~CuckooHashTableOfTensors() { delete table_; }
+  ~CuckooHashTableOfTensors() {
+    delete table_;
+    delete retiring_;
+  }
 
-  size_t size() const override { return table_->size(); }
+  size_t size() const override {
+    tf_shared_lock l(mu_);
+    return table_->size() + (retiring_ != nullptr ? retiring_->size() : 0);
+  }
 
   Status Find(OpKernelContext* ctx, const Tensor& key, Tensor* value,
               const Tensor& default_value) override {
     int64 value_dim = value_shape_.dim_size(0);
 
-    LaunchTensorsFind<CPUDevice, K, V> launcher(value_dim);
-    launcher.launch(ctx, table_, key, value, default_value);
+    const bool lock_free = BeginLockFreeRead();
+    LaunchTensorsFind<CPUDevice, K, V> launcher(
+        value_dim, batched_find_min_keys_, lock_free, sharding_[kShardedFind]);
+    if (lock_free) {
+      launcher.launch(ctx, table_, nullptr, key, value, default_value);
+      EndLockFreeRead();
+      return TFOkStatus;
+    }
+    WithTables(key.NumElements(), [&](cpu::TableWrapperBase<K, V>* table,
+                                      cpu::TableWrapperBase<K, V>* retiring) {
+      launcher.launch(ctx, table, retiring, key, value, default_value);
+    });
 
     return TFOkStatus;
   }
@@ -226,22 +584,102 @@ class CuckooHashTableOfTensors final : public LookupInterface {
                         const Tensor& default_value, Tensor& exists) {
     int64 value_dim = value_shape_.dim_size(0);
 
-    LaunchTensorsFindWithExists<CPUDevice, K, V> launcher(value_dim);
-    launcher.launch(ctx, table_, key, value, default_value, exists);
+    const bool lock_free = BeginLockFreeRead();
+    LaunchTensorsFindWithExists<CPUDevice, K, V> launcher(
+        value_dim, batched_find_min_keys_, lock_free, sharding_[kShardedFind]);
+    if (lock_free) {
+      launcher.launch(ctx, table_, nullptr, key, value, default_value, exists);
+      EndLockFreeRead();
+      return TFOkStatus;
+    }
+    WithTables(key.NumElements(), [&](cpu::TableWrapperBase<K, V>* table,
+                                      cpu::TableWrapperBase<K, V>* retiring) {
+      launcher.launch(ctx, table, retiring, key, value, default_value, exists);
+    });
 
     return TFOkStatus;
   }
 
+  // Fills the rows of `values` whose key is missing, as `exists` says, from
+  // `init_values`: its k-th row for the k-th missing key, or its only row for
+  // all of them. With `insert` the missing keys are inserted too, unless
+  // another writer inserted them since they were looked up, in which case
+  // their row is read back from the table.
+  Status InitMissing(OpKernelContext* ctx, const Tensor& keys,
+                     const Tensor& exists, const Tensor& init_values,
+                     bool insert, Tensor* values) {
+    const int64 value_dim = value_shape_.dim_size(0);
+    const auto key_flat = keys.flat<K>();
+    const auto exists_flat = exists.flat<bool>();
+    std::vector<int64> missing;
+    for (int64 i = 0; i < key_flat.size(); ++i) {
+      if (!exists_flat(i)) {
+        missing.push_back(i);
+      }
+    }
+    const int64 num_missing = static_cast<int64>(missing.size());
+    const bool is_full_init =
+        init_values.NumElements() == num_missing * value_dim;
+    if (!is_full_init && init_values.NumElements() != value_dim) {
+      return errors::InvalidArgument(
+          "init_values must hold a row for each of the ", num_missing,
+          " missing keys or a single row, got shape ",
+          init_values.shape().DebugString());
+    }
+
+    cpu::Tensor2D<V> value_flat = values->flat_inner_dims<V, 2>();
+    const V* init_base = init_values.flat<V>().data();
+    auto fill = [&](int64 begin, int64 end) {
+      for (int64 k = begin; k < end; ++k) {
+        std::copy_n(init_base + (is_full_init ? k * value_dim : 0), value_dim,
+                    &value_flat(missing[k], 0));
+      }
+    };
+    if (!insert) {
+      ShardKeys(ctx, sharding_[kShardedFind], num_missing, num_missing, fill);
+      return TFOkStatus;
+    }
+
+    const Tensor& filled = *values;
+    cpu::ConstTensor2D<V> filled_flat = filled.flat_inner_dims<V, 2>();
+    return Write(
+        ctx, num_missing,
+        [&](cpu::TableWrapperBase<K, V>* table,
+            cpu::TableWrapperBase<K, V>* retiring) {
+          auto shard = [&](int64 begin, int64 end) {
+            fill(begin, end);
+            for (int64 k = begin; k < end; ++k) {
+              const int64 i = missing[k];
+              const K key =
+                  tensorflow::lookup::SubtleMustCopyIfIntegral(key_flat(i));
+              if (retiring != nullptr) {
+                retiring->migrate_key(key, table);
+              }
+              if (!table->insert_if_absent(key, &value_flat(i, 0))) {
+                table->find(key, value_flat, filled_flat, value_dim, true, i);
+              }
+            }
+          };
+          ShardKeys(ctx, sharding_[kShardedInsert], num_missing, num_missing,
+                    shard);
+        });
+  }
+
   Status DoInsert(bool clear, OpKernelContext* ctx, const Tensor& keys,
                   const Tensor& values) {
     int64 value_dim = value_shape_.dim_size(0);
-
     if (clear) {
-      table_->clear();
+      TF_RETURN_IF_ERROR(Clear(ctx));
     }
 
-    LaunchTensorsInsert<CPUDevice, K, V> launcher(value_dim);
-    launcher.launch(ctx, table_, keys, values);
+    LaunchTensorsInsert<CPUDevice, K, V> launcher(value_dim,
+                                                  sharding_[kShardedInsert]);
+    TF_RETURN_IF_ERROR(Write(ctx, keys.NumElements(),
+                             [&](cpu::TableWrapperBase<K, V>* table,
+                                 cpu::TableWrapperBase<K, V>* retiring) {
+                               launcher.launch(ctx, table, retiring, keys,
+                                               values);
+                             }));
 
     return TFOkStatus;
   }
@@ -249,37 +687,152 @@ class CuckooHashTableOfTensors final : public LookupInterface {
   Status DoAccum(bool clear, OpKernelContext* ctx, const Tensor& keys,
                  const Tensor& values_or_deltas, const Tensor& exists) {
     int64 value_dim = value_shape_.dim_size(0);
-
     if (clear) {
-      table_->clear();
+      TF_RETURN_IF_ERROR(Clear(ctx));
     }
 
-    LaunchTensorsAccum<CPUDevice, K, V> launcher(value_dim);
-    launcher.launch(ctx, table_, keys, values_or_deltas, exists);
+    LaunchTensorsAccum<CPUDevice, K, V> launcher(value_dim,
+                                                 sharding_[kShardedAccum]);
+    TF_RETURN_IF_ERROR(Write(ctx, keys.NumElements(),
+                             [&](cpu::TableWrapperBase<K, V>* table,
+                                 cpu::TableWrapperBase<K, V>* retiring) {
+                               launcher.launch(ctx, table, retiring, keys,
+                                               values_or_deltas, exists);
+                             }));
 
     return TFOkStatus;
   }
 
+  // Accum with the deltas `new_values - old_values` of the existing keys
+  // computed row by row, instead of in a separate tensor.
+  Status AccumDelta(OpKernelContext* ctx, const Tensor& keys,
+                    const Tensor& old_values, const Tensor& new_values,
+                    const Tensor& exists) {
+    LaunchTensorsAccumDelta<CPUDevice, K, V> launcher(value_shape_.dim_size(0),
+                                                      sharding_[kShardedAccum]);
+    return Write(ctx, keys.NumElements(),
+                 [&](cpu::TableWrapperBase<K, V>* table,
+                     cpu::TableWrapperBase<K, V>* retiring) {
+                   launcher.launch(ctx, table, retiring, keys, old_values,
+                                   new_values, exists);
+                 });
+  }
+
+  // Applies `update` to the rows of `keys` with their `grads`, inserting the
+  // missing keys with their `init_rows` updated.
+  Status ApplyOptimizer(OpKernelContext* ctx, const Tensor& keys,
+                        const Tensor& grads, const Tensor& init_rows,
+                        const cpu::RowUpdateFn<V>& update) {
+    LaunchTensorsApplyOptimizer<CPUDevice, K, V> launcher(
+        value_shape_.dim_size(0), sharding_[kShardedAccum]);
+    return Write(ctx, keys.NumElements(),
+                 [&](cpu::TableWrapperBase<K, V>* table,
+                     cpu::TableWrapperBase<K, V>* retiring) {
+                   launcher.launch(ctx, table, retiring, keys, grads, init_rows,
+                                   update);
+                 });
+  }
+
+  // Adds `deltas` to the rows of `keys`, a missing key is inserted with its
+  // delta. A key is looked up and written in one step, so the delta lands in
+  // the table whatever the concurrent writers do.
+  Status InsertOrAdd(OpKernelContext* ctx, const Tensor& keys,
+                     const Tensor& deltas) {
+    const int64 value_dim = value_shape_.dim_size(0);
+    const TensorShape rows_shape({keys.NumElements(), value_dim});
+    Tensor delta_rows;
+    if (!delta_rows.CopyFrom(deltas, rows_shape)) {
+      return errors::InvalidArgument("Expected deltas of ",
+                                     rows_shape.num_elements(),
+                                     " elements, got ", deltas.NumElements());
+    }
+    Tensor zeros;
+    TF_RETURN_IF_ERROR(
+        ctx->allocate_temp(DataTypeToEnum<V>::v(), rows_shape, &zeros));
+    std::fill_n(zeros.flat<V>().data(), zeros.NumElements(), V());
+    const cpu::RowUpdateFn<V> add = [value_dim](V* row, const V* delta) {
+      cpu::AccumRow(row, delta, value_dim);
+    };
+    return ApplyOptimizer(ctx, keys, delta_rows, zeros, add);
+  }
+
   Status Insert(OpKernelContext* ctx, const Tensor& keys,
                 const Tensor& values) override {
     return DoInsert(false, ctx, keys, values);
   }
 
   Status Remove(OpKernelContext* ctx, const Tensor& keys) override {
-    const auto key_flat = keys.flat<K>();
+    LaunchTensorsRemove<CPUDevice, K, V> launcher(sharding_[kShardedRemove]);
+    return Write(ctx, keys.NumElements(),
+                 [&](cpu::TableWrapperBase<K, V>* table,
+                     cpu::TableWrapperBase<K, V>* retiring) {
+                   launcher.launch(ctx, table, retiring, keys);
+                 });
+  }
 
-    // mutex_lock l(mu_);
-    for (int64 i = 0; i < key_flat.size(); ++i) {
-      table_->erase(tensorflow::lookup::SubtleMustCopyIfIntegral(key_flat(i)));
-    }
+  Status RemoveIfLess(OpKernelContext* ctx, const V& threshold) {
+    mutex_lock l(mu_);
+    TF_RETURN_IF_ERROR(CheckNotFrozen());
+    DrainRetiringLocked();
+    std::vector<K> removed;
+    table_->erase_if(
+        [&threshold](const V* value) { return value[0] < threshold; },
+        &removed);
+
+    Tensor* removed_keys;
+    TF_RETURN_IF_ERROR(ctx->allocate_output(
+        "removed_keys", TensorShape({static_cast<int64>(removed.size())}),
+        &removed_keys));
+    std::copy(removed.begin(), removed.end(), removed_keys->flat<K>().data());
     return TFOkStatus;
   }
 
   Status Clear(OpKernelContext* ctx) {
+    mutex_lock l(mu_);
+    TF_RETURN_IF_ERROR(CheckNotFrozen());
+    delete retiring_;
+    retiring_ = nullptr;
+    retiring_buckets_.store(0);
     table_->clear();
     return TFOkStatus;
   }
 
+  // A frozen table serves lookups without taking its bucket locks and
+  // rejects every write until it is thawed.
+  Status SetFrozen(bool frozen) {
+    if (frozen_.load() == frozen) {
+      return TFOkStatus;
+    }
+    // Writers hold mu_ shared, so none is in flight once it is exclusive.
+    mutex_lock l(mu_);
+    if (frozen) {
+      DrainRetiringLocked();
+      table_->freeze();
+      frozen_.store(true);
+    } else {
+      frozen_.store(false);
+      while (lock_free_readers_.load() > 0) {
+        std::this_thread::yield();
+      }
+    }
+    return TFOkStatus;
+  }
+
+  bool IsFrozen() const { return frozen_.load(); }
+
+  // Fills `metrics` with the number of resizes, the total and the longest
+  // time in microseconds a resize held up the table operations, and the
+  // number of buckets of the previous generation still to be migrated.
+  void ResizeMetrics(int64* metrics) const {
+    metrics[0] = resize_count_.load();
+    metrics[1] = pause_micros_total_.load();
+    metrics[2] = pause_micros_max_.load();
+    const size_t buckets = retiring_buckets_.load();
+    const size_t migrated = migrate_next_.load();
+    metrics[3] =
+        static_cast<int64>(migrated < buckets ? buckets - migrated : 0);
+  }
+
   Status Accum(OpKernelContext* ctx, const Tensor& keys,
                const Tensor& values_or_deltas, const Tensor& exists) {
     return DoAccum(false, ctx, keys, values_or_deltas, exists);
@@ -291,19 +844,66 @@ class CuckooHashTableOfTensors final : public LookupInterface {
   }
 
   Status ExportValues(OpKernelContext* ctx) override {
-    Tensor* keys;
-    Tensor* values;
-    const auto table_size = table_->size();
-    const auto output_key_size = static_cast<int64>(table_size);
+    mutex_lock l(mu_);
+    DrainRetiringLocked();
+    return ExportValuesLocked(ctx);
+  }
+
+  // Exports the table and empties it while holding mu_ exclusive, so each
+  // concurrent write lands either in the export or in the emptied table.
+  Status ExportAndClear(OpKernelContext* ctx) {
+    mutex_lock l(mu_);
+    TF_RETURN_IF_ERROR(CheckNotFrozen());
+    DrainRetiringLocked();
+    TF_RETURN_IF_ERROR(ExportValuesLocked(ctx));
+    table_->clear();
+    return TFOkStatus;
+  }
+
+  // Outputs the entries of the buckets from `offset` on, about `batch_size`
+  // of them, and the offset of the next chunk, -1 after the last one. A
+  // negative offset outputs an empty chunk. Only a bucket at a time is locked,
+  // so writers keep going meanwhile, and a key written or moved by a resize
+  // during the scan may be missed or repeated.
+  Status ExportChunk(OpKernelContext* ctx, int64 offset, int64 batch_size) {
+    if (offset >= 0 && incremental_resize_) {
+      bool retiring = false;
+      {
+        tf_shared_lock l(mu_);
+        retiring = retiring_ != nullptr;
+      }
+      if (retiring) {
+        mutex_lock l(mu_);
+        DrainRetiringLocked();
+      }
+    }
+    std::vector<K> keys;
+    std::vector<V> values;
+    size_t next = 0;
+    size_t bucket_count = 0;
+    if (offset >= 0) {
+      tf_shared_lock l(mu_);
+      next =
+          table_->dump_buckets(static_cast<size_t>(offset),
+                               static_cast<size_t>(batch_size), &keys, &values);
+      bucket_count = table_->bucket_count();
+    }
+
+    const int64 num_keys = static_cast<int64>(keys.size());
+    Tensor* keys_out;
+    Tensor* values_out;
+    Tensor* next_offset;
     TF_RETURN_IF_ERROR(
-        ctx->allocate_output("keys", TensorShape({output_key_size}), &keys));
+        ctx->allocate_output("keys", TensorShape({num_keys}), &keys_out));
     TF_RETURN_IF_ERROR(ctx->allocate_output(
-        "values",
-        TensorShape({output_key_size, static_cast<int64>(runtime_dim_)}),
-        &values));
-    table_->dump((K*)keys->tensor_data().data(),
-                 (V*)values->tensor_data().data(), 0, table_size);
-
+        "values", TensorShape({num_keys, static_cast<int64>(runtime_dim_)}),
+        &values_out));
+    TF_RETURN_IF_ERROR(
+        ctx->allocate_output("next_offset", TensorShape({}), &next_offset));
+    std::copy(keys.begin(), keys.end(), keys_out->flat<K>().data());
+    std::copy(values.begin(), values.end(), values_out->flat<V>().data());
+    next_offset->scalar<int64>()() =
+        next < bucket_count ? static_cast<int64>(next) : -1;
     return TFOkStatus;
   }
 
@@ -335,8 +935,6 @@ class CuckooHashTableOfTensors final : public LookupInterface {
       TF_RETURN_IF_ERROR(fs->NewWritableFile(value_tmpfilepath, &value_writer));
     }
 
-    size_t key_offset = 0;
-    size_t value_offset = 0;
     const size_t value_len = sizeof(V) * value_dim;
     const size_t key_buffer_byte_size = buffer_size * sizeof(K);
     const size_t value_buffer_byte_size = buffer_size * value_len;
@@ -345,31 +943,21 @@ class CuckooHashTableOfTensors final : public LookupInterface {
     std::vector<char> value_buffer_vector(value_buffer_byte_size);
     char* value_buffer = value_buffer_vector.data();
 
-    const size_t table_size = table_->size();
-    size_t search_offset = 0;
+    // Stream the whole table through one cursor, so that each chunk resumes
+    // where the previous one stopped instead of re-scanning from the
+    // beginning. The table is unlocked as soon as the cursor is released.
     size_t total_saved = 0;
-    while (search_offset < table_size) {
-      auto dump_counter = table_->dump((K*)key_buffer, (V*)value_buffer,
-                                       search_offset, buffer_size);
-      search_offset += dump_counter;
-      key_offset += dump_counter * sizeof(K);
-      value_offset += dump_counter * value_len;
-      TF_RETURN_IF_ERROR(
-          key_writer->Append(StringPiece(key_buffer, key_offset)));
-      key_buffer = key_buffer_vector.data();
-      key_offset = 0;
-      TF_RETURN_IF_ERROR(
-          value_writer->Append(StringPiece(value_buffer, value_offset)));
-      value_buffer = value_buffer_vector.data();
-      value_offset = 0;
-      total_saved += dump_counter;
-    }
-
-    if (key_offset > 0 && value_offset > 0) {
-      TF_RETURN_IF_ERROR(
-          key_writer->Append(StringPiece(key_buffer, key_offset)));
-      TF_RETURN_IF_ERROR(
-          value_writer->Append(StringPiece(value_buffer, value_offset)));
+    {
+      auto cursor = table_->export_cursor();
+      size_t dump_counter = 0;
+      while ((dump_counter = cursor->next((K*)key_buffer, (V*)value_buffer,
+                                          buffer_size)) > 0) {
+        TF_RETURN_IF_ERROR(key_writer->Append(
+            StringPiece(key_buffer, dump_counter * sizeof(K))));
+        TF_RETURN_IF_ERROR(value_writer->Append(
+            StringPiece(value_buffer, dump_counter * value_len)));
+        total_saved += dump_counter;
+      }
     }
 
     TF_RETURN_IF_ERROR(key_writer->Flush());
@@ -393,6 +981,8 @@ class CuckooHashTableOfTensors final : public LookupInterface {
   Status SaveToFileSystem(OpKernelContext* ctx, const string& dirpath,
                           const string& file_name, const size_t buffer_size,
                           bool append_to_file) {
+    mutex_lock l(mu_);
+    DrainRetiringLocked();
     string filepath = io::JoinPath(dirpath, file_name);
     FileSystem* fs;
     const auto env = ctx->env();
@@ -405,29 +995,21 @@ class CuckooHashTableOfTensors final : public LookupInterface {
                                 append_to_file);
   }
 
-  Status LoadFromFileSystemImpl(FileSystem* fs, const size_t value_dim,
-                                const string& filepath,
+  Status LoadFromFileSystemImpl(OpKernelContext* ctx, FileSystem* fs,
+                                const size_t value_dim, const string& filepath,
                                 const size_t buffer_size) {
     const string key_filepath = filepath + "-keys";
     TF_RETURN_IF_ERROR(fs->FileExists(key_filepath));
     std::unique_ptr<RandomAccessFile> key_file;
     TF_RETURN_IF_ERROR(fs->NewRandomAccessFile(key_filepath, &key_file));
-    std::unique_ptr<io::RandomAccessInputStream> key_input_stream(
-        new io::RandomAccessInputStream(key_file.get()));
-    const size_t key_buffer_byte_size = buffer_size * sizeof(K);
-    io::BufferedInputStream key_reader(key_input_stream.get(),
-                                       key_buffer_byte_size);
+    io::RandomAccessInputStream key_reader(key_file.get());
 
     const string value_filepath = filepath + "-values";
     TF_RETURN_IF_ERROR(fs->FileExists(value_filepath));
     std::unique_ptr<RandomAccessFile> value_file;
     TF_RETURN_IF_ERROR(fs->NewRandomAccessFile(value_filepath, &value_file));
-    std::unique_ptr<io::RandomAccessInputStream> value_input_stream(
-        new io::RandomAccessInputStream(value_file.get()));
+    io::RandomAccessInputStream value_reader(value_file.get());
     const size_t value_len = sizeof(V) * value_dim;
-    const size_t value_buffer_size = buffer_size * value_len;
-    io::BufferedInputStream value_reader(value_input_stream.get(),
-                                         value_buffer_size);
 
     uint64 key_file_size = 0;
     TF_RETURN_IF_ERROR(fs->GetFileSize(key_filepath, &key_file_size));
@@ -444,18 +1026,37 @@ class CuckooHashTableOfTensors final : public LookupInterface {
           value_filepath + ".");
     }
 
+    // Grow the table once up front instead of rehashing repeatedly while the
+    // keys are streamed in.
+    table_->reserve(table_->size() + key_size);
+
+    // Read the files in blocks of `buffer_size` keys and insert every block
+    // in parallel on the TF CPU worker threads.
+    auto& worker_threads = *ctx->device()->tensorflow_cpu_worker_threads();
     tstring key_buffer;
-    key_buffer.resize(sizeof(K));
     tstring value_buffer;
-    value_buffer.resize(value_len);
-    uint64 key_file_offset = 0;
-
-    while (key_file_offset < key_file_size) {
-      TF_RETURN_IF_ERROR(key_reader.ReadNBytes(sizeof(K), &key_buffer));
-      TF_RETURN_IF_ERROR(value_reader.ReadNBytes(value_len, &value_buffer));
-      table_->insert_or_assign((K*)key_buffer.data(), (V*)value_buffer.data(),
-                               runtime_dim_);
-      key_file_offset += sizeof(K);
+    size_t key_offset = 0;
+    while (key_offset < key_size) {
+      const int64 block_size =
+          static_cast<int64>(std::min(buffer_size, key_size - key_offset));
+      TF_RETURN_IF_ERROR(
+          key_reader.ReadNBytes(block_size * sizeof(K), &key_buffer));
+      TF_RETURN_IF_ERROR(
+          value_reader.ReadNBytes(block_size * value_len, &value_buffer));
+
+      K* key_ptr = (K*)key_buffer.data();
+      V* value_ptr = (V*)value_buffer.data();
+      auto shard = [this, key_ptr, value_ptr](int64 begin, int64 end) {
+        for (int64 i = begin; i < end; ++i) {
+          table_->insert_or_assign(key_ptr + i, value_ptr + i * runtime_dim_,
+                                   runtime_dim_);
+        }
+      };
+      int64 slices =
+          static_cast<int64>(block_size / worker_threads.num_threads) + 1;
+      Shard(worker_threads.num_threads, worker_threads.workers, block_size,
+            slices, shard);
+      key_offset += block_size;
     }
 
     LOG(INFO) << "Finish loading " << key_size << " keys and values from "
@@ -467,6 +1068,9 @@ class CuckooHashTableOfTensors final : public LookupInterface {
   Status LoadFromFileSystem(OpKernelContext* ctx, const string& dirpath,
                             const string& file_name, const size_t buffer_size,
                             bool load_entire_dir) {
+    mutex_lock l(mu_);
+    TF_RETURN_IF_ERROR(CheckNotFrozen());
+    DrainRetiringLocked();
     FileSystem* fs;
     const auto env = ctx->env();
     TF_RETURN_WITH_CONTEXT_IF_ERROR(env->GetFileSystemForFile(dirpath, &fs),
@@ -494,11 +1098,11 @@ class CuckooHashTableOfTensors final : public LookupInterface {
                          all_filepath.end());
       for (auto& fp : all_filepath) {
         TF_RETURN_IF_ERROR(
-            LoadFromFileSystemImpl(fs, value_dim, fp, buffer_size));
+            LoadFromFileSystemImpl(ctx, fs, value_dim, fp, buffer_size));
       }
     } else {
       string filepath = io::JoinPath(dirpath, file_name);
-      return LoadFromFileSystemImpl(fs, value_dim, filepath, buffer_size);
+      return LoadFromFileSystemImpl(ctx, fs, value_dim, filepath, buffer_size);
     }
     return TFOkStatus;
   }
@@ -513,15 +1117,230 @@ class CuckooHashTableOfTensors final : public LookupInterface {
 
   int64 MemoryUsed() const override {
     int64 ret = 0;
-    ret = (int64)table_->size();
+    ret = (int64)size();
     return sizeof(CuckooHashTableOfTensors) + ret;
   }
 
  private:
+  Status CheckNotFrozen() const {
+    if (frozen_.load()) {
+      return errors::FailedPrecondition(
+          "The table is frozen for inference, thaw it before writing.");
+    }
+    return TFOkStatus;
+  }
+
+  // Returns true if the caller may look up keys without bucket locks, it must
+  // then call EndLockFreeRead once done. Thawing waits for those readers.
+  bool BeginLockFreeRead() {
+    if (!frozen_.load()) {
+      return false;
+    }
+    lock_free_readers_.fetch_add(1);
+    if (frozen_.load()) {
+      return true;
+    }
+    lock_free_readers_.fetch_sub(1);
+    return false;
+  }
+
+  void EndLockFreeRead() { lock_free_readers_.fetch_sub(1); }
+
+  // Runs `fn(table, retiring)` for a lookup of `num_keys` keys. A table that
+  // grows incrementally is only read under mu_, so that its generations are
+  // not swapped meanwhile, and every lookup helps the migration along.
+  template <typename F>
+  void WithTables(int64 num_keys, F fn) {
+    if (!incremental_resize_) {
+      fn(table_, nullptr);
+      return;
+    }
+    {
+      tf_shared_lock l(mu_);
+      MigrateSome(num_keys);
+      fn(table_, retiring_);
+    }
+    MaybeRetire();
+  }
+
+  // Runs `fn(table, retiring)` for a write of `num_keys` keys. A write that
+  // makes libcuckoo grow the table in place counts as a resize, which holds
+  // up the batch for as long as it took.
+  template <typename F>
+  Status Write(OpKernelContext* ctx, int64 num_keys, F fn) {
+    {
+      tf_shared_lock l(mu_);
+      TF_RETURN_IF_ERROR(CheckNotFrozen());
+      MigrateSome(num_keys);
+      const size_t capacity = table_->capacity();
+      const uint64 start_micros = ctx->env()->NowMicros();
+      fn(table_, retiring_);
+      if (table_->capacity() > capacity) {
+        RecordResize(ctx->env()->NowMicros() - start_micros);
+      }
+    }
+    MaybeRetire();
+    MaybeGrow(ctx);
+    return TFOkStatus;
+  }
+
+  // Moves the next buckets of the retiring generation, at least
+  // kMinMigrateBuckets of them or one per key of the calling operation.
+  // Requires mu_ held shared.
+  void MigrateSome(int64 num_keys) {
+    if (retiring_ == nullptr) {
+      return;
+    }
+    const size_t buckets = retiring_buckets_.load();
+    const size_t step =
+        std::max(kMinMigrateBuckets, static_cast<size_t>(num_keys));
+    const size_t begin = migrate_next_.fetch_add(step);
+    if (begin < buckets) {
+      retiring_->migrate_buckets(begin, std::min(begin + step, buckets),
+                                 table_);
+    }
+  }
+
+  // Drops the retiring generation once all of its buckets were claimed. The
+  // exclusive lock waits for the claimers, so it is empty by then.
+  void MaybeRetire() {
+    const size_t buckets = retiring_buckets_.load();
+    if (buckets == 0 || migrate_next_.load() < buckets) {
+      return;
+    }
+    cpu::TableWrapperBase<K, V>* retired = nullptr;
+    {
+      mutex_lock l(mu_);
+      if (retiring_ == nullptr ||
+          migrate_next_.load() < retiring_buckets_.load()) {
+        return;
+      }
+      retired = retiring_;
+      retiring_ = nullptr;
+      retiring_buckets_.store(0);
+    }
+    delete retired;
+  }
+
+  // Moves whatever is left in the retiring generation. Requires mu_ held
+  // exclusively, for operations that walk the whole table.
+  void DrainRetiringLocked() {
+    if (retiring_ == nullptr) {
+      return;
+    }
+    retiring_->migrate_buckets(0, retiring_buckets_.load(), table_);
+    delete retiring_;
+    retiring_ = nullptr;
+    retiring_buckets_.store(0);
+  }
+
+  // Outputs all the keys and values. Requires mu_ held exclusively and the
+  // retiring generation drained.
+  Status ExportValuesLocked(OpKernelContext* ctx) {
+    Tensor* keys;
+    Tensor* values;
+    auto cursor = table_->export_cursor();
+    const auto table_size = cursor->size();
+    const auto output_key_size = static_cast<int64>(table_size);
+    TF_RETURN_IF_ERROR(
+        ctx->allocate_output("keys", TensorShape({output_key_size}), &keys));
+    TF_RETURN_IF_ERROR(ctx->allocate_output(
+        "values",
+        TensorShape({output_key_size, static_cast<int64>(runtime_dim_)}),
+        &values));
+    cursor->next((K*)keys->tensor_data().data(),
+                 (V*)values->tensor_data().data(), table_size);
+
+    return TFOkStatus;
+  }
+
+  // Starts building a table of twice the capacity in the background once the
+  // current one is kLoadFactorToGrow full. Only the swap of the generations
+  // holds up the table operations, the keys are then migrated a few buckets
+  // at a time by the operations themselves.
+  void MaybeGrow(OpKernelContext* ctx) {
+    if (!incremental_resize_ || growing_.load()) {
+      return;
+    }
+    size_t capacity = 0;
+    {
+      tf_shared_lock l(mu_);
+      capacity = table_->capacity();
+      if (retiring_ != nullptr || frozen_.load() ||
+          table_->size() < kLoadFactorToGrow * capacity) {
+        return;
+      }
+    }
+    bool expected = false;
+    if (!growing_.compare_exchange_strong(expected, true)) {
+      return;
+    }
+    // The closure keeps the table alive until it is done.
+    this->Ref();
+    Env* env = ctx->env();
+    env->SchedClosure([this, env, capacity]() {
+      cpu::TableWrapperBase<K, V>* grown = nullptr;
+      cpu::CreateStripedTable(num_subtables_, capacity * 2, runtime_dim_,
+                              &grown);
+      const uint64 start_micros = env->NowMicros();
+      {
+        mutex_lock l(mu_);
+        if (retiring_ == nullptr && !frozen_.load()) {
+          retiring_ = table_;
+          table_ = grown;
+          grown = nullptr;
+          migrate_next_.store(0);
+          retiring_buckets_.store(retiring_->bucket_count());
+        }
+      }
+      if (grown == nullptr) {
+        const uint64 pause_micros = env->NowMicros() - start_micros;
+        RecordResize(pause_micros);
+        LOG(INFO) << "Grew cuckoo hash table to capacity " << capacity * 2
+                  << ", operations paused for " << pause_micros
+                  << " microseconds.";
+      }
+      delete grown;
+      growing_.store(false);
+      this->Unref();
+    });
+  }
+
+  void RecordResize(int64 pause_micros) {
+    resize_count_.fetch_add(1);
+    pause_micros_total_.fetch_add(pause_micros);
+    int64 max_micros = pause_micros_max_.load();
+    while (pause_micros > max_micros &&
+           !pause_micros_max_.compare_exchange_weak(max_micros, pause_micros)) {
+    }
+  }
+
   TensorShape value_shape_;
   size_t runtime_dim_;
   cpu::TableWrapperBase<K, V>* table_ = nullptr;
   size_t init_size_;
+  // Number of lock striped subtables `table_` is split into.
+  size_t num_subtables_ = 1;
+  int64 batched_find_min_keys_ = 1024;
+  ShardingPolicy sharding_[kNumShardedOps];
+  // Held shared by writers and exclusively while freezing or thawing, while
+  // walking the whole table and while swapping generations. Lookups hold it
+  // shared only when the table grows incrementally.
+  mutable mutex mu_;
+  std::atomic<bool> frozen_{false};
+  std::atomic<int64> lock_free_readers_{0};
+
+  // With incremental resizing the previous generation of the table is kept as
+  // `retiring_` until its `retiring_buckets_` buckets are migrated to
+  // `table_`, `migrate_next_` is the first bucket no operation claimed yet.
+  bool incremental_resize_ = false;
+  cpu::TableWrapperBase<K, V>* retiring_ = nullptr;
+  std::atomic<size_t> retiring_buckets_{0};
+  std::atomic<size_t> migrate_next_{0};
+  std::atomic<bool> growing_{false};
+  std::atomic<int64> resize_count_{0};
+  std::atomic<int64> pause_micros_total_{0};
+  std::atomic<int64> pause_micros_max_{0};
 };
 
 }  // namespace lookup
@@ -652,6 +1471,58 @@ class HashTableFindWithExistsOp : public HashTableOpKernel {
   }
 };
 
+// Table find op over a group of tables holding the same key and value types.
+template <class K, class V>
+class HashTableFindGroupOp : public HashTableOpKernel {
+ public:
+  using HashTableOpKernel::HashTableOpKernel;
+
+  void Compute(OpKernelContext* ctx) override {
+    OpInputList handles;
+    OpInputList keys;
+    OpInputList default_values;
+    OP_REQUIRES_OK(ctx, ctx->input_list("table_handles", &handles));
+    OP_REQUIRES_OK(ctx, ctx->input_list("keys", &keys));
+    OP_REQUIRES_OK(ctx, ctx->input_list("default_values", &default_values));
+    OpOutputList values;
+    OpOutputList exists;
+    OP_REQUIRES_OK(ctx, ctx->output_list("values", &values));
+    OP_REQUIRES_OK(ctx, ctx->output_list("exists", &exists));
+
+    // The tables run one after the other, every find is already sharded
+    // over the worker threads by the table.
+    for (int i = 0; i < handles.size(); ++i) {
+      LookupInterface* table;
+      OP_REQUIRES_OK(
+          ctx,
+          LookupResource(ctx, handles[i].scalar<ResourceHandle>()(), &table));
+      core::ScopedUnref unref_me(table);
+      OP_REQUIRES(
+          ctx,
+          table->key_dtype() == DataTypeToEnum<K>::v() &&
+              table->value_dtype() == DataTypeToEnum<V>::v(),
+          errors::InvalidArgument(
+              "Table ", i, " holds ", DataTypeString(table->key_dtype()),
+              " keys and ", DataTypeString(table->value_dtype()),
+              " values, expected ", DataTypeString(DataTypeToEnum<K>::v()),
+              " and ", DataTypeString(DataTypeToEnum<V>::v())));
+      lookup::CuckooHashTableOfTensors<K, V>* table_cuckoo =
+          (lookup::CuckooHashTableOfTensors<K, V>*)table;
+
+      TensorShape output_shape = keys[i].shape();
+      output_shape.RemoveLastDims(table->key_shape().dims());
+      output_shape.AppendShape(table->value_shape());
+      Tensor* values_i;
+      Tensor* exists_i;
+      OP_REQUIRES_OK(ctx, values.allocate(i, output_shape, &values_i));
+      OP_REQUIRES_OK(ctx, exists.allocate(i, keys[i].shape(), &exists_i));
+      OP_REQUIRES_OK(
+          ctx, table_cuckoo->FindWithExists(ctx, keys[i], values_i,
+                                            default_values[i], *exists_i));
+    }
+  }
+};
+
 // Table insert op.
 class HashTableInsertOp : public HashTableOpKernel {
  public:
@@ -735,9 +1606,9 @@ class HashTableClearOp : public HashTableOpKernel {
   }
 };
 
-// Table accum op.
+// Op that removes the keys whose first value is less than a threshold.
 template <class K, class V>
-class HashTableAccumOp : public HashTableOpKernel {
+class HashTableRemoveIfLessOp : public HashTableOpKernel {
  public:
   using HashTableOpKernel::HashTableOpKernel;
 
@@ -749,16 +1620,178 @@ class HashTableAccumOp : public HashTableOpKernel {
     lookup::CuckooHashTableOfTensors<K, V>* table_cuckoo =
         (lookup::CuckooHashTableOfTensors<K, V>*)table;
 
-    DataTypeVector expected_inputs = {expected_input_0_, table->key_dtype(),
-                                      table->value_dtype(),
-                                      DataTypeToEnum<bool>::v()};
-    OP_REQUIRES_OK(ctx, ctx->MatchSignature(expected_inputs, {}));
+    DataTypeVector expected_inputs = {expected_input_0_, table->value_dtype()};
+    DataTypeVector expected_outputs = {table->key_dtype()};
+    OP_REQUIRES_OK(ctx, ctx->MatchSignature(expected_inputs, expected_outputs));
 
-    const Tensor& keys = ctx->input(1);
-    const Tensor& values_or_deltas = ctx->input(2);
-    const Tensor& exists = ctx->input(3);
-    OP_REQUIRES(ctx, (values_or_deltas.dtype() != DataTypeToEnum<tstring>::v()),
-                errors::InvalidArgument(
+    const Tensor& threshold = ctx->input(1);
+    OP_REQUIRES(ctx, TensorShapeUtils::IsScalar(threshold.shape()),
+                errors::InvalidArgument("threshold must be a scalar, got ",
+                                        threshold.shape().DebugString()));
+
+    int64 memory_used_before = 0;
+    if (ctx->track_allocations()) {
+      memory_used_before = table->MemoryUsed();
+    }
+    OP_REQUIRES_OK(ctx,
+                   table_cuckoo->RemoveIfLess(ctx, threshold.scalar<V>()()));
+    if (ctx->track_allocations()) {
+      ctx->record_persistent_memory_allocation(table->MemoryUsed() -
+                                               memory_used_before);
+    }
+  }
+};
+
+// Op that freezes or thaws a table.
+template <class K, class V>
+class HashTableSetFrozenOp : public HashTableOpKernel {
+ public:
+  using HashTableOpKernel::HashTableOpKernel;
+
+  void Compute(OpKernelContext* ctx) override {
+    LookupInterface* table;
+    OP_REQUIRES_OK(ctx, GetTable(ctx, &table));
+    core::ScopedUnref unref_me(table);
+
+    lookup::CuckooHashTableOfTensors<K, V>* table_cuckoo =
+        (lookup::CuckooHashTableOfTensors<K, V>*)table;
+
+    const Tensor& frozen = ctx->input(1);
+    OP_REQUIRES(ctx, TensorShapeUtils::IsScalar(frozen.shape()),
+                errors::InvalidArgument("frozen must be a scalar, got ",
+                                        frozen.shape().DebugString()));
+    OP_REQUIRES_OK(ctx, table_cuckoo->SetFrozen(frozen.scalar<bool>()()));
+  }
+};
+
+// Op that reports whether a table is frozen.
+template <class K, class V>
+class HashTableIsFrozenOp : public HashTableOpKernel {
+ public:
+  using HashTableOpKernel::HashTableOpKernel;
+
+  void Compute(OpKernelContext* ctx) override {
+    LookupInterface* table;
+    OP_REQUIRES_OK(ctx, GetTable(ctx, &table));
+    core::ScopedUnref unref_me(table);
+
+    lookup::CuckooHashTableOfTensors<K, V>* table_cuckoo =
+        (lookup::CuckooHashTableOfTensors<K, V>*)table;
+
+    Tensor* out;
+    OP_REQUIRES_OK(ctx, ctx->allocate_output("frozen", TensorShape({}), &out));
+    out->flat<bool>().setConstant(table_cuckoo->IsFrozen());
+  }
+};
+
+// Table op filling the values of missing keys from initial values.
+template <class K, class V>
+class HashTableInitMissingOp : public HashTableOpKernel {
+ public:
+  explicit HashTableInitMissingOp(OpKernelConstruction* ctx)
+      : HashTableOpKernel(ctx) {
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("insert", &insert_));
+  }
+
+  void Compute(OpKernelContext* ctx) override {
+    LookupInterface* table;
+    OP_REQUIRES_OK(ctx, GetTable(ctx, &table));
+    core::ScopedUnref unref_me(table);
+
+    lookup::CuckooHashTableOfTensors<K, V>* table_cuckoo =
+        (lookup::CuckooHashTableOfTensors<K, V>*)table;
+
+    DataTypeVector expected_inputs = {expected_input_0_, table->key_dtype(),
+                                      table->value_dtype(), DT_BOOL,
+                                      table->value_dtype()};
+    DataTypeVector expected_outputs = {table->value_dtype()};
+    OP_REQUIRES_OK(ctx, ctx->MatchSignature(expected_inputs, expected_outputs));
+
+    const Tensor& keys = ctx->input(1);
+    const Tensor& values = ctx->input(2);
+    const Tensor& exists = ctx->input(3);
+    const Tensor& init_values = ctx->input(4);
+    OP_REQUIRES(
+        ctx, exists.shape() == keys.shape(),
+        errors::InvalidArgument("exists must have the shape of keys, got ",
+                                exists.shape().DebugString(), " and ",
+                                keys.shape().DebugString()));
+    OP_REQUIRES(
+        ctx,
+        values.NumElements() ==
+            keys.NumElements() * table->value_shape().num_elements(),
+        errors::InvalidArgument("values must hold a row for each key, got "
+                                "shape ",
+                                values.shape().DebugString()));
+
+    Tensor* out;
+    OP_REQUIRES_OK(ctx, ctx->forward_input_or_allocate_output(
+                            {2}, 0, values.shape(), &out));
+    if (out->flat<V>().data() != values.flat<V>().data()) {
+      out->flat<V>() = values.flat<V>();
+    }
+
+    int64 memory_used_before = 0;
+    if (insert_ && ctx->track_allocations()) {
+      memory_used_before = table->MemoryUsed();
+    }
+    OP_REQUIRES_OK(ctx, table_cuckoo->InitMissing(ctx, keys, exists,
+                                                  init_values, insert_, out));
+    if (insert_ && ctx->track_allocations()) {
+      ctx->record_persistent_memory_allocation(table->MemoryUsed() -
+                                               memory_used_before);
+    }
+  }
+
+ private:
+  bool insert_;
+};
+
+// Table resize metrics op.
+template <class K, class V>
+class HashTableResizeMetricsOp : public HashTableOpKernel {
+ public:
+  using HashTableOpKernel::HashTableOpKernel;
+
+  void Compute(OpKernelContext* ctx) override {
+    LookupInterface* table;
+    OP_REQUIRES_OK(ctx, GetTable(ctx, &table));
+    core::ScopedUnref unref_me(table);
+
+    lookup::CuckooHashTableOfTensors<K, V>* table_cuckoo =
+        (lookup::CuckooHashTableOfTensors<K, V>*)table;
+
+    Tensor* out;
+    OP_REQUIRES_OK(ctx,
+                   ctx->allocate_output("metrics", TensorShape({4}), &out));
+    table_cuckoo->ResizeMetrics(out->flat<int64>().data());
+  }
+};
+
+// Table accum op.
+template <class K, class V>
+class HashTableAccumOp : public HashTableOpKernel {
+ public:
+  using HashTableOpKernel::HashTableOpKernel;
+
+  void Compute(OpKernelContext* ctx) override {
+    LookupInterface* table;
+    OP_REQUIRES_OK(ctx, GetTable(ctx, &table));
+    core::ScopedUnref unref_me(table);
+
+    lookup::CuckooHashTableOfTensors<K, V>* table_cuckoo =
+        (lookup::CuckooHashTableOfTensors<K, V>*)table;
+
+    DataTypeVector expected_inputs = {expected_input_0_, table->key_dtype(),
+                                      table->value_dtype(),
+                                      DataTypeToEnum<bool>::v()};
+    OP_REQUIRES_OK(ctx, ctx->MatchSignature(expected_inputs, {}));
+
+    const Tensor& keys = ctx->input(1);
+    const Tensor& values_or_deltas = ctx->input(2);
+    const Tensor& exists = ctx->input(3);
+    OP_REQUIRES(ctx, (values_or_deltas.dtype() != DataTypeToEnum<tstring>::v()),
+                errors::InvalidArgument(
                     "AccumOP is not supporting tstring value type!"));
     OP_REQUIRES_OK(
         ctx, table->CheckKeyAndValueTensorsForInsert(keys, values_or_deltas));
@@ -776,6 +1809,171 @@ class HashTableAccumOp : public HashTableOpKernel {
   }
 };
 
+// Table accum op taking the old and the new values instead of the deltas.
+template <class K, class V>
+class HashTableAccumDeltaOp : public HashTableOpKernel {
+ public:
+  using HashTableOpKernel::HashTableOpKernel;
+
+  void Compute(OpKernelContext* ctx) override {
+    LookupInterface* table;
+    OP_REQUIRES_OK(ctx, GetTable(ctx, &table));
+    core::ScopedUnref unref_me(table);
+
+    lookup::CuckooHashTableOfTensors<K, V>* table_cuckoo =
+        (lookup::CuckooHashTableOfTensors<K, V>*)table;
+
+    DataTypeVector expected_inputs = {
+        expected_input_0_, table->key_dtype(), table->value_dtype(),
+        table->value_dtype(), DataTypeToEnum<bool>::v()};
+    OP_REQUIRES_OK(ctx, ctx->MatchSignature(expected_inputs, {}));
+
+    const Tensor& keys = ctx->input(1);
+    const Tensor& old_values = ctx->input(2);
+    const Tensor& new_values = ctx->input(3);
+    const Tensor& exists = ctx->input(4);
+    OP_REQUIRES(ctx, (new_values.dtype() != DataTypeToEnum<tstring>::v()),
+                errors::InvalidArgument(
+                    "AccumDeltaOP is not supporting tstring value type!"));
+    OP_REQUIRES_OK(ctx,
+                   table->CheckKeyAndValueTensorsForInsert(keys, new_values));
+    OP_REQUIRES(ctx, old_values.shape() == new_values.shape(),
+                errors::InvalidArgument(
+                    "old_values and new_values must have the same shape, got ",
+                    old_values.shape().DebugString(), " and ",
+                    new_values.shape().DebugString()));
+    OP_REQUIRES(
+        ctx, exists.NumElements() == keys.NumElements(),
+        errors::InvalidArgument("exists must have one element per key, got ",
+                                exists.NumElements(), " for ",
+                                keys.NumElements(), " keys"));
+
+    int64 memory_used_before = 0;
+    if (ctx->track_allocations()) {
+      memory_used_before = table->MemoryUsed();
+    }
+    OP_REQUIRES_OK(ctx, table_cuckoo->AccumDelta(ctx, keys, old_values,
+                                                 new_values, exists));
+    if (ctx->track_allocations()) {
+      ctx->record_persistent_memory_allocation(table->MemoryUsed() -
+                                               memory_used_before);
+    }
+  }
+};
+
+// Table op adding deltas to the values of the keys, inserting the missing ones.
+template <class K, class V>
+class HashTableInsertOrAddOp : public HashTableOpKernel {
+ public:
+  using HashTableOpKernel::HashTableOpKernel;
+
+  void Compute(OpKernelContext* ctx) override {
+    LookupInterface* table;
+    OP_REQUIRES_OK(ctx, GetTable(ctx, &table));
+    core::ScopedUnref unref_me(table);
+
+    lookup::CuckooHashTableOfTensors<K, V>* table_cuckoo =
+        (lookup::CuckooHashTableOfTensors<K, V>*)table;
+
+    DataTypeVector expected_inputs = {expected_input_0_, table->key_dtype(),
+                                      table->value_dtype()};
+    OP_REQUIRES_OK(ctx, ctx->MatchSignature(expected_inputs, {}));
+
+    const Tensor& keys = ctx->input(1);
+    const Tensor& deltas = ctx->input(2);
+    OP_REQUIRES(ctx, (deltas.dtype() != DataTypeToEnum<tstring>::v()),
+                errors::InvalidArgument(
+                    "InsertOrAddOP is not supporting tstring value type!"));
+    OP_REQUIRES_OK(ctx, table->CheckKeyAndValueTensorsForInsert(keys, deltas));
+
+    int64 memory_used_before = 0;
+    if (ctx->track_allocations()) {
+      memory_used_before = table->MemoryUsed();
+    }
+    OP_REQUIRES_OK(ctx, table_cuckoo->InsertOrAdd(ctx, keys, deltas));
+    if (ctx->track_allocations()) {
+      ctx->record_persistent_memory_allocation(table->MemoryUsed() -
+                                               memory_used_before);
+    }
+  }
+};
+
+// Table op applying a sparse optimizer to the rows of the given keys in
+// place. A row holds the embedding followed by the slots of the optimizer.
+template <class K, class V>
+class HashTableApplyOptimizerOp : public HashTableOpKernel {
+ public:
+  explicit HashTableApplyOptimizerOp(OpKernelConstruction* ctx)
+      : HashTableOpKernel(ctx) {
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("optimizer", &optimizer_));
+  }
+
+  void Compute(OpKernelContext* ctx) override {
+    LookupInterface* table;
+    OP_REQUIRES_OK(ctx, GetTable(ctx, &table));
+    core::ScopedUnref unref_me(table);
+
+    lookup::CuckooHashTableOfTensors<K, V>* table_cuckoo =
+        (lookup::CuckooHashTableOfTensors<K, V>*)table;
+
+    DataTypeVector expected_inputs = {
+        expected_input_0_, table->key_dtype(), table->value_dtype(),
+        table->value_dtype(), table->value_dtype()};
+    OP_REQUIRES_OK(ctx, ctx->MatchSignature(expected_inputs, {}));
+
+    const Tensor& keys = ctx->input(1);
+    const Tensor& grads = ctx->input(2);
+    const Tensor& init_rows = ctx->input(3);
+    const Tensor& hyperparams = ctx->input(4);
+    const lookup::InTableOptimizer* optimizer =
+        lookup::FindInTableOptimizer(optimizer_);
+    OP_REQUIRES(ctx, optimizer != nullptr,
+                errors::InvalidArgument("Unsupported optimizer ", optimizer_));
+    OP_REQUIRES(ctx, TensorShapeUtils::IsVector(keys.shape()),
+                errors::InvalidArgument("keys must be a vector, got ",
+                                        keys.shape().DebugString()));
+    const int64 num_keys = keys.NumElements();
+    const int64 row_dim = table->value_shape().dim_size(0);
+    OP_REQUIRES(
+        ctx,
+        TensorShapeUtils::IsMatrix(grads.shape()) &&
+            grads.dim_size(0) == num_keys &&
+            grads.dim_size(1) * (1 + optimizer->num_slots) == row_dim,
+        errors::InvalidArgument("grads must have one row per key, holding a ",
+                                row_dim, " wide table row without the ",
+                                optimizer->num_slots, " slots of ", optimizer_,
+                                ", got ", grads.shape().DebugString()));
+    OP_REQUIRES(ctx,
+                TensorShapeUtils::IsMatrix(init_rows.shape()) &&
+                    init_rows.dim_size(0) == num_keys &&
+                    init_rows.dim_size(1) == row_dim,
+                errors::InvalidArgument(
+                    "init_rows must have one table row per key, got ",
+                    init_rows.shape().DebugString()));
+    OP_REQUIRES(ctx, hyperparams.NumElements() == optimizer->num_hyperparams,
+                errors::InvalidArgument(
+                    optimizer_, " takes ", optimizer->num_hyperparams,
+                    " hyperparameters, got ", hyperparams.NumElements()));
+
+    const lookup::cpu::RowUpdateFn<V> update =
+        lookup::InTableOptimizerUpdate<V>(
+            optimizer_, hyperparams.flat<V>().data(), grads.dim_size(1));
+    int64 memory_used_before = 0;
+    if (ctx->track_allocations()) {
+      memory_used_before = table->MemoryUsed();
+    }
+    OP_REQUIRES_OK(
+        ctx, table_cuckoo->ApplyOptimizer(ctx, keys, grads, init_rows, update));
+    if (ctx->track_allocations()) {
+      ctx->record_persistent_memory_allocation(table->MemoryUsed() -
+                                               memory_used_before);
+    }
+  }
+
+ private:
+  string optimizer_;
+};
+
 // Op that returns the size of the given table.
 class HashTableSizeOp : public HashTableOpKernel {
  public:
@@ -806,6 +2004,46 @@ class HashTableExportOp : public HashTableOpKernel {
   }
 };
 
+// Op that outputs the next chunk of keys and values.
+template <class K, class V>
+class HashTableExportChunkOp : public HashTableOpKernel {
+ public:
+  using HashTableOpKernel::HashTableOpKernel;
+
+  void Compute(OpKernelContext* ctx) override {
+    LookupInterface* table;
+    OP_REQUIRES_OK(ctx, GetTable(ctx, &table));
+    core::ScopedUnref unref_me(table);
+
+    const int64 offset = ctx->input(1).scalar<int64>()();
+    const int64 batch_size = ctx->input(2).scalar<int64>()();
+    OP_REQUIRES(ctx, batch_size > 0,
+                errors::InvalidArgument("batch_size must be positive, got ",
+                                        batch_size));
+
+    lookup::CuckooHashTableOfTensors<K, V>* table_cuckoo =
+        (lookup::CuckooHashTableOfTensors<K, V>*)table;
+    OP_REQUIRES_OK(ctx, table_cuckoo->ExportChunk(ctx, offset, batch_size));
+  }
+};
+
+// Op that outputs tensors of all keys and all values and empties the table.
+template <class K, class V>
+class HashTableExportAndClearOp : public HashTableOpKernel {
+ public:
+  using HashTableOpKernel::HashTableOpKernel;
+
+  void Compute(OpKernelContext* ctx) override {
+    LookupInterface* table;
+    OP_REQUIRES_OK(ctx, GetTable(ctx, &table));
+    core::ScopedUnref unref_me(table);
+
+    lookup::CuckooHashTableOfTensors<K, V>* table_cuckoo =
+        (lookup::CuckooHashTableOfTensors<K, V>*)table;
+    OP_REQUIRES_OK(ctx, table_cuckoo->ExportAndClear(ctx));
+  }
+};
+
 // Op that save all keys and values to FileSystem.
 template <class K, class V>
 class HashTableSaveToFileSystemOp : public HashTableOpKernel {
@@ -969,6 +2207,56 @@ REGISTER_KERNEL_BUILDER(
                               .TypeConstraint<key_dtype>("key_dtype")         \
                               .TypeConstraint<value_dtype>("value_dtype"),    \
                           HashTableClearOp<key_dtype, value_dtype>);          \
+  REGISTER_KERNEL_BUILDER(Name(PREFIX_OP_NAME(CuckooHashTableRemoveIfLess))   \
+                              .Device(DEVICE_CPU)                             \
+                              .TypeConstraint<key_dtype>("key_dtype")         \
+                              .TypeConstraint<value_dtype>("value_dtype"),    \
+                          HashTableRemoveIfLessOp<key_dtype, value_dtype>);   \
+  REGISTER_KERNEL_BUILDER(Name(PREFIX_OP_NAME(CuckooHashTableSetFrozen))      \
+                              .Device(DEVICE_CPU)                             \
+                              .TypeConstraint<key_dtype>("key_dtype")         \
+                              .TypeConstraint<value_dtype>("value_dtype"),    \
+                          HashTableSetFrozenOp<key_dtype, value_dtype>);      \
+  REGISTER_KERNEL_BUILDER(Name(PREFIX_OP_NAME(CuckooHashTableIsFrozen))       \
+                              .Device(DEVICE_CPU)                             \
+                              .TypeConstraint<key_dtype>("key_dtype")         \
+                              .TypeConstraint<value_dtype>("value_dtype"),    \
+                          HashTableIsFrozenOp<key_dtype, value_dtype>);       \
+  REGISTER_KERNEL_BUILDER(Name(PREFIX_OP_NAME(CuckooHashTableInitMissing))    \
+                              .Device(DEVICE_CPU)                             \
+                              .TypeConstraint<key_dtype>("Tin")               \
+                              .TypeConstraint<value_dtype>("Tout"),           \
+                          HashTableInitMissingOp<key_dtype, value_dtype>);    \
+  REGISTER_KERNEL_BUILDER(Name(PREFIX_OP_NAME(CuckooHashTableFindGroup))      \
+                              .Device(DEVICE_CPU)                             \
+                              .TypeConstraint<key_dtype>("key_dtype")         \
+                              .TypeConstraint<value_dtype>("value_dtype"),    \
+                          HashTableFindGroupOp<key_dtype, value_dtype>);      \
+  REGISTER_KERNEL_BUILDER(Name(PREFIX_OP_NAME(CuckooHashTableExportChunk))    \
+                              .Device(DEVICE_CPU)                             \
+                              .TypeConstraint<key_dtype>("key_dtype")         \
+                              .TypeConstraint<value_dtype>("value_dtype"),    \
+                          HashTableExportChunkOp<key_dtype, value_dtype>);    \
+  REGISTER_KERNEL_BUILDER(Name(PREFIX_OP_NAME(CuckooHashTableExportAndClear)) \
+                              .Device(DEVICE_CPU)                             \
+                              .TypeConstraint<key_dtype>("key_dtype")         \
+                              .TypeConstraint<value_dtype>("value_dtype"),    \
+                          HashTableExportAndClearOp<key_dtype, value_dtype>); \
+  REGISTER_KERNEL_BUILDER(Name(PREFIX_OP_NAME(CuckooHashTableResizeMetrics))  \
+                              .Device(DEVICE_CPU)                             \
+                              .TypeConstraint<key_dtype>("key_dtype")         \
+                              .TypeConstraint<value_dtype>("value_dtype"),    \
+                          HashTableResizeMetricsOp<key_dtype, value_dtype>);  \
+  REGISTER_KERNEL_BUILDER(Name(PREFIX_OP_NAME(CuckooHashTableAccumDelta))     \
+                              .Device(DEVICE_CPU)                             \
+                              .TypeConstraint<key_dtype>("key_dtype")         \
+                              .TypeConstraint<value_dtype>("value_dtype"),    \
+                          HashTableAccumDeltaOp<key_dtype, value_dtype>);     \
+  REGISTER_KERNEL_BUILDER(Name(PREFIX_OP_NAME(CuckooHashTableInsertOrAdd))    \
+                              .Device(DEVICE_CPU)                             \
+                              .TypeConstraint<key_dtype>("key_dtype")         \
+                              .TypeConstraint<value_dtype>("value_dtype"),    \
+                          HashTableInsertOrAddOp<key_dtype, value_dtype>);    \
   REGISTER_KERNEL_BUILDER(Name(PREFIX_OP_NAME(CuckooHashTableAccum))          \
                               .Device(DEVICE_CPU)                             \
                               .TypeConstraint<key_dtype>("key_dtype")         \
@@ -1014,5 +2302,22 @@ REGISTER_KERNEL(tstring, bfloat16);
 
 #undef REGISTER_KERNEL
 
+// The optimizers are only applied to floating point values.
+#define REGISTER_APPLY_OPTIMIZER_KERNEL(key_dtype, value_dtype)               \
+  REGISTER_KERNEL_BUILDER(Name(PREFIX_OP_NAME(CuckooHashTableApplyOptimizer)) \
+                              .Device(DEVICE_CPU)                             \
+                              .TypeConstraint<key_dtype>("key_dtype")         \
+                              .TypeConstraint<value_dtype>("value_dtype"),    \
+                          HashTableApplyOptimizerOp<key_dtype, value_dtype>);
+
+REGISTER_APPLY_OPTIMIZER_KERNEL(int32, double);
+REGISTER_APPLY_OPTIMIZER_KERNEL(int32, float);
+REGISTER_APPLY_OPTIMIZER_KERNEL(int64, double);
+REGISTER_APPLY_OPTIMIZER_KERNEL(int64, float);
+REGISTER_APPLY_OPTIMIZER_KERNEL(tstring, double);
+REGISTER_APPLY_OPTIMIZER_KERNEL(tstring, float);
+
+#undef REGISTER_APPLY_OPTIMIZER_KERNEL
+
 }  // namespace recommenders_addons
 }  // namespace tensorflow
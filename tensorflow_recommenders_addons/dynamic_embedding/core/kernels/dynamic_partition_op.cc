@@ -15,6 +15,11 @@ limitations under the License.
 
 // See docs in ../ops/data_flow_ops.cc.
 
+#include <algorithm>
+#include <atomic>
+#include <cmath>
+#include <functional>
+#include <utility>
 #include <vector>
 
 #include "tensorflow/core/framework/bounds_check.h"
@@ -23,11 +28,127 @@ limitations under the License.
 #include "tensorflow/core/framework/tensor.h"
 #include "tensorflow/core/framework/types.h"
 #include "tensorflow/core/lib/gtl/inlined_vector.h"
+#include "tensorflow/core/platform/hash.h"
 #include "tensorflow/core/util/util.h"
+#include "tensorflow/core/util/work_sharder.h"
 #include "tensorflow_recommenders_addons/dynamic_embedding/core/utils/utils.h"
 
 namespace tensorflow {
 
+namespace {
+
+// Partition ids are counted and scattered in blocks of at least this many
+// consecutive rows, one block per CPU worker thread at most.
+constexpr int64_t kMinRowsPerBlock = 16384;
+
+// The partition ids split into blocks of consecutive rows. Each block writes
+// its rows of partition p from the number of ids p in the blocks before it,
+// so the rows of every partition keep their order in the input.
+struct PartitionBlocks {
+  int64_t num_blocks = 1;
+  int64_t block_size = 0;
+  // offsets[b * num_partitions + p] is the row of partition p that the first
+  // id p of block b goes to.
+  std::vector<int64_t> offsets;
+  gtl::InlinedVector<int64_t, 32> partition_count;
+};
+
+// Runs fn(b) for the blocks [0, num_blocks) on the CPU worker threads.
+void RunBlocks(OpKernelContext* c, int64_t num_blocks, int64_t cost_per_block,
+               const std::function<void(int64_t)>& fn) {
+  if (num_blocks == 1) {
+    fn(0);
+    return;
+  }
+  auto* worker_threads = c->device()->tensorflow_cpu_worker_threads();
+  Shard(worker_threads->num_threads, worker_threads->workers, num_blocks,
+        cost_per_block, [&fn](int64 begin, int64 end) {
+          for (int64 b = begin; b < end; ++b) {
+            fn(b);
+          }
+        });
+}
+
+// Counts the ids of every partition with one histogram per block, then turns
+// the histograms into the offsets of the blocks by prefix sums.
+Status CountPartitions(OpKernelContext* c, const Tensor& partitions,
+                       int num_partitions, PartitionBlocks* blocks) {
+  auto e_partitions = partitions.flat<int32>();
+  const int64_t N = e_partitions.dimension(0);
+  const int64_t num_threads =
+      c->device()->tensorflow_cpu_worker_threads()->num_threads;
+  blocks->num_blocks =
+      std::max<int64_t>(1, std::min(num_threads, N / kMinRowsPerBlock));
+  blocks->block_size = (N + blocks->num_blocks - 1) / blocks->num_blocks;
+
+  std::vector<int64_t> counts(blocks->num_blocks * num_partitions, 0);
+  // The first id out of range in each block, as (row, id).
+  std::vector<std::pair<int64_t, int32_t>> bad(blocks->num_blocks, {-1, 0});
+  RunBlocks(c, blocks->num_blocks, blocks->block_size, [&](int64_t b) {
+    int64_t* count = counts.data() + b * num_partitions;
+    const int64_t end = std::min(N, (b + 1) * blocks->block_size);
+    for (int64_t i = b * blocks->block_size; i < end; i++) {
+      const int32_t p = internal::SubtleMustCopy(e_partitions(i));
+      if (!FastBoundsCheck(p, num_partitions)) {
+        bad[b] = {i, p};
+        return;
+      }
+      count[p]++;
+    }
+  });
+  for (const auto& row_and_id : bad) {
+    if (row_and_id.first >= 0) {
+      return errors::InvalidArgument(
+          "partitions", SliceDebugString(partitions.shape(), row_and_id.first),
+          " = ", row_and_id.second, " is not in [0, ", num_partitions, ")");
+    }
+  }
+
+  blocks->partition_count.assign(num_partitions, 0);
+  blocks->offsets.resize(blocks->num_blocks * num_partitions);
+  for (int p = 0; p < num_partitions; p++) {
+    int64_t offset = 0;
+    for (int64_t b = 0; b < blocks->num_blocks; b++) {
+      blocks->offsets[b * num_partitions + p] = offset;
+      offset += counts[b * num_partitions + p];
+    }
+    blocks->partition_count[p] = offset;
+  }
+  return TFOkStatus;
+}
+
+// Copies the rows of `row_size` elements of `src` to their partition in
+// `dst`. Returns false if the partition ids changed since they were counted.
+template <class T>
+bool ScatterRows(OpKernelContext* c, const Tensor& partitions,
+                 const PartitionBlocks& blocks, const T* src, int64_t row_size,
+                 const std::vector<T*>& dst) {
+  auto e_partitions = partitions.flat<int32>();
+  const int64_t N = e_partitions.dimension(0);
+  const int num_partitions = static_cast<int>(dst.size());
+  std::atomic<bool> in_range(true);
+  RunBlocks(c, blocks.num_blocks, blocks.block_size * row_size, [&](int64_t b) {
+    gtl::InlinedVector<int64_t, 32> output_index(
+        blocks.offsets.begin() + b * num_partitions,
+        blocks.offsets.begin() + (b + 1) * num_partitions);
+    const int64_t end = std::min(N, (b + 1) * blocks.block_size);
+    for (int64_t i = b * blocks.block_size; i < end; i++) {
+      const int32_t p = internal::SubtleMustCopy(e_partitions(i));
+      if (!FastBoundsCheck(p, num_partitions) ||
+          output_index[p] >= blocks.partition_count[p]) {
+        in_range.store(false);
+        return;
+      }
+      std::copy_n(src + i * row_size, row_size,
+                  dst[p] + output_index[p] * row_size);
+      output_index[p]++;
+    }
+  });
+  return in_range.load();
+}
+
+}  // namespace
+
 // Shared code that is not dependent on the type of T.  We do this to reduce
 // code size by not duplicating all this for all T (float, double, int32, etc.)
 class TfraDynamicPartitionOp_Shared : public OpKernel {
@@ -43,8 +164,8 @@ class TfraDynamicPartitionOp_Shared : public OpKernel {
   }
 
   void ValidateAndAllocateOutputs(OpKernelContext* c, const Tensor** data,
-                                  const Tensor** partitions,
-                                  OpOutputList* Tout) {
+                                  const Tensor** partitions, OpOutputList* Tout,
+                                  PartitionBlocks* blocks) {
     OP_REQUIRES_OK(c, c->input("data", data));
     OP_REQUIRES_OK(c, c->input("partitions", partitions));
     OP_REQUIRES(
@@ -56,23 +177,14 @@ class TfraDynamicPartitionOp_Shared : public OpKernel {
             ", partitions.shape = ", (*partitions)->shape().DebugString()));
 
     // Count how many occurrences of each partition id we have in partitions
-    gtl::InlinedVector<int, 32> partition_count(num_partitions_);
-    auto e_partitions = (*partitions)->flat<int32>();
-    const int64_t N = e_partitions.dimension(0);
-    for (int64_t i = 0; i < N; i++) {
-      const int32_t p = internal::SubtleMustCopy(e_partitions(i));
-      OP_REQUIRES(c, FastBoundsCheck(p, num_partitions_),
-                  errors::InvalidArgument(
-                      "partitions", SliceDebugString((*partitions)->shape(), i),
-                      " = ", p, " is not in [0, ", num_partitions_, ")"));
-      partition_count[p]++;
-    }
+    OP_REQUIRES_OK(c,
+                   CountPartitions(c, **partitions, num_partitions_, blocks));
 
     // Allocate output tensors of the right size
     OP_REQUIRES_OK(c, c->output_list("outputs", Tout));
     for (int p = 0; p < num_partitions_; p++) {
       TensorShape shape;
-      shape.AddDim(partition_count[p]);
+      shape.AddDim(blocks->partition_count[p]);
       for (int i = (*partitions)->dims(); i < (*data)->dims(); i++) {
         shape.AddDim((*data)->dim_size(i));
       }
@@ -94,70 +206,25 @@ class TfraDynamicPartitionOp : public TfraDynamicPartitionOp_Shared {
     const Tensor* data;
     const Tensor* partitions;
     OpOutputList outputs;
-    ValidateAndAllocateOutputs(c, &data, &partitions, &outputs);
+    PartitionBlocks blocks;
+    ValidateAndAllocateOutputs(c, &data, &partitions, &outputs, &blocks);
     if (!c->status().ok()) return;
     if (num_partitions_ == 0 || data->NumElements() == 0) return;
 
-    auto e_partitions = partitions->flat<int32>();
-    const int64_t N = e_partitions.dimension(0);
-    gtl::InlinedVector<int, 32> output_index(num_partitions_);
-
-    if (partitions->dims() == data->dims()) {
-      // Walk through data and copy the data to the appropriate output tensor
-      const auto data_flat = data->flat<T>();
-      std::vector<Eigen::TensorMap<Eigen::Tensor<T, 1, Eigen::RowMajor>,
-                                   Eigen::Aligned> >
-          out_vec;
-      out_vec.reserve(num_partitions_);
-      for (int p = 0; p < num_partitions_; p++) {
-        out_vec.push_back(outputs[p]->vec<T>());
-      }
-      for (int64_t i = 0; i < N; i++) {
-        const int32_t p = internal::SubtleMustCopy(e_partitions(i));
-        OP_REQUIRES(
-            c, FastBoundsCheck(p, num_partitions_),
-            errors::InvalidArgument("indices[", i, "] is out of range"));
-        auto oi = output_index[p];
-        OP_REQUIRES(c, FastBoundsCheck(oi, out_vec[p].size()),
-                    errors::InvalidArgument(
-                        "out_vec[", p, "] size: ", out_vec[p].size(),
-                        " is not LTE output_index[", p, "] : ", oi));
-        out_vec[p](oi) = data_flat(i);
-        output_index[p]++;
-      }
-    } else {
-      // If data has extra dimensions, use Eigen slices
-      std::vector<Eigen::TensorMap<Eigen::Tensor<T, 2, Eigen::RowMajor>,
-                                   Eigen::Aligned> >
-          out_flat;
-      out_flat.reserve(num_partitions_);
-      for (int p = 0; p < num_partitions_; p++) {
-        out_flat.push_back(outputs[p]->flat_outer_dims<T>());
-      }
-
-      // Walk through data and copy the data to the appropriate output tensor
-      const int64_t slice_size = data->NumElements() / N;
-      const auto data_flat = data->shaped<T, 2>({N, slice_size});
-      Eigen::DSizes<Eigen::DenseIndex, 2> sizes(1, slice_size);
-      for (int64_t i = 0; i < N; i++) {
-        // outputs[p][output_index[p]++] = data[i]
-        const int32_t p = internal::SubtleMustCopy(e_partitions(i));
-        OP_REQUIRES(
-            c, FastBoundsCheck(p, num_partitions_),
-            errors::InvalidArgument("indices[", i,
-                                    "] has been asynchronously overwritten and "
-                                    "is no longer in range!"));
-        auto oi = output_index[p];
-        OP_REQUIRES(c, FastBoundsCheck(oi, out_flat[p].dimension(0)),
-                    errors::InvalidArgument("Size of output_index: ", oi,
-                                            " is no longer in range."));
-        Eigen::DSizes<Eigen::DenseIndex, 2> out_indices(oi, 0);
-        Eigen::DSizes<Eigen::DenseIndex, 2> data_indices(i, 0);
-        out_flat[p].slice(out_indices, sizes) =
-            data_flat.slice(data_indices, sizes);
-        output_index[p]++;
-      }
+    // Walk through data and copy the data to the appropriate output tensor,
+    // a slice of `row_size` elements per partition id.
+    const int64_t N = partitions->NumElements();
+    const int64_t row_size = data->NumElements() / N;
+    std::vector<T*> out(num_partitions_);
+    for (int p = 0; p < num_partitions_; p++) {
+      out[p] = outputs[p]->flat<T>().data();
     }
+    OP_REQUIRES(c,
+                ScatterRows(c, *partitions, blocks, data->flat<T>().data(),
+                            row_size, out),
+                errors::InvalidArgument("partitions have been asynchronously "
+                                        "overwritten and are no longer in "
+                                        "range!"));
   }
 };
 
@@ -170,4 +237,238 @@ class TfraDynamicPartitionOp : public TfraDynamicPartitionOp_Shared {
 TF_CALL_ALL_TYPES(REGISTER_DYNAMIC_PARTITION);
 #undef REGISTER_DYNAMIC_PARTITION
 
+// Partitions any number of tensors by the same partition ids. The ids are
+// counted once, then every data tensor is scattered by the same blocks,
+// instead of recounting the ids for every tensor as one TfraDynamicPartition
+// per tensor does. It also outputs the positions of the rows of each
+// partition, for stitching the results back.
+class TfraMultiDynamicPartitionOp : public OpKernel {
+ public:
+  explicit TfraMultiDynamicPartitionOp(OpKernelConstruction* c) : OpKernel(c) {
+    OP_REQUIRES_OK(c, c->GetAttr("num_partitions", &num_partitions_));
+  }
+
+  void Compute(OpKernelContext* c) override {
+    OpInputList data;
+    OP_REQUIRES_OK(c, c->input_list("data", &data));
+    const Tensor& partitions = c->input(data.size());
+    OpOutputList outputs;
+    OP_REQUIRES_OK(c, c->output_list("outputs", &outputs));
+    OP_REQUIRES(c, outputs.size() == data.size() * num_partitions_,
+                errors::InvalidArgument(
+                    "Expected ", data.size() * num_partitions_, " outputs for ",
+                    data.size(), " data tensors and ", num_partitions_,
+                    " partitions, got ", outputs.size()));
+    for (int j = 0; j < data.size(); j++) {
+      OP_REQUIRES(
+          c, TensorShapeUtils::StartsWith(data[j].shape(), partitions.shape()),
+          errors::InvalidArgument(
+              "data.shape must start with partitions.shape, ", "got data[", j,
+              "].shape = ", data[j].shape().DebugString(),
+              ", partitions.shape = ", partitions.shape().DebugString()));
+      OP_REQUIRES(
+          c,
+          DataTypeCanUseMemcpy(data[j].dtype()) || data[j].dtype() == DT_STRING,
+          errors::Unimplemented("Unsupported data type ",
+                                DataTypeString(data[j].dtype())));
+      // The rows are copied bytewise, so the outputs must have their type.
+      for (int p = 0; p < num_partitions_; p++) {
+        OP_REQUIRES(c,
+                    outputs.expected_output_dtype(j * num_partitions_ + p) ==
+                        data[j].dtype(),
+                    errors::InvalidArgument(
+                        "Tout[", j * num_partitions_ + p, "] = ",
+                        DataTypeString(outputs.expected_output_dtype(
+                            j * num_partitions_ + p)),
+                        " does not match data[", j,
+                        "].dtype = ", DataTypeString(data[j].dtype())));
+      }
+    }
+
+    // The only pass counting the partition ids.
+    PartitionBlocks blocks;
+    OP_REQUIRES_OK(c, CountPartitions(c, partitions, num_partitions_, &blocks));
+    const int64_t N = partitions.NumElements();
+
+    OpOutputList indices;
+    OP_REQUIRES_OK(c, c->output_list("indices", &indices));
+    std::vector<int32*> indices_out(num_partitions_);
+    for (int p = 0; p < num_partitions_; p++) {
+      Tensor* out;
+      OP_REQUIRES_OK(c, indices.allocate(
+                            p, TensorShape({blocks.partition_count[p]}), &out));
+      indices_out[p] = out->flat<int32>().data();
+    }
+    std::atomic<bool> indices_in_range(true);
+    RunBlocks(c, blocks.num_blocks, blocks.block_size, [&](int64_t b) {
+      auto e_partitions = partitions.flat<int32>();
+      gtl::InlinedVector<int64_t, 32> output_index(
+          blocks.offsets.begin() + b * num_partitions_,
+          blocks.offsets.begin() + (b + 1) * num_partitions_);
+      const int64_t end = std::min(N, (b + 1) * blocks.block_size);
+      for (int64_t i = b * blocks.block_size; i < end; i++) {
+        const int32_t p = internal::SubtleMustCopy(e_partitions(i));
+        if (!FastBoundsCheck(p, num_partitions_) ||
+            output_index[p] >= blocks.partition_count[p]) {
+          indices_in_range.store(false);
+          return;
+        }
+        indices_out[p][output_index[p]++] = static_cast<int32>(i);
+      }
+    });
+    OP_REQUIRES(c, indices_in_range.load(),
+                errors::InvalidArgument("partitions have been "
+                                        "asynchronously overwritten and are "
+                                        "no longer in range!"));
+
+    for (int j = 0; j < data.size(); j++) {
+      const Tensor& d = data[j];
+      TensorShape row_shape;
+      for (int k = partitions.dims(); k < d.dims(); k++) {
+        row_shape.AddDim(d.dim_size(k));
+      }
+      std::vector<Tensor*> out(num_partitions_);
+      for (int p = 0; p < num_partitions_; p++) {
+        TensorShape shape({blocks.partition_count[p]});
+        shape.AppendShape(row_shape);
+        OP_REQUIRES_OK(
+            c, outputs.allocate(j * num_partitions_ + p, shape, &out[p]));
+      }
+      const int64_t row_size = row_shape.num_elements();
+      if (N == 0 || row_size == 0) continue;
+      bool in_range;
+      if (d.dtype() == DT_STRING) {
+        std::vector<tstring*> dst(num_partitions_);
+        for (int p = 0; p < num_partitions_; p++) {
+          dst[p] = out[p]->flat<tstring>().data();
+        }
+        in_range = ScatterRows(c, partitions, blocks, d.flat<tstring>().data(),
+                               row_size, dst);
+      } else {
+        // Any other type is copied bytewise.
+        std::vector<char*> dst(num_partitions_);
+        for (int p = 0; p < num_partitions_; p++) {
+          dst[p] = const_cast<char*>(out[p]->tensor_data().data());
+        }
+        in_range = ScatterRows(c, partitions, blocks, d.tensor_data().data(),
+                               row_size * DataTypeSize(d.dtype()), dst);
+      }
+      OP_REQUIRES(c, in_range,
+                  errors::InvalidArgument("partitions have been "
+                                          "asynchronously overwritten and are "
+                                          "no longer in range!"));
+    }
+  }
+
+ private:
+  int num_partitions_;
+};
+
+REGISTER_KERNEL_BUILDER(
+    Name(PREFIX_OP_NAME(MultiDynamicPartition)).Device(DEVICE_CPU),
+    TfraMultiDynamicPartitionOp);
+
+#if GOOGLE_CUDA
+// Tensors placed on GPUs are partitioned on the host.
+REGISTER_KERNEL_BUILDER(Name(PREFIX_OP_NAME(MultiDynamicPartition))
+                            .Device(DEVICE_GPU)
+                            .HostMemory("data")
+                            .HostMemory("partitions")
+                            .HostMemory("outputs")
+                            .HostMemory("indices"),
+                        TfraMultiDynamicPartitionOp);
+#endif  // GOOGLE_CUDA
+
+namespace {
+
+// Spreads consecutive integer keys over the whole 64-bit range, the finalizer
+// of MurmurHash3.
+inline uint64 MixKey(uint64 k) {
+  k ^= k >> 33;
+  k *= 0xff51afd7ed558ccdULL;
+  k ^= k >> 33;
+  k *= 0xc4ceb9fe1a85ec53ULL;
+  k ^= k >> 33;
+  return k;
+}
+
+// Jump consistent hash, Lamping & Veach, "A Fast, Minimal Memory, Consistent
+// Hash Algorithm".
+inline int32 JumpHash(uint64 key, int32 num_buckets) {
+  int64_t b = -1;
+  int64_t j = 0;
+  while (j < num_buckets) {
+    b = j;
+    key = key * 2862933555777941757ULL + 1;
+    j = static_cast<int64_t>((b + 1) * (static_cast<double>(1LL << 31) /
+                                        static_cast<double>((key >> 33) + 1)));
+  }
+  return static_cast<int32>(b);
+}
+
+inline uint64 HashKey(int32 key) {
+  return MixKey(static_cast<uint64>(static_cast<int64_t>(key)));
+}
+inline uint64 HashKey(int64 key) { return MixKey(static_cast<uint64>(key)); }
+inline uint64 HashKey(const tstring& key) {
+  return Hash64(key.data(), key.size());
+}
+
+}  // namespace
+
+template <typename T>
+class TfraJumpHashPartitionOp : public OpKernel {
+ public:
+  explicit TfraJumpHashPartitionOp(OpKernelConstruction* c) : OpKernel(c) {
+    OP_REQUIRES_OK(c, c->GetAttr("num_partitions", &num_partitions_));
+  }
+
+  void Compute(OpKernelContext* c) override {
+    const Tensor& keys = c->input(0);
+    Tensor* partitions = nullptr;
+    OP_REQUIRES_OK(c, c->allocate_output(0, keys.shape(), &partitions));
+    const auto e_keys = keys.flat<T>();
+    auto e_partitions = partitions->flat<int32>();
+    // Each key takes about ln(num_partitions) jumps.
+    const int64_t cost_per_key =
+        16 * static_cast<int64_t>(std::log2(num_partitions_) + 1);
+    auto* worker_threads = c->device()->tensorflow_cpu_worker_threads();
+    Shard(worker_threads->num_threads, worker_threads->workers, e_keys.size(),
+          cost_per_key, [&](int64 begin, int64 end) {
+            for (int64 i = begin; i < end; ++i) {
+              e_partitions(i) = JumpHash(HashKey(e_keys(i)), num_partitions_);
+            }
+          });
+  }
+
+ private:
+  int32 num_partitions_;
+};
+
+#define REGISTER_JUMP_HASH_PARTITION(T)                           \
+  REGISTER_KERNEL_BUILDER(Name(PREFIX_OP_NAME(JumpHashPartition)) \
+                              .Device(DEVICE_CPU)                 \
+                              .TypeConstraint<T>("T"),            \
+                          TfraJumpHashPartitionOp<T>)
+
+REGISTER_JUMP_HASH_PARTITION(int32);
+REGISTER_JUMP_HASH_PARTITION(int64);
+REGISTER_JUMP_HASH_PARTITION(tstring);
+#undef REGISTER_JUMP_HASH_PARTITION
+
+#if GOOGLE_CUDA
+// Keys placed on GPUs are hashed on the host.
+#define REGISTER_JUMP_HASH_PARTITION_GPU(T)                       \
+  REGISTER_KERNEL_BUILDER(Name(PREFIX_OP_NAME(JumpHashPartition)) \
+                              .Device(DEVICE_GPU)                 \
+                              .HostMemory("keys")                 \
+                              .HostMemory("partitions")           \
+                              .TypeConstraint<T>("T"),            \
+                          TfraJumpHashPartitionOp<T>)
+
+REGISTER_JUMP_HASH_PARTITION_GPU(int32);
+REGISTER_JUMP_HASH_PARTITION_GPU(int64);
+#undef REGISTER_JUMP_HASH_PARTITION_GPU
+#endif  // GOOGLE_CUDA
+
 }  // namespace tensorflow
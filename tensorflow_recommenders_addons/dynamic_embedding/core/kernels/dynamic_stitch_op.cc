@@ -15,11 +15,18 @@ limitations under the License.
 
 // See docs in ../ops/data_flow_ops.cc.
 
+#include <algorithm>
+#include <atomic>
+#include <memory>
+#include <utility>
+#include <vector>
+
 #include "tensorflow/core/framework/bounds_check.h"
 #include "tensorflow/core/framework/op_kernel.h"
 #include "tensorflow/core/framework/register_types.h"
 #include "tensorflow/core/framework/tensor.h"
 #include "tensorflow/core/lib/core/threadpool.h"
+#include "tensorflow/core/util/work_sharder.h"
 
 #if GOOGLE_CUDA || TENSORFLOW_USE_ROCM
 #include "tensorflow/core/kernels/gpu_device_array.h"
@@ -338,7 +345,9 @@ class TfraDynamicStitchOpImplCPU : public TfraDynamicStitchOpImplBase<T> {
 
     // TODO(jeff): Currently we leave uninitialized any portions of
     // merged that aren't covered by an index in indices.  What should we do?
-    if (first_dim_size > 0) {
+    if (first_dim_size > 0 && UseBlocks(c, indices_inputs)) {
+      BlockStitch(c, indices_inputs, data_inputs, first_dim_size, merged);
+    } else if (first_dim_size > 0) {
       auto merged_flat = merged->flat_outer_dims<T>();
       // slice_size must not be stored as int for cases of tensors over 2GB.
       const auto slice_size = merged_flat.dimension(1);
@@ -403,6 +412,106 @@ class TfraDynamicStitchOpImplCPU : public TfraDynamicStitchOpImplBase<T> {
       }
     }
   }
+
+ private:
+  // Large inputs are stitched in blocks of at least this many rows, one
+  // block per CPU worker thread at most.
+  static constexpr int64_t kMinRowsPerBlock = 16384;
+
+  static bool UseBlocks(OpKernelContext* c, const OpInputList& indices_inputs) {
+    int64_t total = 0;
+    for (const Tensor& indices : indices_inputs) {
+      total += indices.NumElements();
+    }
+    return c->device()->tensorflow_cpu_worker_threads()->num_threads > 1 &&
+           total >= 2 * kMinRowsPerBlock;
+  }
+
+  // Stitches the rows of all inputs, as if they were concatenated, in two
+  // passes split over the CPU worker threads. The first records for every
+  // merged row the last input row that goes there, so that duplicate indices
+  // resolve as in the serial loop, and the second copies those rows.
+  void BlockStitch(OpKernelContext* c, const OpInputList& indices_inputs,
+                   const OpInputList& data_inputs, int first_dim_size,
+                   Tensor* merged) {
+    auto* worker_threads = c->device()->tensorflow_cpu_worker_threads();
+    const int num_inputs = indices_inputs.size();
+    // input_offsets[k] is the position of the first row of input k.
+    std::vector<int64_t> input_offsets(num_inputs + 1, 0);
+    for (int k = 0; k < num_inputs; k++) {
+      input_offsets[k + 1] = input_offsets[k] + indices_inputs[k].NumElements();
+    }
+    const int64_t total = input_offsets[num_inputs];
+    auto input_of = [&input_offsets](int64_t pos) {
+      return static_cast<int>(std::upper_bound(input_offsets.begin(),
+                                               input_offsets.end(), pos) -
+                              input_offsets.begin()) -
+             1;
+    };
+
+    auto merged_flat = merged->flat_outer_dims<T>();
+    const int64_t slice_size = merged_flat.dimension(1);
+    std::unique_ptr<std::atomic<int64_t>[]> source(
+        new std::atomic<int64_t>[first_dim_size]);
+    Shard(worker_threads->num_threads, worker_threads->workers, first_dim_size,
+          1, [&source](int64 begin, int64 end) {
+            for (int64 r = begin; r < end; r++) {
+              source[r].store(-1, std::memory_order_relaxed);
+            }
+          });
+
+    const int64_t num_blocks =
+        std::max<int64_t>(1, std::min<int64_t>(worker_threads->num_threads,
+                                               total / kMinRowsPerBlock));
+    const int64_t block_size = (total + num_blocks - 1) / num_blocks;
+    // The first index out of range in each block, as (input, row).
+    std::vector<std::pair<int, int64_t>> bad(num_blocks, {-1, 0});
+    Shard(worker_threads->num_threads, worker_threads->workers, num_blocks,
+          block_size, [&](int64 begin_block, int64 end_block) {
+            for (int64 b = begin_block; b < end_block; b++) {
+              const int64_t end = std::min(total, (b + 1) * block_size);
+              int64_t pos = b * block_size;
+              for (int k = input_of(pos); pos < end; k++) {
+                auto indices_vec = indices_inputs[k].flat<int32>();
+                const int64_t input_end = std::min(end, input_offsets[k + 1]);
+                for (; pos < input_end; pos++) {
+                  const int64_t i = pos - input_offsets[k];
+                  const int32_t index =
+                      internal::SubtleMustCopy(indices_vec(i));
+                  if (!FastBoundsCheck(index, first_dim_size)) {
+                    bad[b] = {k, i};
+                    return;
+                  }
+                  int64_t last = source[index].load(std::memory_order_relaxed);
+                  while (last < pos &&
+                         !source[index].compare_exchange_weak(last, pos)) {
+                  }
+                }
+              }
+            }
+          });
+    for (const auto& input_and_row : bad) {
+      OP_REQUIRES(c, input_and_row.first < 0,
+                  errors::InvalidArgument("indices[", input_and_row.second,
+                                          "] is out of range"));
+    }
+
+    std::vector<const T*> data_base(num_inputs);
+    for (int k = 0; k < num_inputs; k++) {
+      data_base[k] = data_inputs[k].flat<T>().data();
+    }
+    T* merged_base = merged_flat.data();
+    Shard(worker_threads->num_threads, worker_threads->workers, first_dim_size,
+          slice_size * sizeof(T), [&](int64 begin, int64 end) {
+            for (int64 r = begin; r < end; r++) {
+              const int64_t pos = source[r].load(std::memory_order_relaxed);
+              if (pos < 0) continue;
+              const int k = input_of(pos);
+              std::copy_n(data_base[k] + (pos - input_offsets[k]) * slice_size,
+                          slice_size, merged_base + r * slice_size);
+            }
+          });
+  }
 };
 
 // Using inheritance rather than a typedef so that these classes might have more
@@ -16,7 +16,11 @@ limitations under the License.
 #ifndef TFRA_CORE_KERNELS_LOOKUP_TABLE_OP_CPU_H_
 #define TFRA_CORE_KERNELS_LOOKUP_TABLE_OP_CPU_H_
 
+#include <algorithm>
+#include <functional>
+#include <memory>
 #include <typeindex>
+#include <vector>
 
 #include "tensorflow/core/framework/bounds_check.h"
 #include "tensorflow/core/framework/op_kernel.h"
@@ -26,11 +30,11 @@ limitations under the License.
 #include "tensorflow/core/framework/tensor_shape.h"
 #include "tensorflow/core/framework/types.h"
 #include "tensorflow/core/framework/variant.h"
-#include "tensorflow/core/lib/gtl/inlined_vector.h"
 #include "tensorflow/core/lib/io/buffered_inputstream.h"
 #include "tensorflow/core/lib/io/random_inputstream.h"
 #include "tensorflow/core/platform/env.h"
 #include "tensorflow/core/platform/file_system.h"
+#include "tensorflow/core/platform/mutex.h"
 #include "tensorflow_recommenders_addons/dynamic_embedding/core/lib/cuckoo/cuckoohash_map.hh"
 #include "tensorflow_recommenders_addons/dynamic_embedding/core/utils/types.h"
 
@@ -51,29 +55,121 @@ class ValueArray final : public std::array<V, DIM> {
   }
 };
 
-template <class V, size_t N>
-class DefaultValueArray final : public gtl::InlinedVector<V, N> {
+// Hands out rows of `dim` values carved from large contiguous pages, so a
+// table with a runtime dimension does not pay one heap allocation per key.
+// Released rows are reused before a new page is carved, and pages are only
+// freed all at once, by `clear` or when the slab is destroyed.
+template <class V>
+class ValueSlab final {
+ private:
+  static constexpr size_t kMinPageRows = 64;
+  static constexpr size_t kMaxPageBytes = 1 << 20;
+
  public:
-  inline DefaultValueArray<V, N>& operator+=(
-      const DefaultValueArray<V, N>& rhs) noexcept {
-    for (size_t i = 0; i < this->size(); i++) {
-      (*this)[i] = ((*this)[i]) + rhs[i];
+  void init(size_t dim) {
+    dim_ = dim;
+    const size_t max_page_rows = kMaxPageBytes / (sizeof(V) * dim);
+    max_page_rows_ =
+        max_page_rows > kMinPageRows ? max_page_rows : kMinPageRows;
+    page_rows_ = 0;
+    next_row_ = 0;
+  }
+
+  size_t dim() const { return dim_; }
+
+  V* allocate() {
+    mutex_lock l(mu_);
+    if (!free_rows_.empty()) {
+      V* row = free_rows_.back();
+      free_rows_.pop_back();
+      return row;
     }
-    return *this;
+    if (next_row_ == page_rows_) {
+      // Pages start small and double up to kMaxPageBytes, small tables stay
+      // small while large ones are served from a few big pages.
+      page_rows_ = page_rows_ == 0 ? kMinPageRows : page_rows_ * 2;
+      page_rows_ = std::min(page_rows_, max_page_rows_);
+      pages_.emplace_back(new V[page_rows_ * dim_]);
+      next_row_ = 0;
+    }
+    return pages_.back().get() + (next_row_++) * dim_;
+  }
+
+  void release(V* row) {
+    mutex_lock l(mu_);
+    free_rows_.push_back(row);
   }
+
+  void clear() {
+    mutex_lock l(mu_);
+    pages_.clear();
+    free_rows_.clear();
+    page_rows_ = 0;
+    next_row_ = 0;
+  }
+
+ private:
+  mutex mu_;
+  size_t dim_ = 0;
+  size_t max_page_rows_ = 0;
+  size_t page_rows_ = 0;
+  size_t next_row_ = 0;
+  std::vector<std::unique_ptr<V[]>> pages_;
+  std::vector<V*> free_rows_;
 };
 
-template <>
-class DefaultValueArray<tstring, 2> final
-    : public gtl::InlinedVector<tstring, 2> {
- public:
-  inline DefaultValueArray<tstring, 2>& operator+=(
-      const DefaultValueArray<tstring, 2>& rhs) noexcept {
-    LOG(ERROR) << "Error: the accum is not supported for string value!";
-    return *this;
+// The mapped value of a slab backed table, only a pointer to a slab row. It
+// is constructed by the table only when a new key is really inserted.
+template <class V>
+struct SlabValue {
+  SlabValue(ValueSlab<V>* slab, const V* src) : data(slab->allocate()) {
+    std::copy_n(src, slab->dim(), data);
   }
+  V* data;
 };
 
+template <class V>
+inline void AccumRow(V* row, const V* delta, size_t dim) {
+  for (size_t i = 0; i < dim; i++) {
+    row[i] = row[i] + delta[i];
+  }
+}
+
+template <>
+inline void AccumRow<tstring>(tstring* row, const tstring* delta, size_t dim) {
+  LOG(ERROR) << "Error: the accum is not supported for string value!";
+}
+
+// row += new_row - old_row, without materializing the delta.
+template <class V>
+inline void AccumDeltaRow(V* row, const V* old_row, const V* new_row,
+                          size_t dim) {
+  for (size_t i = 0; i < dim; i++) {
+    row[i] = row[i] + static_cast<V>(new_row[i] - old_row[i]);
+  }
+}
+
+template <>
+inline void AccumDeltaRow<tstring>(tstring* row, const tstring* old_row,
+                                   const tstring* new_row, size_t dim) {
+  LOG(ERROR) << "Error: the accum is not supported for string value!";
+}
+
+// Updates a value row in place with the gradient of its key, see
+// TableWrapperBase::apply_or_insert.
+template <class V>
+using RowUpdateFn = std::function<void(V* row, const V* grad)>;
+
+template <class V, size_t DIM>
+inline const V* ValueData(const ValueArray<V, DIM>& value) {
+  return value.data();
+}
+
+template <class V>
+inline const V* ValueData(const SlabValue<V>& value) {
+  return value.data;
+}
+
 template <class V>
 using Tensor2D = typename tensorflow::TTypes<V, 2>::Tensor;
 
@@ -114,6 +210,151 @@ struct HybridHash<int32> {
   }
 };
 
+// A string key stored together with its hash. libcuckoo hashes the stored
+// keys again whenever it moves them along a cuckoo path or grows the table,
+// which is costly for strings, so their hash is computed only once.
+struct HashedStringKey {
+  explicit HashedStringKey(const tstring& k)
+      : key(k), hash(HybridHash<tstring>{}(k)) {}
+  tstring key;
+  std::size_t hash;
+};
+
+struct HashedStringKeyHash {
+  inline std::size_t operator()(const HashedStringKey& k) const noexcept {
+    return k.hash;
+  }
+  inline std::size_t operator()(const tstring& k) const noexcept {
+    return HybridHash<tstring>{}(k);
+  }
+};
+
+struct HashedStringKeyEqual {
+  inline bool operator()(const HashedStringKey& lhs,
+                         const HashedStringKey& rhs) const noexcept {
+    return lhs.hash == rhs.hash && lhs.key == rhs.key;
+  }
+  inline bool operator()(const HashedStringKey& lhs, const tstring& rhs) const
+      noexcept {
+    return lhs.key == rhs;
+  }
+};
+
+// How keys of type K are stored in the cuckoo map.
+template <class K>
+struct TableKeyTraits {
+  using key_type = K;
+  using hasher = HybridHash<K>;
+  using key_equal = std::equal_to<K>;
+  static inline const K& get(const key_type& k) { return k; }
+};
+
+template <>
+struct TableKeyTraits<tstring> {
+  using key_type = HashedStringKey;
+  using hasher = HashedStringKeyHash;
+  using key_equal = HashedStringKeyEqual;
+  static inline const tstring& get(const key_type& k) { return k.key; }
+};
+
+template <class K, class ValueType>
+using TableOf = cuckoohash_map<typename TableKeyTraits<K>::key_type, ValueType,
+                               typename TableKeyTraits<K>::hasher,
+                               typename TableKeyTraits<K>::key_equal>;
+
+// Number of keys whose buckets are prefetched ahead of probing them.
+constexpr int64 kFindPrefetchBlock = 16;
+
+// Batched find shared by the cuckoo backed wrappers: hashes and prefetches
+// the buckets of a block of keys, then probes them while the loads are in
+// flight. The keys are keys[i] for i in [begin, end), or for i in
+// rows[begin, end) if `rows` is not nullptr, and go to row i of the outputs.
+// `copy` copies a found value into its output row. With `lock_free` the
+// buckets are probed without their locks, see TableWrapperBase::freeze.
+template <class K, class V, class Table, class CopyFn>
+void PrefetchedFind(const Table* table, const K* keys, const int64* rows,
+                    int64 begin, int64 end, Tensor2D<V>& value_flat,
+                    ConstTensor2D<V>& default_flat, bool* exists,
+                    int64 value_dim, bool is_full_size_default, bool lock_free,
+                    CopyFn copy) {
+  std::size_t hashes[kFindPrefetchBlock];
+  for (int64 block = begin; block < end; block += kFindPrefetchBlock) {
+    const int64 block_end = std::min(block + kFindPrefetchBlock, end);
+    for (int64 n = block; n < block_end; ++n) {
+      hashes[n - block] = table->prefetch(keys[rows ? rows[n] : n]);
+    }
+    for (int64 n = block; n < block_end; ++n) {
+      const int64 i = rows ? rows[n] : n;
+      V* dst = value_flat.data() + i * value_dim;
+      auto fn = [&copy, dst, value_dim](const typename Table::mapped_type& v) {
+        copy(v, dst, value_dim);
+      };
+      const bool found =
+          lock_free
+              ? table->find_fn_hashed_unlocked(keys[i], hashes[n - block], fn)
+              : table->find_fn_hashed(keys[i], hashes[n - block], fn);
+      if (!found) {
+        for (int64 j = 0; j < value_dim; j++) {
+          value_flat(i, j) =
+              is_full_size_default ? default_flat(i, j) : default_flat(0, j);
+        }
+      }
+      if (exists) {
+        exists[i] = found;
+      }
+    }
+  }
+}
+
+// A resumable, forward-only cursor over a consistent snapshot of a table.
+// The underlying table stays locked for the lifetime of the cursor, so every
+// key is visited exactly once no matter how many chunks the caller asks for.
+template <class K, class V>
+class TableExportCursor {
+ public:
+  virtual ~TableExportCursor() {}
+  // Number of keys in the snapshot.
+  virtual size_t size() const = 0;
+  // Copies at most `max_count` key/value pairs into `keys` and `values`, and
+  // moves the cursor forward. Returns the number of pairs copied, 0 means the
+  // cursor is exhausted.
+  virtual size_t next(K* keys, V* values, const size_t max_count) = 0;
+};
+
+template <class K, class V, class Table>
+class LockedTableExportCursor final : public TableExportCursor<K, V> {
+ private:
+  using LockedTable = typename Table::locked_table;
+  using Iterator = typename LockedTable::iterator;
+
+ public:
+  LockedTableExportCursor(Table* table, size_t value_dim)
+      : lt_(table->lock_table()),
+        it_(lt_.begin()),
+        end_(lt_.end()),
+        value_dim_(value_dim) {}
+
+  size_t size() const override { return lt_.size(); }
+
+  size_t next(K* keys, V* values, const size_t max_count) override {
+    K* key_ptr = keys;
+    V* val_ptr = values;
+    size_t dump_counter = 0;
+    for (; it_ != end_ && dump_counter < max_count; ++it_, ++key_ptr) {
+      *key_ptr = TableKeyTraits<K>::get(it_->first);
+      val_ptr = std::copy_n(ValueData(it_->second), value_dim_, val_ptr);
+      ++dump_counter;
+    }
+    return dump_counter;
+  }
+
+ private:
+  LockedTable lt_;
+  Iterator it_;
+  Iterator end_;
+  size_t value_dim_;
+};
+
 template <class K, class V>
 class TableWrapperBase {
  public:
@@ -129,6 +370,18 @@ class TableWrapperBase {
                                bool exist, int64 value_dim, int64 index) const {
     return false;
   }
+  // Inserts `new_row` for a key that did not exist, or adds
+  // `new_row - old_row` to the value of one that did.
+  virtual bool insert_or_accum_delta(K key, const V* old_row, const V* new_row,
+                                     bool exist) const {
+    return false;
+  }
+  // Applies `update` with `grad` to the row of `key`. A missing key is
+  // inserted with `init_row` updated the same way.
+  virtual bool apply_or_insert(K key, const RowUpdateFn<V>& update,
+                               const V* grad, const V* init_row) const {
+    return false;
+  }
   virtual void find(const K& key, Tensor2D<V>& value_flat,
                     ConstTensor2D<V>& default_flat, int64 value_dim,
                     bool is_full_size_default, int64 index) const {}
@@ -136,27 +389,103 @@ class TableWrapperBase {
                     ConstTensor2D<V>& default_flat, bool& exist,
                     int64 value_dim, bool is_full_size_default,
                     int64 index) const {}
+  // Looks up keys[begin, end). `exists` may be nullptr. Tables override it to
+  // hide the latency of bucket cache misses over a block of keys. `lock_free`
+  // may only be set while the table is frozen, see freeze().
+  virtual void find_batch(const K* keys, int64 begin, int64 end,
+                          Tensor2D<V>& value_flat,
+                          ConstTensor2D<V>& default_flat, bool* exists,
+                          int64 value_dim, bool is_full_size_default,
+                          bool lock_free) const {
+    bool exist = false;
+    for (int64 i = begin; i < end; ++i) {
+      if (exists) {
+        find(keys[i], value_flat, default_flat, exists[i], value_dim,
+             is_full_size_default, i);
+      } else {
+        find(keys[i], value_flat, default_flat, exist, value_dim,
+             is_full_size_default, i);
+      }
+    }
+  }
+  // Looks up keys[rows[n]] into row rows[n] for n in [0, count), like
+  // find_batch, for a selection of the keys.
+  virtual void find_rows(const K* keys, const int64* rows, int64 count,
+                         Tensor2D<V>& value_flat,
+                         ConstTensor2D<V>& default_flat, bool* exists,
+                         int64 value_dim, bool is_full_size_default,
+                         bool lock_free) const {
+    bool exist = false;
+    for (int64 n = 0; n < count; ++n) {
+      const int64 i = rows[n];
+      find(keys[i], value_flat, default_flat, exists ? exists[i] : exist,
+           value_dim, is_full_size_default, i);
+    }
+  }
   virtual size_t dump(K* keys, V* values, const size_t search_offset,
                       const size_t search_length) const {
     return 0;
   }
+  virtual std::unique_ptr<TableExportCursor<K, V>> export_cursor() const {
+    return nullptr;
+  }
+  // Appends the entries of whole buckets from bucket `begin` on to `keys` and
+  // `values`, at most `max_count` of them unless a single bucket holds more.
+  // Only one bucket is locked at a time. Returns the bucket to resume from,
+  // bucket_count() once the last bucket was visited.
+  virtual size_t dump_buckets(size_t begin, size_t max_count,
+                              std::vector<K>* keys,
+                              std::vector<V>* values) const {
+    return bucket_count();
+  }
   virtual size_t size() const { return 0; }
+  virtual size_t capacity() const { return 0; }
+  virtual size_t bucket_count() const { return 0; }
+  virtual bool reserve(const size_t new_size) { return false; }
   virtual void clear() {}
+  // Waits for in-flight writes and finishes any pending lazy rehash. Until
+  // the table is written again, find_batch may then run with `lock_free`.
+  virtual void freeze() {}
   virtual bool erase(const K& key) { return false; }
+  // Removes, in a single pass over the locked table, every key whose value
+  // row makes `pred` return true, and appends the removed keys to `removed`.
+  virtual size_t erase_if(const std::function<bool(const V*)>& pred,
+                          std::vector<K>* removed) {
+    return 0;
+  }
+  // Inserts the row `value` for `key` unless the key is already present.
+  virtual bool insert_if_absent(const K& key, const V* value) { return false; }
+  // Moves the keys stored in buckets [begin, end) into `dst`, which must be a
+  // table of the same kind, and returns how many were moved. Keys `dst`
+  // already holds keep their value there.
+  virtual size_t migrate_buckets(size_t begin, size_t end,
+                                 TableWrapperBase<K, V>* dst) {
+    return 0;
+  }
+  // Moves `key` into `dst` as migrate_buckets does, if it is stored here.
+  virtual bool migrate_key(const K& key, TableWrapperBase<K, V>* dst) {
+    return false;
+  }
 };
 
+// Stores values inline in the cuckoo map as fixed size arrays. DIM is the
+// padded width of the array, the table itself works on `runtime_dim` values
+// and keeps the padding lanes zero.
 template <class K, class V, size_t DIM>
 class TableWrapperOptimized final : public TableWrapperBase<K, V> {
  private:
   using ValueType = ValueArray<V, DIM>;
-  using Table = cuckoohash_map<K, ValueType, HybridHash<K>>;
+  using TableKey = typename TableKeyTraits<K>::key_type;
+  using Table = TableOf<K, ValueType>;
 
  public:
-  explicit TableWrapperOptimized(size_t init_size) : init_size_(init_size) {
+  TableWrapperOptimized(size_t init_size, size_t runtime_dim)
+      : init_size_(init_size), runtime_dim_(runtime_dim) {
     table_ = new Table(init_size);
     LOG(INFO) << "HashTable on CPU is created on optimized mode:"
               << " K=" << std::type_index(typeid(K)).name()
               << ", V=" << std::type_index(typeid(V)).name() << ", DIM=" << DIM
+              << ", runtime_dim=" << runtime_dim_
               << ", init_size=" << init_size_;
   }
 
@@ -165,34 +494,62 @@ class TableWrapperOptimized final : public TableWrapperBase<K, V> {
   bool insert_or_assign(K key, ConstTensor2D<V>& value_flat, int64 value_dim,
                         int64 index) const override {
     ValueType value_vec;
-    std::copy_n(value_flat.data() + index * value_dim, value_dim,
-                value_vec.begin());
-    return table_->insert_or_assign(key, value_vec);
+    fill_row(&value_vec, value_flat.data() + index * value_dim, value_dim);
+    return table_->insert_or_assign(TableKey(key), value_vec);
   }
 
   bool insert_or_assign(K* key, V* value, int64 value_dim) const override {
-    assert(value_dim == DIM);
+    assert(value_dim <= DIM);
     ValueType value_vec;
-    std::copy_n(value, value_dim, value_vec.begin());
-    return table_->insert_or_assign(*key, value_vec);
+    fill_row(&value_vec, value, value_dim);
+    return table_->insert_or_assign(TableKey(*key), value_vec);
   }
 
   bool insert_or_accum(K key, ConstTensor2D<V>& value_or_delta_flat, bool exist,
                        int64 value_dim, int64 index) const override {
     ValueType value_or_delta_vec;
-    std::copy_n(value_or_delta_flat.data() + index * value_dim, value_dim,
-                value_or_delta_vec.begin());
-    return table_->insert_or_accum(key, value_or_delta_vec, exist);
+    fill_row(&value_or_delta_vec,
+             value_or_delta_flat.data() + index * value_dim, value_dim);
+    return table_->insert_or_accum(TableKey(key), value_or_delta_vec, exist);
+  }
+
+  bool insert_or_accum_delta(K key, const V* old_row, const V* new_row,
+                             bool exist) const override {
+    const size_t dim = runtime_dim_;
+    // Only read when the key is inserted, which `exist` rules out.
+    ValueType new_vec;
+    if (!exist) {
+      fill_row(&new_vec, new_row, dim);
+    }
+    return table_->accumrase(
+        TableKey(key),
+        [old_row, new_row, dim](ValueType& v) {
+          AccumDeltaRow(v.data(), old_row, new_row, dim);
+        },
+        exist, new_vec);
+  }
+
+  bool apply_or_insert(K key, const RowUpdateFn<V>& update, const V* grad,
+                       const V* init_row) const override {
+    auto apply = [&update, grad](ValueType& v) { update(v.data(), grad); };
+    if (table_->update_fn(TableKey(key), apply)) {
+      return false;
+    }
+    ValueType init_vec;
+    fill_row(&init_vec, init_row, runtime_dim_);
+    update(init_vec.data(), grad);
+    // The key may have been inserted by another writer meanwhile, the update
+    // then goes to its row instead.
+    return table_->upsert(TableKey(key), apply, init_vec);
   }
 
   void find(const K& key, Tensor2D<V>& value_flat,
             ConstTensor2D<V>& default_flat, int64 value_dim,
             bool is_full_size_default, int64 index) const override {
-    ValueType value_vec;
-    if (table_->find(key, value_vec)) {
-      std::copy_n(value_vec.begin(), value_dim,
-                  value_flat.data() + index * value_dim);
-    } else {
+    V* dst = value_flat.data() + index * value_dim;
+    if (!table_->find_fn(key, [dst, value_dim](const ValueType& v) {
+          std::copy_n(v.begin(), value_dim, dst);
+        })) {
       for (int64 j = 0; j < value_dim; j++) {
         value_flat(index, j) =
             is_full_size_default ? default_flat(index, j) : default_flat(0, j);
@@ -203,12 +560,11 @@ class TableWrapperOptimized final : public TableWrapperBase<K, V> {
   void find(const K& key, Tensor2D<V>& value_flat,
             ConstTensor2D<V>& default_flat, bool& exist, int64 value_dim,
             bool is_full_size_default, int64 index) const override {
-    ValueType value_vec;
-    exist = table_->find(key, value_vec);
-    if (exist) {
-      std::copy_n(value_vec.begin(), value_dim,
-                  value_flat.data() + index * value_dim);
-    } else {
+    V* dst = value_flat.data() + index * value_dim;
+    exist = table_->find_fn(key, [dst, value_dim](const ValueType& v) {
+      std::copy_n(v.begin(), value_dim, dst);
+    });
+    if (!exist) {
       for (int64 j = 0; j < value_dim; j++) {
         value_flat(index, j) =
             is_full_size_default ? default_flat(index, j) : default_flat(0, j);
@@ -216,6 +572,28 @@ class TableWrapperOptimized final : public TableWrapperBase<K, V> {
     }
   }
 
+  void find_batch(const K* keys, int64 begin, int64 end,
+                  Tensor2D<V>& value_flat, ConstTensor2D<V>& default_flat,
+                  bool* exists, int64 value_dim, bool is_full_size_default,
+                  bool lock_free) const override {
+    PrefetchedFind<K, V>(table_, keys, nullptr, begin, end, value_flat,
+                         default_flat, exists, value_dim, is_full_size_default,
+                         lock_free, [](const ValueType& v, V* dst, int64 dim) {
+                           std::copy_n(v.begin(), dim, dst);
+                         });
+  }
+
+  void find_rows(const K* keys, const int64* rows, int64 count,
+                 Tensor2D<V>& value_flat, ConstTensor2D<V>& default_flat,
+                 bool* exists, int64 value_dim, bool is_full_size_default,
+                 bool lock_free) const override {
+    PrefetchedFind<K, V>(table_, keys, rows, 0, count, value_flat, default_flat,
+                         exists, value_dim, is_full_size_default, lock_free,
+                         [](const ValueType& v, V* dst, int64 dim) {
+                           std::copy_n(v.begin(), dim, dst);
+                         });
+  }
+
   size_t dump(K* keys, V* values, const size_t search_offset,
               const size_t search_length) const override {
     auto lt = table_->lock_table();
@@ -236,88 +614,192 @@ class TableWrapperOptimized final : public TableWrapperBase<K, V> {
       }
     }
 
-    constexpr const size_t value_dim = DIM;
+    const size_t value_dim = runtime_dim_;
     K* key_ptr = keys;
     V* val_ptr = values;
     size_t dump_counter = 0;
     for (auto it = search_begin; it != search_end;
          ++it, ++key_ptr, val_ptr += value_dim) {
-      const K& key = it->first;
       const ValueType& value = it->second;
-      *key_ptr = key;
+      *key_ptr = TableKeyTraits<K>::get(it->first);
       std::copy_n(value.begin(), value_dim, val_ptr);
       ++dump_counter;
     }
     return dump_counter;
   }
 
+  std::unique_ptr<TableExportCursor<K, V>> export_cursor() const override {
+    return std::unique_ptr<TableExportCursor<K, V>>(
+        new LockedTableExportCursor<K, V, Table>(table_, runtime_dim_));
+  }
+
+  size_t dump_buckets(size_t begin, size_t max_count, std::vector<K>* keys,
+                      std::vector<V>* values) const override {
+    const size_t value_dim = runtime_dim_;
+    const size_t end =
+        begin + std::max<size_t>(1, max_count / Table::slot_per_bucket());
+    // Nothing is erased, the functor only copies the entries out.
+    table_->erase_in_buckets_fn(begin, end,
+                                [&](const TableKey& key, ValueType& value) {
+                                  keys->push_back(TableKeyTraits<K>::get(key));
+                                  values->insert(values->end(), value.begin(),
+                                                 value.begin() + value_dim);
+                                  return false;
+                                });
+    return std::min(end, table_->bucket_count());
+  }
+
   size_t size() const override { return table_->size(); }
 
+  size_t capacity() const override { return table_->capacity(); }
+
+  size_t bucket_count() const override { return table_->bucket_count(); }
+
+  bool reserve(const size_t new_size) override {
+    // libcuckoo may shrink the table on reserve, only ever grow it here.
+    if (new_size <= table_->capacity()) {
+      return false;
+    }
+    return table_->reserve(new_size);
+  }
+
   void clear() override { table_->clear(); }
 
+  void freeze() override { auto lt = table_->lock_table(); }
+
   bool erase(const K& key) override { return table_->erase(key); }
 
+  size_t erase_if(const std::function<bool(const V*)>& pred,
+                  std::vector<K>* removed) override {
+    size_t erased = 0;
+    auto lt = table_->lock_table();
+    for (auto it = lt.begin(); it != lt.end();) {
+      if (pred(it->second.data())) {
+        removed->push_back(TableKeyTraits<K>::get(it->first));
+        it = lt.erase(it);
+        ++erased;
+      } else {
+        ++it;
+      }
+    }
+    return erased;
+  }
+
+  bool insert_if_absent(const K& key, const V* value) override {
+    ValueType value_vec;
+    fill_row(&value_vec, value, runtime_dim_);
+    return table_->insert(TableKey(key), value_vec);
+  }
+
+  size_t migrate_buckets(size_t begin, size_t end,
+                         TableWrapperBase<K, V>* dst) override {
+    return table_->erase_in_buckets_fn(
+        begin, end, [dst](const TableKey& key, ValueType& value) {
+          dst->insert_if_absent(TableKeyTraits<K>::get(key), value.data());
+          return true;
+        });
+  }
+
+  bool migrate_key(const K& key, TableWrapperBase<K, V>* dst) override {
+    return table_->erase_fn(TableKey(key), [dst, &key](ValueType& value) {
+      dst->insert_if_absent(key, value.data());
+      return true;
+    });
+  }
+
  private:
+  inline void fill_row(ValueType* row, const V* src, int64 value_dim) const {
+    std::copy_n(src, value_dim, row->begin());
+    std::fill(row->begin() + value_dim, row->end(), V(0));
+  }
+
   size_t init_size_;
+  size_t runtime_dim_;
   Table* table_;
 };
 
 template <class K, class V>
 class TableWrapperDefault final : public TableWrapperBase<K, V> {
  private:
-  using ValueType = DefaultValueArray<V, 2>;
-  using Table = cuckoohash_map<K, ValueType, HybridHash<K>>;
+  using ValueType = SlabValue<V>;
+  using TableKey = typename TableKeyTraits<K>::key_type;
+  using Table = TableOf<K, ValueType>;
+  // Rows are allocated from one of several slabs picked by key hash, so
+  // concurrent inserts rarely wait on the same slab lock.
+  static constexpr size_t kSlabStripes = 16;
 
  public:
-  explicit TableWrapperDefault(size_t init_size) : init_size_(init_size) {
+  TableWrapperDefault(size_t init_size, size_t runtime_dim)
+      : init_size_(init_size),
+        runtime_dim_(runtime_dim),
+        slabs_(new ValueSlab<V>[kSlabStripes]) {
     table_ = new Table(init_size);
+    for (size_t i = 0; i < kSlabStripes; i++) {
+      slabs_[i].init(runtime_dim);
+    }
     LOG(INFO) << "HashTable on CPU is created on default mode:"
               << " K=" << std::type_index(typeid(K)).name()
               << ", V=" << std::type_index(typeid(V)).name()
-              << ", init_size=" << init_size_;
+              << ", DIM=" << runtime_dim_ << ", init_size=" << init_size_;
   }
 
   ~TableWrapperDefault() override { delete table_; }
 
   bool insert_or_assign(K key, ConstTensor2D<V>& value_flat, int64 value_dim,
                         int64 index) const override {
-    ValueType value_vec;
-    value_vec.reserve(value_dim);
-    for (int64 j = 0; j < value_dim; j++) {
-      V value = value_flat(index, j);
-      value_vec.push_back(value);
-    }
-    return table_->insert_or_assign(key, value_vec);
+    return assign_row(key, value_flat.data() + index * value_dim);
   }
 
   bool insert_or_assign(K* key, V* value, int64 value_dim) const override {
-    ValueType value_vec;
-    value_vec.reserve(value_dim);
-    for (int64 j = 0; j < value_dim; j++) {
-      value_vec.push_back(*(value + j));
-    }
-    return table_->insert_or_assign(*key, value_vec);
+    return assign_row(*key, value);
   }
 
   bool insert_or_accum(K key, ConstTensor2D<V>& value_or_delta_flat, bool exist,
                        int64 value_dim, int64 index) const override {
-    ValueType value_or_delta_vec;
-    value_or_delta_vec.reserve(value_dim);
-    for (int64 j = 0; j < value_dim; j++) {
-      value_or_delta_vec.push_back(value_or_delta_flat(index, j));
+    const V* src = value_or_delta_flat.data() + index * value_dim;
+    const size_t dim = runtime_dim_;
+    TableKey table_key(key);
+    ValueSlab<V>* slab = slab_of(table_key);
+    return table_->accumrase(
+        std::move(table_key),
+        [src, dim](ValueType& v) { AccumRow(v.data, src, dim); }, exist, slab,
+        src);
+  }
+
+  bool insert_or_accum_delta(K key, const V* old_row, const V* new_row,
+                             bool exist) const override {
+    const size_t dim = runtime_dim_;
+    TableKey table_key(key);
+    ValueSlab<V>* slab = slab_of(table_key);
+    return table_->accumrase(
+        std::move(table_key),
+        [old_row, new_row, dim](ValueType& v) {
+          AccumDeltaRow(v.data, old_row, new_row, dim);
+        },
+        exist, slab, new_row);
+  }
+
+  bool apply_or_insert(K key, const RowUpdateFn<V>& update, const V* grad,
+                       const V* init_row) const override {
+    auto apply = [&update, grad](ValueType& v) { update(v.data, grad); };
+    TableKey table_key(key);
+    if (table_->update_fn(table_key, apply)) {
+      return false;
     }
-    return table_->insert_or_accum(key, value_or_delta_vec, exist);
+    std::vector<V> init(init_row, init_row + runtime_dim_);
+    update(init.data(), grad);
+    ValueSlab<V>* slab = slab_of(table_key);
+    const V* init_data = init.data();
+    return table_->upsert(std::move(table_key), apply, slab, init_data);
   }
 
-  void find(const K& key, typename tensorflow::TTypes<V, 2>::Tensor& value_flat,
+  void find(const K& key, Tensor2D<V>& value_flat,
             ConstTensor2D<V>& default_flat, int64 value_dim,
             bool is_full_size_default, int64 index) const override {
-    ValueType value_vec;
-    value_vec.reserve(value_dim);
-    if (table_->find(key, value_vec)) {
-      std::copy_n(value_vec.begin(), value_dim,
-                  value_flat.data() + index * value_dim);
-    } else {
+    V* dst = value_flat.data() + index * value_dim;
+    if (!table_->find_fn(key, [dst, value_dim](const ValueType& v) {
+          std::copy_n(v.data, value_dim, dst);
+        })) {
       for (int64 j = 0; j < value_dim; j++) {
         value_flat(index, j) =
             is_full_size_default ? default_flat(index, j) : default_flat(0, j);
@@ -325,16 +807,14 @@ class TableWrapperDefault final : public TableWrapperBase<K, V> {
     }
   }
 
-  void find(const K& key, typename tensorflow::TTypes<V, 2>::Tensor& value_flat,
+  void find(const K& key, Tensor2D<V>& value_flat,
             ConstTensor2D<V>& default_flat, bool& exist, int64 value_dim,
             bool is_full_size_default, int64 index) const override {
-    ValueType value_vec;
-    value_vec.reserve(value_dim);
-    exist = table_->find(key, value_vec);
-    if (exist) {
-      std::copy_n(value_vec.begin(), value_dim,
-                  value_flat.data() + index * value_dim);
-    } else {
+    V* dst = value_flat.data() + index * value_dim;
+    exist = table_->find_fn(key, [dst, value_dim](const ValueType& v) {
+      std::copy_n(v.data, value_dim, dst);
+    });
+    if (!exist) {
       for (int64 j = 0; j < value_dim; j++) {
         value_flat(index, j) =
             is_full_size_default ? default_flat(index, j) : default_flat(0, j);
@@ -342,6 +822,28 @@ class TableWrapperDefault final : public TableWrapperBase<K, V> {
     }
   }
 
+  void find_batch(const K* keys, int64 begin, int64 end,
+                  Tensor2D<V>& value_flat, ConstTensor2D<V>& default_flat,
+                  bool* exists, int64 value_dim, bool is_full_size_default,
+                  bool lock_free) const override {
+    PrefetchedFind<K, V>(table_, keys, nullptr, begin, end, value_flat,
+                         default_flat, exists, value_dim, is_full_size_default,
+                         lock_free, [](const ValueType& v, V* dst, int64 dim) {
+                           std::copy_n(v.data, dim, dst);
+                         });
+  }
+
+  void find_rows(const K* keys, const int64* rows, int64 count,
+                 Tensor2D<V>& value_flat, ConstTensor2D<V>& default_flat,
+                 bool* exists, int64 value_dim, bool is_full_size_default,
+                 bool lock_free) const override {
+    PrefetchedFind<K, V>(table_, keys, rows, 0, count, value_flat, default_flat,
+                         exists, value_dim, is_full_size_default, lock_free,
+                         [](const ValueType& v, V* dst, int64 dim) {
+                           std::copy_n(v.data, dim, dst);
+                         });
+  }
+
   size_t dump(K* keys, V* values, const size_t search_offset,
               const size_t search_length) const override {
     auto lt = table_->lock_table();
@@ -362,29 +864,141 @@ class TableWrapperDefault final : public TableWrapperBase<K, V> {
       }
     }
 
-    const auto value_dim = (lt.begin()->second).size();
+    const size_t value_dim = runtime_dim_;
     K* key_ptr = keys;
     V* val_ptr = values;
     size_t dump_counter = 0;
     for (auto it = search_begin; it != search_end;
          ++it, ++key_ptr, val_ptr += value_dim) {
-      const K& key = it->first;
-      const ValueType& value = it->second;
-      *key_ptr = key;
-      std::copy_n(value.begin(), value_dim, val_ptr);
+      *key_ptr = TableKeyTraits<K>::get(it->first);
+      std::copy_n(it->second.data, value_dim, val_ptr);
       ++dump_counter;
     }
     return dump_counter;
   }
 
+  std::unique_ptr<TableExportCursor<K, V>> export_cursor() const override {
+    return std::unique_ptr<TableExportCursor<K, V>>(
+        new LockedTableExportCursor<K, V, Table>(table_, runtime_dim_));
+  }
+
+  size_t dump_buckets(size_t begin, size_t max_count, std::vector<K>* keys,
+                      std::vector<V>* values) const override {
+    const size_t value_dim = runtime_dim_;
+    const size_t end =
+        begin + std::max<size_t>(1, max_count / Table::slot_per_bucket());
+    // Nothing is erased, the functor only copies the entries out.
+    table_->erase_in_buckets_fn(
+        begin, end, [&](const TableKey& key, ValueType& value) {
+          keys->push_back(TableKeyTraits<K>::get(key));
+          values->insert(values->end(), value.data, value.data + value_dim);
+          return false;
+        });
+    return std::min(end, table_->bucket_count());
+  }
+
   size_t size() const override { return table_->size(); }
 
-  void clear() override { table_->clear(); }
+  size_t capacity() const override { return table_->capacity(); }
 
-  bool erase(const K& key) override { return table_->erase(key); }
+  size_t bucket_count() const override { return table_->bucket_count(); }
+
+  bool reserve(const size_t new_size) override {
+    // libcuckoo may shrink the table on reserve, only ever grow it here.
+    if (new_size <= table_->capacity()) {
+      return false;
+    }
+    return table_->reserve(new_size);
+  }
+
+  void clear() override {
+    // Hold every bucket lock so no row can be handed out while the slabs are
+    // being dropped.
+    auto lt = table_->lock_table();
+    lt.clear();
+    for (size_t i = 0; i < kSlabStripes; i++) {
+      slabs_[i].clear();
+    }
+  }
+
+  void freeze() override { auto lt = table_->lock_table(); }
+
+  bool erase(const K& key) override {
+    const TableKey table_key(key);
+    ValueSlab<V>* slab = slab_of(table_key);
+    return table_->erase_fn(table_key, [slab](ValueType& v) {
+      slab->release(v.data);
+      return true;
+    });
+  }
+
+  size_t erase_if(const std::function<bool(const V*)>& pred,
+                  std::vector<K>* removed) override {
+    size_t erased = 0;
+    auto lt = table_->lock_table();
+    for (auto it = lt.begin(); it != lt.end();) {
+      if (pred(it->second.data)) {
+        slab_of(it->first)->release(it->second.data);
+        removed->push_back(TableKeyTraits<K>::get(it->first));
+        it = lt.erase(it);
+        ++erased;
+      } else {
+        ++it;
+      }
+    }
+    return erased;
+  }
+
+  bool insert_if_absent(const K& key, const V* value) override {
+    TableKey table_key(key);
+    ValueSlab<V>* slab = slab_of(table_key);
+    return table_->insert(std::move(table_key), slab, value);
+  }
+
+  // The rows are copied into the slabs of `dst`, so this table can be
+  // dropped once it is drained.
+  size_t migrate_buckets(size_t begin, size_t end,
+                         TableWrapperBase<K, V>* dst) override {
+    return table_->erase_in_buckets_fn(
+        begin, end, [this, dst](const TableKey& key, ValueType& value) {
+          dst->insert_if_absent(TableKeyTraits<K>::get(key), value.data);
+          slab_of(key)->release(value.data);
+          return true;
+        });
+  }
+
+  bool migrate_key(const K& key, TableWrapperBase<K, V>* dst) override {
+    const TableKey table_key(key);
+    ValueSlab<V>* slab = slab_of(table_key);
+    return table_->erase_fn(table_key, [slab, dst, &key](ValueType& value) {
+      dst->insert_if_absent(key, value.data);
+      slab->release(value.data);
+      return true;
+    });
+  }
 
  private:
+  inline ValueSlab<V>* slab_of(const TableKey& key) const {
+    const size_t hash = typename TableKeyTraits<K>::hasher{}(key);
+    return &slabs_[hash % kSlabStripes];
+  }
+
+  inline bool assign_row(const K& key, const V* src) const {
+    const size_t dim = runtime_dim_;
+    TableKey table_key(key);
+    ValueSlab<V>* slab = slab_of(table_key);
+    return table_->uprase_fn(
+        std::move(table_key),
+        [src, dim](ValueType& v) {
+          std::copy_n(src, dim, v.data);
+          return false;
+        },
+        slab, src);
+  }
+
   size_t init_size_;
+  size_t runtime_dim_;
+  std::unique_ptr<ValueSlab<V>[]> slabs_;
   Table* table_;
 };
 
@@ -402,11 +1016,9 @@ struct TableDispatcherImpl<K, V, DIM, true> {
 
 template <class K, class V, size_t DIM>
 struct TableDispatcher {
-  static constexpr bool IS_FIX_RANGE = (DIM <= 100);
-  static constexpr bool K_IS_INT64 = std::is_same<K, int64>::value;
+  static constexpr bool IS_FIX_RANGE = (DIM <= 512);
   static constexpr bool V_IS_TSTRING = std::is_same<V, tstring>::value;
-  static constexpr bool OPTIMIZED =
-      (IS_FIX_RANGE && K_IS_INT64 && !V_IS_TSTRING);
+  static constexpr bool OPTIMIZED = (IS_FIX_RANGE && !V_IS_TSTRING);
   using table_type =
       typename TableDispatcherImpl<K, V, DIM, OPTIMIZED>::table_type;
 };
@@ -415,16 +1027,27 @@ struct TableDispatcher {
   do {                                                                     \
     if (runtime_dim == (DIM + 1)) {                                        \
       using Table = typename TableDispatcher<K, V, (DIM + 1)>::table_type; \
-      *pptable = new Table(init_size);                                     \
+      *pptable = new Table(init_size, runtime_dim);                        \
       return;                                                              \
     };                                                                     \
   } while (0)
 
-#define CREATE_DEFAULT_TABLE()               \
-  do {                                       \
-    using Table = TableWrapperDefault<K, V>; \
-    *pptable = new Table(init_size);         \
-    return;                                  \
+// Dims above 100 share a table whose value arrays are padded up to the next
+// multiple of 32, which bounds the number of instantiations per K/V pair.
+#define CREATE_A_PADDED_TABLE(WIDTH)                                     \
+  do {                                                                   \
+    if (runtime_dim <= (WIDTH)) {                                        \
+      using Table = typename TableDispatcher<K, V, (WIDTH)>::table_type; \
+      *pptable = new Table(init_size, runtime_dim);                      \
+      return;                                                            \
+    };                                                                   \
+  } while (0)
+
+#define CREATE_DEFAULT_TABLE()                    \
+  do {                                            \
+    using Table = TableWrapperDefault<K, V>;      \
+    *pptable = new Table(init_size, runtime_dim); \
+    return;                                       \
   } while (0)
 
 #define CREATE_TABLE_PARTIAL_BRANCHES(PREFIX) \
@@ -441,7 +1064,25 @@ struct TableDispatcher {
     CREATE_A_TABLE((PREFIX)*10 + 9);          \
   } while (0)
 
-// create branches with dim range [1, 100]
+// create branches with dim range (100, 512]
+#define CREATE_TABLE_PADDED_BRANCHES() \
+  do {                                 \
+    CREATE_A_PADDED_TABLE(128);        \
+    CREATE_A_PADDED_TABLE(160);        \
+    CREATE_A_PADDED_TABLE(192);        \
+    CREATE_A_PADDED_TABLE(224);        \
+    CREATE_A_PADDED_TABLE(256);        \
+    CREATE_A_PADDED_TABLE(288);        \
+    CREATE_A_PADDED_TABLE(320);        \
+    CREATE_A_PADDED_TABLE(352);        \
+    CREATE_A_PADDED_TABLE(384);        \
+    CREATE_A_PADDED_TABLE(416);        \
+    CREATE_A_PADDED_TABLE(448);        \
+    CREATE_A_PADDED_TABLE(480);        \
+    CREATE_A_PADDED_TABLE(512);        \
+  } while (0)
+
+// create branches with dim range [1, 512]
 #define CREATE_TABLE_ALL_BRANCHES(CENTILE, DECTILE)          \
   CREATE_TABLE_PARTIAL_BRANCHES(CENTILE * 10 + DECTILE + 0); \
   CREATE_TABLE_PARTIAL_BRANCHES(CENTILE * 10 + DECTILE + 1); \
@@ -453,6 +1094,7 @@ struct TableDispatcher {
   CREATE_TABLE_PARTIAL_BRANCHES(CENTILE * 10 + DECTILE + 7); \
   CREATE_TABLE_PARTIAL_BRANCHES(CENTILE * 10 + DECTILE + 8); \
   CREATE_TABLE_PARTIAL_BRANCHES(CENTILE * 10 + DECTILE + 9); \
+  CREATE_TABLE_PADDED_BRANCHES();                            \
   CREATE_DEFAULT_TABLE();
 
 template <class K, class V, int CENTILE, int DECTILE>
@@ -492,11 +1134,310 @@ DECLARE_CREATE_TABLE(tstring, Eigen::half);
 DECLARE_CREATE_TABLE(tstring, bfloat16);
 
 #undef CREATE_A_TABLE
+#undef CREATE_A_PADDED_TABLE
 #undef CREATE_DEFAULT_TABLE
 #undef CREATE_TABLE_PARTIAL_BRANCHES
+#undef CREATE_TABLE_PADDED_BRANCHES
 #undef CREATE_TABLE_ALL_BRANCHES
 #undef DECLARE_CREATE_TABLE
 
+// Exports the subtables of a StripedTableWrapper one after the other. The
+// cursors of all the subtables are created up front, so the snapshot is
+// consistent across them.
+template <class K, class V>
+class ChainedExportCursor final : public TableExportCursor<K, V> {
+ public:
+  ChainedExportCursor(
+      std::vector<std::unique_ptr<TableExportCursor<K, V>>> cursors,
+      size_t value_dim)
+      : cursors_(std::move(cursors)), value_dim_(value_dim) {}
+
+  size_t size() const override {
+    size_t total = 0;
+    for (const auto& cursor : cursors_) {
+      total += cursor->size();
+    }
+    return total;
+  }
+
+  size_t next(K* keys, V* values, const size_t max_count) override {
+    size_t dump_counter = 0;
+    while (current_ < cursors_.size() && dump_counter < max_count) {
+      const size_t n = cursors_[current_]->next(
+          keys + dump_counter, values + dump_counter * value_dim_,
+          max_count - dump_counter);
+      if (n == 0) {
+        ++current_;
+      }
+      dump_counter += n;
+    }
+    return dump_counter;
+  }
+
+ private:
+  std::vector<std::unique_ptr<TableExportCursor<K, V>>> cursors_;
+  size_t value_dim_;
+  size_t current_ = 0;
+};
+
+// Splits one table into subtables, each key living in the subtable its hash
+// routes it to. libcuckoo grows a full table, and exports it, under the
+// locks of all its buckets, so a single large table stalls every thread
+// working on it. The subtables fill up and grow independently, holding up
+// only the keys routed to them.
+//
+// Bucket offsets, as taken by dump_buckets and migrate_buckets, run over the
+// buckets of the subtables one after the other.
+template <class K, class V>
+class StripedTableWrapper final : public TableWrapperBase<K, V> {
+ public:
+  StripedTableWrapper(
+      std::vector<std::unique_ptr<TableWrapperBase<K, V>>> subtables,
+      size_t runtime_dim)
+      : subtables_(std::move(subtables)), runtime_dim_(runtime_dim) {}
+
+  bool insert_or_assign(K key, ConstTensor2D<V>& value_flat, int64 value_dim,
+                        int64 index) const override {
+    return subtable_of(key)->insert_or_assign(key, value_flat, value_dim,
+                                              index);
+  }
+
+  bool insert_or_assign(K* key, V* value, int64 value_dim) const override {
+    return subtable_of(*key)->insert_or_assign(key, value, value_dim);
+  }
+
+  bool insert_or_accum(K key, ConstTensor2D<V>& value_or_delta_flat, bool exist,
+                       int64 value_dim, int64 index) const override {
+    return subtable_of(key)->insert_or_accum(key, value_or_delta_flat, exist,
+                                             value_dim, index);
+  }
+
+  bool insert_or_accum_delta(K key, const V* old_row, const V* new_row,
+                             bool exist) const override {
+    return subtable_of(key)->insert_or_accum_delta(key, old_row, new_row,
+                                                   exist);
+  }
+
+  bool apply_or_insert(K key, const RowUpdateFn<V>& update, const V* grad,
+                       const V* init_row) const override {
+    return subtable_of(key)->apply_or_insert(key, update, grad, init_row);
+  }
+
+  void find(const K& key, Tensor2D<V>& value_flat,
+            ConstTensor2D<V>& default_flat, int64 value_dim,
+            bool is_full_size_default, int64 index) const override {
+    subtable_of(key)->find(key, value_flat, default_flat, value_dim,
+                           is_full_size_default, index);
+  }
+
+  void find(const K& key, Tensor2D<V>& value_flat,
+            ConstTensor2D<V>& default_flat, bool& exist, int64 value_dim,
+            bool is_full_size_default, int64 index) const override {
+    subtable_of(key)->find(key, value_flat, default_flat, exist, value_dim,
+                           is_full_size_default, index);
+  }
+
+  void find_batch(const K* keys, int64 begin, int64 end,
+                  Tensor2D<V>& value_flat, ConstTensor2D<V>& default_flat,
+                  bool* exists, int64 value_dim, bool is_full_size_default,
+                  bool lock_free) const override {
+    std::vector<std::vector<int64>> rows(subtables_.size());
+    for (int64 i = begin; i < end; ++i) {
+      rows[stripe_of(keys[i])].push_back(i);
+    }
+    find_striped(keys, rows, value_flat, default_flat, exists, value_dim,
+                 is_full_size_default, lock_free);
+  }
+
+  void find_rows(const K* keys, const int64* rows, int64 count,
+                 Tensor2D<V>& value_flat, ConstTensor2D<V>& default_flat,
+                 bool* exists, int64 value_dim, bool is_full_size_default,
+                 bool lock_free) const override {
+    std::vector<std::vector<int64>> striped_rows(subtables_.size());
+    for (int64 n = 0; n < count; ++n) {
+      striped_rows[stripe_of(keys[rows[n]])].push_back(rows[n]);
+    }
+    find_striped(keys, striped_rows, value_flat, default_flat, exists,
+                 value_dim, is_full_size_default, lock_free);
+  }
+
+  size_t dump(K* keys, V* values, const size_t search_offset,
+              const size_t search_length) const override {
+    size_t offset = search_offset;
+    size_t dump_counter = 0;
+    for (const auto& subtable : subtables_) {
+      if (dump_counter >= search_length) {
+        break;
+      }
+      const size_t sub_size = subtable->size();
+      if (offset >= sub_size) {
+        offset -= sub_size;
+        continue;
+      }
+      dump_counter += subtable->dump(keys + dump_counter,
+                                     values + dump_counter * runtime_dim_,
+                                     offset, search_length - dump_counter);
+      offset = 0;
+    }
+    return dump_counter;
+  }
+
+  std::unique_ptr<TableExportCursor<K, V>> export_cursor() const override {
+    std::vector<std::unique_ptr<TableExportCursor<K, V>>> cursors;
+    for (const auto& subtable : subtables_) {
+      cursors.push_back(subtable->export_cursor());
+    }
+    return std::unique_ptr<TableExportCursor<K, V>>(
+        new ChainedExportCursor<K, V>(std::move(cursors), runtime_dim_));
+  }
+
+  size_t dump_buckets(size_t begin, size_t max_count, std::vector<K>* keys,
+                      std::vector<V>* values) const override {
+    size_t first = 0;
+    for (const auto& subtable : subtables_) {
+      const size_t buckets = subtable->bucket_count();
+      if (begin < first + buckets) {
+        return first +
+               subtable->dump_buckets(begin - first, max_count, keys, values);
+      }
+      first += buckets;
+    }
+    return first;
+  }
+
+  size_t size() const override {
+    size_t total = 0;
+    for (const auto& subtable : subtables_) {
+      total += subtable->size();
+    }
+    return total;
+  }
+
+  size_t capacity() const override {
+    size_t total = 0;
+    for (const auto& subtable : subtables_) {
+      total += subtable->capacity();
+    }
+    return total;
+  }
+
+  size_t bucket_count() const override {
+    size_t total = 0;
+    for (const auto& subtable : subtables_) {
+      total += subtable->bucket_count();
+    }
+    return total;
+  }
+
+  bool reserve(const size_t new_size) override {
+    const size_t sub_size =
+        (new_size + subtables_.size() - 1) / subtables_.size();
+    bool reserved = false;
+    for (auto& subtable : subtables_) {
+      reserved |= subtable->reserve(sub_size);
+    }
+    return reserved;
+  }
+
+  void clear() override {
+    for (auto& subtable : subtables_) {
+      subtable->clear();
+    }
+  }
+
+  void freeze() override {
+    for (auto& subtable : subtables_) {
+      subtable->freeze();
+    }
+  }
+
+  bool erase(const K& key) override { return subtable_of(key)->erase(key); }
+
+  size_t erase_if(const std::function<bool(const V*)>& pred,
+                  std::vector<K>* removed) override {
+    size_t erased = 0;
+    for (auto& subtable : subtables_) {
+      erased += subtable->erase_if(pred, removed);
+    }
+    return erased;
+  }
+
+  bool insert_if_absent(const K& key, const V* value) override {
+    return subtable_of(key)->insert_if_absent(key, value);
+  }
+
+  size_t migrate_buckets(size_t begin, size_t end,
+                         TableWrapperBase<K, V>* dst) override {
+    size_t migrated = 0;
+    size_t first = 0;
+    for (auto& subtable : subtables_) {
+      const size_t buckets = subtable->bucket_count();
+      const size_t last = first + buckets;
+      if (begin < last && end > first) {
+        migrated += subtable->migrate_buckets(std::max(begin, first) - first,
+                                              std::min(end, last) - first, dst);
+      }
+      first = last;
+    }
+    return migrated;
+  }
+
+  bool migrate_key(const K& key, TableWrapperBase<K, V>* dst) override {
+    return subtable_of(key)->migrate_key(key, dst);
+  }
+
+ private:
+  // libcuckoo picks buckets with the low bits of HybridHash, routing on them
+  // would leave most buckets of every subtable empty. The hash is mixed once
+  // more and routed on its high bits instead.
+  inline size_t stripe_of(const K& key) const {
+    const uint64 hash = static_cast<uint64>(HybridHash<K>{}(key));
+    return static_cast<size_t>(((hash * UINT64_C(0x9e3779b97f4a7c15)) >> 32) %
+                               subtables_.size());
+  }
+
+  inline TableWrapperBase<K, V>* subtable_of(const K& key) const {
+    return subtables_[stripe_of(key)].get();
+  }
+
+  // Looks the keys up subtable by subtable, rows[s] holding the rows of the
+  // keys of subtable s, so each subtable prefetches over a block of its own
+  // keys and frozen subtables are still probed lock free.
+  void find_striped(const K* keys, const std::vector<std::vector<int64>>& rows,
+                    Tensor2D<V>& value_flat, ConstTensor2D<V>& default_flat,
+                    bool* exists, int64 value_dim, bool is_full_size_default,
+                    bool lock_free) const {
+    for (size_t s = 0; s < subtables_.size(); ++s) {
+      if (rows[s].empty()) continue;
+      subtables_[s]->find_rows(
+          keys, rows[s].data(), static_cast<int64>(rows[s].size()), value_flat,
+          default_flat, exists, value_dim, is_full_size_default, lock_free);
+    }
+  }
+
+  std::vector<std::unique_ptr<TableWrapperBase<K, V>>> subtables_;
+  size_t runtime_dim_;
+};
+
+// Creates a table of `num_subtables` subtables sharing `init_size` between
+// them, or a plain table if `num_subtables` is at most 1.
+template <class K, class V>
+void CreateStripedTable(size_t num_subtables, size_t init_size,
+                        size_t runtime_dim, TableWrapperBase<K, V>** pptable) {
+  if (num_subtables <= 1) {
+    CreateTable(init_size, runtime_dim, pptable);
+    return;
+  }
+  const size_t sub_size = (init_size + num_subtables - 1) / num_subtables;
+  std::vector<std::unique_ptr<TableWrapperBase<K, V>>> subtables;
+  for (size_t i = 0; i < num_subtables; i++) {
+    TableWrapperBase<K, V>* subtable = nullptr;
+    CreateTable(sub_size, runtime_dim, &subtable);
+    subtables.emplace_back(subtable);
+  }
+  *pptable = new StripedTableWrapper<K, V>(std::move(subtables), runtime_dim);
+}
+
 }  // namespace cpu
 }  // namespace lookup
 }  // namespace recommenders_addons
@@ -0,0 +1,399 @@
+/* Copyright 2024 The TensorFlow Authors. All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+==============================================================================*/
+
+#define EIGEN_USE_THREADS
+
+#include <atomic>
+#include <memory>
+#include <string>
+#include <vector>
+
+#include "tensorflow/core/kernels/lookup_table_op.h"
+#include "tensorflow/core/platform/path.h"
+#include "tensorflow/core/util/work_sharder.h"
+#include "tensorflow_recommenders_addons/dynamic_embedding/core/kernels/cuckoo_hashtable_op.h"
+#include "tensorflow_recommenders_addons/dynamic_embedding/core/kernels/lookup_impl/lookup_table_op_cpu.h"
+#include "tensorflow_recommenders_addons/dynamic_embedding/core/utils/types.h"
+#include "tensorflow_recommenders_addons/dynamic_embedding/core/utils/utils.h"
+
+namespace tensorflow {
+namespace recommenders_addons {
+namespace lookup {
+
+// A read-only table serving the `-keys`/`-values` file pair written by
+// `save_to_file_system`. Both files are memory mapped, so restoring is
+// close to free and the pages are shared by every process on the host that
+// maps the same files. Only an open-addressing index of row numbers is built
+// in memory, keys and values are read from the mapped regions directly.
+template <class K, class V>
+class MmapTableOfTensors final : public LookupInterface {
+ private:
+  static constexpr int64 kEmptySlot = -1;
+
+ public:
+  MmapTableOfTensors(OpKernelContext* ctx, OpKernel* kernel) {
+    string dirpath;
+    string file_name;
+    OP_REQUIRES_OK(ctx,
+                   GetNodeAttr(kernel->def(), "value_shape", &value_shape_));
+    OP_REQUIRES_OK(ctx, GetNodeAttr(kernel->def(), "dirpath", &dirpath));
+    OP_REQUIRES_OK(ctx, GetNodeAttr(kernel->def(), "file_name", &file_name));
+    OP_REQUIRES(
+        ctx, TensorShapeUtils::IsVector(value_shape_),
+        errors::InvalidArgument("Default value must be a vector, got shape ",
+                                value_shape_.DebugString()));
+    runtime_dim_ = value_shape_.dim_size(0);
+    OP_REQUIRES_OK(ctx, MapFiles(ctx, io::JoinPath(dirpath, file_name)));
+  }
+
+  size_t size() const override { return num_keys_; }
+
+  Status Find(OpKernelContext* ctx, const Tensor& key, Tensor* value,
+              const Tensor& default_value) override {
+    return DoFind(ctx, key, value, default_value, nullptr);
+  }
+
+  Status FindWithExists(OpKernelContext* ctx, const Tensor& key, Tensor* value,
+                        const Tensor& default_value, Tensor& exists) {
+    return DoFind(ctx, key, value, default_value, &exists);
+  }
+
+  Status Insert(OpKernelContext* ctx, const Tensor& keys,
+                const Tensor& values) override {
+    return errors::Unimplemented("MmapTable is read-only.");
+  }
+
+  Status Remove(OpKernelContext* ctx, const Tensor& keys) override {
+    return errors::Unimplemented("MmapTable is read-only.");
+  }
+
+  Status ImportValues(OpKernelContext* ctx, const Tensor& keys,
+                      const Tensor& values) override {
+    return errors::Unimplemented("MmapTable is read-only.");
+  }
+
+  Status ExportValues(OpKernelContext* ctx) override {
+    Tensor* keys;
+    Tensor* values;
+    const auto output_key_size = static_cast<int64>(num_keys_);
+    TF_RETURN_IF_ERROR(
+        ctx->allocate_output("keys", TensorShape({output_key_size}), &keys));
+    TF_RETURN_IF_ERROR(ctx->allocate_output(
+        "values",
+        TensorShape({output_key_size, static_cast<int64>(runtime_dim_)}),
+        &values));
+    if (num_keys_ > 0) {
+      std::copy_n(keys_, num_keys_, keys->flat<K>().data());
+      std::copy_n(values_, num_keys_ * runtime_dim_, values->flat<V>().data());
+    }
+    return TFOkStatus;
+  }
+
+  DataType key_dtype() const override { return DataTypeToEnum<K>::v(); }
+
+  DataType value_dtype() const override { return DataTypeToEnum<V>::v(); }
+
+  TensorShape key_shape() const final { return TensorShape(); }
+
+  TensorShape value_shape() const override { return value_shape_; }
+
+  int64 MemoryUsed() const override {
+    return sizeof(MmapTableOfTensors) + index_.size() * sizeof(int64);
+  }
+
+ private:
+  Status MapFiles(OpKernelContext* ctx, const string& filepath) {
+    const string key_filepath = filepath + "-keys";
+    const string value_filepath = filepath + "-values";
+    const auto env = ctx->env();
+    TF_RETURN_WITH_CONTEXT_IF_ERROR(
+        env->NewReadOnlyMemoryRegionFromFile(key_filepath, &key_region_),
+        "Failed to map ", key_filepath);
+    TF_RETURN_WITH_CONTEXT_IF_ERROR(
+        env->NewReadOnlyMemoryRegionFromFile(value_filepath, &value_region_),
+        "Failed to map ", value_filepath);
+
+    const size_t value_len = sizeof(V) * runtime_dim_;
+    num_keys_ = key_region_->length() / sizeof(K);
+    if (num_keys_ != value_region_->length() / value_len) {
+      return errors::Unavailable(
+          "the keys number in file " + key_filepath +
+          " is not equal to the value vectors number in file " +
+          value_filepath + ".");
+    }
+    keys_ = reinterpret_cast<const K*>(key_region_->data());
+    values_ = reinterpret_cast<const V*>(value_region_->data());
+
+    BuildIndex(ctx);
+    LOG(INFO) << "MmapTable mapped " << num_keys_ << " keys and values from "
+              << key_filepath << " and " << value_filepath
+              << ", index slots=" << index_.size();
+    return TFOkStatus;
+  }
+
+  // Builds a linear-probing index with a load factor of at most 0.5, in
+  // parallel. When a key appears more than once, the last row in the files
+  // wins, the same as loading them into a mutable table would do.
+  void BuildIndex(OpKernelContext* ctx) {
+    size_t capacity = 2;
+    while (capacity < num_keys_ * 2) {
+      capacity <<= 1;
+    }
+    index_mask_ = capacity - 1;
+    index_ = std::vector<std::atomic<int64>>(capacity);
+    for (auto& slot : index_) {
+      slot.store(kEmptySlot, std::memory_order_relaxed);
+    }
+
+    auto shard = [this](int64 begin, int64 end) {
+      for (int64 row = begin; row < end; ++row) {
+        size_t pos = hasher_(keys_[row]) & index_mask_;
+        while (true) {
+          int64 current = index_[pos].load(std::memory_order_relaxed);
+          if (current == kEmptySlot) {
+            if (index_[pos].compare_exchange_weak(current, row)) {
+              break;
+            }
+            continue;
+          }
+          if (keys_[current] == keys_[row]) {
+            while (current < row &&
+                   !index_[pos].compare_exchange_weak(current, row)) {
+            }
+            break;
+          }
+          pos = (pos + 1) & index_mask_;
+        }
+      }
+    };
+    auto& worker_threads = *ctx->device()->tensorflow_cpu_worker_threads();
+    int64 total = static_cast<int64>(num_keys_);
+    int64 slices = static_cast<int64>(total / worker_threads.num_threads) + 1;
+    Shard(worker_threads.num_threads, worker_threads.workers, total, slices,
+          shard);
+  }
+
+  inline int64 FindRow(const K& key) const {
+    size_t pos = hasher_(key) & index_mask_;
+    while (true) {
+      const int64 row = index_[pos].load(std::memory_order_relaxed);
+      if (row == kEmptySlot) {
+        return kEmptySlot;
+      }
+      if (keys_[row] == key) {
+        return row;
+      }
+      pos = (pos + 1) & index_mask_;
+    }
+  }
+
+  Status DoFind(OpKernelContext* ctx, const Tensor& key, Tensor* value,
+                const Tensor& default_value, Tensor* exists) {
+    const auto key_flat = key.flat<K>();
+    cpu::Tensor2D<V> value_flat = value->flat_inner_dims<V, 2>();
+    cpu::ConstTensor2D<V> default_flat = default_value.flat_inner_dims<V, 2>();
+    bool* exists_ptr = exists ? exists->flat<bool>().data() : nullptr;
+    const int64 value_dim = static_cast<int64>(runtime_dim_);
+    int64 total = value_flat.size();
+    bool is_full_default = (total == default_flat.size());
+    int64 num_keys = key_flat.size();
+
+    auto shard = [this, key_flat, &value_flat, &default_flat, exists_ptr,
+                  value_dim, is_full_default](int64 begin, int64 end) {
+      for (int64 i = begin; i < end; ++i) {
+        const int64 row = num_keys_ > 0 ? FindRow(key_flat(i)) : kEmptySlot;
+        if (row != kEmptySlot) {
+          std::copy_n(values_ + row * value_dim, value_dim,
+                      value_flat.data() + i * value_dim);
+        } else {
+          for (int64 j = 0; j < value_dim; j++) {
+            value_flat(i, j) =
+                is_full_default ? default_flat(i, j) : default_flat(0, j);
+          }
+        }
+        if (exists_ptr) {
+          exists_ptr[i] = (row != kEmptySlot);
+        }
+      }
+    };
+    auto& worker_threads = *ctx->device()->tensorflow_cpu_worker_threads();
+    int64 slices =
+        static_cast<int64>(num_keys / worker_threads.num_threads) + 1;
+    Shard(worker_threads.num_threads, worker_threads.workers, num_keys, slices,
+          shard);
+    return TFOkStatus;
+  }
+
+  TensorShape value_shape_;
+  size_t runtime_dim_;
+  std::unique_ptr<ReadOnlyMemoryRegion> key_region_;
+  std::unique_ptr<ReadOnlyMemoryRegion> value_region_;
+  const K* keys_ = nullptr;
+  const V* values_ = nullptr;
+  size_t num_keys_ = 0;
+  std::vector<std::atomic<int64>> index_;
+  size_t index_mask_ = 0;
+  cpu::HybridHash<K> hasher_;
+};
+
+}  // namespace lookup
+
+class MmapTableOpKernel : public OpKernel {
+ public:
+  explicit MmapTableOpKernel(OpKernelConstruction* ctx) : OpKernel(ctx) {}
+
+ protected:
+  Status GetTable(OpKernelContext* ctx, LookupInterface** table) {
+    const Tensor* handle_tensor;
+    TF_RETURN_IF_ERROR(ctx->input("table_handle", &handle_tensor));
+    const ResourceHandle& handle = handle_tensor->scalar<ResourceHandle>()();
+    return ctx->resource_manager()->Lookup<LookupInterface, false>(
+        handle.container(), handle.name(), table);
+  }
+};
+
+// Table find op.
+class MmapTableFindOp : public MmapTableOpKernel {
+ public:
+  using MmapTableOpKernel::MmapTableOpKernel;
+
+  void Compute(OpKernelContext* ctx) override {
+    LookupInterface* table;
+    OP_REQUIRES_OK(ctx, GetTable(ctx, &table));
+    core::ScopedUnref unref_me(table);
+
+    DataTypeVector expected_inputs = {DT_RESOURCE, table->key_dtype(),
+                                      table->value_dtype()};
+    DataTypeVector expected_outputs = {table->value_dtype()};
+    OP_REQUIRES_OK(ctx, ctx->MatchSignature(expected_inputs, expected_outputs));
+
+    const Tensor& key = ctx->input(1);
+    const Tensor& default_value = ctx->input(2);
+
+    TensorShape output_shape = key.shape();
+    output_shape.RemoveLastDims(table->key_shape().dims());
+    output_shape.AppendShape(table->value_shape());
+    Tensor* out;
+    OP_REQUIRES_OK(ctx, ctx->allocate_output("values", output_shape, &out));
+
+    OP_REQUIRES_OK(ctx, table->Find(ctx, key, out, default_value));
+  }
+};
+
+// Table find op with return exists tensor.
+template <class K, class V>
+class MmapTableFindWithExistsOp : public MmapTableOpKernel {
+ public:
+  using MmapTableOpKernel::MmapTableOpKernel;
+
+  void Compute(OpKernelContext* ctx) override {
+    LookupInterface* table;
+    OP_REQUIRES_OK(ctx, GetTable(ctx, &table));
+    core::ScopedUnref unref_me(table);
+
+    lookup::MmapTableOfTensors<K, V>* table_mmap =
+        (lookup::MmapTableOfTensors<K, V>*)table;
+
+    DataTypeVector expected_inputs = {DT_RESOURCE, table->key_dtype(),
+                                      table->value_dtype()};
+    DataTypeVector expected_outputs = {table->value_dtype(), DT_BOOL};
+    OP_REQUIRES_OK(ctx, ctx->MatchSignature(expected_inputs, expected_outputs));
+
+    const Tensor& key = ctx->input(1);
+    const Tensor& default_value = ctx->input(2);
+
+    TensorShape output_shape = key.shape();
+    output_shape.RemoveLastDims(table->key_shape().dims());
+    output_shape.AppendShape(table->value_shape());
+
+    Tensor* values;
+    Tensor* exists;
+    OP_REQUIRES_OK(ctx, ctx->allocate_output("values", output_shape, &values));
+    OP_REQUIRES_OK(ctx, ctx->allocate_output("exists", key.shape(), &exists));
+
+    OP_REQUIRES_OK(ctx, table_mmap->FindWithExists(ctx, key, values,
+                                                   default_value, *exists));
+  }
+};
+
+// Op that returns the size of the given table.
+class MmapTableSizeOp : public MmapTableOpKernel {
+ public:
+  using MmapTableOpKernel::MmapTableOpKernel;
+
+  void Compute(OpKernelContext* ctx) override {
+    LookupInterface* table;
+    OP_REQUIRES_OK(ctx, GetTable(ctx, &table));
+    core::ScopedUnref unref_me(table);
+
+    Tensor* out;
+    OP_REQUIRES_OK(ctx, ctx->allocate_output("size", TensorShape({}), &out));
+    out->flat<int64>().setConstant(table->size());
+  }
+};
+
+// Op that outputs tensors of all keys and all values.
+class MmapTableExportOp : public MmapTableOpKernel {
+ public:
+  using MmapTableOpKernel::MmapTableOpKernel;
+
+  void Compute(OpKernelContext* ctx) override {
+    LookupInterface* table;
+    OP_REQUIRES_OK(ctx, GetTable(ctx, &table));
+    core::ScopedUnref unref_me(table);
+
+    OP_REQUIRES_OK(ctx, table->ExportValues(ctx));
+  }
+};
+
+REGISTER_KERNEL_BUILDER(Name("TfraMmapTableFind").Device(DEVICE_CPU),
+                        MmapTableFindOp);
+REGISTER_KERNEL_BUILDER(Name("TfraMmapTableSize").Device(DEVICE_CPU),
+                        MmapTableSizeOp);
+REGISTER_KERNEL_BUILDER(Name("TfraMmapTableExport").Device(DEVICE_CPU),
+                        MmapTableExportOp);
+
+// Register the custom op.
+#define REGISTER_KERNEL(key_dtype, value_dtype)                       \
+  REGISTER_KERNEL_BUILDER(                                            \
+      Name("TfraMmapTableOfTensors")                                  \
+          .Device(DEVICE_CPU)                                         \
+          .TypeConstraint<key_dtype>("key_dtype")                     \
+          .TypeConstraint<value_dtype>("value_dtype"),                \
+      HashTableOp<lookup::MmapTableOfTensors<key_dtype, value_dtype>, \
+                  key_dtype, value_dtype>);                           \
+  REGISTER_KERNEL_BUILDER(Name("TfraMmapTableFindWithExists")         \
+                              .Device(DEVICE_CPU)                     \
+                              .TypeConstraint<key_dtype>("Tin")       \
+                              .TypeConstraint<value_dtype>("Tout"),   \
+                          MmapTableFindWithExistsOp<key_dtype, value_dtype>);
+
+// String keys are not registered: the saved key files only hold fixed size
+// records, which can not be served in place for variable length keys.
+REGISTER_KERNEL(int32, double);
+REGISTER_KERNEL(int32, float);
+REGISTER_KERNEL(int32, int32);
+REGISTER_KERNEL(int64, double);
+REGISTER_KERNEL(int64, float);
+REGISTER_KERNEL(int64, int32);
+REGISTER_KERNEL(int64, int64);
+REGISTER_KERNEL(int64, int8);
+REGISTER_KERNEL(int64, Eigen::half);
+REGISTER_KERNEL(int64, bfloat16);
+
+#undef REGISTER_KERNEL
+
+}  // namespace recommenders_addons
+}  // namespace tensorflow
@@ -501,6 +501,66 @@ class cuckoohash_map {
     }
   }
 
+  /**
+   * Hashes @p key and prefetches the locks and the slot metadata of the two
+   * buckets it may live in, without taking any lock. Issuing this for a block
+   * of keys before looking them up with @ref find_fn_hashed overlaps their
+   * cache misses. The hashpower may change before the lookup, which is still
+   * correct, the prefetch is only a hint.
+   *
+   * @tparam K type of the key. This can be any type comparable with @c key_type
+   * @param key the key to prefetch
+   * @return the hash of @p key, to pass to @ref find_fn_hashed
+   */
+  template <typename K>
+  size_type prefetch(const K &key) const {
+    const size_type hash = hashed_key_only_hash(key);
+    const size_type hp = hashpower();
+    const size_type i1 = index_hash(hp, hash);
+    const size_type i2 = alt_index(hp, partial_key(hash), i1);
+    prefetch_bucket(i1);
+    prefetch_bucket(i2);
+    return hash;
+  }
+
+  /**
+   * Same as @ref find_fn, for a key whose hash was already computed by
+   * @ref prefetch.
+   */
+  template <typename K, typename F>
+  bool find_fn_hashed(const K &key, const size_type hash, F fn) const {
+    const hash_value hv = {hash, partial_key(hash)};
+    const auto b = snapshot_and_lock_two<normal_mode>(hv);
+    const table_position pos = cuckoo_find(key, hv.partial, b.i1, b.i2);
+    if (pos.status == ok) {
+      fn(buckets_[pos.index].mapped(pos.slot));
+      return true;
+    } else {
+      return false;
+    }
+  }
+
+  /**
+   * Same as @ref find_fn_hashed, but probes the buckets without taking their
+   * locks. It is only safe while no other thread modifies the table and no
+   * lazy rehash is pending, which holds after a @ref lock_table has been
+   * taken and released following the last write.
+   */
+  template <typename K, typename F>
+  bool find_fn_hashed_unlocked(const K &key, const size_type hash, F fn) const {
+    const partial_t partial = partial_key(hash);
+    const size_type hp = hashpower();
+    const size_type i1 = index_hash(hp, hash);
+    const size_type i2 = alt_index(hp, partial, i1);
+    const table_position pos = cuckoo_find(key, partial, i1, i2);
+    if (pos.status == ok) {
+      fn(buckets_[pos.index].mapped(pos.slot));
+      return true;
+    } else {
+      return false;
+    }
+  }
+
   /**
    * Searches the table for @p key, and invokes @p fn on the value. @p fn is
    * allow to modify the contents of the value if found.
@@ -552,6 +612,46 @@ class cuckoohash_map {
     }
   }
 
+  /**
+   * Calls @p fn on every element stored in the buckets [@p begin, @p end),
+   * holding the lock of each bucket while its elements are visited, and
+   * erases the elements for which @p fn returns @c true. Unlike iterating a
+   * @ref locked_table, other threads keep using the table while the range is
+   * walked, so a table can be drained in small steps.
+   *
+   * @tparam F type of the functor. It should implement the method
+   * <tt>bool operator()(const key_type&, mapped_type&)</tt>.
+   * @param begin the first bucket to visit
+   * @param end one past the last bucket to visit, clipped to @ref
+   * bucket_count
+   * @param fn the functor to invoke on each element
+   * @return the number of elements erased
+   */
+  template <typename F>
+  size_type erase_in_buckets_fn(size_type begin, const size_type end, F fn) {
+    size_type erased = 0;
+    while (true) {
+      const size_type hp = hashpower();
+      const size_type stop = std::min(end, hashsize(hp));
+      try {
+        for (; begin < stop; ++begin) {
+          const auto lock = lock_one(hp, begin, normal_mode());
+          bucket &b = buckets_[begin];
+          for (size_type slot = 0; slot < slot_per_bucket(); ++slot) {
+            if (b.occupied(slot) && fn(b.key(slot), b.mapped(slot))) {
+              del_from_bucket(begin, slot);
+              ++erased;
+            }
+          }
+        }
+        return erased;
+      } catch (hashpower_changed &) {
+        // The table grew, the remaining buckets are walked at the new size.
+        continue;
+      }
+    }
+  }
+
   /**
    * Searches for @p key in the table. If the key is found, then @p fn is
    * called on the existing value, and nothing happens to the passed-in key and
@@ -1211,6 +1311,15 @@ class cuckoohash_map {
     return AllLocksManager(this, AllUnlocker{first_locked});
   }
 
+  // prefetch_bucket prefetches the lock of a bucket, its first slot, and its
+  // partials and occupied flags, which are stored after the slots.
+  void prefetch_bucket(const size_type i) const {
+    const bucket &b = buckets_[i];
+    __builtin_prefetch(&get_current_locks()[lock_ind(i)]);
+    __builtin_prefetch(&b);
+    __builtin_prefetch(reinterpret_cast<const char *>(&b + 1) - 1);
+  }
+
   // lock_ind converts an index into buckets to an index into locks.
   static inline size_type lock_ind(const size_type bucket_ind) {
     return bucket_ind & (kMaxNumLocks - 1);
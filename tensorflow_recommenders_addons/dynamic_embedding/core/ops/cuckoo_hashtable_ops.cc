@@ -180,6 +180,37 @@ REGISTER_OP(PREFIX_OP_NAME(CuckooHashTableFindWithExists))
       return TFOkStatus;
     });
 
+// Looks up keys[i] in the table of table_handles[i] for every i, so the
+// lookups of many tables on one device run as a single op.
+REGISTER_OP(PREFIX_OP_NAME(CuckooHashTableFindGroup))
+    .Input("table_handles: N * resource")
+    .Input("keys: N * key_dtype")
+    .Input("default_values: N * value_dtype")
+    .Output("values: N * value_dtype")
+    .Output("exists: N * bool")
+    .Attr("N: int >= 1")
+    .Attr("key_dtype: type")
+    .Attr("value_dtype: type")
+    .SetShapeFn([](InferenceContext* c) {
+      int num_tables;
+      TF_RETURN_IF_ERROR(c->GetAttr("N", &num_tables));
+      for (int i = 0; i < num_tables; ++i) {
+        ShapeHandle handle;
+        TF_RETURN_IF_ERROR(c->WithRank(c->input(i), 0, &handle));
+        ShapeHandle keys = c->input(num_tables + i);
+        ShapeHandle default_value = c->input(2 * num_tables + i);
+        ShapeHandle values = c->UnknownShape();
+        if (c->RankKnown(default_value) && c->Rank(default_value) > 0) {
+          ShapeHandle value_shape =
+              c->Vector(c->Dim(default_value, c->Rank(default_value) - 1));
+          TF_RETURN_IF_ERROR(c->Concatenate(keys, value_shape, &values));
+        }
+        c->set_output(i, values);
+        c->set_output(num_tables + i, keys);
+      }
+      return TFOkStatus;
+    });
+
 REGISTER_OP(PREFIX_OP_NAME(CuckooHashTableInsert))
     .Input("table_handle: resource")
     .Input("keys: Tin")
@@ -209,6 +240,62 @@ REGISTER_OP(PREFIX_OP_NAME(CuckooHashTableAccum))
       return TFOkStatus;
     });
 
+REGISTER_OP(PREFIX_OP_NAME(CuckooHashTableAccumDelta))
+    .Input("table_handle: resource")
+    .Input("keys: key_dtype")
+    .Input("old_values: value_dtype")
+    .Input("new_values: value_dtype")
+    .Input("exists: bool")
+    .Attr("key_dtype: type")
+    .Attr("value_dtype: type")
+    .SetShapeFn([](InferenceContext* c) {
+      ShapeHandle handle;
+      TF_RETURN_IF_ERROR(c->WithRank(c->input(0), 0, &handle));
+      ShapeHandle values;
+      TF_RETURN_IF_ERROR(c->Merge(c->input(2), c->input(3), &values));
+      return TFOkStatus;
+    });
+
+REGISTER_OP(PREFIX_OP_NAME(CuckooHashTableInsertOrAdd))
+    .Input("table_handle: resource")
+    .Input("keys: key_dtype")
+    .Input("deltas: value_dtype")
+    .Attr("key_dtype: type")
+    .Attr("value_dtype: type")
+    .SetShapeFn([](InferenceContext* c) {
+      ShapeHandle handle;
+      TF_RETURN_IF_ERROR(c->WithRank(c->input(0), 0, &handle));
+
+      // TODO: Validate keys and values shape.
+      return TFOkStatus;
+    });
+
+REGISTER_OP(PREFIX_OP_NAME(CuckooHashTableApplyOptimizer))
+    .Input("table_handle: resource")
+    .Input("keys: key_dtype")
+    .Input("grads: value_dtype")
+    .Input("init_rows: value_dtype")
+    .Input("hyperparams: value_dtype")
+    .Attr("optimizer: {'sgd', 'adagrad', 'adam', 'ftrl'}")
+    .Attr("key_dtype: type")
+    .Attr("value_dtype: type")
+    .SetShapeFn([](InferenceContext* c) {
+      ShapeHandle handle;
+      TF_RETURN_IF_ERROR(c->WithRank(c->input(0), 0, &handle));
+      ShapeHandle keys;
+      TF_RETURN_IF_ERROR(c->WithRank(c->input(1), 1, &keys));
+      ShapeHandle grads;
+      TF_RETURN_IF_ERROR(c->WithRank(c->input(2), 2, &grads));
+      ShapeHandle init_rows;
+      TF_RETURN_IF_ERROR(c->WithRank(c->input(3), 2, &init_rows));
+      DimensionHandle unused;
+      TF_RETURN_IF_ERROR(c->Merge(c->Dim(keys, 0), c->Dim(grads, 0), &unused));
+      TF_RETURN_IF_ERROR(
+          c->Merge(c->Dim(keys, 0), c->Dim(init_rows, 0), &unused));
+      TF_RETURN_IF_ERROR(c->WithRank(c->input(4), 1, &handle));
+      return TFOkStatus;
+    });
+
 REGISTER_OP(PREFIX_OP_NAME(CuckooHashTableRemove))
     .Input("table_handle: resource")
     .Input("keys: Tin")
@@ -222,6 +309,74 @@ REGISTER_OP(PREFIX_OP_NAME(CuckooHashTableRemove))
       return TFOkStatus;
     });
 
+REGISTER_OP(PREFIX_OP_NAME(CuckooHashTableRemoveIfLess))
+    .Input("table_handle: resource")
+    .Input("threshold: value_dtype")
+    .Output("removed_keys: key_dtype")
+    .Attr("key_dtype: type")
+    .Attr("value_dtype: type")
+    .SetShapeFn([](InferenceContext* c) {
+      ShapeHandle handle;
+      TF_RETURN_IF_ERROR(c->WithRank(c->input(0), 0, &handle));
+      TF_RETURN_IF_ERROR(c->WithRank(c->input(1), 0, &handle));
+      c->set_output(0, c->Vector(c->UnknownDim()));
+      return TFOkStatus;
+    });
+
+REGISTER_OP(PREFIX_OP_NAME(CuckooHashTableSetFrozen))
+    .Input("table_handle: resource")
+    .Input("frozen: bool")
+    .Attr("key_dtype: type")
+    .Attr("value_dtype: type")
+    .SetShapeFn([](InferenceContext* c) {
+      ShapeHandle handle;
+      TF_RETURN_IF_ERROR(c->WithRank(c->input(0), 0, &handle));
+      TF_RETURN_IF_ERROR(c->WithRank(c->input(1), 0, &handle));
+      return TFOkStatus;
+    });
+
+REGISTER_OP(PREFIX_OP_NAME(CuckooHashTableIsFrozen))
+    .Input("table_handle: resource")
+    .Output("frozen: bool")
+    .Attr("key_dtype: type")
+    .Attr("value_dtype: type")
+    .SetShapeFn([](InferenceContext* c) {
+      ShapeHandle handle;
+      TF_RETURN_IF_ERROR(c->WithRank(c->input(0), 0, &handle));
+      c->set_output(0, c->Scalar());
+      return TFOkStatus;
+    });
+
+REGISTER_OP(PREFIX_OP_NAME(CuckooHashTableInitMissing))
+    .Input("table_handle: resource")
+    .Input("keys: Tin")
+    .Input("values: Tout")
+    .Input("exists: bool")
+    .Input("init_values: Tout")
+    .Output("values_out: Tout")
+    .Attr("Tin: type")
+    .Attr("Tout: type")
+    .Attr("insert: bool = false")
+    .SetShapeFn([](InferenceContext* c) {
+      ShapeHandle handle;
+      TF_RETURN_IF_ERROR(c->WithRank(c->input(0), 0, &handle));
+      TF_RETURN_IF_ERROR(c->Merge(c->input(1), c->input(3), &handle));
+      c->set_output(0, c->input(2));
+      return TFOkStatus;
+    });
+
+REGISTER_OP(PREFIX_OP_NAME(CuckooHashTableResizeMetrics))
+    .Input("table_handle: resource")
+    .Output("metrics: int64")
+    .Attr("key_dtype: type")
+    .Attr("value_dtype: type")
+    .SetShapeFn([](InferenceContext* c) {
+      ShapeHandle handle;
+      TF_RETURN_IF_ERROR(c->WithRank(c->input(0), 0, &handle));
+      c->set_output(0, c->Vector(4));
+      return TFOkStatus;
+    });
+
 REGISTER_OP(PREFIX_OP_NAME(CuckooHashTableClear))
     .Input("table_handle: resource")
     .Attr("key_dtype: type")
@@ -254,6 +409,56 @@ REGISTER_OP(PREFIX_OP_NAME(CuckooHashTableExport))
       return TFOkStatus;
     });
 
+REGISTER_OP(PREFIX_OP_NAME(CuckooHashTableExportAndClear))
+    .Input("table_handle: resource")
+    .Output("keys: key_dtype")
+    .Output("values: value_dtype")
+    .Attr("key_dtype: type")
+    .Attr("value_dtype: type")
+    .SetShapeFn([](InferenceContext* c) {
+      ShapeHandle handle;
+      TF_RETURN_IF_ERROR(c->WithRank(c->input(0), 0, &handle));
+      ShapeHandle keys = c->UnknownShapeOfRank(1);
+      ShapeAndType value_shape_and_type;
+      TF_RETURN_IF_ERROR(ValidateTableResourceHandle(
+          c,
+          /*keys=*/keys,
+          /*key_dtype_attr=*/"key_dtype",
+          /*value_dtype_attr=*/"value_dtype",
+          /*is_lookup=*/false, &value_shape_and_type));
+      c->set_output(0, keys);
+      c->set_output(1, value_shape_and_type.shape);
+      return TFOkStatus;
+    });
+
+REGISTER_OP(PREFIX_OP_NAME(CuckooHashTableExportChunk))
+    .Input("table_handle: resource")
+    .Input("offset: int64")
+    .Input("batch_size: int64")
+    .Output("keys: key_dtype")
+    .Output("values: value_dtype")
+    .Output("next_offset: int64")
+    .Attr("key_dtype: type")
+    .Attr("value_dtype: type")
+    .SetShapeFn([](InferenceContext* c) {
+      ShapeHandle handle;
+      TF_RETURN_IF_ERROR(c->WithRank(c->input(0), 0, &handle));
+      TF_RETURN_IF_ERROR(c->WithRank(c->input(1), 0, &handle));
+      TF_RETURN_IF_ERROR(c->WithRank(c->input(2), 0, &handle));
+      ShapeHandle keys = c->UnknownShapeOfRank(1);
+      ShapeAndType value_shape_and_type;
+      TF_RETURN_IF_ERROR(ValidateTableResourceHandle(
+          c,
+          /*keys=*/keys,
+          /*key_dtype_attr=*/"key_dtype",
+          /*value_dtype_attr=*/"value_dtype",
+          /*is_lookup=*/false, &value_shape_and_type));
+      c->set_output(0, keys);
+      c->set_output(1, value_shape_and_type.shape);
+      c->set_output(2, c->Scalar());
+      return TFOkStatus;
+    });
+
 REGISTER_OP(PREFIX_OP_NAME(CuckooHashTableSaveToFileSystem))
     .Input("table_handle: resource")
     .Input("dirpath: string")
@@ -299,6 +504,10 @@ REGISTER_OP(PREFIX_OP_NAME(CuckooHashTableOfTensors))
     .Attr("value_dtype: type")
     .Attr("value_shape: shape = {}")
     .Attr("init_size: int = 0")
+    .Attr("min_slice_sizes: list(int) = []")
+    .Attr("num_threads: list(int) = []")
+    .Attr("incremental_resize: bool = false")
+    .Attr("num_subtables: int >= 1 = 1")
     .SetIsStateful()
     .SetShapeFn([](InferenceContext* c) {
       PartialTensorShape value_p;
@@ -148,4 +148,56 @@ REGISTER_OP(PREFIX_OP_NAME(ParallelDynamicStitch))
 
 #endif  // GOOGLE_CUDA
 
+REGISTER_OP(PREFIX_OP_NAME(MultiDynamicPartition))
+    .Input("data: T")
+    .Input("partitions: int32")
+    .Output("outputs: Tout")
+    .Output("indices: num_partitions * int32")
+    .Attr("num_partitions: int >= 1")
+    .Attr("T: list(type)")
+    .Attr("Tout: list(type)")
+    .SetShapeFn([](InferenceContext* c) {
+      int64_t num_partitions;
+      TF_RETURN_IF_ERROR(c->GetAttr("num_partitions", &num_partitions));
+      const int num_data = c->num_inputs() - 1;
+      if (c->num_outputs() != num_data * num_partitions + num_partitions) {
+        return errors::InvalidArgument(
+            "Tout must list the type of each data tensor once per partition.");
+      }
+
+      ShapeHandle partitions_shape = c->input(num_data);
+      ShapeHandle unknown_dim0 = c->MakeShape({c->UnknownDim()});
+      for (int p = 0; p < num_partitions; ++p) {
+        c->set_output(num_data * num_partitions + p, unknown_dim0);
+      }
+      for (int j = 0; j < num_data; ++j) {
+        ShapeHandle result_shape = c->UnknownShape();
+        if (c->RankKnown(partitions_shape)) {
+          // data shape must start with partitions_shape
+          ShapeHandle unused;
+          TF_RETURN_IF_ERROR(
+              c->MergePrefix(c->input(j), partitions_shape, &unused, &unused));
+          ShapeHandle data_suffix_shape;
+          TF_RETURN_IF_ERROR(c->Subshape(c->input(j), c->Rank(partitions_shape),
+                                         &data_suffix_shape));
+          TF_RETURN_IF_ERROR(
+              c->Concatenate(unknown_dim0, data_suffix_shape, &result_shape));
+        }
+        for (int p = 0; p < num_partitions; ++p) {
+          c->set_output(j * num_partitions + p, result_shape);
+        }
+      }
+      return TFOkStatus;
+    });
+
+// Maps every key to a partition in [0, num_partitions) by jump consistent
+// hash. Growing num_partitions from n to n + 1 only moves the keys that now map
+// to partition n, about 1 / (n + 1) of them.
+REGISTER_OP(PREFIX_OP_NAME(JumpHashPartition))
+    .Input("keys: T")
+    .Output("partitions: int32")
+    .Attr("num_partitions: int >= 1")
+    .Attr("T: {int32, int64, string}")
+    .SetShapeFn(shape_inference::UnchangedShape);
+
 }  // namespace tensorflow
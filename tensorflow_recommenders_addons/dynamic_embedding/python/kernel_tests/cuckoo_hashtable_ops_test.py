@@ -22,12 +22,19 @@ import sys
 import os
 
 from tensorflow_recommenders_addons import dynamic_embedding as de
+from tensorflow_recommenders_addons.dynamic_embedding.python.ops import cuckoo_hashtable_ops
 
 from tensorflow.core.protobuf import config_pb2
+from tensorflow.python.client import session
 from tensorflow.python.framework import constant_op
 from tensorflow.python.framework import dtypes
+from tensorflow.python.framework import errors
+from tensorflow.python.framework import ops
 from tensorflow.python.framework import test_util
+from tensorflow.python.ops import array_ops
 from tensorflow.python.ops import init_ops
+from tensorflow.python.ops import math_ops
+from tensorflow.python.ops import random_ops
 from tensorflow.python.platform import test
 
 import tensorflow as tf
@@ -98,6 +105,420 @@ class CuckooHashtableTest(test.TestCase):
           self.assertEqual(168, len(exported_values))
           id += 1
 
+  @test_util.run_in_graph_and_eager_modes()
+  def test_cuckoo_hashtable_default_mode_reuses_removed_rows(self):
+    # Dims above 512 are served by the slab backed table.
+    dim = 520
+    with self.session(config=default_config):
+      table = de.get_variable("slab-t0",
+                              dtypes.string,
+                              dtypes.float32,
+                              initializer=-1.0,
+                              dim=dim)
+      keys = constant_op.constant([str(i) for i in range(200)], dtypes.string)
+      values = constant_op.constant([[i] * dim for i in range(200)],
+                                    dtypes.float32)
+      self.evaluate(table.upsert(keys, values))
+      self.evaluate(table.remove(keys[:100]))
+      self.assertAllEqual(100, self.evaluate(table.size()))
+
+      new_keys = constant_op.constant([str(i) for i in range(200, 300)],
+                                      dtypes.string)
+      new_values = constant_op.constant([[i] * dim for i in range(200, 300)],
+                                        dtypes.float32)
+      self.evaluate(table.upsert(new_keys, new_values))
+      self.evaluate(
+          table.accum(keys[100:], values[100:] * 0, values[100:], [True] * 100))
+      self.assertAllEqual(200, self.evaluate(table.size()))
+
+      found = self.evaluate(table.lookup(keys))
+      self.assertAllEqual([[-1.0] * dim] * 100, found[:100])
+      self.assertAllEqual([[2.0 * i] * dim for i in range(100, 200)],
+                          found[100:])
+      self.assertAllEqual([[i] * dim for i in range(200, 300)],
+                          self.evaluate(table.lookup(new_keys)))
+
+      self.evaluate(table.clear())
+      self.assertAllEqual(0, self.evaluate(table.size()))
+
+  @test_util.run_in_graph_and_eager_modes()
+  def test_cuckoo_hashtable_padded_dim(self):
+    # Tables with dims in (100, 512] store values in padded arrays.
+    dim = 130
+    for idx, key_dtype in enumerate([dtypes.int32, dtypes.string]):
+      with self.session(config=default_config):
+        table = de.get_variable("padded-t" + str(idx),
+                                key_dtype,
+                                dtypes.float32,
+                                initializer=-1.0,
+                                dim=dim)
+        if key_dtype == dtypes.string:
+          keys = constant_op.constant([str(i) for i in range(100)], key_dtype)
+        else:
+          keys = constant_op.constant(list(range(100)), key_dtype)
+        values = constant_op.constant([[i] * dim for i in range(100)],
+                                      dtypes.float32)
+        self.evaluate(table.upsert(keys, values))
+        self.evaluate(table.accum(keys, values * 0, values, [True] * 100))
+        self.assertAllEqual([[2.0 * i] * dim for i in range(100)],
+                            self.evaluate(table.lookup(keys)))
+
+        exported_keys, exported_values = self.evaluate(table.export())
+        self.assertAllEqual([100, dim], exported_values.shape)
+        self.assertAllEqual(sorted(exported_values[:, 0]),
+                            [2.0 * i for i in range(100)])
+        self.assertEqual(100, len(set(exported_keys)))
+
+  @test_util.run_in_graph_and_eager_modes()
+  def test_cuckoo_hashtable_remove_and_remove_if_less(self):
+    with self.session(config=default_config):
+      table = de.CuckooHashTable(key_dtype=dtypes.int64,
+                                 value_dtype=dtypes.int64,
+                                 default_value=[-1],
+                                 device='/CPU:0')
+      keys = constant_op.constant(list(range(10000)), dtypes.int64)
+      values = constant_op.constant([[i] for i in range(10000)], dtypes.int64)
+      self.evaluate(table.insert(keys, values))
+      self.evaluate(table.remove(keys[:5000:2]))
+      self.assertAllEqual(7500, self.evaluate(table.size()))
+
+      removed_keys = self.evaluate(table.remove_if_less(6000))
+      self.assertAllEqual(
+          list(range(1, 5000, 2)) + list(range(5000, 6000)),
+          sorted(removed_keys))
+      self.assertAllEqual(4000, self.evaluate(table.size()))
+      self.assertAllEqual([[-1], [6000]],
+                          self.evaluate(table.lookup(keys[5999:6001])))
+
+  @test_util.run_in_graph_and_eager_modes()
+  def test_cuckoo_hashtable_batched_find(self):
+    # Lookups of at least TFRA_BATCHED_FIND_MIN_KEYS keys take the
+    # prefetching path.
+    num_keys = 5000
+    for dim, value_dtype in [(4, dtypes.float32), (520, dtypes.float32),
+                             (2, dtypes.string)]:
+      with self.session(config=default_config):
+        if value_dtype == dtypes.string:
+          default_value = [""] * dim
+        else:
+          default_value = [-1.0] * dim
+        table = de.CuckooHashTable(key_dtype=dtypes.int64,
+                                   value_dtype=value_dtype,
+                                   default_value=default_value,
+                                   device='/CPU:0')
+        keys = constant_op.constant(list(range(num_keys)), dtypes.int64)
+        if value_dtype == dtypes.string:
+          values = constant_op.constant(
+              [[str(i)] * dim for i in range(num_keys)], value_dtype)
+        else:
+          values = constant_op.constant([[i] * dim for i in range(num_keys)],
+                                        value_dtype)
+        self.evaluate(table.insert(keys[::2], values[::2]))
+
+        expected = self.evaluate(values)
+        expected[1::2] = default_value
+        found, exists = self.evaluate(table.lookup(keys, return_exists=True))
+        self.assertAllEqual(expected, found)
+        self.assertAllEqual([True, False] * (num_keys // 2), exists)
+        self.assertAllEqual(expected, self.evaluate(table.lookup(keys)))
+
+  @test_util.run_in_graph_and_eager_modes()
+  def test_cuckoo_hashtable_freeze(self):
+    with self.session(config=default_config):
+      table = de.CuckooHashTable(key_dtype=dtypes.int64,
+                                 value_dtype=dtypes.float32,
+                                 default_value=[-1.0, -1.0],
+                                 device='/CPU:0')
+      keys = constant_op.constant([0, 1, 2], dtypes.int64)
+      values = constant_op.constant([[0, 0], [1, 1], [2, 2]], dtypes.float32)
+      self.evaluate(table.insert(keys, values))
+
+      self.evaluate(table.freeze())
+      self.evaluate(table.freeze())
+      self.assertTrue(self.evaluate(table.is_frozen()))
+      query = constant_op.constant([2, 3, 0], dtypes.int64)
+      found, exists = self.evaluate(table.lookup(query, return_exists=True))
+      self.assertAllEqual([[2, 2], [-1, -1], [0, 0]], found)
+      self.assertAllEqual([True, False, True], exists)
+      with self.assertRaises(errors.FailedPreconditionError):
+        self.evaluate(table.insert(query, values))
+      with self.assertRaises(errors.FailedPreconditionError):
+        self.evaluate(table.remove(keys))
+      self.assertAllEqual(3, self.evaluate(table.size()))
+
+      self.evaluate(table.thaw())
+      self.assertFalse(self.evaluate(table.is_frozen()))
+      self.evaluate(table.insert(query, values))
+      self.assertAllEqual([[0, 0], [1, 1], [2, 2]],
+                          self.evaluate(table.lookup(query)))
+
+  @test_util.run_in_graph_and_eager_modes()
+  def test_cuckoo_hashtable_sharding_config(self):
+    num_keys = 10000
+    for min_slice_size, num_threads in [(1, 0), (1000, 2), (20000, 0)]:
+      with self.session(config=default_config):
+        config = de.CuckooHashTableConfig(find_min_slice_size=min_slice_size,
+                                          find_num_threads=num_threads,
+                                          insert_min_slice_size=min_slice_size,
+                                          insert_num_threads=num_threads,
+                                          accum_min_slice_size=min_slice_size,
+                                          accum_num_threads=num_threads,
+                                          remove_min_slice_size=min_slice_size,
+                                          remove_num_threads=num_threads)
+        table = de.CuckooHashTable(key_dtype=dtypes.int64,
+                                   value_dtype=dtypes.float32,
+                                   default_value=[-1.0],
+                                   config=config,
+                                   device='/CPU:0')
+        keys = constant_op.constant(list(range(num_keys)), dtypes.int64)
+        values = constant_op.constant([[i] for i in range(num_keys)],
+                                      dtypes.float32)
+        self.evaluate(table.insert(keys, values))
+        self.evaluate(table.accum(keys, values * 0, values, [True] * num_keys))
+        self.evaluate(table.remove(keys[::2]))
+        self.assertAllEqual(num_keys // 2, self.evaluate(table.size()))
+        expected = [[2.0 * i] if i % 2 else [-1.0] for i in range(num_keys)]
+        self.assertAllEqual(expected, self.evaluate(table.lookup(keys)))
+
+  def test_cuckoo_hashtable_lookup_or_init(self):
+    dim = 2
+    with self.session(config=default_config):
+      table = de.CuckooHashTable(key_dtype=dtypes.int64,
+                                 value_dtype=dtypes.float32,
+                                 default_value=[-1.0] * dim,
+                                 device='/CPU:0')
+      keys = constant_op.constant(list(range(10)), dtypes.int64)
+      self.evaluate(table.insert(keys,
+                                 constant_op.constant([[1.0] * dim] * 10)))
+
+      init_shapes = []
+
+      def initializer(shape):
+        init_shapes.append(shape)
+        return array_ops.fill(shape, 7.0)
+
+      keys = constant_op.constant([3, 12, 5, 15], dtypes.int64)
+      values, exists = table.lookup_or_init(keys,
+                                            initializer,
+                                            return_exists=True)
+      values, exists, num_missing = self.evaluate(
+          (values, exists, init_shapes[0][0]))
+      self.assertEqual(2, num_missing)
+      self.assertAllEqual([[1.0] * dim, [7.0] * dim, [1.0] * dim, [7.0] * dim],
+                          values)
+      self.assertAllEqual([True, False, True, False], exists)
+      self.assertAllEqual(10, self.evaluate(table.size()))
+
+      # A single row is shared by the missing keys, which are inserted.
+      values = table.lookup_or_init(
+          keys, lambda shape: constant_op.constant([5.0] * dim), insert=True)
+      self.assertAllEqual([[1.0] * dim, [5.0] * dim, [1.0] * dim, [5.0] * dim],
+                          self.evaluate(values))
+      self.assertAllEqual(12, self.evaluate(table.size()))
+      values = table.lookup_or_init(keys,
+                                    lambda shape: array_ops.fill(shape, 9.0),
+                                    insert=True)
+      self.assertAllEqual([[1.0] * dim, [5.0] * dim, [1.0] * dim, [5.0] * dim],
+                          self.evaluate(values))
+
+  def test_cuckoo_hashtable_accum_delta(self):
+    # Dims above 512 are served by the slab backed table.
+    for dim in [3, 520]:
+      with self.session(config=default_config):
+        table = de.CuckooHashTable(key_dtype=dtypes.int64,
+                                   value_dtype=dtypes.float32,
+                                   default_value=[-1.0] * dim,
+                                   device='/CPU:0')
+        self.evaluate(
+            table.insert(constant_op.constant([0, 1], dtypes.int64),
+                         constant_op.constant([[1.0] * dim, [2.0] * dim])))
+
+        keys = constant_op.constant([0, 1, 2], dtypes.int64)
+        old_values = constant_op.constant([[0.5] * dim, [2.0] * dim,
+                                           [0.0] * dim])
+        new_values = constant_op.constant([[1.5] * dim, [1.0] * dim,
+                                           [4.0] * dim])
+        # Key 1 was removed by another worker meanwhile, so it is not
+        # accumulated, and key 2 is inserted.
+        self.evaluate(table.remove(constant_op.constant([1], dtypes.int64)))
+        self.evaluate(
+            table.accum_delta(keys, old_values, new_values,
+                              constant_op.constant([True, True, False])))
+        self.assertAllEqual([[2.0] * dim, [-1.0] * dim, [4.0] * dim],
+                            self.evaluate(table.lookup(keys)))
+
+  def test_cuckoo_hashtable_insert_or_add_and_export_and_clear(self):
+    # Dims above 512 are served by the slab backed table.
+    for dim in [3, 520]:
+      with self.session(config=default_config):
+        table = de.CuckooHashTable(key_dtype=dtypes.int64,
+                                   value_dtype=dtypes.float32,
+                                   default_value=[0.0] * dim,
+                                   device='/CPU:0')
+        self.evaluate(
+            table.insert(constant_op.constant([0], dtypes.int64),
+                         constant_op.constant([[1.0] * dim])))
+
+        # Key 0 is added to, key 1 is inserted and then added to.
+        self.evaluate(
+            table.insert_or_add(
+                constant_op.constant([0, 1, 1], dtypes.int64),
+                constant_op.constant([[2.0] * dim, [3.0] * dim, [4.0] * dim])))
+        keys, values = self.evaluate(table.export_and_clear())
+        self.assertAllEqual([[3.0] * dim, [7.0] * dim], values[keys.argsort()])
+        self.assertAllEqual(0, self.evaluate(table.size()))
+
+  def test_cuckoo_hashtable_apply_optimizer(self):
+    # Dims above 512 are served by the slab backed table.
+    for dim in [2, 260]:
+      with self.session(config=default_config):
+        table = de.CuckooHashTable(key_dtype=dtypes.int64,
+                                   value_dtype=dtypes.float32,
+                                   default_value=[0.0] * (3 * dim),
+                                   device='/CPU:0')
+        # Rows of the embedding followed by the m and v slots of adam.
+        self.evaluate(
+            table.insert(
+                constant_op.constant([0], dtypes.int64),
+                constant_op.constant([[1.0] * dim + [0.5] * dim + [4.0] * dim
+                                     ])))
+
+        keys = constant_op.constant([0, 1], dtypes.int64)
+        grads = constant_op.constant([[2.0] * dim, [1.0] * dim])
+        # Key 1 is missing, it starts from its init row.
+        init_rows = constant_op.constant([[9.0] * (3 * dim),
+                                          [3.0] * dim + [0.0] * (2 * dim)])
+        lr, beta1, beta2, epsilon = 0.1, 0.5, 0.75, 0.0
+        self.evaluate(
+            table.apply_optimizer(keys, grads, init_rows,
+                                  [lr, beta1, beta2, epsilon], "adam"))
+        # m = 0.5 * 0.5 + 0.5 * 2 = 1.25, v = 0.75 * 4 + 0.25 * 4 = 4.
+        # m = 0.5 * 1 = 0.5, v = 0.25 * 1 = 0.25.
+        self.assertAllClose(
+            [[1.0 - lr * 1.25 / 2.0] * dim + [1.25] * dim + [4.0] * dim,
+             [3.0 - lr * 0.5 / 0.5] * dim + [0.5] * dim + [0.25] * dim],
+            self.evaluate(table.lookup(keys)))
+
+        with self.assertRaisesOpError("hyperparameters"):
+          self.evaluate(
+              table.apply_optimizer(keys, grads, init_rows, [lr], "adam"))
+        with self.assertRaisesOpError("grads"):
+          self.evaluate(
+              table.apply_optimizer(keys, grads, init_rows, [lr], "sgd"))
+
+  def test_cuckoo_hashtable_find_group(self):
+    with self.session(config=default_config):
+      tables = [
+          de.CuckooHashTable(key_dtype=dtypes.int64,
+                             value_dtype=dtypes.float32,
+                             default_value=[-1.0] * dim,
+                             device='/CPU:0') for dim in [2, 3]
+      ]
+      keys = constant_op.constant([0, 1], dtypes.int64)
+      self.evaluate(tables[0].insert(keys, [[0.0, 0.0], [1.0, 1.0]]))
+      self.evaluate(tables[1].insert(keys[1:], [[1.0, 1.0, 1.0]]))
+
+      values, exists = cuckoo_hashtable_ops.find_group(
+          tables, [keys, constant_op.constant([[0, 1]], dtypes.int64)])
+      values, exists = self.evaluate((values, exists))
+      self.assertAllEqual([[0, 0], [1, 1]], values[0])
+      self.assertAllEqual([[[-1, -1, -1], [1, 1, 1]]], values[1])
+      self.assertAllEqual([True, True], exists[0])
+      self.assertAllEqual([[False, True]], exists[1])
+
+  def test_cuckoo_hashtable_incremental_resize(self):
+    num_keys = 20000
+    batch_size = 1000
+    for incremental_resize in [False, True]:
+      with self.session(config=default_config):
+        config = de.CuckooHashTableConfig(incremental_resize=incremental_resize)
+        table = de.CuckooHashTable(key_dtype=dtypes.int64,
+                                   value_dtype=dtypes.float32,
+                                   default_value=[-1.0, -1.0],
+                                   init_size=1024,
+                                   config=config,
+                                   device='/CPU:0')
+        for begin in range(0, num_keys, batch_size):
+          keys = constant_op.constant(list(range(begin, begin + batch_size)),
+                                      dtypes.int64)
+          values = constant_op.constant(
+              [[i, -i] for i in range(begin, begin + batch_size)],
+              dtypes.float32)
+          self.evaluate(table.insert(keys, values))
+          # Lookups, accums and removes are served across both generations
+          # while the table is being migrated.
+          self.evaluate(table.accum(keys[:10], values[:10], [True] * 10))
+          self.evaluate(table.remove(keys[-10:]))
+
+        keys = constant_op.constant(list(range(num_keys)), dtypes.int64)
+        expected = []
+        for i in range(num_keys):
+          if i % batch_size >= batch_size - 10:
+            expected.append([-1.0, -1.0])
+          elif i % batch_size < 10:
+            expected.append([2.0 * i, -2.0 * i])
+          else:
+            expected.append([i, -i])
+        self.assertAllEqual(expected, self.evaluate(table.lookup(keys)))
+        expected_size = num_keys - 10 * (num_keys // batch_size)
+        self.assertAllEqual(expected_size, self.evaluate(table.size()))
+        exported_keys, _ = table.export()
+        self.assertAllEqual(expected_size,
+                            self.evaluate(array_ops.size(exported_keys)))
+
+        metrics = self.evaluate(table.resize_metrics())
+        self.assertGreaterEqual(metrics["resizes"], 1)
+        self.assertGreaterEqual(metrics["pause_micros_total"],
+                                metrics["pause_micros_max"])
+
+  def test_cuckoo_hashtable_subtables(self):
+    num_keys = 5000
+    for incremental_resize in [False, True]:
+      with self.session(config=default_config):
+        config = de.CuckooHashTableConfig(incremental_resize=incremental_resize,
+                                          num_subtables=7)
+        table = de.CuckooHashTable(key_dtype=dtypes.int64,
+                                   value_dtype=dtypes.float32,
+                                   default_value=[-1.0, -1.0],
+                                   init_size=1024,
+                                   config=config,
+                                   device='/CPU:0')
+        keys = constant_op.constant(list(range(num_keys)), dtypes.int64)
+        values = constant_op.constant([[i, -i] for i in range(num_keys)],
+                                      dtypes.float32)
+        self.evaluate(table.insert(keys, values))
+        self.evaluate(table.accum(keys[:10], values[:10], [True] * 10))
+        self.evaluate(table.remove(keys[-10:]))
+
+        expected = [[2.0 * i, -2.0 * i] if i < 10 else [i, -i]
+                    for i in range(num_keys - 10)] + [[-1.0, -1.0]] * 10
+        self.assertAllEqual(expected, self.evaluate(table.lookup(keys)))
+        self.assertAllEqual(num_keys - 10, self.evaluate(table.size()))
+
+        exported_keys, exported_values = self.evaluate(table.export())
+        self.assertAllEqual(sorted(range(num_keys - 10)),
+                            sorted(exported_keys.tolist()))
+        self.assertAllEqual([expected[k] for k in exported_keys.tolist()],
+                            exported_values)
+
+        chunk_keys = []
+        offset = 0
+        while offset >= 0:
+          keys_chunk, _, offset = self.evaluate(table.export_chunk(offset, 100))
+          chunk_keys.extend(keys_chunk.tolist())
+        self.assertAllEqual(sorted(range(num_keys - 10)), sorted(chunk_keys))
+
+        # Batched lookups go to each subtable by a block of its own keys.
+        values, exists = self.evaluate(table.lookup(keys, return_exists=True))
+        self.assertAllEqual(expected, values)
+        self.assertAllEqual([True] * (num_keys - 10) + [False] * 10, exists)
+
+        self.evaluate(table.freeze())
+        self.assertAllEqual(expected, self.evaluate(table.lookup(keys)))
+        values, exists = self.evaluate(table.lookup(keys, return_exists=True))
+        self.assertAllEqual(expected, values)
+        self.assertAllEqual([True] * (num_keys - 10) + [False] * 10, exists)
+
   @test_util.run_in_graph_and_eager_modes()
   def test_cuckoo_hashtable_save_file_system(self):
     self.skipTest('Only test for file_system export, need file_system path.')
@@ -198,6 +619,45 @@ class CuckooHashtableTest(test.TestCase):
         self.assertAllEqual(np_keys, load_keys)
         self.assertAllEqual(np_values, load_values)
 
+  @test_util.run_in_graph_and_eager_modes()
+  def test_cuckoo_hashtable_save_local_file_system_in_small_chunks(self):
+    dim = 4
+    var1 = de.get_variable('lfscv1',
+                           key_dtype=dtypes.int64,
+                           value_dtype=dtypes.float32,
+                           initializer=init_ops.random_normal_initializer(
+                               0.0, 0.01),
+                           devices=['/CPU:0'],
+                           dim=dim)
+    var2 = de.get_variable('lfscv2',
+                           key_dtype=dtypes.int64,
+                           value_dtype=dtypes.float32,
+                           initializer=0.0,
+                           devices=['/CPU:0'],
+                           dim=dim)
+    init_keys = constant_op.constant(list(range(1001)), dtypes.int64)
+    init_values = var1.lookup(init_keys)
+
+    with self.session():
+      self.evaluate(var1.upsert(init_keys, init_values))
+      np_keys = self.evaluate(init_keys)
+      np_values = self.evaluate(init_values)
+
+      dirpath = "file:///tmp/test_local_file_system/tfra_embedding_chunks"
+      # The buffer size does not divide the table size, so the last chunk is
+      # a partial one.
+      self.evaluate(var1.tables[0].save_to_file_system(dirpath,
+                                                       file_name='lfscv',
+                                                       buffer_size=7))
+      self.evaluate(var2.tables[0].load_from_file_system(dirpath,
+                                                         file_name='lfscv',
+                                                         buffer_size=7))
+      self.assertAllEqual(1001, self.evaluate(var2.size()))
+      load_keys, load_values = self.evaluate(var2.export())
+      sort_idx = load_keys.argsort()
+      self.assertAllEqual(np_keys, load_keys[sort_idx])
+      self.assertAllEqual(np_values, load_values[sort_idx])
+
   @test_util.run_in_graph_and_eager_modes()
   def test_cuckoo_hashtable_save_and_load_all_with_local_file_system(self):
     test_devices = [['/CPU:0', '/CPU:1']]
@@ -267,5 +727,82 @@ class CuckooHashtableTest(test.TestCase):
         self.assertAllEqual(np_values, load_values)
 
 
+class CuckooHashTableFindBenchmark(test.Benchmark):
+  """Compares the per-key and the prefetching batched find paths.
+
+  Run with `--benchmarks=CuckooHashTableFindBenchmark`.
+  """
+
+  def _benchmark_find(self, table_size, batched, dim=8, batch_size=65536):
+    # The threshold is read when the table is created.
+    os.environ["TFRA_BATCHED_FIND_MIN_KEYS"] = "1" if batched else str(2**62)
+    with ops.Graph().as_default(), session.Session() as sess:
+      table = de.CuckooHashTable(key_dtype=dtypes.int64,
+                                 value_dtype=dtypes.float32,
+                                 default_value=[0.0] * dim,
+                                 init_size=table_size,
+                                 device='/CPU:0')
+      insert_batch = 1 << 20
+      start = array_ops.placeholder(dtypes.int64, [])
+      insert_keys = math_ops.range(start, start + insert_batch)
+      insert_op = table.insert(
+          insert_keys, array_ops.ones([insert_batch, dim], dtypes.float32))
+      for i in range(0, table_size, insert_batch):
+        sess.run(insert_op, feed_dict={start: i})
+
+      query_keys = random_ops.random_uniform([batch_size],
+                                             maxval=table_size,
+                                             dtype=dtypes.int64)
+      find_op = table.lookup(query_keys)
+      self.run_op_benchmark(sess,
+                            find_op.op,
+                            min_iters=20,
+                            name="find_size_{}_{}".format(
+                                table_size,
+                                "batched" if batched else "per_key"))
+    del os.environ["TFRA_BATCHED_FIND_MIN_KEYS"]
+
+  def benchmark_find(self):
+    for table_size in [10**6, 10**7, 10**8]:
+      for batched in [False, True]:
+        self._benchmark_find(table_size, batched)
+
+
+class CuckooHashTableShardingBenchmark(test.Benchmark):
+  """Times find and insert over batch sizes and `CuckooHashTableConfig`s.
+
+  Run with `--benchmarks=CuckooHashTableShardingBenchmark` to pick the
+  minimal slice sizes of a host.
+  """
+
+  def _benchmark_sharding(self, batch_size, min_slice_size, dim=8):
+    config = de.CuckooHashTableConfig(find_min_slice_size=min_slice_size,
+                                      insert_min_slice_size=min_slice_size)
+    with ops.Graph().as_default(), session.Session() as sess:
+      table = de.CuckooHashTable(key_dtype=dtypes.int64,
+                                 value_dtype=dtypes.float32,
+                                 default_value=[0.0] * dim,
+                                 init_size=1 << 20,
+                                 config=config,
+                                 device='/CPU:0')
+      keys = random_ops.random_uniform([batch_size],
+                                       maxval=1 << 20,
+                                       dtype=dtypes.int64)
+      insert_op = table.insert(
+          keys, array_ops.ones([batch_size, dim], dtypes.float32))
+      find_op = table.lookup(keys)
+      for op_name, op in [("insert", insert_op), ("find", find_op.op)]:
+        self.run_op_benchmark(sess,
+                              op,
+                              min_iters=50,
+                              name="{}_batch_{}_min_slice_{}".format(
+                                  op_name, batch_size, min_slice_size))
+
+  def benchmark_sharding(self):
+    for batch_size in [256, 4096, 65536, 1 << 20]:
+      for min_slice_size in [0, 256, 1024, 4096, 16384]:
+        self._benchmark_sharding(batch_size, min_slice_size)
+
+
 if __name__ == "__main__":
   test.main()
@@ -0,0 +1,96 @@
+# Copyright 2024 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""unit tests of tf.data embedding prefetch
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from tensorflow_recommenders_addons import dynamic_embedding as de
+
+from tensorflow.python.data.ops import dataset_ops
+from tensorflow.python.eager import context
+from tensorflow.python.framework import constant_op
+from tensorflow.python.framework import dtypes
+from tensorflow.python.ops import math_ops
+from tensorflow.python.platform import test
+try:
+  from tensorflow.keras.legacy.optimizers import SGD
+except:
+  from tensorflow.keras.optimizers import SGD
+
+_BATCHES = [[1, 2], [1, 3], [1, 2], [4, 1], [5, 6]]
+
+
+class PrefetchEmbeddingsTest(test.TestCase):
+
+  def test_prefetch_embeddings_marks_stale_keys(self):
+    if not context.executing_eagerly():
+      self.skipTest('Only test in eager mode.')
+    var = de.get_variable('pf_stale', dim=2, initializer=0.0)
+    var.upsert(constant_op.constant([1, 2, 3], dtypes.int64),
+               constant_op.constant([[1., 1.], [2., 2.], [3., 3.]]))
+    dataset = dataset_ops.Dataset.from_tensor_slices(
+        {'ids': constant_op.constant(_BATCHES, dtypes.int64)})
+    dataset = dataset.apply(
+        de.data.prefetch_embeddings(var, 'ids', buffer_size=1, consistent=True))
+    elements = list(dataset)
+    self.assertAllEqual([[1., 1.], [2., 2.]], elements[0]['ids_embeddings'])
+    self.assertAllEqual([[0., 0.], [0., 0.]], elements[4]['ids_embeddings'])
+    # Keys of the two batches before are marked.
+    self.assertAllEqual([[False, False], [True, False], [True, True],
+                         [False, True], [False, False]],
+                        [e['ids_embeddings_stale'] for e in elements])
+
+    with self.assertRaises(TypeError):
+      dataset_ops.Dataset.from_tensor_slices({
+          'ids': constant_op.constant(_BATCHES, dtypes.int32)
+      }).apply(de.data.prefetch_embeddings(var, 'ids'))
+    with self.assertRaises(ValueError):
+      de.data.prefetch_embeddings(var, 'ids', buffer_size=0)
+
+  def test_embedding_lookup_prefetched_trains_fresh_values(self):
+    if not context.executing_eagerly():
+      self.skipTest('Only test in eager mode.')
+    for bp_v2 in [False, True]:
+      name = 'pf_train_{}'.format(bp_v2)
+      var = de.get_variable(name, dim=2, initializer=0.0, bp_v2=bp_v2)
+      shadow = de.shadow_ops.ShadowVariable(var, name=name + '-shadow')
+      optimizer = de.DynamicEmbeddingOptimizer(SGD(1.0))
+      dataset = dataset_ops.Dataset.from_tensor_slices(
+          {'ids': constant_op.constant(_BATCHES, dtypes.int64)})
+      dataset = dataset.apply(
+          de.data.prefetch_embeddings(var,
+                                      'ids',
+                                      buffer_size=2,
+                                      consistent=True))
+
+      for features in dataset:
+
+        def loss():
+          emb = de.data.embedding_lookup_prefetched(shadow, features, 'ids')
+          return math_ops.reduce_sum(emb)
+
+        optimizer.minimize(loss, var_list=[shadow])
+
+      # Every batch lowers its keys by 1, including the keys updated after
+      # the batch was prefetched.
+      keys = constant_op.constant([1, 2, 3, 4, 5, 6], dtypes.int64)
+      self.assertAllEqual([[-4., -4.], [-2., -2.], [-1., -1.], [-1., -1.],
+                           [-1., -1.], [-1., -1.]], var.lookup(keys))
+
+
+if __name__ == "__main__":
+  test.main()
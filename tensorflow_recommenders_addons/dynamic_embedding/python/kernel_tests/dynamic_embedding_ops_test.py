@@ -65,6 +65,7 @@ except:
   from tensorflow.python.ops.array_ops import stack
 from tensorflow.python.platform import test
 from tensorflow.python.training import device_setter
+from tensorflow.python.training import gradient_descent
 from tensorflow.python.training import server_lib
 from tensorflow.python.util import compat
 try:
@@ -751,6 +752,90 @@ class EmbeddingLookupUniqueTest(test.TestCase):
     np.testing.assert_almost_equal(embedded_np, embedded_de)
 
 
+@test_util.deprecated_graph_mode_only
+class EmbeddingLookupSharedTest(test.TestCase):
+
+  def test_embedding_lookup_shared(self):
+    dim = 2
+    embeddings = de.get_variable("t_shared_001",
+                                 dtypes.int64,
+                                 dtypes.float32,
+                                 devices=_get_devices() * 2,
+                                 dim=dim)
+    ids0 = constant_op.constant([[0, 1, 1], [2, 0, 3]], dtype=dtypes.int64)
+    ids1 = constant_op.constant([1, 3, 4, 4], dtype=dtypes.int64)
+    emb0, emb1 = de.embedding_lookup_shared(embeddings, [ids0, ids1])
+    self.assertAllEqual([2, 3, dim], emb0.get_shape())
+    self.assertAllEqual([4, dim], emb1.get_shape())
+
+    loss = math_ops.reduce_sum(emb0) + 2.0 * math_ops.reduce_sum(emb1)
+    optimizer = de.DynamicEmbeddingOptimizer(
+        gradient_descent.GradientDescentOptimizer(1.0))
+    train_op = optimizer.minimize(loss)
+
+    keys = constant_op.constant([0, 1, 2, 3, 4], dtype=dtypes.int64)
+    with self.session(use_gpu=test_util.is_gpu_available(),
+                      config=default_config):
+      self.evaluate(
+          embeddings.upsert(keys, [[float(k)] * dim for k in range(5)]))
+      self.assertAllEqual([[[0, 0], [1, 1], [1, 1]], [[2, 2], [0, 0], [3, 3]]],
+                          self.evaluate(emb0))
+      self.assertAllEqual([[1, 1], [3, 3], [4, 4], [4, 4]], self.evaluate(emb1))
+      # The gradients of the ids both features share are summed.
+      self.evaluate(train_op)
+      self.assertAllEqual([[-2, -2], [-3, -3], [1, 1], [0, 0], [0, 0]],
+                          self.evaluate(embeddings.lookup(keys)))
+
+
+@test_util.deprecated_graph_mode_only
+class EmbeddingLookupGroupTest(test.TestCase):
+
+  def test_embedding_lookup_group(self):
+    devices = _get_devices() * 2
+    var0 = de.get_variable("t_group_001", dim=2, devices=devices)
+    var1 = de.get_variable("t_group_002", dim=3, devices=devices)
+    # Missing keys are initialized by the initializer of the Variable.
+    var2 = de.get_variable("t_group_003",
+                           dim=2,
+                           devices=devices,
+                           initializer=init_ops.constant_initializer(7.0))
+    ids0 = constant_op.constant([[0, 1], [2, 0]], dtype=dtypes.int64)
+    ids1 = constant_op.constant([1, 2, 3], dtype=dtypes.int64)
+    ids2 = constant_op.constant([0, 5], dtype=dtypes.int64)
+    emb0, emb1, emb2 = de.embedding_lookup_group([var0, var1, var2],
+                                                 [ids0, ids1, ids2])
+    self.assertAllEqual([2, 2, 2], emb0.get_shape())
+    self.assertAllEqual([3, 3], emb1.get_shape())
+
+    loss = (math_ops.reduce_sum(emb0) + math_ops.reduce_sum(emb1) +
+            math_ops.reduce_sum(emb2))
+    optimizer = de.DynamicEmbeddingOptimizer(
+        gradient_descent.GradientDescentOptimizer(1.0))
+    train_op = optimizer.minimize(loss)
+
+    keys = constant_op.constant([0, 1, 2, 3], dtype=dtypes.int64)
+    with self.session(use_gpu=test_util.is_gpu_available(),
+                      config=default_config):
+      self.evaluate(var0.upsert(keys, [[float(k)] * 2 for k in range(4)]))
+      self.evaluate(var1.upsert(keys, [[float(k)] * 3 for k in range(4)]))
+      self.evaluate(var2.upsert(keys[:1], [[1.0, 1.0]]))
+      self.assertAllEqual([[[0, 0], [1, 1]], [[2, 2], [0, 0]]],
+                          self.evaluate(emb0))
+      self.assertAllEqual([[1, 1, 1], [2, 2, 2], [3, 3, 3]],
+                          self.evaluate(emb1))
+      self.assertAllEqual([[1, 1], [7, 7]], self.evaluate(emb2))
+      self.evaluate(train_op)
+      self.assertAllEqual([[-1, -1], [0, 0], [1, 1], [3, 3]],
+                          self.evaluate(var0.lookup(keys)))
+      self.assertAllEqual([[0, 0, 0], [0, 0, 0], [1, 1, 1], [2, 2, 2]],
+                          self.evaluate(var1.lookup(keys)))
+      self.assertAllEqual([[0, 0], [6, 6]],
+                          self.evaluate(
+                              var2.lookup(
+                                  constant_op.constant([0, 5],
+                                                       dtype=dtypes.int64))))
+
+
 @test_util.run_all_in_graph_and_eager_modes
 class EmbeddingLookupSparseTest(test.TestCase, parameterized.TestCase):
 
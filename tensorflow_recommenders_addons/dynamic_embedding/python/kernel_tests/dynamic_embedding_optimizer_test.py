@@ -1468,6 +1468,208 @@ class TrainDynamicEmbeddingInMonitoredTrainingSessionTest(test.TestCase):
                                    bp_v2=True)
 
 
+@test_util.deprecated_graph_mode_only
+class ColocatedSlotsTest(test.TestCase):
+
+  def common_minimize_colocated(self,
+                                base_opt,
+                                test_opt,
+                                name,
+                                slot_inits,
+                                bp_v2,
+                                apply_in_table=False,
+                                raw_ids=(0, 2, 5)):
+    num_slots = len(slot_inits)
+    raw_init_ids = [0, 1, 2]
+    raw_init_vals = np.random.rand(3, 2)
+    # Key 5 is missing in the table, its slots start from their defaults.
+    raw_ids = list(raw_ids)
+    name = name + ("-in-table" if apply_in_table else "")
+    run_step = 5
+    with self.session(use_gpu=test_util.is_gpu_available(),
+                      config=default_config):
+      base_var = resource_variable_ops.ResourceVariable(np.concatenate(
+          [raw_init_vals, np.ones([1, 2])]),
+                                                        dtype=dtypes.float32)
+      ids = constant_op.constant(raw_ids, dtype=dtypes.int64)
+      base_emb = embedding_ops.embedding_lookup(
+          base_var,
+          constant_op.constant([3 if i == 5 else i for i in raw_ids],
+                               dtype=dtypes.int64))
+      base_op = base_opt.minimize(math_ops.reduce_sum(base_emb * base_emb),
+                                  var_list=[base_var])
+
+      embeddings = de.get_variable("colocated-" + name + str(bp_v2),
+                                   dim=2,
+                                   initializer=1.0,
+                                   bp_v2=bp_v2,
+                                   colocated_slots=num_slots)
+      # Upsert whole rows, so the slots of the keys hold their defaults.
+      init_rows = np.concatenate([raw_init_vals] +
+                                 [np.full([3, 2], v) for v in slot_inits], 1)
+      self.evaluate(
+          embeddings.upsert(
+              constant_op.constant(raw_init_ids, dtype=dtypes.int64),
+              constant_op.constant(init_rows, dtypes.float32)))
+      test_emb, trainable = de.embedding_lookup(embeddings,
+                                                ids,
+                                                return_trainable=True,
+                                                name="colocated-" + name)
+      test_op = de.DynamicEmbeddingOptimizer(
+          test_opt, apply_in_table=apply_in_table).minimize(
+              math_ops.reduce_sum(test_emb * test_emb), var_list=[trainable])
+      self.assertAllEqual([],
+                          embeddings.get_slot_variables(test_opt),
+                          msg="The slots are not Variables of their own.")
+      in_table_ops = [
+          op for op in ops.get_default_graph().get_operations()
+          if op.type.endswith("CuckooHashTableApplyOptimizer")
+      ]
+      self.assertEqual(apply_in_table, bool(in_table_ops))
+
+      self.evaluate(variables.global_variables_initializer())
+      for _ in range(run_step):
+        self.evaluate(base_op)
+        self.evaluate(test_op)
+
+      keys = constant_op.constant([0, 1, 2, 5], dtypes.int64)
+      self.assertAllCloseAccordingToType(
+          self.evaluate(array_ops.gather(base_var, [0, 1, 2, 3])),
+          self.evaluate(embeddings.lookup(keys)))
+      base_slots = [
+          self.evaluate(base_opt.get_slot(base_var, s))
+          for s in base_opt.get_slot_names()
+      ]
+      rows = self.evaluate(embeddings._lookup_rows(keys))
+      self.assertAllEqual([4, 2 * (1 + num_slots)], rows.shape)
+      for i, slot in enumerate(base_slots):
+        self.assertAllCloseAccordingToType(slot, rows[:,
+                                                      2 * (i + 1):2 * (i + 2)])
+
+  def test_adam_minimize_colocated(self):
+    for bp_v2 in [False, True]:
+      self.common_minimize_colocated(adam.AdamOptimizer(0.1),
+                                     adam.AdamOptimizer(0.1), "adam",
+                                     [0.0, 0.0], bp_v2)
+
+  def test_adagrad_minimize_colocated(self):
+    # The accumulators start from initial_accumulator_value, not zeros.
+    for bp_v2 in [False, True]:
+      self.common_minimize_colocated(adagrad.AdagradOptimizer(0.1),
+                                     adagrad.AdagradOptimizer(0.1), "adagrad",
+                                     [0.1], bp_v2)
+
+  def test_ftrl_minimize_colocated(self):
+    # The accumulators start from initial_accumulator_value, linear from zeros.
+    for bp_v2 in [False, True]:
+      self.common_minimize_colocated(
+          ftrl.FtrlOptimizer(0.1, l1_regularization_strength=0.01),
+          ftrl.FtrlOptimizer(0.1, l1_regularization_strength=0.01), "ftrl",
+          [0.1, 0.0], bp_v2)
+
+  def test_sgd_minimize_in_table(self):
+    for bp_v2 in [False, True]:
+      self.common_minimize_colocated(
+          gradient_descent.GradientDescentOptimizer(0.1),
+          gradient_descent.GradientDescentOptimizer(0.1),
+          "sgd", [],
+          bp_v2,
+          apply_in_table=True)
+
+  def test_sgd_minimize_in_table_duplicate_ids(self):
+    # The gradients of a repeated id are summed, as for a dense variable.
+    self.common_minimize_colocated(
+        gradient_descent.GradientDescentOptimizer(0.1),
+        gradient_descent.GradientDescentOptimizer(0.1),
+        "sgd-duplicate", [],
+        False,
+        apply_in_table=True,
+        raw_ids=(0, 2, 2, 5, 0))
+
+  def test_adam_minimize_in_table(self):
+    self.common_minimize_colocated(adam.AdamOptimizer(0.1),
+                                   adam.AdamOptimizer(0.1),
+                                   "adam", [0.0, 0.0],
+                                   False,
+                                   apply_in_table=True,
+                                   raw_ids=(0, 2, 2, 5))
+
+  def test_adagrad_minimize_in_table(self):
+    self.common_minimize_colocated(adagrad.AdagradOptimizer(0.1),
+                                   adagrad.AdagradOptimizer(0.1),
+                                   "adagrad", [0.1],
+                                   False,
+                                   apply_in_table=True,
+                                   raw_ids=(0, 2, 2, 5))
+
+  def test_ftrl_minimize_in_table(self):
+    self.common_minimize_colocated(
+        ftrl.FtrlOptimizer(0.1, l1_regularization_strength=0.01),
+        ftrl.FtrlOptimizer(0.1, l1_regularization_strength=0.01),
+        "ftrl", [0.1, 0.0],
+        False,
+        apply_in_table=True,
+        raw_ids=(0, 2, 2, 5))
+
+
+@test_util.deprecated_graph_mode_only
+class SlotDtypeTest(test.TestCase):
+
+  def common_minimize_slot_dtype(self, slot_dtype, bp_v2, loss_scale=1.0):
+    raw_init_ids = [0, 1, 2]
+    raw_init_vals = np.random.rand(3, 4)
+    raw_ids = [0, 2, 5]
+    run_step = 10
+    with self.session(use_gpu=test_util.is_gpu_available(),
+                      config=default_config):
+      results = []
+      for dtype in [None, slot_dtype]:
+        name = "slot-dtype-{}-{}-{}-{}".format(slot_dtype.name, dtype, bp_v2,
+                                               loss_scale)
+        embeddings = de.get_variable(name, dim=4, initializer=1.0, bp_v2=bp_v2)
+        self.evaluate(
+            embeddings.upsert(
+                constant_op.constant(raw_init_ids, dtype=dtypes.int64),
+                constant_op.constant(raw_init_vals, dtypes.float32)))
+        test_emb, trainable = de.embedding_lookup(embeddings,
+                                                  constant_op.constant(
+                                                      raw_ids, dtypes.int64),
+                                                  return_trainable=True,
+                                                  name=name)
+        opt = adam.AdamOptimizer(0.1)
+        test_op = de.DynamicEmbeddingOptimizer(opt, slot_dtype=dtype).minimize(
+            math_ops.reduce_sum(test_emb * test_emb) * loss_scale,
+            var_list=[trainable])
+        # The second moments are kept from underflowing.
+        self.assertEqual(dtype or dtypes.float32,
+                         opt.get_slot(trainable, "m").params.value_dtype)
+        self.assertEqual(dtypes.float32,
+                         opt.get_slot(trainable, "v").params.value_dtype)
+        self.evaluate(variables.global_variables_initializer())
+        for _ in range(run_step):
+          self.evaluate(test_op)
+        results.append(
+            self.evaluate(
+                embeddings.lookup(
+                    constant_op.constant([0, 1, 2, 5], dtypes.int64))))
+
+      # The slots lose precision, the embeddings converge the same way.
+      self.assertAllClose(results[0], results[1], rtol=2e-2, atol=2e-2)
+
+  def test_adam_minimize_half_slots(self):
+    for bp_v2 in [False, True]:
+      self.common_minimize_slot_dtype(dtypes.float16, bp_v2)
+
+  def test_adam_minimize_bfloat16_slots(self):
+    for bp_v2 in [False, True]:
+      self.common_minimize_slot_dtype(dtypes.bfloat16, bp_v2)
+
+  def test_adam_minimize_small_gradients(self):
+    # Squared gradients of about 4e-8 are below the float16 subnormals.
+    for slot_dtype in [dtypes.float16, dtypes.bfloat16]:
+      self.common_minimize_slot_dtype(slot_dtype, False, loss_scale=1e-4)
+
+
 @test_util.deprecated_graph_mode_only
 class ModelModeTest(test.TestCase):
   """Tests ModelMode."""
@@ -32,9 +32,11 @@ from tensorflow_recommenders_addons.utils.check_platform import is_macos, is_arm
 from tensorflow.core.protobuf import config_pb2
 from tensorflow.keras import layers
 from tensorflow.python.client import session
+from tensorflow.python.data.ops import dataset_ops
 from tensorflow.python.eager import context
 from tensorflow.python.framework import constant_op
 from tensorflow.python.framework import dtypes
+from tensorflow.python.framework import errors
 from tensorflow.python.framework import ops
 from tensorflow.python.framework import sparse_tensor
 from tensorflow.python.framework import test_util
@@ -551,6 +553,265 @@ class VariableTest(test.TestCase):
 
         del table
 
+  def test_variable_write_buffer(self):
+    with self.assertRaisesRegex(ValueError, "bp_v2"):
+      de.get_variable('twrite_buffer0', dim=2, write_buffer_steps=2)
+
+    with self.session(config=default_config,
+                      use_gpu=test_util.is_gpu_available()):
+      table = de.get_variable('twrite_buffer1',
+                              initializer=-1.0,
+                              dim=2,
+                              bp_v2=True,
+                              write_buffer_steps=2)
+      self.evaluate(variables.local_variables_initializer())
+      keys = constant_op.constant([0, 1, 2], dtypes.int64)
+      self.evaluate(table.upsert(keys[:2], [[1.0, 1.0], [2.0, 2.0]]))
+
+      # The deltas of key 0 are buffered, missing key 2 is inserted at once.
+      self.evaluate(
+          table.accum(
+              constant_op.constant([0, 0, 2], dtypes.int64),
+              [[1.0, 1.0], [1.0, 1.0], [0.0, 0.0]],
+              [[2.0, 2.0], [3.0, 3.0], [5.0, 5.0]],
+              [True, True, False],
+          ))
+      self.assertAllEqual([[1.0, 1.0], [2.0, 2.0], [5.0, 5.0]],
+                          self.evaluate(table.tables[0].lookup(keys)))
+      self.assertAllEqual([[4.0, 4.0], [2.0, 2.0], [5.0, 5.0]],
+                          self.evaluate(table.lookup(keys)))
+
+      # The second accum flushes the buffer.
+      self.evaluate(table.accum(keys[1:2], [[2.0, 2.0]], [[3.0, 3.0]], [True]))
+      self.assertAllEqual([[4.0, 4.0], [3.0, 3.0], [5.0, 5.0]],
+                          self.evaluate(table.tables[0].lookup(keys)))
+      self.assertAllEqual([[4.0, 4.0], [3.0, 3.0], [5.0, 5.0]],
+                          self.evaluate(table.lookup(keys)))
+      self.assertAllEqual(0, self.evaluate(table._write_buffer.size()))
+
+  def test_variable_write_buffer_save_restore(self):
+    if context.executing_eagerly():
+      self.skipTest('skip eager test when using legacy Saver.')
+    save_dir = os.path.join(self.get_temp_dir(), "save_restore")
+    save_path = os.path.join(tempfile.mkdtemp(prefix=save_dir), "hash")
+    keys = [0, 1]
+
+    with self.session(config=default_config, graph=ops.Graph()) as sess:
+      table = de.get_variable('twrite_buffer_save',
+                              initializer=-1.0,
+                              dim=2,
+                              bp_v2=True,
+                              write_buffer_steps=100)
+      self.evaluate(variables.local_variables_initializer())
+      self.evaluate(
+          table.upsert(constant_op.constant(keys, dtypes.int64),
+                       [[1.0, 1.0], [2.0, 2.0]]))
+      self.evaluate(
+          table.accum(constant_op.constant(keys, dtypes.int64),
+                      [[1.0, 1.0], [2.0, 2.0]], [[3.0, 3.0], [2.5, 2.5]],
+                      [True, True]))
+      self.assertAllEqual(2, self.evaluate(table._write_buffer.size()))
+
+      # Saving writes the buffered deltas to the tables first.
+      save = saver.Saver(var_list=[table])
+      save.save(sess, save_path)
+      self.assertAllEqual(0, self.evaluate(table._write_buffer.size()))
+      self.assertAllEqual([[3.0, 3.0], [2.5, 2.5]],
+                          self.evaluate(table.tables[0].lookup(keys)))
+
+    with self.session(config=default_config, graph=ops.Graph()) as sess:
+      table = de.get_variable('twrite_buffer_save', initializer=-1.0, dim=2)
+      save = saver.Saver(var_list=[table])
+      save.restore(sess, save_path)
+      self.assertAllEqual(
+          [[3.0, 3.0], [2.5, 2.5]],
+          self.evaluate(table.lookup(constant_op.constant(keys, dtypes.int64))))
+
+  def test_variable_inference_mode_stays_writable(self):
+    if context.executing_eagerly():
+      self.skipTest('skip eager test when using TrainableWrapper lookups.')
+    with self.session(config=default_config,
+                      use_gpu=test_util.is_gpu_available()):
+      table = de.get_variable('tinference_mode', initializer=-1.0, dim=2)
+      keys = constant_op.constant([0, 1], dtypes.int64)
+      self.evaluate(table.upsert(keys, [[1.0, 1.0], [2.0, 2.0]]))
+
+      # The inference lookups freeze the tables, and the writes built after
+      # switching back to train mode thaw them, so evaluating between training
+      # phases leaves the tables writable.
+      de.enable_inference_mode()
+      try:
+        emb = de.embedding_lookup(table, keys, name="inference_mode")
+        self.assertAllEqual([[1.0, 1.0], [2.0, 2.0]], self.evaluate(emb))
+        if not test_util.is_gpu_available():
+          self.assertTrue(self.evaluate(table.tables[0].is_frozen()))
+      finally:
+        de.enable_train_mode()
+      self.evaluate(table.upsert(keys, [[3.0, 3.0], [4.0, 4.0]]))
+      self.assertAllEqual([[3.0, 3.0], [4.0, 4.0]],
+                          self.evaluate(table.lookup(keys)))
+
+      # Evaluating again freezes the tables again.
+      if not test_util.is_gpu_available():
+        self.assertFalse(self.evaluate(table.tables[0].is_frozen()))
+        self.evaluate(emb)
+        self.assertTrue(self.evaluate(table.tables[0].is_frozen()))
+        self.evaluate(table.upsert(keys, [[3.0, 3.0], [4.0, 4.0]]))
+        self.assertFalse(self.evaluate(table.tables[0].is_frozen()))
+
+      if not test_util.is_gpu_available():
+        self.evaluate(table.freeze())
+        self.assertAllEqual([[3.0, 3.0], [4.0, 4.0]],
+                            self.evaluate(table.lookup(keys)))
+        with self.assertRaises(errors.FailedPreconditionError):
+          self.evaluate(table.upsert(keys, [[5.0, 5.0], [6.0, 6.0]]))
+        self.evaluate(table.thaw())
+        self.evaluate(table.upsert(keys, [[5.0, 5.0], [6.0, 6.0]]))
+
+  def test_variable_colocated_slots_unknown_dim(self):
+    if context.executing_eagerly():
+      self.skipTest('skip eager test when using placeholders.')
+    with self.session(config=default_config,
+                      use_gpu=test_util.is_gpu_available()) as sess:
+      table = de.get_variable('tcolocated_unknown_dim',
+                              initializer=-1.0,
+                              dim=2,
+                              colocated_slots=1)
+      keys = constant_op.constant([0, 1], dtypes.int64)
+      values = array_ops.placeholder(dtypes.float32, [None, None])
+      upsert_op = table.upsert(keys, values)
+
+      # Values of dim wide have the slots padded with zeros at run time.
+      sess.run(upsert_op, feed_dict={values: [[1.0, 1.0], [2.0, 2.0]]})
+      self.assertAllEqual([[1.0, 1.0, 0.0, 0.0], [2.0, 2.0, 0.0, 0.0]],
+                          self.evaluate(table.tables[0].lookup(keys)))
+
+      # Whole rows are written as they are.
+      sess.run(upsert_op,
+               feed_dict={values: [[3.0, 3.0, 5.0, 5.0], [4.0, 4.0, 6.0, 6.0]]})
+      self.assertAllEqual([[3.0, 3.0, 5.0, 5.0], [4.0, 4.0, 6.0, 6.0]],
+                          self.evaluate(table.tables[0].lookup(keys)))
+      self.assertAllEqual([[3.0, 3.0], [4.0, 4.0]],
+                          self.evaluate(table.lookup(keys)))
+
+  def test_variable_delta_dtype(self):
+    with self.assertRaisesRegex(ValueError, "bp_v2"):
+      de.get_variable('tdelta_dtype0', dim=2, delta_dtype=dtypes.float16)
+    with self.assertRaisesRegex(ValueError, "delta_dtype"):
+      de.get_variable('tdelta_dtype1',
+                      dim=2,
+                      bp_v2=True,
+                      delta_dtype=dtypes.int32)
+    # The int8 scales make the deltas larger than float16 for dim 2.
+    with self.assertRaisesRegex(ValueError, "dim"):
+      de.get_variable('tdelta_dtype2',
+                      dim=2,
+                      bp_v2=True,
+                      delta_dtype=dtypes.int8)
+
+    for delta_dtype in [dtypes.float16, dtypes.bfloat16]:
+      with self.session(config=default_config,
+                        use_gpu=test_util.is_gpu_available()):
+        table = de.get_variable('tdelta_dtype-' + delta_dtype.name,
+                                initializer=-1.0,
+                                dim=2,
+                                devices=["/CPU:0", "/CPU:0"],
+                                bp_v2=True,
+                                delta_dtype=delta_dtype)
+        keys = constant_op.constant([0, 1, 2], dtypes.int64)
+        self.evaluate(table.upsert(keys[:2], [[1.0, 1.0], [2.0, 2.0]]))
+
+        # Missing key 2 is inserted as it is, the deltas are rounded.
+        self.evaluate(
+            table.accum(
+                keys,
+                [[1.0, 1.0], [2.0, 2.0], [0.0, 0.0]],
+                [[1.5, 0.7], [2.0, 3.1], [5.3, 5.1]],
+                [True, True, False],
+            ))
+        values = self.evaluate(table.lookup(keys))
+        self.assertAllClose([[1.5, 0.7], [2.0, 3.1]],
+                            values[:2],
+                            rtol=1e-2,
+                            atol=1e-2)
+        self.assertAllEqual(
+            self.evaluate(constant_op.constant([5.3, 5.1], dtypes.float32)),
+            values[2])
+
+  def test_variable_delta_dtype_int8(self):
+    with self.session(config=default_config,
+                      use_gpu=test_util.is_gpu_available()):
+      table = de.get_variable('tdelta_dtype_int8',
+                              initializer=0.0,
+                              dim=4,
+                              colocated_slots=1,
+                              bp_v2=True,
+                              delta_dtype=dtypes.int8)
+      keys = constant_op.constant([0, 1], dtypes.int64)
+      rows = [[0.0] * 8, [0.0] * 8]
+      self.evaluate(table.upsert(keys, rows))
+
+      # The embedding deltas are a thousand times smaller than the slot
+      # deltas, they are scaled on their own rather than rounded to zero.
+      new_rows = [
+          [127 / 1024, 1 / 1024, 0.0, -64 / 1024, 127.0, 1.0, 0.0, -2.0],
+          [-127 / 2048, 0.0, 0.0, 0.0, -63.5, 32.0, 0.0, 0.5],
+      ]
+      self.evaluate(table.accum(keys, rows, new_rows, [True, True]))
+      self.assertAllEqual(new_rows, self.evaluate(table.tables[0].lookup(keys)))
+
+      # The rounding is stochastic, so the deltas are right on average.
+      num_keys = 4000
+      table = de.get_variable('tdelta_dtype_int8_mean',
+                              initializer=0.0,
+                              dim=4,
+                              bp_v2=True,
+                              delta_dtype=dtypes.int8)
+      keys = math_ops.range(num_keys, dtype=dtypes.int64)
+      rows = array_ops.zeros([num_keys, 4])
+      self.evaluate(table.upsert(keys, rows))
+      self.evaluate(
+          table.accum(
+              keys, rows,
+              array_ops.tile([[127 / 128, 0.3, 0.0, 0.0]], [num_keys, 1]),
+              array_ops.ones([num_keys], dtypes.bool)))
+      values = self.evaluate(table.lookup(keys))
+      self.assertAllEqual([127 / 128] * num_keys, values[:, 0])
+      # 0.3 is 38.4 steps of 1 / 128, rounding to nearest would give 38.
+      self.assertAllClose(0.3, values[:, 1].mean(), atol=5e-4)
+
+  def test_variable_delta_dtype_int8_sizes(self):
+    with self.session(config=default_config,
+                      use_gpu=test_util.is_gpu_available()):
+      table = de.get_variable('tdelta_dtype_int8_sizes',
+                              initializer=0.0,
+                              dim=4,
+                              colocated_slots=1,
+                              devices=["/CPU:0", "/CPU:0"],
+                              bp_v2=True,
+                              delta_dtype=dtypes.int8)
+      keys = constant_op.constant([0, 1, 2, 3], dtypes.int64)
+      old_rows = array_ops.zeros([4, 8])
+      new_rows = array_ops.ones([4, 8])
+      (missing_keys, missing_values, existing_keys, deltas,
+       scales) = self.evaluate(
+           table._partition_quantized(keys, old_rows, new_rows,
+                                      [True, True, True, False]))
+      self.assertAllEqual([3], sorted(np.concatenate(missing_keys)))
+      self.assertAllEqual([1, 8], np.concatenate(missing_values).shape)
+      self.assertAllEqual([0, 1, 2], sorted(np.concatenate(existing_keys)))
+
+      # An int8 delta per value and a bfloat16 scale per dim values are sent
+      # for each existing key, less than float16 deltas.
+      deltas = np.concatenate(deltas)
+      scales = np.concatenate(scales)
+      self.assertEqual(np.int8, deltas.dtype)
+      self.assertAllEqual([3, 8], deltas.shape)
+      self.assertEqual(dtypes.bfloat16.as_numpy_dtype, scales.dtype)
+      self.assertAllEqual([3, 2], scales.shape)
+      self.assertEqual(36, deltas.nbytes + scales.nbytes)
+      self.assertLess(deltas.nbytes + scales.nbytes, 3 * 8 * 2)
+
   def test_variable_initializer(self):
     id = 0
     for initializer, target_mean, target_stddev in [
@@ -794,6 +1055,53 @@ class VariableTest(test.TestCase):
 
       del table
 
+  def test_save_restore_file_system_jump_hash(self):
+    if context.executing_eagerly():
+      self.skipTest('skip eager test when using legacy Saver.')
+    save_dir = os.path.join(self.get_temp_dir(), "save_restore")
+    save_path = os.path.join(tempfile.mkdtemp(prefix=save_dir), "hash")
+    keys = np.arange(100, dtype=np.int64)
+    values = np.arange(100, dtype=np.float32).reshape(100, 1)
+
+    with self.session(config=default_config, graph=ops.Graph()) as sess:
+      table = de.Variable(
+          key_dtype=dtypes.int64,
+          value_dtype=dtypes.float32,
+          initializer=-1.0,
+          devices=_get_devices() * 2,
+          partitioner=de.jump_hash_partition_fn,
+          name="t1",
+          dim=1,
+          kv_creator=de.CuckooHashTableCreator(saver=de.FileSystemSaver()))
+      save = saver.Saver(var_list=[table])
+      self.evaluate(table.upsert(keys, values))
+      save.save(sess, save_path)
+      del table
+
+    for num_shards in [3, 1]:
+      with self.session(config=default_config, graph=ops.Graph()) as sess:
+        table = de.Variable(
+            key_dtype=dtypes.int64,
+            value_dtype=dtypes.float32,
+            initializer=-1.0,
+            devices=_get_devices() * num_shards,
+            partitioner=de.jump_hash_partition_fn,
+            name="t1",
+            dim=1,
+            kv_creator=de.CuckooHashTableCreator(saver=de.FileSystemSaver()))
+        save = saver.Saver(var_list=[table])
+        save.restore(sess, save_path)
+
+        self.assertAllEqual(100, self.evaluate(table.size()))
+        self.assertAllEqual(values, self.evaluate(table.lookup(keys)))
+        # Every shard only holds the keys mapping to it.
+        for idx, shard in enumerate(table._tables):
+          shard_keys, _ = self.evaluate(shard.export())
+          self.assertAllEqual(
+              np.full(len(shard_keys), idx),
+              self.evaluate(de.jump_hash_partition_fn(shard_keys, num_shards)))
+        del table
+
   def test_table_save_load_file_system(self):
     self.skipTest('Only test for file_system export, need file_system path.')
     if context.executing_eagerly():
@@ -1519,6 +1827,41 @@ class VariableTest(test.TestCase):
       output2 = table2.lookup(input_keys)
       self.assertAllEqual(expected_output, self.evaluate(output2))
 
+  def test_dynamic_embedding_variable_export_dataset(self):
+    if test_util.is_gpu_available():
+      self.skipTest("Chunked export is only supported by tables on CPU.")
+    with self.session(config=default_config, use_gpu=False):
+      keys = np.arange(1000, dtype=np.int64)
+      values = np.stack([keys, -keys], axis=1).astype(np.float32)
+      table = de.get_variable("t_export_dataset",
+                              dtypes.int64,
+                              dtypes.float32,
+                              devices=["/CPU:0"] * 3,
+                              initializer=-1.0,
+                              dim=2)
+      self.evaluate(table.upsert(keys, values))
+
+      dataset = table.export_dataset(batch_size=64)
+      chunks = []
+      if context.executing_eagerly():
+        chunks = [(k.numpy(), v.numpy()) for k, v in dataset]
+      else:
+        iterator = dataset_ops.make_initializable_iterator(dataset)
+        next_chunk = iterator.get_next()
+        self.evaluate(iterator.initializer)
+        while True:
+          try:
+            chunks.append(self.evaluate(next_chunk))
+          except errors.OutOfRangeError:
+            break
+
+      for chunk_keys, chunk_values in chunks:
+        self.assertGreater(len(chunk_keys), 0)
+        self.assertLessEqual(len(chunk_keys), 64)
+        self.assertAllEqual(values[chunk_keys], chunk_values)
+      exported_keys = np.concatenate([k for k, _ in chunks])
+      self.assertAllEqual(keys, np.sort(exported_keys))
+
   def test_dynamic_embedding_variable_invalid_shape(self):
     with self.session(config=default_config,
                       use_gpu=test_util.is_gpu_available()):
@@ -21,13 +21,19 @@ import numpy as np
 from tensorflow_recommenders_addons.dynamic_embedding.python.ops import data_flow_ops as data_flow
 import tensorflow_recommenders_addons.dynamic_embedding.python.ops.data_flow_grad  # pylint: disable=unused-import
 
+from tensorflow.python.client import session
 from tensorflow.python.framework import config
 from tensorflow.python.framework import constant_op
 from tensorflow.python.framework import dtypes
 from tensorflow.python.framework import ops
 from tensorflow.python.framework import test_util
 from tensorflow.python.ops import array_ops
+from tensorflow.python.ops import control_flow_ops
+from tensorflow.python.ops import data_flow_ops
 from tensorflow.python.ops import gradients_impl
+from tensorflow.python.ops import math_ops
+from tensorflow.python.ops import random_ops
+from tensorflow.python.ops import variables
 from tensorflow.python.platform import test
 
 
@@ -292,6 +298,21 @@ class DynamicPartitionTest(test.TestCase):
       with self.assertRaisesOpError(r"partitions\[2\] = 99 is not in \[0, 4\)"):
         self.evaluate(partitions)
 
+  @test_util.run_deprecated_v1
+  @test_util.no_xla_auto_jit("xla doesn't raise out-of-range exceptions")
+  def testLargeErrorIndexOutOfRange(self):
+    # The ids are counted in blocks, the first bad id is still reported.
+    with self.cached_session(use_gpu=False):
+      indices_list = [x % 4 for x in range(100000)]
+      indices_list[70000] = 99
+      indices_list[90000] = 98
+      data = constant_op.constant(list(range(100000)))
+      indices = constant_op.constant(indices_list)
+      partitions = data_flow.dynamic_partition(data, indices, num_partitions=4)
+      with self.assertRaisesOpError(
+          r"partitions\[70000\] = 99 is not in \[0, 4\)"):
+        self.evaluate(partitions)
+
   @test_util.run_deprecated_v1
   @test_util.no_xla_auto_jit("xla doesn't raise out-of-range exceptions")
   def testScalarIndexOutOfRange(self):
@@ -357,5 +378,176 @@ class DynamicPartitionTest(test.TestCase):
       self.assertAllEqual(results, np.zeros((len(device_list), 10, 100)))
 
 
+class MultiDynamicPartitionTest(test.TestCase):
+
+  @test_util.run_deprecated_v1
+  def testSimple(self):
+    with self.session(use_gpu=False):
+      keys = constant_op.constant([0, 13, 2, 39, 4, 17], dtype=dtypes.int64)
+      values = constant_op.constant(
+          [[0, 1], [2, 3], [4, 5], [6, 7], [8, 9], [10, 11]],
+          dtype=dtypes.float32)
+      exists = constant_op.constant([True, False, True, True, False, False])
+      strings = constant_op.constant(["a", "b", "c", "d", "e", "f"])
+      indices = constant_op.constant([0, 0, 2, 3, 2, 1])
+      outputs, positions = data_flow.multi_dynamic_partition(
+          [keys, values, exists, strings], indices, num_partitions=4)
+      outputs_vals, positions_vals = self.evaluate((outputs, positions))
+
+    self.assertEqual(4, len(outputs_vals))
+    self.assertAllEqual([[0, 13], [17], [2, 4], [39]], outputs_vals[0])
+    self.assertAllEqual(
+        [[[0, 1], [2, 3]], [[10, 11]], [[4, 5], [8, 9]], [[6, 7]]],
+        outputs_vals[1])
+    self.assertAllEqual([[True, False], [False], [True, False], [True]],
+                        outputs_vals[2])
+    self.assertAllEqual([[b"a", b"b"], [b"f"], [b"c", b"e"], [b"d"]],
+                        outputs_vals[3])
+    self.assertAllEqual([[0, 1], [5], [2, 4], [3]], positions_vals)
+    self.assertEqual([None, 2], outputs[1][0].get_shape().as_list())
+    self.assertEqual([None], positions[0].get_shape().as_list())
+
+  def testMatchesDynamicPartition(self):
+    rows = 10000
+    num_partitions = 7
+    data = np.random.randn(rows, 3).astype(np.float32)
+    indices = np.random.randint(0, num_partitions, rows).astype(np.int32)
+    with self.session(use_gpu=False):
+      outputs, positions = data_flow.multi_dynamic_partition([data], indices,
+                                                             num_partitions)
+      expected = data_flow.dynamic_partition(data, indices, num_partitions)
+      stitched = data_flow.dynamic_stitch(positions, outputs[0])
+      outputs_vals, expected_vals, stitched_val = self.evaluate(
+          (outputs[0], expected, stitched))
+    for p in range(num_partitions):
+      self.assertAllEqual(expected_vals[p], outputs_vals[p])
+    self.assertAllEqual(data, stitched_val)
+
+  @test_util.run_deprecated_v1
+  def testGradient(self):
+    with self.session(use_gpu=False):
+      data = constant_op.constant([[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]])
+      indices = constant_op.constant([1, 0, 1])
+      outputs, _ = data_flow.multi_dynamic_partition([data], indices, 2)
+      loss = (2.0 * math_ops.reduce_sum(outputs[0][0]) +
+              3.0 * math_ops.reduce_sum(outputs[0][1]))
+      grad = gradients_impl.gradients(loss, data)[0]
+      self.assertAllEqual([[3.0, 3.0], [2.0, 2.0], [3.0, 3.0]],
+                          self.evaluate(grad))
+
+  @test_util.run_deprecated_v1
+  def testErrorIndexOutOfRange(self):
+    with self.cached_session(use_gpu=False):
+      data = constant_op.constant([0, 1, 2])
+      indices = constant_op.constant([0, 9, 1])
+      outputs, _ = data_flow.multi_dynamic_partition([data], indices, 2)
+      with self.assertRaisesOpError(r"partitions\[1\] = 9 is not in \[0, 2\)"):
+        self.evaluate(outputs)
+
+  @test_util.run_deprecated_v1
+  def testErrorToutMismatch(self):
+    with self.cached_session(use_gpu=False):
+      data = constant_op.constant([0, 1, 2])
+      indices = constant_op.constant([0, 1, 1])
+      outputs, _ = data_flow.tfra_data_flow_ops.tfra_multi_dynamic_partition(
+          data=[data],
+          partitions=indices,
+          num_partitions=2,
+          Tout=[dtypes.int64, dtypes.int64])
+      with self.assertRaisesOpError("does not match data"):
+        self.evaluate(outputs)
+
+
+def _jump_hash(key, num_partitions):
+  mask = (1 << 64) - 1
+  key &= mask
+  for mul in [0xff51afd7ed558ccd, 0xc4ceb9fe1a85ec53]:
+    key ^= key >> 33
+    key = (key * mul) & mask
+  key ^= key >> 33
+  b, j = -1, 0
+  while j < num_partitions:
+    b = j
+    key = (key * 2862933555777941757 + 1) & mask
+    j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+  return b
+
+
+class JumpHashPartitionTest(test.TestCase):
+
+  def testMatchesReference(self):
+    keys = np.array([0, 1, 2, -1, 7, 1 << 40, -(1 << 50)], dtype=np.int64)
+    with self.session(use_gpu=False):
+      for num_partitions in [1, 2, 7, 100]:
+        partitions = self.evaluate(
+            data_flow.jump_hash_partition(keys, num_partitions))
+        self.assertAllEqual([_jump_hash(int(k), num_partitions) for k in keys],
+                            partitions)
+
+  def testInt32MatchesInt64(self):
+    keys = np.arange(-500, 500, dtype=np.int32)
+    with self.session(use_gpu=False):
+      self.assertAllEqual(
+          self.evaluate(data_flow.jump_hash_partition(keys, 13)),
+          self.evaluate(data_flow.jump_hash_partition(keys.astype(np.int64),
+                                                      13)))
+
+  def testStringKeys(self):
+    keys = constant_op.constant([["a", "b"], ["c", "a"]])
+    with self.session(use_gpu=False):
+      partitions = self.evaluate(data_flow.jump_hash_partition(keys, 5))
+    self.assertEqual((2, 2), partitions.shape)
+    self.assertEqual(partitions[0][0], partitions[1][1])
+    self.assertTrue(np.all((partitions >= 0) & (partitions < 5)))
+
+  def testMinimalMovement(self):
+    keys = np.arange(100000, dtype=np.int64)
+    with self.session(use_gpu=False):
+      before = self.evaluate(data_flow.jump_hash_partition(keys, 8))
+      after = self.evaluate(data_flow.jump_hash_partition(keys, 12))
+    moved = before != after
+    # Keys only move into the added partitions, about 1/3 of them.
+    self.assertTrue(np.all(after[moved] >= 8))
+    self.assertNear(1.0 / 3, np.mean(moved), 0.01)
+    self.assertNear(1.0 / 12,
+                    np.min(np.bincount(after, minlength=12)) / 100000, 0.005)
+
+
+class DynamicPartitionBenchmark(test.Benchmark):
+  """Compares the TFRA partition kernels to `tf.dynamic_partition` on CPU.
+
+  Run with `--benchmarks=DynamicPartitionBenchmark`.
+  """
+
+  def _benchmark_partition(self, rows, num_partitions, dim):
+    with ops.Graph().as_default(), session.Session() as sess:
+      with ops.device("/CPU:0"):
+        partitions = variables.Variable(
+            random_ops.random_uniform([rows],
+                                      maxval=num_partitions,
+                                      dtype=dtypes.int32))
+        data = variables.Variable(random_ops.random_uniform([rows, dim]))
+        sess.run(variables.global_variables_initializer())
+        for op_name, op in [
+            ("tf",
+             data_flow_ops.dynamic_partition(data, partitions, num_partitions)),
+            ("tfra",
+             data_flow.dynamic_partition(data, partitions, num_partitions)),
+            ("tfra_multi",
+             data_flow.multi_dynamic_partition([data], partitions,
+                                               num_partitions)[0][0]),
+        ]:
+          self.run_op_benchmark(sess,
+                                control_flow_ops.group(op),
+                                min_iters=20,
+                                name="{}_rows_{}_partitions_{}_dim_{}".format(
+                                    op_name, rows, num_partitions, dim))
+
+  def benchmark_partition(self):
+    for rows in [1 << 14, 1 << 18, 1 << 21]:
+      for dim in [1, 16]:
+        self._benchmark_partition(rows, 16, dim)
+
+
 if __name__ == "__main__":
   test.main()
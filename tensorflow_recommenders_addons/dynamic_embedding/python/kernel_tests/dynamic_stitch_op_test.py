@@ -19,12 +19,16 @@ import numpy as np
 from tensorflow_recommenders_addons.dynamic_embedding.python.ops import data_flow_ops as de_data_flow
 import tensorflow_recommenders_addons.dynamic_embedding.python.ops.data_flow_grad  # pylint: disable=unused-import
 
+from tensorflow.python.client import session
 from tensorflow.python.framework import constant_op
 from tensorflow.python.framework import dtypes
+from tensorflow.python.framework import ops
 from tensorflow.python.framework import test_util
 from tensorflow.python.ops import array_ops
+from tensorflow.python.ops import data_flow_ops
 from tensorflow.python.ops import math_ops
 from tensorflow.python.ops import gradients_impl
+from tensorflow.python.ops import random_ops
 from tensorflow.python.platform import test
 
 
@@ -206,6 +210,32 @@ class DynamicStitchTestBase(object):
     with self.assertRaises(ValueError):
       self.stitch_op(indices, data, self.use_fast)
 
+  def testLargeWithDuplicates(self):
+    # Large enough to be stitched in blocks on several threads, where the
+    # last row written to an index must still win.
+    rows = 100000
+    first_dim_size = 60000
+    indices_np = [
+        np.random.randint(0, first_dim_size, rows // 2).astype(np.int32),
+        np.random.randint(0, first_dim_size, rows // 2).astype(np.int32)
+    ]
+    data_np = [
+        np.random.randn(rows // 2, 4).astype(np.float32),
+        np.random.randn(rows // 2, 4).astype(np.float32)
+    ]
+    indices_np[1][-1] = first_dim_size - 1
+    expected = np.zeros([first_dim_size, 4], dtype=np.float32)
+    covered = np.zeros([first_dim_size], dtype=bool)
+    for indices_part, data_part in zip(indices_np, data_np):
+      expected[indices_part] = data_part
+      covered[indices_part] = True
+    with self.session(use_gpu=False):
+      stitched = self.stitch_op([constant_op.constant(i) for i in indices_np],
+                                [constant_op.constant(d) for d in data_np],
+                                self.use_fast)
+      stitched_val = self.evaluate(stitched)
+    self.assertAllEqual(expected[covered], stitched_val[covered])
+
   @test_util.run_deprecated_v1
   def testErrorDataAndIndicesSizeMismatch(self):
     indices = [
@@ -234,5 +264,41 @@ class DynamicStitchTestFast(DynamicStitchTestBase, test.TestCase):
     DynamicStitchTestBase.__init__(self, de_data_flow.dynamic_stitch, True)
 
 
+class DynamicStitchBenchmark(test.Benchmark):
+  """Compares the TFRA stitch kernels to `tf.dynamic_stitch` on CPU.
+
+  Run with `--benchmarks=DynamicStitchBenchmark`.
+  """
+
+  def _benchmark_stitch(self, rows, num_partitions, dim):
+    with ops.Graph().as_default(), session.Session() as sess:
+      with ops.device("/CPU:0"):
+        partitions = random_ops.random_uniform([rows],
+                                               maxval=num_partitions,
+                                               dtype=dtypes.int32)
+        data = random_ops.random_uniform([rows, dim])
+        indices = data_flow_ops.dynamic_partition(math_ops.range(rows),
+                                                  partitions, num_partitions)
+        parts = data_flow_ops.dynamic_partition(data, partitions,
+                                                num_partitions)
+        indices, parts = sess.run((indices, parts))
+        indices = [constant_op.constant(i) for i in indices]
+        parts = [constant_op.constant(p) for p in parts]
+        for op_name, op in [
+            ("tf", data_flow_ops.dynamic_stitch(indices, parts)),
+            ("tfra", de_data_flow.dynamic_stitch(indices, parts)),
+        ]:
+          self.run_op_benchmark(sess,
+                                op.op,
+                                min_iters=20,
+                                name="{}_rows_{}_partitions_{}_dim_{}".format(
+                                    op_name, rows, num_partitions, dim))
+
+  def benchmark_stitch(self):
+    for rows in [1 << 14, 1 << 18, 1 << 21]:
+      for dim in [1, 16]:
+        self._benchmark_stitch(rows, 16, dim)
+
+
 if __name__ == "__main__":
   test.main()
@@ -0,0 +1,88 @@
+# Copyright 2024 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""unit tests of mmap table ops
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+from tensorflow_recommenders_addons import dynamic_embedding as de
+
+from tensorflow.python.framework import constant_op
+from tensorflow.python.framework import dtypes
+from tensorflow.python.framework import test_util
+from tensorflow.python.ops import init_ops
+from tensorflow.python.platform import test
+
+
+class MmapTableTest(test.TestCase):
+
+  @test_util.run_in_graph_and_eager_modes()
+  def test_mmap_table_serves_saved_variable(self):
+    dim = 4
+    dirpath = "file:///tmp/test_local_file_system/tfra_mmap_table"
+    var1 = de.get_variable('mmapv',
+                           key_dtype=dtypes.int64,
+                           value_dtype=dtypes.float32,
+                           initializer=init_ops.random_normal_initializer(
+                               0.0, 0.01),
+                           devices=['/CPU:0', '/CPU:1'],
+                           dim=dim)
+    init_keys = constant_op.constant(list(range(1000)), dtypes.int64)
+    init_values = var1.lookup(init_keys)
+
+    with self.session():
+      self.evaluate(var1.upsert(init_keys, init_values))
+      np_values = self.evaluate(init_values)
+      self.evaluate(var1.save_to_file_system(dirpath))
+
+      with self.assertRaises(TypeError):
+        de.get_variable('mmapv_string',
+                        key_dtype=dtypes.string,
+                        value_dtype=dtypes.float32,
+                        dim=dim,
+                        kv_creator=de.MmapTableCreator(
+                            de.MmapTableConfig(dirpath)))
+      # Shares the name with var1, so the tables find the files var1 saved.
+      var2 = de.Variable(name='mmapv',
+                         key_dtype=dtypes.int64,
+                         value_dtype=dtypes.float32,
+                         initializer=-1.0,
+                         devices=['/CPU:0', '/CPU:1'],
+                         dim=dim,
+                         kv_creator=de.MmapTableCreator(
+                             de.MmapTableConfig(dirpath)))
+      self.assertAllEqual(1000, self.evaluate(var2.size()))
+
+      query_keys = constant_op.constant([3, 999, 1000, 0], dtypes.int64)
+      values, exists = self.evaluate(var2.lookup(query_keys,
+                                                 return_exists=True))
+      self.assertAllEqual([True, True, False, True], exists)
+      self.assertAllEqual(np_values[[3, 999, 0]], values[[0, 1, 3]])
+      self.assertAllEqual(np.full([dim], -1.0), values[2])
+
+      load_keys, load_values = self.evaluate(var2.export())
+      sort_idx = load_keys.argsort()
+      self.assertAllEqual(list(range(1000)), load_keys[sort_idx])
+      self.assertAllEqual(np_values, load_values[sort_idx])
+
+      with self.assertRaises(NotImplementedError):
+        var2.tables[0].insert(query_keys, values)
+
+
+if __name__ == "__main__":
+  test.main()
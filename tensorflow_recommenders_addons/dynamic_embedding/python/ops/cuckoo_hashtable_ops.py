@@ -24,9 +24,11 @@ from tensorflow.python.framework import dtypes
 from tensorflow.python.framework import ops
 from tensorflow.python.framework import device as tf_device
 from tensorflow.python.ops import array_ops
+from tensorflow.python.ops import math_ops
 from tensorflow.python.ops.lookup_ops import LookupInterface
 from tensorflow.python.training.saver import BaseSaverBuilder
 
+from tensorflow_recommenders_addons.dynamic_embedding.python.ops.dynamic_embedding_creator import CuckooHashTableConfig
 from tensorflow_recommenders_addons.utils.resource_loader import LazySO
 from tensorflow_recommenders_addons.utils.resource_loader import prefix_op_name
 
@@ -86,6 +88,8 @@ class CuckooHashTable(LookupInterface):
             is shared using the table node name.
           init_size: initial size for the Variable and initial size of each hash
             tables will be int(init_size / N), N is the number of the devices.
+          config: A `CuckooHashTableConfig` setting how the operations of a
+            table on CPU are split over the worker threads.
 
         Returns:
           A `CuckooHashTable` object.
@@ -107,6 +111,21 @@ class CuckooHashTable(LookupInterface):
     self._max_hbm_for_values = sys.maxsize
     self._device_type = tf_device.DeviceSpec.from_string(
         self._device).device_type
+    self._min_slice_sizes = []
+    self._num_threads = []
+    self._incremental_resize = False
+    self._num_subtables = 1
+    if isinstance(config, CuckooHashTableConfig):
+      self._incremental_resize = config.incremental_resize
+      self._num_subtables = config.num_subtables
+      self._min_slice_sizes = [
+          config.find_min_slice_size, config.insert_min_slice_size,
+          config.accum_min_slice_size, config.remove_min_slice_size
+      ]
+      self._num_threads = [
+          config.find_num_threads, config.insert_num_threads,
+          config.accum_num_threads, config.remove_num_threads
+      ]
 
     self._shared_name = None
     if context.executing_eagerly():
@@ -172,6 +191,10 @@ class CuckooHashTable(LookupInterface):
             value_dtype=self._value_dtype,
             value_shape=self._default_value.get_shape(),
             init_size=self._init_size,
+            min_slice_sizes=self._min_slice_sizes,
+            num_threads=self._num_threads,
+            incremental_resize=self._incremental_resize,
+            num_subtables=self._num_subtables,
             name=self._name,
         )
 
@@ -248,6 +271,121 @@ class CuckooHashTable(LookupInterface):
         return cuckoo_ops.tfra_cuckoo_hash_table_remove(self.resource_handle,
                                                         keys)
 
+  def remove_if_less(self, threshold, name=None):
+    """Removes every key whose first value is less than `threshold`.
+
+        The whole table is scanned once under its lock, so status tables such
+        as timestamps or frequencies can be evicted without exporting them.
+
+        Args:
+          threshold: A scalar of the table's value type.
+          name: A name for the operation (optional).
+
+        Returns:
+          A 1-D tensor of the removed keys, which can be used to remove the
+            same keys from other tables.
+        """
+    if self._device_type == "GPU":
+      raise NotImplementedError(
+          "remove_if_less is only supported by tables on CPU.")
+    with ops.name_scope(name, "%s_lookup_table_remove_if_less" % self.name,
+                        (self.resource_handle, threshold)):
+      threshold = ops.convert_to_tensor(threshold,
+                                        self._value_dtype,
+                                        name="threshold")
+      with ops.colocate_with(self.resource_handle, ignore_existing=True):
+        return cuckoo_ops.tfra_cuckoo_hash_table_remove_if_less(
+            self.resource_handle,
+            threshold,
+            key_dtype=self._key_dtype,
+            value_dtype=self._value_dtype)
+
+  def freeze(self, name=None):
+    """Freezes the table for serving.
+
+        A frozen table answers lookups without taking its bucket locks, and
+        every write to it (insert, accum, remove, clear, import and load)
+        fails until `thaw` is called. Freezing an already frozen table is a
+        no-op, so the op is cheap to run before every lookup.
+
+        Args:
+          name: A name for the operation (optional).
+
+        Returns:
+          The created Operation.
+        """
+    return self._set_frozen(True, name, "freeze")
+
+  def thaw(self, name=None):
+    """Makes a frozen table writable again.
+
+        Args:
+          name: A name for the operation (optional).
+
+        Returns:
+          The created Operation.
+        """
+    return self._set_frozen(False, name, "thaw")
+
+  def is_frozen(self, name=None):
+    """Returns a scalar bool tensor, True if the table is frozen.
+
+        Args:
+          name: A name for the operation (optional).
+        """
+    if self._device_type == "GPU":
+      raise NotImplementedError("Freezing is only supported by tables on CPU.")
+    with ops.name_scope(name, "%s_lookup_table_is_frozen" % self.name,
+                        [self.resource_handle]):
+      with ops.colocate_with(self.resource_handle):
+        return cuckoo_ops.tfra_cuckoo_hash_table_is_frozen(
+            self.resource_handle,
+            key_dtype=self._key_dtype,
+            value_dtype=self._value_dtype)
+
+  def resize_metrics(self, name=None):
+    """Returns how often the table grew and how long that held it up.
+
+        Args:
+          name: A name for the operation (optional).
+
+        Returns:
+          A dict of scalar int64 tensors: `resizes` counts the times the table
+            grew, `pause_micros_total` and `pause_micros_max` are the total and
+            the longest time in microseconds the table operations were held
+            up by a resize, and `buckets_to_migrate` is the number of buckets
+            of the previous generation an incremental resize still has to
+            migrate.
+        """
+    if self._device_type == "GPU":
+      raise NotImplementedError(
+          "Resize metrics are only supported by tables on CPU.")
+    with ops.name_scope(name, "%s_lookup_table_resize_metrics" % self.name,
+                        [self.resource_handle]):
+      with ops.colocate_with(self.resource_handle):
+        metrics = cuckoo_ops.tfra_cuckoo_hash_table_resize_metrics(
+            self.resource_handle,
+            key_dtype=self._key_dtype,
+            value_dtype=self._value_dtype)
+    return {
+        "resizes": metrics[0],
+        "pause_micros_total": metrics[1],
+        "pause_micros_max": metrics[2],
+        "buckets_to_migrate": metrics[3],
+    }
+
+  def _set_frozen(self, frozen, name, op_name):
+    if self._device_type == "GPU":
+      raise NotImplementedError("Freezing is only supported by tables on CPU.")
+    with ops.name_scope(name, "%s_lookup_table_%s" % (self.name, op_name),
+                        [self.resource_handle]):
+      with ops.colocate_with(self.resource_handle, ignore_existing=True):
+        return cuckoo_ops.tfra_cuckoo_hash_table_set_frozen(
+            self.resource_handle,
+            frozen,
+            key_dtype=self._key_dtype,
+            value_dtype=self._value_dtype)
+
   def clear(self, name=None):
     """clear all keys and values in the table.
 
@@ -339,6 +477,73 @@ class CuckooHashTable(LookupInterface):
 
     return (values, exists) if return_exists else values
 
+  def lookup_or_init(self,
+                     keys,
+                     initializer,
+                     insert=False,
+                     return_exists=False,
+                     name=None):
+    """Looks up `keys`, generating initial values for the missing keys only.
+
+      Passing initial values as `dynamic_default_values` to `lookup` needs a
+      row for every key, although most keys usually exist once training has
+      warmed up. Here the table is probed first and `initializer` is called
+      for the rows of the missing keys alone.
+
+      Args:
+        keys: Keys to look up. Can be a tensor of any shape. Must match the
+          table's key_dtype.
+        initializer: A callable taking the shape `[num_missing] + value_shape`
+          and returning the initial values of the missing keys, or a single
+          row of `value_shape` shared by all of them.
+        insert: if True, the missing keys are also inserted with their initial
+          values. A key inserted by another writer since it was probed keeps
+          the value of that writer, which is then returned.
+        return_exists: if True, will return a additional Tensor which indicates
+          if or not keys were existing in the table.
+        name: A name for the operation (optional).
+
+      Returns:
+        A tensor containing the values in the same shape as `keys` using the
+          table's value type.
+        exists:
+          A bool type Tensor of the same shape as `keys` which indicates
+            if keys were existing in the table.
+            Only provided if `return_exists` is True.
+
+      Raises:
+        NotImplementedError: when the table is on GPU.
+    """
+    if self._device_type == "GPU":
+      raise NotImplementedError(
+          "lookup_or_init is only supported by tables on CPU.")
+    with ops.name_scope(
+        name,
+        "%s_lookup_table_find_or_init" % self.name,
+        (self.resource_handle, keys, self._default_value),
+    ):
+      keys = ops.convert_to_tensor(keys, dtype=self._key_dtype, name="keys")
+      with ops.colocate_with(self.resource_handle, ignore_existing=True):
+        values, exists = cuckoo_ops.tfra_cuckoo_hash_table_find_with_exists(
+            self.resource_handle, keys, self._default_value)
+        values = self._init_missing(keys, values, exists, initializer, insert)
+
+    return (values, exists) if return_exists else values
+
+  def _init_missing(self, keys, values, exists, initializer, insert=False):
+    """Fills the rows of `values` of the keys not `exists` by `initializer`."""
+    num_missing = array_ops.size(keys) - math_ops.reduce_sum(
+        math_ops.cast(exists, dtypes.int32))
+    init_values = math_ops.cast(
+        initializer([num_missing] + self._value_shape.as_list()),
+        self._value_dtype)
+    return cuckoo_ops.tfra_cuckoo_hash_table_init_missing(self.resource_handle,
+                                                          keys,
+                                                          values,
+                                                          exists,
+                                                          init_values,
+                                                          insert=insert)
+
   def insert(self, keys, values, name=None):
     """Associates `keys` with `values`.
 
@@ -410,6 +615,152 @@ class CuckooHashTable(LookupInterface):
           return cuckoo_ops.tfra_cuckoo_hash_table_accum(
               self.resource_handle, keys, values_or_deltas, exists)
 
+  def accum_delta(self, keys, old_values, new_values, exists, name=None):
+    """Inserts `new_values` for the keys that did not exist, or accumulates
+    `new_values - old_values` to the keys that did.
+
+      It does what `accum` does with the values or deltas selected by
+      `exists`, but the deltas are computed row by row by the table, without
+      materializing them. Only supported by tables on CPU.
+
+      Args:
+        keys: Keys to accmulate. Can be a tensor of any shape.
+          Must match the table's key type.
+        old_values: The values the keys had, of the same shape as
+          `new_values`.
+        new_values: The new values of the keys. Must be a tensor of
+          the same shape as `keys` and match the table's value type.
+        exists: A bool type tensor indicates if keys already exist or not.
+          Must be a tensor of the same shape as `keys`.
+        name: A name for the operation (optional).
+
+      Returns:
+        The created Operation.
+
+      Raises:
+        TypeError: when `keys` or `values` doesn't match the table data
+          types.
+    """
+    if self._device_type == "GPU":
+      raise NotImplementedError(
+          "accum_delta is only supported by tables on CPU.")
+    with ops.name_scope(
+        name,
+        "%s_lookup_table_accum_delta" % self.name,
+        [self.resource_handle, keys, old_values, new_values],
+    ):
+      keys = ops.convert_to_tensor(keys, self._key_dtype, name="keys")
+      old_values = ops.convert_to_tensor(old_values,
+                                         self._value_dtype,
+                                         name="old_values")
+      new_values = ops.convert_to_tensor(new_values,
+                                         self._value_dtype,
+                                         name="new_values")
+      exists = ops.convert_to_tensor(exists, dtypes.bool, name="exists")
+      with ops.colocate_with(self.resource_handle, ignore_existing=True):
+        return cuckoo_ops.tfra_cuckoo_hash_table_accum_delta(
+            self.resource_handle, keys, old_values, new_values, exists)
+
+  def insert_or_add(self, keys, deltas, name=None):
+    """Adds `deltas` to the values of `keys`, inserting the missing keys with
+    their `deltas`.
+
+      Unlike `accum`, whether a key exists is decided by the table as it
+      writes the key, so a delta is never dropped by a concurrent insert or
+      removal of the key. Only supported by tables on CPU.
+
+      Args:
+        keys: Keys to add to. Can be a tensor of any shape. Must match the
+          table's key type.
+        deltas: The deltas to add. Must be a tensor of the same shape as
+          `keys` and match the table's value type.
+        name: A name for the operation (optional).
+
+      Returns:
+        The created Operation.
+
+      Raises:
+        TypeError: when `keys` or `deltas` doesn't match the table data
+          types.
+    """
+    if self._device_type == "GPU":
+      raise NotImplementedError(
+          "insert_or_add is only supported by tables on CPU.")
+    with ops.name_scope(
+        name,
+        "%s_lookup_table_insert_or_add" % self.name,
+        [self.resource_handle, keys, deltas],
+    ):
+      keys = ops.convert_to_tensor(keys, self._key_dtype, name="keys")
+      deltas = ops.convert_to_tensor(deltas, self._value_dtype, name="deltas")
+      with ops.colocate_with(self.resource_handle, ignore_existing=True):
+        return cuckoo_ops.tfra_cuckoo_hash_table_insert_or_add(
+            self.resource_handle, keys, deltas)
+
+  def apply_optimizer(self,
+                      keys,
+                      grads,
+                      init_rows,
+                      hyperparams,
+                      optimizer,
+                      name=None):
+    """Applies a sparse optimizer to the rows of `keys` inside the table.
+
+      A row holds the embedding followed by the slots of the optimizer, as
+      a `Variable` with `colocated_slots` stores them. The rows are updated
+      in place the way the dense TF training ops update a variable and its
+      slots, and the missing keys are inserted with their `init_rows`
+      updated. Only supported by tables on CPU.
+
+      The `hyperparams` of each `optimizer`, with its slots in row order:
+        sgd: [lr], no slots.
+        adagrad: [lr, epsilon], with the accumulator.
+        adam: [lr_t, beta1, beta2, epsilon], with m and v, where `lr_t` is
+          the learning rate corrected for the bias of the step.
+        ftrl: [lr, l1, l2, lr_power], with the accumulator and linear.
+
+      Args:
+        keys: Unique keys to update, a vector of the table's key type.
+        grads: The gradients of the embeddings of the keys, a matrix with a
+          row per key and one column per embedding value.
+        init_rows: The whole rows the missing keys start from, a matrix with
+          a row per key.
+        hyperparams: The hyperparameters of `optimizer`, a vector.
+        optimizer: One of "sgd", "adagrad", "adam" and "ftrl".
+        name: A name for the operation (optional).
+
+      Returns:
+        The created Operation.
+
+      Raises:
+        TypeError: when `keys` or `grads` doesn't match the table data
+          types.
+    """
+    if self._device_type == "GPU":
+      raise NotImplementedError(
+          "apply_optimizer is only supported by tables on CPU.")
+    with ops.name_scope(
+        name,
+        "%s_lookup_table_apply_optimizer" % self.name,
+        [self.resource_handle, keys, grads, init_rows, hyperparams],
+    ):
+      keys = ops.convert_to_tensor(keys, self._key_dtype, name="keys")
+      grads = ops.convert_to_tensor(grads, self._value_dtype, name="grads")
+      init_rows = ops.convert_to_tensor(init_rows,
+                                        self._value_dtype,
+                                        name="init_rows")
+      hyperparams = ops.convert_to_tensor(hyperparams,
+                                          self._value_dtype,
+                                          name="hyperparams")
+      with ops.colocate_with(self.resource_handle, ignore_existing=True):
+        return cuckoo_ops.tfra_cuckoo_hash_table_apply_optimizer(
+            self.resource_handle,
+            keys,
+            grads,
+            init_rows,
+            hyperparams,
+            optimizer=optimizer)
+
   def export(self, name=None):
     """Returns tensors of all keys and values in the table.
 
@@ -432,6 +783,65 @@ class CuckooHashTable(LookupInterface):
 
     return keys, values
 
+  def export_and_clear(self, name=None):
+    """Returns tensors of all keys and values in the table and empties it.
+
+        The table is exported and emptied at once, so each concurrent write
+        is either in the returned tensors or left in the table. Only
+        supported by tables on CPU.
+
+        Args:
+          name: A name for the operation (optional).
+
+        Returns:
+          A pair of tensors with the first tensor containing all keys and the
+            second tensors containing all values the table held.
+        """
+    if self._device_type == "GPU":
+      raise NotImplementedError(
+          "export_and_clear is only supported by tables on CPU.")
+    with ops.name_scope(name, "%s_lookup_table_export_and_clear" % self.name,
+                        [self.resource_handle]):
+      with ops.colocate_with(self.resource_handle):
+        return cuckoo_ops.tfra_cuckoo_hash_table_export_and_clear(
+            self.resource_handle,
+            key_dtype=self._key_dtype,
+            value_dtype=self._value_dtype)
+
+  def export_chunk(self, offset, batch_size, name=None):
+    """Returns a chunk of the keys and values in the table.
+
+        The table is scanned bucket by bucket without being locked as a whole,
+        so the whole table can be read in chunks of bounded size while it is
+        still written. A key written, removed or moved by a resize during the
+        scan may be missed or repeated, `freeze` the table first for an exact
+        snapshot.
+
+        Args:
+          offset: A scalar int64 tensor, 0 for the first chunk and the
+            `next_offset` of the previous chunk for the others. A negative
+            offset returns an empty chunk.
+          batch_size: The most keys in a chunk, a chunk may hold less of them
+            or none.
+          name: A name for the operation (optional).
+
+        Returns:
+          A tuple `(keys, values, next_offset)`, `next_offset` is -1 after the
+            last chunk.
+        """
+    if self._device_type == "GPU":
+      raise NotImplementedError(
+          "Chunked export is only supported by tables on CPU.")
+    with ops.name_scope(name, "%s_lookup_table_export_chunk" % self.name,
+                        [self.resource_handle]):
+      with ops.colocate_with(self.resource_handle):
+        return cuckoo_ops.tfra_cuckoo_hash_table_export_chunk(
+            self.resource_handle,
+            ops.convert_to_tensor(offset, dtypes.int64),
+            ops.convert_to_tensor(batch_size, dtypes.int64),
+            key_dtype=self._key_dtype,
+            value_dtype=self._value_dtype)
+
   def save_to_file_system(self,
                           dirpath,
                           file_name=None,
@@ -570,4 +980,34 @@ class CuckooHashTable(LookupInterface):
             )
 
 
+def find_group(tables, keys_list, name=None):
+  """Looks up keys in several CPU `CuckooHashTable`s with a single op.
+
+    The tables must be placed on the same device and hold the same key and
+    value types, the values of missing keys are the default values of the
+    tables.
+
+    Args:
+      tables: A list of `CuckooHashTable`s on CPU.
+      keys_list: A list of key tensors, `keys_list[i]` is looked up in
+        `tables[i]`.
+      name: A name for the operation (optional).
+
+    Returns:
+      A pair of lists, the values of `keys_list[i]` and whether they exist in
+        `tables[i]`.
+  """
+  handles = [table.resource_handle for table in tables]
+  with ops.name_scope(name, "cuckoo_hash_table_find_group",
+                      handles + list(keys_list)):
+    keys_list = [
+        ops.convert_to_tensor(keys, dtype=table._key_dtype, name="keys")
+        for table, keys in zip(tables, keys_list)
+    ]
+    with ops.colocate_with(handles[0], ignore_existing=True):
+      values, exists = cuckoo_ops.tfra_cuckoo_hash_table_find_group(
+          handles, keys_list, [table._default_value for table in tables])
+  return list(values), list(exists)
+
+
 ops.NotDifferentiable(prefix_op_name("CuckooHashTableOfTensors"))
@@ -45,6 +45,30 @@ def _TfraDynamicPartitionGrads(op, *grads):
   return [reconstructed, None]
 
 
+@ops.RegisterGradient(prefix_op_name("MultiDynamicPartition"))
+def _TfraMultiDynamicPartitionGrads(op, *grads):
+  """Gradients for TfraMultiDynamicPartition."""
+  num_partitions = op.get_attr("num_partitions")
+  num_data = len(op.inputs) - 1
+  indices = op.outputs[num_data * num_partitions:]
+
+  data_grads = []
+  for i in range(num_data):
+    data = op.inputs[i]
+    partition_grads = grads[i * num_partitions:(i + 1) * num_partitions]
+    if not data.dtype.is_floating or all(g is None for g in partition_grads):
+      data_grads.append(None)
+      continue
+    partition_grads = [
+        array_ops.zeros_like(op.outputs[i * num_partitions +
+                                        p]) if g is None else g
+        for p, g in enumerate(partition_grads)
+    ]
+    reconstructed = de_data_flow.dynamic_stitch(indices, partition_grads)
+    data_grads.append(array_ops.reshape(reconstructed, array_ops.shape(data)))
+  return data_grads + [None]
+
+
 @ops.RegisterGradient(prefix_op_name("DynamicStitch"))
 @ops.RegisterGradient(prefix_op_name("DynamicStitchFast"))
 @ops.RegisterGradient(prefix_op_name("ParallelDynamicStitch"))
@@ -26,6 +26,7 @@ from tensorflow.python.framework import dtypes
 from tensorflow.python.framework import errors
 from tensorflow.python.framework import ops
 from tensorflow.python.ops import array_ops
+from tensorflow.python.ops import math_ops
 from tensorflow.python.platform import tf_logging
 
 from tensorflow_recommenders_addons.dynamic_embedding.python.ops import data_flow_grad
@@ -51,6 +52,72 @@ def dynamic_partition(data, partitions, num_partitions, name=None):
                                                      name=name)
 
 
+def multi_dynamic_partition(data, partitions, num_partitions, name=None):
+  """Partitions every tensor of `data` by the same `partitions`.
+
+    The partition ids are scanned only once, unlike running
+    `dynamic_partition` for each tensor.
+
+    Args:
+      data: A list of tensors, the shape of each must start with
+        `partitions.shape`.
+      partitions: An int32 tensor of partition ids in [0, num_partitions).
+      num_partitions: The number of partitions.
+      name: A name for the operation (optional).
+
+    Returns:
+      A pair `(outputs, indices)`. `outputs[i][p]` is partition `p` of
+        `data[i]`, and `indices[p]` holds the positions of the rows of
+        partition `p`, as `dynamic_stitch` takes them.
+  """
+  data = [ops.convert_to_tensor(d) for d in data]
+  if not hasattr(tfra_data_flow_ops, 'tfra_multi_dynamic_partition'):
+    tf_logging.warn(
+        '`tfra.dynamic_embedding.data_flow.multi_dynamic_partition` is not'
+        ' found. Use dynamic_partition on each tensor instead.')
+    outputs = [
+        dynamic_partition(d, partitions, num_partitions, name=name)
+        for d in data
+    ]
+    positions = array_ops.reshape(math_ops.range(array_ops.size(partitions)),
+                                  array_ops.shape(partitions))
+    indices = dynamic_partition(positions,
+                                partitions,
+                                num_partitions,
+                                name=name)
+    return outputs, indices
+  outputs, indices = tfra_data_flow_ops.tfra_multi_dynamic_partition(
+      data,
+      partitions,
+      num_partitions,
+      Tout=[d.dtype for d in data for _ in range(num_partitions)],
+      name=name)
+  return [
+      outputs[i * num_partitions:(i + 1) * num_partitions]
+      for i in range(len(data))
+  ], indices
+
+
+def jump_hash_partition(keys, num_partitions, name=None):
+  """Maps keys to partitions in [0, num_partitions) by jump consistent hash.
+
+    Unlike `key mod num_partitions`, growing the number of partitions from `n`
+    to `m` only moves about `(m - n) / m` of the keys, all of them into the
+    new partitions `[n, m)`. Shrinking it only moves the keys of the removed
+    partitions.
+
+    Args:
+      keys: A tensor of `int32`, `int64` or `string` keys.
+      num_partitions: The number of partitions, a python int.
+      name: A name for the operation (optional).
+
+    Returns:
+      An int32 tensor with the shape of `keys`.
+  """
+  return tfra_data_flow_ops.tfra_jump_hash_partition(
+      keys, num_partitions=num_partitions, name=name)
+
+
 def dynamic_stitch(indices, data, use_fast=True, name=None):
   if not hasattr(tfra_data_flow_ops, 'tfra_dynamic_stitch'):
     tf_logging.warn('`tfra.dynamic_embedding.data_flow.dynamic_stitch` is not'
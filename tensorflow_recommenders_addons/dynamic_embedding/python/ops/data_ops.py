@@ -0,0 +1,194 @@
+# Copyright 2024 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""`tf.data` transformations looking up dynamic embeddings ahead of time."""
+
+from tensorflow_recommenders_addons import dynamic_embedding as de
+
+from tensorflow.python.distribute import distribute_utils
+from tensorflow.python.framework import ops
+from tensorflow.python.framework import tensor_spec
+from tensorflow.python.ops import array_ops
+from tensorflow.python.ops import math_ops
+
+_EXISTS_SUFFIX = "_exists"
+_STALE_SUFFIX = "_stale"
+
+
+def _embeddings_key(ids_key, embeddings_key):
+  return embeddings_key if embeddings_key is not None else (ids_key +
+                                                            "_embeddings")
+
+
+def prefetch_embeddings(variable,
+                        ids_key,
+                        buffer_size=1,
+                        consistent=False,
+                        embeddings_key=None):
+  """Looks up the embeddings of upcoming batches in the input pipeline.
+
+  Returns a transformation for `tf.data.Dataset.apply`. Each element of the
+  dataset must be a dict of features, the embeddings of the dense ids in
+  `features[ids_key]` are looked up in `variable` and added to the features
+  as `features[embeddings_key]`. The lookups run `buffer_size` batches ahead
+  of the consumer, so they overlap with the training steps instead of
+  sitting on their critical path. For a bp_v2 `variable` whether the keys
+  exist is added as well, for `embedding_lookup_prefetched`. With
+  `colocated_slots` the embeddings are whole rows, slots included.
+
+  The embeddings of a batch are looked up before the steps training the
+  batches in front of it have updated the table, so keys shared with those
+  batches may be stale. With `consistent` the keys the previous
+  `buffer_size + 1` batches hold are marked, and `embedding_lookup_prefetched`
+  looks up only those again. Updates from other workers are not tracked.
+
+  Example usage:
+
+  ```python
+  dataset = dataset.apply(
+      tfra.dynamic_embedding.data.prefetch_embeddings(
+          variable, "user_id", buffer_size=2, consistent=True))
+  for features in dataset:
+    with tf.GradientTape() as tape:
+      emb = tfra.dynamic_embedding.data.embedding_lookup_prefetched(
+          shadow, features, "user_id")
+      ...
+  ```
+
+  Args:
+    variable: A `dynamic_embedding.Variable` to look the embeddings up in.
+    ids_key: The feature holding the ids, must be a dense tensor of the
+      key_dtype of `variable`.
+    buffer_size: The number of batches looked up ahead, at least 1.
+    consistent: Whether to mark the keys that may be updated between the
+      lookup and the training step of their batch.
+    embeddings_key: The feature the embeddings are added as, defaults to
+      `ids_key + "_embeddings"`.
+
+  Returns:
+    A `Dataset` transformation function, which can be passed to
+    `tf.data.Dataset.apply`.
+
+  Raises:
+    ValueError: If `buffer_size` is less than 1.
+  """
+  if buffer_size < 1:
+    raise ValueError(
+        "buffer_size must be at least 1, got {}.".format(buffer_size))
+  embeddings_key = _embeddings_key(ids_key, embeddings_key)
+
+  def _mark_stale(window, features):
+    ids = array_ops.reshape(features[ids_key], [-1])
+    recent, _ = array_ops.unique(array_ops.concat(window, 0))
+    # The unique indices of `recent` come first, so an id was seen in the
+    # window iff its index is below their count.
+    _, idx = array_ops.unique(array_ops.concat([recent, ids], 0))
+    stale = math_ops.less(idx[array_ops.size(recent):], array_ops.size(recent))
+    features = dict(features)
+    features[embeddings_key + _STALE_SUFFIX] = array_ops.reshape(
+        stale, array_ops.shape(features[ids_key]))
+    unique_ids, _ = array_ops.unique(ids)
+    return window[1:] + (unique_ids,), features
+
+  def _lookup(features):
+    features = dict(features)
+    ids = features[ids_key]
+    ids_shape = array_ops.shape(ids)
+    flat_ids = array_ops.reshape(ids, [-1])
+    if variable.bp_v2 or variable.colocated_slots:
+      values, exists = variable._lookup_rows(flat_ids, return_exists=True)
+      features[embeddings_key + _EXISTS_SUFFIX] = array_ops.reshape(
+          exists, ids_shape)
+    else:
+      values = variable.lookup(flat_ids)
+    features[embeddings_key] = array_ops.reshape(
+        values, array_ops.concat([ids_shape, [variable._row_dim]], 0))
+    return features
+
+  def _apply_fn(dataset):
+    spec = dataset.element_spec
+    if not isinstance(spec, dict) or ids_key not in spec:
+      raise ValueError(
+          "Dataset elements must be dicts holding {}, got {}.".format(
+              ids_key, spec))
+    if not isinstance(spec[ids_key], tensor_spec.TensorSpec):
+      raise TypeError("{} must be a dense tensor, got {}.".format(
+          ids_key, spec[ids_key]))
+    if spec[ids_key].dtype != variable.key_dtype:
+      raise TypeError(
+          "variable.key_dtype should be same with the dtype of {}: {} vs. {}".
+          format(ids_key, variable.key_dtype, spec[ids_key].dtype))
+    if consistent:
+      window = tuple(
+          array_ops.zeros([0], dtype=variable.key_dtype)
+          for _ in range(buffer_size + 1))
+      dataset = dataset.scan(window, _mark_stale)
+    return dataset.map(_lookup).prefetch(buffer_size)
+
+  return _apply_fn
+
+
+def embedding_lookup_prefetched(shadow,
+                                features,
+                                ids_key,
+                                embeddings_key=None,
+                                name=None):
+  """Reads the embeddings `prefetch_embeddings` added to `features`.
+
+  The keys marked as possibly stale are looked up again. In train mode the
+  embeddings are then loaded into `shadow` like `shadow_ops.embedding_lookup`
+  does, so the optimizers update the variable of `shadow` with them.
+
+  Args:
+    shadow: A `ShadowVariable` of the variable passed to
+      `prefetch_embeddings`.
+    features: A dataset element produced by `prefetch_embeddings`.
+    ids_key: The same `ids_key` as passed to `prefetch_embeddings`.
+    embeddings_key: The same `embeddings_key` as passed to
+      `prefetch_embeddings`.
+    name: A name for the operation (optional).
+
+  Returns:
+    A tensor with shape [shape of ids] + [dim], the embeddings of the ids.
+  """
+  if distribute_utils.is_distributed_variable(shadow):
+    shadow_ = shadow._get_on_device_or_primary()
+  else:
+    shadow_ = shadow
+  params = shadow_.params
+  embeddings_key = _embeddings_key(ids_key, embeddings_key)
+
+  with ops.name_scope(name, "embedding_lookup_prefetched"):
+    ids = ops.convert_to_tensor(features[ids_key])
+    flat_ids = array_ops.reshape(ids, [-1])
+    values = array_ops.reshape(features[embeddings_key], [-1, params._row_dim])
+    exists = features.get(embeddings_key + _EXISTS_SUFFIX, None)
+    if exists is not None:
+      exists = array_ops.reshape(exists, [-1])
+    stale = features.get(embeddings_key + _STALE_SUFFIX, None)
+    if stale is not None:
+      stale_idx = array_ops.where(array_ops.reshape(stale, [-1]))
+      stale_ids = array_ops.gather_nd(flat_ids, stale_idx)
+      if exists is not None:
+        fresh, fresh_exists = params._lookup_rows(stale_ids, return_exists=True)
+        exists = array_ops.tensor_scatter_update(exists, stale_idx,
+                                                 fresh_exists)
+      else:
+        fresh = params.lookup(stale_ids)
+      values = array_ops.tensor_scatter_update(values, stale_idx, fresh)
+
+    values = de.shadow_ops._embedding_lookup_prefetched(shadow_, flat_ids,
+                                                        values, exists)
+    return array_ops.reshape(
+        values, array_ops.concat([array_ops.shape(ids), [params.dim]], 0))
@@ -14,6 +14,7 @@
 
 # lint-as: python3
 
+import re
 from abc import ABCMeta
 
 from tensorflow.python.eager import context
@@ -78,10 +79,56 @@ class KVCreator(object, metaclass=ABCMeta):
 
 class CuckooHashTableConfig(object):
 
-  def __init__(self):
-    """ CuckooHashTableConfig include nothing for parameter default satisfied.
+  def __init__(self,
+               find_min_slice_size=0,
+               find_num_threads=0,
+               insert_min_slice_size=0,
+               insert_num_threads=0,
+               accum_min_slice_size=0,
+               accum_num_threads=0,
+               remove_min_slice_size=0,
+               remove_num_threads=0,
+               incremental_resize=False,
+               num_subtables=1):
+    """ CuckooHashTableConfig sets how a CPU table splits the keys of its
+    find, insert, accum and remove operations over the worker threads.
+
+    Small batches on hosts with many cores are cheaper to run on fewer
+    threads, each taking a slice of at least `*_min_slice_size` keys.
+    It also sets whether a full table grows in place, which holds up the
+    batch that fills it, or incrementally: the larger table is then built in
+    the background and every operation moves a few buckets over to it.
+    A table can also be split into lock striped subtables which fill up and
+    grow independently, so growing one of them holds up only its own keys.
+    All the defaults keep the original behavior.
+
+    Args:
+      find_min_slice_size: The fewest keys a thread looks up at once. 0 keeps
+        the original heuristic, which splits batches over every thread.
+      find_num_threads: The most threads a lookup runs on, 0 for all.
+      insert_min_slice_size: Same as `find_min_slice_size`, for inserts.
+      insert_num_threads: Same as `find_num_threads`, for inserts. 0 falls
+        back to the TFRA_NUM_WORKER_THREADS_FOR_LOOKUP_TABLE_INSERT env var.
+      accum_min_slice_size: Same as `find_min_slice_size`, for accums.
+      accum_num_threads: Same as `find_num_threads`, for accums.
+      remove_min_slice_size: Same as `find_min_slice_size`, for removes.
+      remove_num_threads: Same as `find_num_threads`, for removes.
+      incremental_resize: Whether to grow the table incrementally once it is
+        three quarters full, see `CuckooHashTable.resize_metrics`.
+      num_subtables: The number of subtables the keys are hashed over, 1
+        keeps a single table. Values larger than 1 are worth it on hosts
+        with many cores serving one large table.
     """
-    pass
+    self.find_min_slice_size = find_min_slice_size
+    self.find_num_threads = find_num_threads
+    self.insert_min_slice_size = insert_min_slice_size
+    self.insert_num_threads = insert_num_threads
+    self.accum_min_slice_size = accum_min_slice_size
+    self.accum_num_threads = accum_num_threads
+    self.remove_min_slice_size = remove_min_slice_size
+    self.remove_num_threads = remove_num_threads
+    self.incremental_resize = incremental_resize
+    self.num_subtables = num_subtables
 
 
 class CuckooHashTableCreator(KVCreator):
@@ -104,7 +151,8 @@ class CuckooHashTableCreator(KVCreator):
     self.name = name
     self.checkpoint = checkpoint
     self.init_size = init_size
-    self.config = config
+    if config is not None:
+      self.config = config
     self.device = device
     self.shard_saveable_object_fn = shard_saveable_object_fn
     return de.CuckooHashTable(
@@ -210,6 +258,80 @@ class HkvHashTableCreator(KVCreator):
     return config
 
 
+class MmapTableConfig(object):
+
+  def __init__(self, dirpath, proc_size=1, proc_rank=0):
+    """ MmapTableConfig points the tables at the files written by
+    `Variable.save_to_file_system` with the same `dirpath`, `proc_size` and
+    `proc_rank`.
+    """
+    self.dirpath = dirpath
+    self.proc_size = proc_size
+    self.proc_rank = proc_rank
+
+
+class MmapTableCreator(KVCreator):
+  """
+      MmapTableCreator creates read-only tables which memory map the key and
+    value files saved by `Variable.save_to_file_system`, for serving.
+  """
+
+  def create(
+      self,
+      key_dtype=None,
+      value_dtype=None,
+      default_value=None,
+      name=None,
+      checkpoint=None,
+      init_size=None,
+      config=None,
+      device=None,
+      shard_saveable_object_fn=None,
+  ):
+    self.key_dtype = key_dtype
+    self.value_dtype = value_dtype
+    self.default_value = default_value
+    self.name = name
+    self.checkpoint = checkpoint
+    self.init_size = init_size
+    if config:
+      self.config = config
+    if not isinstance(self.config, MmapTableConfig):
+      raise TypeError(
+          "config should be instance of 'MmapTableConfig', but got ",
+          str(type(self.config)))
+    self.device = device
+    file_name = re.sub(
+        r'_mht_([^/]*)of([^/]*)', r'_mht_\1of\2_rank' +
+        str(self.config.proc_rank) + '_size' + str(self.config.proc_size),
+        self.name)
+
+    return de.MmapTable(key_dtype=self.key_dtype,
+                        value_dtype=self.value_dtype,
+                        default_value=self.default_value,
+                        dirpath=self.config.dirpath,
+                        file_name=file_name,
+                        name=self.name,
+                        device=self.device)
+
+  def get_config(self):
+    if not context.executing_eagerly():
+      raise RuntimeError(
+          'Unsupported to serialize python object of MmapTableCreator.')
+
+    config = {
+        'key_dtype': self.key_dtype,
+        'value_dtype': self.value_dtype,
+        'default_value': self.default_value.numpy(),
+        'name': self.name,
+        'checkpoint': self.checkpoint,
+        'init_size': self.init_size,
+        'config': self.config,
+        'device': self.device,
+    }
+    return config
+
+
 class RedisTableConfig(object):
   """ 
   RedisTableConfig config json file for connecting Redis service and 
@@ -19,6 +19,8 @@ See [Sparse Domain Isolation](https://github.com/tensorflow/community/pull/237)
 """
 
 from tensorflow_recommenders_addons import dynamic_embedding as de
+from tensorflow_recommenders_addons.dynamic_embedding.python.ops.dynamic_embedding_variable import _lookup_rows_group
+from tensorflow_recommenders_addons.dynamic_embedding.python.ops.dynamic_embedding_variable import _thaw_inference_frozen_variables
 from tensorflow_recommenders_addons.utils.resource_loader import get_tf_version_triple
 
 from tensorflow.core.framework import attr_value_pb2
@@ -136,6 +138,10 @@ class TrainableWrapper(resource_variable_ops.ResourceVariable):
           ids: A tensor with any shape as same dtype of params.key_dtype.
           max_norm: If not `None`, each values is clipped if its l2-norm is larger
             than this value.
+          primary: If set, the wrapper is a view of the optimizer slot stored
+            in block `slot_index` of the rows `primary` looks up, and
+            `slot_default` is the value of the slot for the missing ids.
+            Only used for the `colocated_slots` of `params`.
           other parameters is same with ResourceVariable.
         Returns:
           A `TrainableWrapper` object which is a subclass of ResourceVariable.
@@ -147,19 +153,92 @@ class TrainableWrapper(resource_variable_ops.ResourceVariable):
     self.prefetch_values_op = None
     self.model_mode = kwargs.get("model_mode")
     kwargs.pop("model_mode")
+    self._primary = kwargs.pop("primary", None)
+    self._slot_index = kwargs.pop("slot_index", 0)
+    self._slot_default = kwargs.pop("slot_default", None)
+    self._rows = None
+    self._rows_exists = None
     self._tracked_slots = []
     self._optimizer_vars = data_structures.NoDependency([])
     super(TrainableWrapper, self).__init__(*args, **kwargs)
 
   def prefetch_values(self, update=False):
     if update or (self.prefetch_values_op is None):
-      if self.params.bp_v2:
-        r, self.exists = self.params.lookup(self.ids, return_exists=True)
-        self.prefetch_values_op = self.transform(r)
-      else:
-        self.prefetch_values_op = self.transform(self.params.lookup(self.ids))
+      # Tables are never written on inference mode, so they are frozen to
+      # serve lookups without locks, until `enable_train_mode` thaws them.
+      freeze_ops = []
+      if (self.model_mode == ModelMode.INFERENCE and self._primary is None
+          and hasattr(self.params, "_freeze_for_inference")):
+        freeze_ops = [self.params._freeze_for_inference()]
+      with ops.control_dependencies(freeze_ops):
+        if self._primary is not None:
+          self.prefetch_values_op = self._primary._slot_values(self)
+        elif self.params.colocated_slots:
+          self._rows, self.exists = self.params._lookup_rows(self.ids,
+                                                             return_exists=True)
+          self._rows_exists = self.exists
+          self.prefetch_values_op = self.transform(
+              self._rows[..., :self.params.dim])
+        elif self.params.bp_v2:
+          r, self.exists = self.params.lookup(self.ids, return_exists=True)
+          self.prefetch_values_op = self.transform(self._from_params(r))
+        else:
+          self.prefetch_values_op = self.transform(
+              self._from_params(self.params.lookup(self.ids)))
     return self.prefetch_values_op
 
+  def _from_params(self, values):
+    """Casts `values` of `params` to the dtype of the wrapper, which differs
+    for optimizer slots stored in reduced precision."""
+    if values.dtype.base_dtype == self.dtype.base_dtype:
+      return values
+    return math_ops.cast(values, self.dtype)
+
+  def _to_params(self, values):
+    """Casts `values` of the wrapper to the value dtype of `params`."""
+    if values.dtype.base_dtype == self.params.value_dtype:
+      return values
+    return math_ops.cast(values, self.params.value_dtype)
+
+  def _set_prefetched_values(self, values, exists=None):
+    """Serves `values` looked up beforehand, with `exists` for bp_v2, as the
+    values of the ids instead of looking them up on the first read. With
+    `colocated_slots` the `values` are whole rows, and `exists` is required."""
+    if self.params.colocated_slots:
+      self._rows, self._rows_exists = values, exists
+      values = values[..., :self.params.dim]
+    if self.params.bp_v2 or self.params.colocated_slots:
+      self.exists = exists
+    self.prefetch_values_op = self.transform(values)
+
+  def _slot_values(self, slot):
+    """Returns the values of the colocated optimizer `slot`, sliced from the
+    rows looked up for the ids, with the default of the slot for the ids
+    missing in the table."""
+    if self._rows is None:
+      self.prefetch_values()
+    dim = self.params.dim
+    values = self._rows[...,
+                        dim * slot._slot_index:dim * (slot._slot_index + 1)]
+    return array_ops.where_v2(array_ops.expand_dims(self._rows_exists, -1),
+                              values, slot._slot_default)
+
+  def _colocated_rows(self, values):
+    """Joins `values` with the current values of the colocated optimizer
+    slots into whole rows. The blocks of the rows no slot is tracked for are
+    kept as looked up."""
+    slots = {
+        s._slot_index: s for s in self._tracked_slots if s._primary is self
+    }
+    dim = self.params.dim
+    blocks = [values]
+    for index in range(1, self.params.colocated_slots + 1):
+      if index in slots:
+        blocks.append(slots[index].read_value(False))
+      else:
+        blocks.append(self._rows[..., dim * index:dim * (index + 1)])
+    return array_ops.concat(blocks, -1)
+
   def __repr__(self):
     if context.executing_eagerly() and not self._in_graph_mode:
       return "<tf.Variable '%s' shape=%s dtype=%s, numpy=%s>" % (
@@ -423,7 +502,18 @@ class TrainableWrapper(resource_variable_ops.ResourceVariable):
       )
 
   def update_op(self, v0=None):
+    if self._primary is not None:
+      # The slot is written along with the values by its primary.
+      return control_flow_ops.no_op()
     v1 = self.read_value(False)
+    if self.params.colocated_slots:
+      # One write covers the values and all the slots of the rows.
+      v1 = self._colocated_rows(v1)
+      if v0 is not None:
+        v0 = array_ops.concat([v0, self._rows[..., self.params.dim:]], -1)
+    v1 = self._to_params(v1)
+    if v0 is not None:
+      v0 = self._to_params(v0)
     if self.params.bp_v2:
       assert v0 is not None
       update_param_op = self.params.accum(self.ids, v0, v1, self.exists)
@@ -522,7 +612,9 @@ class TrainableWrapper(resource_variable_ops.ResourceVariable):
         self._tracked_slots.append(s)
 
     if self.params.restrict_policy is not None:
-      self.params.restrict_policy._track_params_from_optimizer_slots(slots)
+      # The colocated slots are restricted along with the rows of params.
+      self.params.restrict_policy._track_params_from_optimizer_slots(
+          [s for s in slots if s.params is not self.params])
 
   def _reset_ids(self, ids):
     self.ids = ids
@@ -571,6 +663,29 @@ def embedding_lookup(
           Only provided if `return_trainable` is True. If in eager mode,
           it will be a `ShadowVariable`, which is eager derivative of TrainableWrapper.
     """
+  return _embedding_lookup(params,
+                           ids,
+                           partition_strategy=partition_strategy,
+                           name=name,
+                           validate_indices=validate_indices,
+                           max_norm=max_norm,
+                           return_trainable=return_trainable)
+
+
+def _embedding_lookup(params,
+                      ids,
+                      partition_strategy=None,
+                      name=None,
+                      validate_indices=None,
+                      max_norm=None,
+                      return_trainable=False,
+                      prefetched=None,
+                      dtype=None):
+  """`embedding_lookup`, which loads the pair of values and exists tensors
+  `prefetched` into the TrainableWrapper if set, instead of looking them up.
+  The TrainableWrapper has the dtype `dtype` if set, which the values of
+  `params` are cast to.
+  """
   if isinstance(params, (list, tuple)) and len(params) > 1:
     raise ValueError("Only one params is allowed.")
   if isinstance(params, (list, tuple)):
@@ -601,13 +716,13 @@ def embedding_lookup(
       initial_shape = (1, params.dim)
       embeddings_shape = array_ops.concat([array_ops.shape(ids), [params.dim]],
                                           axis=0)
-    initial_value = array_ops.zeros(shape=initial_shape,
-                                    dtype=params.value_dtype)
+    dtype = dtype or params.value_dtype
+    initial_value = array_ops.zeros(shape=initial_shape, dtype=dtype)
     if (isinstance(initial_value, Tensor) and hasattr(initial_value, "graph")
         and initial_value.graph.building_function):
 
       def initial_value():
-        return array_ops.zeros(initial_shape, dtype=params.value_dtype)
+        return array_ops.zeros(initial_shape, dtype=dtype)
 
     with ops.colocate_with(None, ignore_existing=True):
       collections = [ops.GraphKeys.LOCAL_VARIABLES]
@@ -627,7 +742,7 @@ def embedding_lookup(
                                         ids=ids,
                                         max_norm=max_norm,
                                         initial_value=initial_value,
-                                        dtype=params.value_dtype,
+                                        dtype=dtype,
                                         trainable=params.trainable,
                                         collections=collections,
                                         model_mode=ModelMode.CURRENT_SETTING,
@@ -643,7 +758,8 @@ def embedding_lookup(
                   name=trainable_name,
                   max_norm=max_norm,
                   trainable=params.trainable,
-                  model_mode=ModelMode.CURRENT_SETTING)
+                  model_mode=ModelMode.CURRENT_SETTING,
+                  dtype=dtype)
               params._trainable_store[trainable_name] = shadow
           return shadow
 
@@ -676,12 +792,16 @@ def embedding_lookup(
       else:
         trainable_device = trainable_
       if isinstance(trainable_device, de.shadow_ops.ShadowVariable):
-        embeddings = de.shadow_ops.embedding_lookup(
-            trainable_device,
-            ids,
-            partition_strategy=partition_strategy,
-            name=name,
-            validate_indices=validate_indices)
+        if prefetched is not None:
+          embeddings = de.shadow_ops._embedding_lookup_prefetched(
+              trainable_device, ids, prefetched[0], prefetched[1])
+        else:
+          embeddings = de.shadow_ops.embedding_lookup(
+              trainable_device,
+              ids,
+              partition_strategy=partition_strategy,
+              name=name,
+              validate_indices=validate_indices)
         if return_trainable:
           if not context.executing_eagerly():
             raise NotImplementedError(
@@ -691,6 +811,8 @@ def embedding_lookup(
                 ' APIs inside tf.function scope.')
           return embeddings, trainable_
         return embeddings
+      if prefetched is not None and isinstance(trainable_, TrainableWrapper):
+        trainable_._set_prefetched_values(prefetched[0], prefetched[1])
 
     embeddings = trainable_
     embeddings = array_ops.reshape(embeddings, shape=embeddings_shape)
@@ -751,6 +873,134 @@ def embedding_lookup_unique(params,
     return (embeddings, trainable_) if return_trainable else embeddings
 
 
+def embedding_lookup_shared(params,
+                            ids_list,
+                            name=None,
+                            max_norm=None,
+                            return_trainable=False):
+  """Looks up several id tensors of features sharing one `params` at once.
+
+  The ids of all the features are concatenated and deduplicated, so the
+  embeddings of all of them are looked up by a single partitioned lookup,
+  and then split back per feature. A single TrainableWrapper covers the
+  unique ids, so the gradients of all the features are applied to `params`
+  in one sparse update, with the gradients of shared ids summed.
+
+  Args:
+    params: A dynamic_embedding.Variable instance.
+    ids_list: A list of tensors of any shape, with the same dtype as
+      params.key_dtype.
+    name: A name for the operation. Name is optional in graph mode and required
+      in eager mode.
+    max_norm: If not `None`, each embedding is clipped if its l2-norm is larger
+      than this value.
+    return_trainable: optional, If True, also return TrainableWrapper
+
+  Returns:
+    A list of tensors, the i-th with shape [shape of ids_list[i]] + [dim],
+      dim is equal to the value dim of params.
+      containing the values from the params tensor(s) for keys in ids_list[i].
+    trainable_wrap:
+      A TrainableWrapper object used to fill the Optimizers `var_list`
+        Only provided if `return_trainable` is True.
+
+  Raises:
+    ValueError: If `ids_list` is not a non-empty list of tensors.
+  """
+  if not isinstance(ids_list, (list, tuple)) or not ids_list:
+    raise ValueError("ids_list should be a non-empty list of tensors.")
+  with ops.name_scope(name, "EmbeddingLookupShared", [params] + list(ids_list)):
+    ids_list = [ops.convert_to_tensor(ids) for ids in ids_list]
+    ids_flat = [array_ops.reshape(ids, [-1]) for ids in ids_list]
+    sizes = stack([array_ops.size(ids) for ids in ids_flat])
+    unique_ids, idx = array_ops.unique(array_ops.concat(ids_flat, 0))
+    if return_trainable:
+      unique_embeddings, trainable_ = embedding_lookup(params,
+                                                       unique_ids,
+                                                       name=name,
+                                                       max_norm=max_norm,
+                                                       return_trainable=True)
+    else:
+      unique_embeddings = embedding_lookup(params,
+                                           unique_ids,
+                                           name=name,
+                                           max_norm=max_norm)
+    embeddings_flat = array_ops.split(array_ops.gather(unique_embeddings, idx),
+                                      sizes,
+                                      num=len(ids_list))
+    embeddings = []
+    for ids, emb in zip(ids_list, embeddings_flat):
+      emb = array_ops.reshape(
+          emb, array_ops.concat([array_ops.shape(ids), [params.dim]], 0))
+      emb.set_shape(ids.get_shape().concatenate([params.dim]))
+      embeddings.append(emb)
+    return (embeddings, trainable_) if return_trainable else embeddings
+
+
+def embedding_lookup_group(params_list, ids_list, name=None, max_norm=None):
+  """Looks up `ids_list[i]` in `params_list[i]` for many Variables at once.
+
+  Works as `embedding_lookup` on every pair, except that the lookups of all
+  the Variables are issued together: the shards on CPU `CuckooHashTable`s
+  sharing a device are looked up by a single op on that device, instead of
+  an op, and a round trip to a parameter server, per shard. The
+  TrainableWrappers are then served the values looked up here.
+
+  Args:
+    params_list: A list of dynamic_embedding.Variable instances.
+    ids_list: A list of tensors with any shape, `ids_list[i]` with the same
+      dtype as `params_list[i].key_dtype`.
+    name: A name for the operation. Name is optional in graph mode and required
+      in eager mode.
+    max_norm: If not `None`, each embedding is clipped if its l2-norm is larger
+      than this value.
+
+  Returns:
+    A list of tensors, the i-th with shape [shape of ids_list[i]] + [dim],
+      dim is equal to the value dim of params_list[i].
+      containing the values from the params tensor(s) for keys in ids_list[i].
+
+  Raises:
+    ValueError: If `params_list` and `ids_list` differ in length.
+  """
+  if len(params_list) != len(ids_list):
+    raise ValueError(
+        "params_list and ids_list should have the same length: {} vs. {}".
+        format(len(params_list), len(ids_list)))
+  if context.executing_eagerly() and (name is None):
+    raise ValueError(
+        'Must specify a name for dynamic_embedding.embedding_lookup_group when '
+        'running eagerly.')
+  for params, ids in zip(params_list, ids_list):
+    if not isinstance(params, de.Variable):
+      raise TypeError("params should be a Variable instance.")
+    if params.key_dtype != ids.dtype:
+      raise TypeError(
+          "params.key_dtype should be same with ids.dtype: {} vs. {}".format(
+              params.key_dtype, ids.dtype))
+
+  with ops.name_scope(name, "EmbeddingLookupGroup"):
+    ids_list = [ops.convert_to_tensor(ids, name="ids") for ids in ids_list]
+    # Whole rows are served to the Variables with colocated slots.
+    results = _lookup_rows_group(
+        params_list, [array_ops.reshape(ids, [-1]) for ids in ids_list],
+        return_exists=True)
+  embeddings = []
+  for i, (params, ids,
+          (values, exists)) in enumerate(zip(params_list, ids_list, results)):
+    ids_shape = array_ops.shape(ids)
+    values = array_ops.reshape(
+        values, array_ops.concat([ids_shape, [params._row_dim]], 0))
+    exists = array_ops.reshape(exists, ids_shape)
+    embeddings.append(
+        _embedding_lookup(params,
+                          ids,
+                          name=None if name is None else "%s_%d" % (name, i),
+                          max_norm=max_norm,
+                          prefetched=(values, exists)))
+  return embeddings
+
+
 def embedding_lookup_sparse(
     params,
     sp_ids,
@@ -1136,12 +1386,19 @@ def get_model_mode():
 
 def enable_train_mode():
   """ enable train mode.
+
+  The variables frozen by the lookups built in inference mode are thawed, at
+  once when executing eagerly, else by the writes built afterwards.
   """
   ModelMode.CURRENT_SETTING = ModelMode.TRAIN
+  _thaw_inference_frozen_variables()
 
 
 def enable_inference_mode():
   """ set inference mode.
+
+  The CPU `CuckooHashTable`s read by the embedding lookups built afterwards
+  are frozen before their first lookup, see `Variable.freeze`.
   """
   ModelMode.CURRENT_SETTING = ModelMode.INFERENCE
 
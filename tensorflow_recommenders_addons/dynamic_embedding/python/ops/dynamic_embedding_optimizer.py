@@ -54,6 +54,10 @@ try:  # tf version >= 2.14.0
 except:
   from tensorflow.python.ops.control_flow_ops import cond
 from tensorflow.python.platform import tf_logging as logging
+from tensorflow.python.training import adagrad as adagrad_v1
+from tensorflow.python.training import adam as adam_v1
+from tensorflow.python.training import ftrl as ftrl_v1
+from tensorflow.python.training import gradient_descent as gradient_descent_v1
 from tensorflow.python.training import optimizer
 from tensorflow.python.training import slot_creator
 try:
@@ -81,6 +85,7 @@ try:  # The data_structures has been moved to the new package in tf 2.11
 except:
   from tensorflow.python.training.tracking import data_structures
 from tensorflow_recommenders_addons.dynamic_embedding.python.ops.dynamic_embedding_ops import DistributedVariableWrapper, TrainableWrapperDistributedPolicy
+from tensorflow_recommenders_addons.dynamic_embedding.python.ops.dynamic_embedding_ops import _embedding_lookup
 from tensorflow_recommenders_addons.dynamic_embedding.python.ops.dynamic_embedding_ops import trainable_wrapper_filter
 from tensorflow_recommenders_addons.utils.check_platform import is_macos, is_arm64
 
@@ -92,7 +97,12 @@ except Exception as e:
   hvd = None
 
 
-def DynamicEmbeddingOptimizer(self, bp_v2=False, synchronous=False, **kwargs):
+def DynamicEmbeddingOptimizer(self,
+                              bp_v2=False,
+                              synchronous=False,
+                              slot_dtype=None,
+                              apply_in_table=False,
+                              **kwargs):
   """ An optimizer wrapper to make any TensorFlow optimizer capable of training
   Dynamic Embeddding Variables.
 
@@ -103,6 +113,22 @@ def DynamicEmbeddingOptimizer(self, bp_v2=False, synchronous=False, **kwargs):
       distributed asynchronous training. Reference: https://www.usenix.org/system/files/osdi20-jiang.pdf
     synchronous: If True, we will use DE custom all-reduce method(now implemented by horovod) to merge the dense grad of model parameter, 
       the default reduce method is SUM. For TrainableWrapper's grad, keep same with before.
+    slot_dtype: If set, e.g. to `tf.bfloat16` or `tf.float16`, the first moment
+      and momentum slots of the Dynamic Embedding Variables, such as Adam `m`,
+      are stored in tables of this value dtype. They are cast to the dtype of
+      the embeddings when looked up for the apply, and back when written.
+      Accumulators of squared gradients, such as Adam `v` or the Adagrad
+      `accumulator`, keep the value dtype of the Variables: small squared
+      gradients underflow float16, and their decay is below the resolution of
+      bfloat16. Slots colocated in the rows of the Variables keep their dtype.
+      Default is None, the value dtype of the Variables.
+    apply_in_table: If True, plain SGD, Adagrad, Adam and Ftrl optimizers of
+      `tf.compat.v1.train` or legacy Keras update the rows of Dynamic Embedding
+      Variables in place inside their tables, when all the slots are colocated
+      in the rows and every table is a `CuckooHashTable` on CPU. The gradients
+      of repeated ids are then summed, as for dense variables, and the rows
+      are updated in the tables instead of being written back through `bp_v2`.
+      Other Variables are trained as usual. Default is False.
 
   Example usage:
 
@@ -116,6 +142,9 @@ def DynamicEmbeddingOptimizer(self, bp_v2=False, synchronous=False, **kwargs):
   """
   self._bp_v2 = bp_v2
   self._custom_sync = synchronous
+  self._slot_dtype = (dtypes.as_dtype(slot_dtype)
+                      if slot_dtype is not None else None)
+  self._in_table_apply = apply_in_table
 
   original_apply_gradients = self.apply_gradients
   if hasattr(self, 'add_variable_from_reference'):
@@ -164,6 +193,11 @@ def DynamicEmbeddingOptimizer(self, bp_v2=False, synchronous=False, **kwargs):
             s0 = [_s.read_value() for _s in _slots]
             _before = [v0] + s0
 
+          with ops.control_dependencies(_before):
+            _apply_op = _apply_in_table(self, var, grad, _slots, v0, s0)
+          if _apply_op is not None:
+            return _apply_op
+
           if isinstance(grad, IndexedSlices):
             if var.constraint is not None:
               raise RuntimeError(
@@ -271,8 +305,12 @@ def DynamicEmbeddingOptimizer(self, bp_v2=False, synchronous=False, **kwargs):
             var_check = var
 
           if isinstance(var_check, de.TrainableWrapper):
-            weight = de.create_slots(var, initial_value, slot_name,
-                                     var._shared_name, self._bp_v2)
+            weight = de.create_slots(var,
+                                     initial_value,
+                                     slot_name,
+                                     var._shared_name,
+                                     self._bp_v2,
+                                     slot_dtype=self._slot_dtype)
             # Record the optimizer Variable into trace.
             for _de_opt_var in var_check._optimizer_vars.value:
               self._track_trackable(_de_opt_var, _de_opt_var.name)
@@ -389,8 +427,12 @@ def DynamicEmbeddingOptimizer(self, bp_v2=False, synchronous=False, **kwargs):
     else:
       var_check = model_variable
     if isinstance(var_check, de.TrainableWrapper):
-      variable = de.create_slots(model_variable, initial_value, variable_name,
-                                 model_variable._shared_name, self._bp_v2)
+      variable = de.create_slots(model_variable,
+                                 initial_value,
+                                 variable_name,
+                                 model_variable._shared_name,
+                                 self._bp_v2,
+                                 slot_dtype=self._slot_dtype)
       self._variables.append(variable)
       # Record the optimizer Variable into trace.
       for _de_opt_var in var_check._optimizer_vars.value:
@@ -446,8 +488,12 @@ def DynamicEmbeddingOptimizer(self, bp_v2=False, synchronous=False, **kwargs):
     named_slots = self._slot_dict(slot_name)
     if optimizer._var_key(var) not in named_slots:
       if isinstance(var, de.TrainableWrapper):
-        new_slot_variable = de.create_slots(var, val, slot_name, op_name,
-                                            self._bp_v2)
+        new_slot_variable = de.create_slots(var,
+                                            val,
+                                            slot_name,
+                                            op_name,
+                                            self._bp_v2,
+                                            slot_dtype=self._slot_dtype)
       else:
         new_slot_variable = slot_creator.create_slot(var, val, op_name)
       self._restore_slot_variable(slot_name=slot_name,
@@ -475,8 +521,12 @@ def DynamicEmbeddingOptimizer(self, bp_v2=False, synchronous=False, **kwargs):
     named_slots = self._slot_dict(slot_name)
     if optimizer._var_key(var) not in named_slots:
       if isinstance(var, de.TrainableWrapper):
-        new_slot_variable = de.create_slots(var, initializer, slot_name,
-                                            op_name, self._bp_v2)
+        new_slot_variable = de.create_slots(var,
+                                            initializer,
+                                            slot_name,
+                                            op_name,
+                                            self._bp_v2,
+                                            slot_dtype=self._slot_dtype)
       else:
         new_slot_variable = slot_creator.create_slot_with_initializer(
             var, initializer, shape, dtype, op_name)
@@ -501,8 +551,12 @@ def DynamicEmbeddingOptimizer(self, bp_v2=False, synchronous=False, **kwargs):
     named_slots = self._slot_dict(slot_name)
     if optimizer._var_key(var) not in named_slots:
       if isinstance(var, de.TrainableWrapper):
-        new_slot_variable = de.create_slots(var, 0.0, slot_name, op_name,
-                                            self._bp_v2)
+        new_slot_variable = de.create_slots(var,
+                                            0.0,
+                                            slot_name,
+                                            op_name,
+                                            self._bp_v2,
+                                            slot_dtype=self._slot_dtype)
       else:
         new_slot_variable = slot_creator.create_zeros_slot(var, op_name)
       self._restore_slot_variable(slot_name=slot_name,
@@ -858,8 +912,23 @@ def DynamicEmbeddingOptimizer(self, bp_v2=False, synchronous=False, **kwargs):
   return self
 
 
-def create_slots(variable, init, slot_name, op_name, bp_v2):
-  """Helper function for creating a slot variable for statefull optimizers."""
+# The slots which may be stored in a reduced precision `slot_dtype`. They
+# track gradients linearly, unlike the accumulators of squared gradients.
+_REDUCED_PRECISION_SLOTS = ("m", "momentum", "mom", "mg", "average_gradient")
+
+
+def create_slots(variable, init, slot_name, op_name, bp_v2, slot_dtype=None):
+  """Helper function for creating a slot variable for statefull optimizers.
+
+  If the params of `variable` have `colocated_slots`, the slot is a view of a
+  block of their rows instead of a Variable of its own, and it is written
+  along with the values the same way, regardless of `bp_v2`. Otherwise the
+  Variable of the slot has the value dtype `slot_dtype` if set and the slot
+  is one of `_REDUCED_PRECISION_SLOTS`, and the slot is cast to the dtype of
+  `variable` when read.
+  """
+  if slot_name not in _REDUCED_PRECISION_SLOTS:
+    slot_dtype = None
   if distribute_utils.is_distributed_variable(variable):
     strategy_devices = variable.distribute_strategy.extended.worker_devices
     primary = variable._get_on_device_or_primary()
@@ -871,12 +940,19 @@ def create_slots(variable, init, slot_name, op_name, bp_v2):
 
   scope_store = variable_scope._get_default_variable_store()
   full_name = params_var_.name + "/" + op_name + "/" + slot_name
-  if full_name not in scope_store._vars:
+  colocation = {}
+  if params_var_.colocated_slots:
+    colocation = dict(
+        slot_index=params_var_._colocated_slot_index(op_name + "/" + slot_name),
+        slot_default=params_var_._convert_anything_to_init(
+            init, params_var_.dim, set_initializer=False))
+  elif full_name not in scope_store._vars:
+    slot_bp_v2 = bp_v2 if bp_v2 is not None else params_var_.bp_v2
     with ops.colocate_with(primary, ignore_existing=True):
       slot_variable_ = de.Variable(
           name=full_name,
           key_dtype=params_var_.key_dtype,
-          value_dtype=params_var_.value_dtype,
+          value_dtype=slot_dtype or params_var_.value_dtype,
           dim=params_var_.dim,
           devices=params_var_.devices,
           partitioner=params_var_.partition_fn,
@@ -885,10 +961,16 @@ def create_slots(variable, init, slot_name, op_name, bp_v2):
           kv_creator=params_var_.kv_creator,
           trainable=False,
           checkpoint=params_var_.checkpoint,
-          bp_v2=bp_v2 if bp_v2 is not None else params_var_.bp_v2)
+          bp_v2=slot_bp_v2,
+          write_buffer_steps=params_var_.write_buffer_steps
+          if slot_bp_v2 else 0,
+          write_buffer_keys=params_var_.write_buffer_keys,
+          delta_dtype=params_var_.delta_dtype if slot_bp_v2 else None)
 
     scope_store._vars[full_name] = slot_variable_
     primary._optimizer_vars.value.append(slot_variable_)
+  # A colocated slot lives in the rows of params.
+  slot_params = params_var_ if colocation else scope_store._vars[full_name]
 
   slot_trainable = None
   if context.executing_eagerly():
@@ -908,13 +990,31 @@ def create_slots(variable, init, slot_name, op_name, bp_v2):
           exists=var_impl.exists,
           name=full_name_in,
           trainable=False,
+          dtype=var_impl.dtype,
+          **colocation,
       )
+    elif colocation:
+      with ops.colocate_with(None, ignore_existing=True):
+        slot_trainable = de.TrainableWrapper(
+            params=scope_store_params,
+            ids=var_impl.ids,
+            max_norm=None,
+            initial_value=array_ops.zeros((1, scope_store_params.dim),
+                                          dtype=scope_store_params.value_dtype),
+            dtype=scope_store_params.value_dtype,
+            trainable=False,
+            collections=[ops.GraphKeys.LOCAL_VARIABLES],
+            model_mode=de.ModelMode.CURRENT_SETTING,
+            name=slot_tw_name_in,
+            primary=var_impl,
+            **colocation)
     else:
-      _, slot_trainable = de.embedding_lookup(
+      _, slot_trainable = _embedding_lookup(
           params=scope_store_params,
           ids=var_impl.ids,
           name=slot_tw_name_in,
           return_trainable=True,
+          dtype=var_impl.dtype,
       )
     return slot_trainable
 
@@ -930,16 +1030,137 @@ def create_slots(variable, init, slot_name, op_name, bp_v2):
         with context.device_policy(context.DEVICE_PLACEMENT_SILENT):
           with tape.stop_recording():
             slot_variable_impl.as_list().append(
-                slot_trainable_create_(variable.values[i],
-                                       scope_store._vars[full_name],
+                slot_trainable_create_(variable.values[i], slot_params,
                                        full_name_replica, slot_tw_name_replica))
     slot_trainable = DistributedVariableWrapper(
         variable.distribute_strategy, slot_variable_impl.as_list(),
         VariableAggregation.NONE,
         TrainableWrapperDistributedPolicy(VariableAggregation.NONE))
   else:
-    slot_trainable = slot_trainable_create_(variable,
-                                            scope_store._vars[full_name],
-                                            full_name, slot_tw_name)
+    slot_trainable = slot_trainable_create_(variable, slot_params, full_name,
+                                            slot_tw_name)
 
   return slot_trainable
+
+
+def _in_table_optimizer(opt):
+  """Returns the name `CuckooHashTable.apply_optimizer` knows `opt` by and the
+  names of its slots in row order, or None if it is not applied in tables."""
+
+  def _is_zero(value):
+    return isinstance(value, (int, float)) and value == 0
+
+  kind = type(opt)
+  if kind is gradient_descent_v1.GradientDescentOptimizer:
+    return "sgd", []
+  if kind is adagrad_v1.AdagradOptimizer:
+    return "adagrad", ["accumulator"]
+  if kind is adam_v1.AdamOptimizer:
+    return "adam", ["m", "v"]
+  if kind is ftrl_v1.FtrlOptimizer:
+    if not _is_zero(opt._l2_shrinkage_regularization_strength):
+      return None
+    return "ftrl", ["accum", "linear"]
+  # The legacy Keras optimizers, which may come from several Keras packages.
+  if not (hasattr(opt, "_distributed_apply") and "keras" in kind.__module__):
+    return None
+  if kind.__name__ == "SGD" and not opt._momentum:
+    return "sgd", []
+  if kind.__name__ == "Adagrad":
+    return "adagrad", ["accumulator"]
+  if kind.__name__ == "Adam" and not opt.amsgrad:
+    return "adam", ["m", "v"]
+  if kind.__name__ == "Ftrl" and _is_zero(
+      opt._l2_shrinkage_regularization_strength):
+    return "ftrl", ["accumulator", "linear"]
+  return None
+
+
+def _in_table_hyperparams(opt, kind, dtype):
+  """Returns the hyperparameters of the `kind` optimizer `opt` for
+  `CuckooHashTable.apply_optimizer`, as the training ops of `opt` get them."""
+  if isinstance(opt, optimizer.Optimizer):
+    if kind == "adam":
+      beta1_power, beta2_power = opt._get_beta_accumulators()
+      lr = (opt._lr_t * math_ops.sqrt(1 - beta2_power) / (1 - beta1_power))
+      hyperparams = [lr, opt._beta1_t, opt._beta2_t, opt._epsilon_t]
+    elif kind == "ftrl":
+      l2 = getattr(opt, "_adjusted_l2_regularization_strength_tensor",
+                   opt._l2_regularization_strength_tensor)
+      hyperparams = [
+          opt._learning_rate_tensor, opt._l1_regularization_strength_tensor, l2,
+          opt._learning_rate_power_tensor
+      ]
+    elif kind == "adagrad":
+      hyperparams = [opt._learning_rate_tensor, 0.0]
+    else:
+      hyperparams = [opt._learning_rate_tensor]
+  else:
+    lr = opt._decayed_lr(dtype)
+    if kind == "adam":
+      step = math_ops.cast(opt.iterations + 1, dtype)
+      beta1 = opt._get_hyper("beta_1", dtype)
+      beta2 = opt._get_hyper("beta_2", dtype)
+      lr_t = lr * (math_ops.sqrt(1 - math_ops.pow(beta2, step)) /
+                   (1 - math_ops.pow(beta1, step)))
+      hyperparams = [lr_t, beta1, beta2, opt.epsilon]
+    elif kind == "ftrl":
+      l2 = opt._get_hyper("l2_regularization_strength", dtype)
+      if "beta" in opt._hyper:
+        l2 += opt._get_hyper("beta", dtype) / (2. * lr)
+      hyperparams = [
+          lr,
+          opt._get_hyper("l1_regularization_strength", dtype), l2,
+          opt._get_hyper("learning_rate_power", dtype)
+      ]
+    elif kind == "adagrad":
+      hyperparams = [lr, opt.epsilon]
+    else:
+      hyperparams = [lr]
+  return array_ops.stack([math_ops.cast(h, dtype) for h in hyperparams])
+
+
+def _apply_in_table(opt, var, grad, slots, v0, s0):
+  """Applies `grad` of the TrainableWrapper `var` to its rows in the tables.
+
+  The rows are updated in place by `CuckooHashTable.apply_optimizer`, instead
+  of applying `opt` to `var` and its `slots` and writing them back with
+  `update_op`. `v0` and `s0` are the values read of `var` and `slots`, the
+  rows of the missing keys start from them.
+
+  Returns the update op, or None if `var` does not qualify: `opt` must be an
+  optimizer the tables apply, wrapped with `apply_in_table`, with its slots
+  colocated in the rows of a Variable whose tables are all `CuckooHashTable`s
+  on CPU, and which buffers no writes.
+  """
+  if not getattr(opt, "_in_table_apply", False):
+    return None
+  in_table = _in_table_optimizer(opt)
+  if in_table is None:
+    return None
+  kind, slot_names = in_table
+  params = var.params
+  if (params.value_dtype not in (dtypes.float32, dtypes.float64)
+      or params._write_buffer is not None or var.max_norm is not None
+      or var.constraint is not None or params.colocated_slots != len(slot_names)
+      or len(params._freezable_table_indices()) != params.shard_num):
+    return None
+
+  init_rows = [v0]
+  for i, slot_name in enumerate(slot_names):
+    slot = opt.get_slot(var, slot_name)
+    if getattr(slot, "_primary", None) is not var or slot._slot_index != i + 1:
+      return None
+    init_rows.append(next(s0[j] for j, s in enumerate(slots) if s is slot))
+
+  if isinstance(grad, IndexedSlices):
+    grad = ops.convert_to_tensor(grad)
+  dtype = params.value_dtype
+  update_op = params._apply_optimizer(var.ids, grad,
+                                      array_ops.concat(init_rows, -1),
+                                      _in_table_hyperparams(opt, kind, dtype),
+                                      kind)
+  if params.restrict_policy is not None:
+    update_status_op = params.restrict_policy.apply_update(var.ids)
+    return control_flow_ops.group([update_op, update_status_op])
+  return update_op
@@ -21,9 +21,11 @@ See [Sparse Domain Isolation](https://github.com/tensorflow/community/pull/237)
 import functools
 import re
 import typing
+import weakref
 import tensorflow as tf
 
 from tensorflow_recommenders_addons import dynamic_embedding as de
+from tensorflow_recommenders_addons.dynamic_embedding.python.ops import cuckoo_hashtable_ops
 from tensorflow_recommenders_addons.utils.check_platform import is_macos, is_arm64
 
 try:
@@ -44,6 +46,7 @@ from tensorflow.python.client import device_lib
 from tensorflow.python.eager import context
 from tensorflow.python.eager import def_function
 from tensorflow.python.framework import constant_op
+from tensorflow.python.framework import device as pydev
 from tensorflow.python.framework import dtypes
 from tensorflow.python.framework import ops
 from tensorflow.python.framework import versions
@@ -51,6 +54,7 @@ from tensorflow.python.keras.optimizer_v2.optimizer_v2 import OptimizerV2
 from tensorflow.python.keras.utils import tf_utils
 from tensorflow.python.ops import array_ops
 from tensorflow.python.ops import bitwise_ops
+from tensorflow.python.ops import clip_ops
 from tensorflow.python.ops import control_flow_ops
 from tensorflow.python.ops import data_flow_ops
 from tensorflow.python.ops import gen_functional_ops
@@ -62,6 +66,8 @@ from tensorflow.python.data.ops import dataset_ops
 from tensorflow.python.data.ops import iterator_ops
 from tensorflow.python.ops import math_ops
 from tensorflow.python.ops import parsing_ops
+from tensorflow.python.ops import random_ops
+from tensorflow.python.ops import resource_variable_ops
 from tensorflow.python.ops import string_ops
 from tensorflow.python.ops import tensor_array_ops
 from tensorflow.python.ops import variable_scope
@@ -124,6 +130,124 @@ def make_partition(data, partition_index, shard_num, name=None):
   return partitions, indices
 
 
+def make_multi_partition(data, partition_index, shard_num, name=None):
+  """
+  Shard several tensors to shard_num partitions by the same partition index.
+
+  On CPU the partition index is scanned once for all of the tensors, instead
+  of once per tensor and once more for the indices as `make_partition` does.
+
+  Args:
+    data: a list of tensors, such as keys, values and exists, of the same
+      length in the first dimension.
+    partition_index: partitions index.
+    shard_num: partition number
+  Returns:
+    a pair: (a list with the partition result of each tensor of `data`,
+      partition indices)
+  """
+  if shard_num <= 1:
+    return [[d] for d in data], None
+  if pywrap.IsGoogleCudaEnabled():
+    # Keep the GPU kernels of dynamic_partition.
+    partitions = []
+    indices = None
+    for d in data:
+      d_partitions, indices = make_partition(d, partition_index, shard_num,
+                                             name)
+      partitions.append(d_partitions)
+    return partitions, indices
+  with ops.colocate_with(data[0], ignore_existing=True):
+    with ops.name_scope("data_partitions"):
+      return de.data_flow.multi_dynamic_partition(data, partition_index,
+                                                  shard_num, name)
+
+
+_DELTA_DTYPES = (dtypes.float16, dtypes.bfloat16, dtypes.int8)
+
+# The dtype of the int8 scales, with the range of float32 as the deltas can be
+# tiny. A block of `dim` int8 deltas and its scale only take less than `dim`
+# float16 deltas for `dim` above 2.
+_SCALE_DTYPE = dtypes.bfloat16
+
+
+def _quantize_deltas(deltas, delta_dtype, block_dim):
+  """Quantizes the rows of `deltas` to `delta_dtype`.
+
+  For int8 each `block_dim` wide block of a row has a scale of its own, so
+  the small deltas of a block are not rounded away next to the large ones of
+  another, and the deltas are rounded stochastically, so that the rounding
+  errors cancel out over the steps instead of adding up.
+
+  Returns:
+    A pair: (the quantized deltas, the `_SCALE_DTYPE` scales of the blocks
+      with shape [n, row_dim / block_dim] for int8 or None)
+  """
+  if delta_dtype != dtypes.int8:
+    return math_ops.cast(deltas, delta_dtype), None
+  blocks = array_ops.reshape(deltas, [-1, block_dim])
+  # The deltas are scaled by the rounded scales the tables will see.
+  scales = math_ops.cast(
+      math_ops.reduce_max(math_ops.abs(blocks), axis=-1, keepdims=True) / 127.0,
+      _SCALE_DTYPE)
+  scaled = math_ops.div_no_nan(blocks, math_ops.cast(scales, deltas.dtype))
+  rounded = math_ops.floor(
+      scaled +
+      random_ops.random_uniform(array_ops.shape(scaled), dtype=scaled.dtype))
+  quantized = clip_ops.clip_by_value(rounded, -127.0, 127.0)
+  return (math_ops.cast(array_ops.reshape(quantized, array_ops.shape(deltas)),
+                        dtypes.int8),
+          array_ops.reshape(scales,
+                            array_ops.shape(deltas) // [1, block_dim]))
+
+
+def _dequantize_deltas(quantized, scales, value_dtype, block_dim):
+  deltas = math_ops.cast(quantized, value_dtype)
+  if scales is not None:
+    blocks = array_ops.reshape(deltas, [-1, block_dim])
+    deltas = array_ops.reshape(
+        blocks * math_ops.cast(array_ops.reshape(scales, [-1, 1]), value_dtype),
+        array_ops.shape(deltas))
+  return deltas
+
+
+def _after_flush(saveable_fn, flush_op, *args, **kwargs):
+  """Builds a saveable with `saveable_fn`, saving after `flush_op` wrote the
+  deltas of a write buffer to the tables."""
+  with ops.control_dependencies([flush_op]):
+    return saveable_fn(*args, **kwargs)
+
+
+# The variables frozen by the lookups built in inference mode, which
+# `enable_train_mode` thaws.
+_inference_frozen_variables = weakref.WeakSet()
+
+
+def _thaw_inference_frozen_variables():
+  """Thaws the variables frozen by the lookups built in inference mode, at
+  once when executing eagerly, else by the writes built afterwards."""
+  for var in list(_inference_frozen_variables):
+    if context.executing_eagerly():
+      var.thaw()
+    else:
+      var._thaw_before_write = True
+  _inference_frozen_variables.clear()
+
+
+def _thaw_first(write_fn):
+  """Makes the writes `write_fn` builds wait for the tables to be thawed, once
+  lookups built in inference mode froze them, see `enable_train_mode`."""
+
+  @functools.wraps(write_fn)
+  def _write(self, *args, **kwargs):
+    if not self._thaw_before_write:
+      return write_fn(self, *args, **kwargs)
+    with ops.control_dependencies([self.thaw()]):
+      return write_fn(self, *args, **kwargs)
+
+  return _write
+
+
 def _stitch(values, indices, use_fast=True, name=None):
   if len(values) == 1:
     return values[0]
@@ -167,6 +291,29 @@ def default_partition_fn(keys, shard_num):
   return ids
 
 
+def jump_hash_partition_fn(keys, shard_num):
+  """A consistent hash partition function.
+    partition keys by jump consistent hash.
+
+    Compared with `default_partition_fn`, changing `shard_num` from `n` to `m`
+    only moves the keys which go into or come from the shards
+    `[min(n, m), max(n, m))`, so `load_de_variable_from_file_system` restores
+    each shard only from the saved shards which may hold its keys.
+
+    keys: a tensor presents the keys to be partitioned.
+    shard_num: the num of partitions
+  Returns:
+    a tensor with same shape as keys with type of `tf.int32`,
+      represents the corresponding partition-ids of keys.
+  """
+  if shard_num <= 1:
+    return array_ops.zeros(shape=array_ops.shape(keys), dtype=dtypes.int32)
+
+  keys_op = ops.convert_to_tensor(keys, name="keys")
+  with ops.colocate_with(keys_op):
+    return de.data_flow.jump_hash_partition(keys_op, shard_num)
+
+
 def _list_de_variable_saved_files_from_file_system(de_variable_name,
                                                    de_variable_folder_path,
                                                    proc_size: int = None):
@@ -208,7 +355,8 @@ def _insert_de_shard_from_file_system(
                                   typing.Any] = default_partition_fn,
     proc_size: int = None,
     proc_rank: int = None,
-    buffer_size: int = 4194304):
+    buffer_size: int = 4194304,
+    filter_fn: typing.Callable[[typing.Any], typing.Any] = None):
   """Load DE keys/values files from file system as tensor partitions which fitting number of table shards in present DE variable. 
     Only load files and insert to DE table when shards number of files is not equal to the present DE variable table shards number.
 
@@ -220,6 +368,8 @@ def _insert_de_shard_from_file_system(
     proc_size: Total shards number of current DE in entire nodes system.
     proc_rank: Global shards index of current DE in total nodes.
     buffer_size: Read files buffer size for FixedLengthRecordDataset.
+    filter_fn: Optional callable returning a bool mask of the keys read from
+      files, only the keys in the mask are inserted.
   Returns:
     traverse_files_result: A tensor from loop result, return False if success.
   """
@@ -284,27 +434,26 @@ def _insert_de_shard_from_file_system(
         values_tensor_byte = values_get_next.get_value()
         values_tensor = parsing_ops.decode_raw(values_tensor_byte, _value_dtype)
         values_tensor = array_ops.reshape(values_tensor, (-1, value_dim))
+        if filter_fn is not None:
+          keep = filter_fn(keys_tensor)
+          keys_tensor = array_ops.boolean_mask(keys_tensor, keep)
+          values_tensor = array_ops.boolean_mask(values_tensor, keep)
         if _proc_size == 1:
           local_keys = keys_tensor
           local_values = values_tensor
         else:
           mpi_partition_index = partition_fn(keys_tensor, _proc_size)
-          mpi_keys_partitions, _ = make_partition(keys_tensor,
-                                                  mpi_partition_index,
-                                                  _proc_size)
-          mpi_values_partitions, _ = make_partition(values_tensor,
-                                                    mpi_partition_index,
-                                                    _proc_size)
+          (mpi_keys_partitions,
+           mpi_values_partitions), _ = make_multi_partition(
+               [keys_tensor, values_tensor], mpi_partition_index, _proc_size)
           local_keys = mpi_keys_partitions[_proc_rank]
           local_values = mpi_values_partitions[_proc_rank]
         _insert_ops = tf_utils.ListWrapper([])
         local_partition_index = partition_fn(local_keys, _local_shard_num)
-        local_keys_partitions, _ = make_partition(local_keys,
-                                                  local_partition_index,
-                                                  _local_shard_num)
-        local_values_partitions, _ = make_partition(local_values,
-                                                    local_partition_index,
-                                                    _local_shard_num)
+        (local_keys_partitions,
+         local_values_partitions), _ = make_multi_partition(
+             [local_keys, local_values], local_partition_index,
+             _local_shard_num)
         for local_idx, shard in enumerate(shard_list):
           with ops.name_scope("%s_table_restore" % shard._name):
             _insert_ops.as_list().append(
@@ -327,6 +476,63 @@ def _insert_de_shard_from_file_system(
   return traverse_files_result
 
 
+def _reshard_de_variable_from_file_system(de_variable,
+                                          shard_list,
+                                          de_variable_folder_path,
+                                          prev_shard_num,
+                                          buffer_size: int = 4194304):
+  """Restores the shards of a DE partitioned by `jump_hash_partition_fn` from
+    files saved with another number of shards by a single process.
+
+    With jump consistent hash, going from `n` to `m` shards, the keys of new
+    shard `b` come from saved shard `b` if `b < n`, and from the saved shards
+    `[m, n)` when shrinking or from every saved shard when `b >= n`. Each
+    shard reads only those files, on its own device, and keeps the keys
+    mapping to it, so growing from 8 to 12 shards moves about 1/3 of the keys.
+
+    de_variable: A present DynamicEmbedding Variable obeject.
+    shard_list: A list of local DynamicEmbedding Variable shard table.
+    de_variable_folder_path: A directory path which saved DynamicEmbedding table shards before.
+    prev_shard_num: A int32 scalar tensor, the shards number of saved files.
+    buffer_size: Read files buffer size for FixedLengthRecordDataset.
+  Returns:
+    load_op: A TF Operation contains a flow to load shard table.
+  """
+  shard_num = len(shard_list)
+  de_variable_saveable_name = string_ops.regex_replace(de_variable.name, "/",
+                                                       "_")
+  shard_name_base_dir = string_ops.string_join(
+      [de_variable_folder_path, de_variable_saveable_name], separator='/')
+
+  def _shard_files(saved_idx, suffix):
+    return string_ops.string_join([
+        shard_name_base_dir, '_mht_',
+        string_ops.as_string(saved_idx + 1), 'of',
+        string_ops.as_string(prev_shard_num), '_rank0_size1', suffix
+    ])
+
+  load_ops = []
+  for idx, shard in enumerate(shard_list):
+    # Read the files on the host of the shard.
+    with ops.device(de_variable.devices[idx]), ops.device("CPU"):
+      own_shard = math_ops.range(idx, math_ops.minimum(idx + 1, prev_shard_num))
+      moved_start = array_ops.where(idx >= prev_shard_num, 0, shard_num)
+      moved_shards = math_ops.range(moved_start, prev_shard_num)
+      saved_idx = array_ops.concat([own_shard, moved_shards], 0)
+
+      def _filter_fn(keys, idx=idx):
+        return math_ops.equal(jump_hash_partition_fn(keys, shard_num), idx)
+
+      load_ops.append(
+          _insert_de_shard_from_file_system([shard],
+                                            de_variable._row_dim,
+                                            _shard_files(saved_idx, '-keys'),
+                                            _shard_files(saved_idx, '-values'),
+                                            buffer_size=buffer_size,
+                                            filter_fn=_filter_fn))
+  return control_flow_ops.group(load_ops)
+
+
 def load_de_variable_from_file_system(de_variable,
                                       de_variable_folder_dir,
                                       proc_size: int = None,
@@ -335,7 +541,8 @@ def load_de_variable_from_file_system(de_variable,
   """Load DE keys/values files from file system or tensor array 
       which generated from load_de_variable_from_file_system function. 
     Load files directly when _de_now_global_shard_num == _de_prev_global_shard_num or _de_now_global_shard_num == 1.
-    Otherwith insert tensor from files.
+    Otherwith insert tensor from files. For a DE partitioned by `jump_hash_partition_fn` in a single process,
+    each shard only reads the saved shards which may hold its keys.
 
     de_variable: A present DynamicEmbedding Variable obeject.
     shard: A present DynamicEmbedding Variable table obeject.
@@ -399,12 +606,17 @@ def load_de_variable_from_file_system(de_variable,
                                            buffer_size=buffer_size)
 
     def insert_de_table():
+      if de_variable.partition_fn is jump_hash_partition_fn and _proc_size == 1:
+        with ops.name_scope(de_variable.name):
+          return _reshard_de_variable_from_file_system(
+              de_variable, _shard_list.as_list(), de_variable_folder_dir,
+              _de_prev_global_shard_num, buffer_size)
       _shard_keys_file_list, _shard_values_file_list = _list_de_variable_saved_files_from_file_system(
           de_variable.name, de_variable_folder_dir)
       _partition_fn = de_variable.partition_fn
       with ops.name_scope(de_variable.name):
         return _insert_de_shard_from_file_system(_shard_list.as_list(),
-                                                 de_variable.dim,
+                                                 de_variable._row_dim,
                                                  _shard_keys_file_list,
                                                  _shard_values_file_list,
                                                  _partition_fn, _proc_size,
@@ -467,6 +679,10 @@ class Variable(base.Trackable):
       kv_creator=None,
       restrict_policy=None,
       bp_v2=False,
+      colocated_slots=0,
+      write_buffer_steps=0,
+      write_buffer_keys=0,
+      delta_dtype=None,
   ):
     """Creates an empty `Variable` object.
 
@@ -494,6 +710,9 @@ class Variable(base.Trackable):
           def default_partition_fn(keys, shard_num):
             return tf.cast(keys % shard_num, dtype=tf.int32)
           ```
+          `tfra.dynamic_embedding.jump_hash_partition_fn` partitions keys by
+          consistent hash instead, so restoring the variable on a different
+          number of devices moves only the keys of the added or removed shards.
           shared_name: No used.
           name: A name for the operation (optional).
           initializer: The value to use if a key is missing in the hash table.
@@ -519,14 +738,74 @@ class Variable(base.Trackable):
             parameters by *adding delta* instead of *setting*, which solves the
             race condition problem among workers during backpropagation in
             large-scale distributed asynchronous training.
+          colocated_slots: The number of optimizer slots stored in the table
+            rows after the values, e.g. 2 for Adam. The rows then hold
+            `dim * (1 + colocated_slots)` values, and the slots created by
+            `DynamicEmbeddingOptimizer` are views of them instead of Variables
+            of their own, so a training step looks up and writes the values
+            and all the slots at once. `lookup` still returns the first `dim`
+            values of the rows, `export` returns whole rows. Default is 0.
+          write_buffer_steps: If positive, `accum` adds the deltas of the
+            existing keys to a buffer table local to the worker, which is
+            flushed to the tables every `write_buffer_steps` accums, so a key
+            updated in several steps is written once. Lookups add the buffered
+            deltas, while other workers see the updates at most
+            `write_buffer_steps` accums late. Keys missing from the tables
+            are still inserted right away. Requires `bp_v2`. Saving the
+            variable flushes the buffer first. Default is 0.
+          write_buffer_keys: If positive, the buffer is also flushed once it
+            holds this many keys. Default is 0.
+          delta_dtype: If set to `tf.float16`, `tf.bfloat16` or `tf.int8`,
+            `accum` computes the deltas of the existing keys on the worker and
+            sends them to the tables in this dtype, which are cast back to
+            `value_dtype` on the devices of the tables. int8 deltas have a
+            bfloat16 scale per `dim` values, one for the embedding and one
+            for each colocated slot, and are rounded stochastically, so they
+            are right on average over the steps. With the scales int8 only
+            takes less than float16 for `dim` above 2, and requires it. This
+            cuts the traffic to the parameter servers at the cost of rounding
+            the deltas. The values of missing keys are sent as they are.
+            Requires `bp_v2` and a floating `value_dtype`. Default is None.
 
         Returns:
           A `Variable` object.
+
+        Raises:
+          ValueError: If `colocated_slots` is negative, or
+            `write_buffer_steps` or `delta_dtype` is set without `bp_v2`, or
+            `delta_dtype` is not supported, or is int8 for a `dim` of 2 or
+            less.
     """
     self.key_dtype = key_dtype
     self.value_dtype = value_dtype
     self.dim = dim
     self.bp_v2 = bp_v2
+    if colocated_slots < 0:
+      raise ValueError("colocated_slots must be non-negative, got {}.".format(
+          colocated_slots))
+    self.colocated_slots = int(colocated_slots)
+    self._row_dim = dim * (1 + self.colocated_slots)
+    self._colocated_slot_names = []
+    if write_buffer_steps and not bp_v2:
+      raise ValueError("write_buffer_steps requires bp_v2.")
+    self.write_buffer_steps = int(write_buffer_steps)
+    self.write_buffer_keys = int(write_buffer_keys)
+    if delta_dtype is not None:
+      delta_dtype = dtypes.as_dtype(delta_dtype)
+      if not bp_v2:
+        raise ValueError("delta_dtype requires bp_v2.")
+      if delta_dtype not in _DELTA_DTYPES or not value_dtype.is_floating:
+        raise ValueError(
+            "delta_dtype should be one of {} for a floating value_dtype, got "
+            "{} for {}.".format([d.name for d in _DELTA_DTYPES],
+                                delta_dtype.name, value_dtype.name))
+      if delta_dtype == dtypes.int8 and dim <= 2:
+        raise ValueError(
+            "delta_dtype int8 sends a {} scale per dim deltas, which takes "
+            "no less than float16 deltas for dim {}, use float16 for dim 2 or "
+            "less.".format(_SCALE_DTYPE.name, dim))
+    self.delta_dtype = delta_dtype
+    self._thaw_before_write = False
 
     def _get_default_devices():
       gpu_list = [
@@ -601,6 +880,11 @@ class Variable(base.Trackable):
           [dtypes.int64, dtypes.half],
           [dtypes.int64, dtypes.bfloat16],
       ]
+    if isinstance(self.kv_creator, de.MmapTableCreator):
+      valid_dtype_list = [
+          dtype_pair for dtype_pair in valid_dtype_list
+          if dtype_pair[0] != dtypes.string and dtype_pair[1] != dtypes.string
+      ]
     if is_macos() and is_arm64():
       if value_dtype == dtypes.half or value_dtype == dtypes.bfloat16:
         raise TypeError("""
@@ -614,7 +898,8 @@ class Variable(base.Trackable):
     _initializer = initializer
     if _initializer is None:
       _initializer = init_ops.zeros_initializer(dtype=self.value_dtype)
-    static_default_value = self._convert_anything_to_init(_initializer, dim)
+    static_default_value = self._pad_rows(
+        self._convert_anything_to_init(_initializer, dim))
     scope_name = self.name.split("/")[-1]
     with ops.name_scope(scope_name, "DynamicEmbedding_Variable"):
       with ops.colocate_with(None, ignore_existing=True):
@@ -642,12 +927,49 @@ class Variable(base.Trackable):
                 shard_saveable_object_fn=shard_saveable_object_fn_i)
             self._tables.append(mht)
 
+    self._write_buffer = None
+    if self.write_buffer_steps > 0:
+      # Placed by the worker rather than with the tables.
+      with ops.colocate_with(None, ignore_existing=True), ops.device(None):
+        self._write_buffer = de.CuckooHashTable(
+            key_dtype=self.key_dtype,
+            value_dtype=self.value_dtype,
+            default_value=array_ops.zeros([self._row_dim], self.value_dtype),
+            name="{}_write_buffer".format(self.name.replace("/", "_")),
+            checkpoint=False)
+        self._write_buffer_accums = resource_variable_ops.ResourceVariable(
+            0,
+            dtype=dtypes.int64,
+            trainable=False,
+            collections=[ops.GraphKeys.LOCAL_VARIABLES],
+            name="{}_write_buffer_accums".format(self.name.replace("/", "_")))
+
+    save_deps = []
+    if (self._write_buffer is not None and self.checkpoint
+        and not context.executing_eagerly()):
+      # The saveables of the tables export them as they are built, so they are
+      # built again with the export waiting for the buffered deltas.
+      flush_op = self.flush_write_buffer(name="flush_on_save")
+      save_deps.append(flush_op)
+      saveables = ops.get_collection_ref(ops.GraphKeys.SAVEABLE_OBJECTS)
+      for table in self._tables:
+        saveable = getattr(table, "saveable", None)
+        if saveable is not None and saveable in saveables:
+          saveables.remove(saveable)
+          table.saveable = _after_flush(table._saveable_fn,
+                                        flush_op,
+                                        table=table,
+                                        name=saveable.name,
+                                        full_name=saveable.name)
+          saveables.append(table.saveable)
+
     if self._saveable_object_creator:
       if self.checkpoint:
         if not context.executing_eagerly():
           self.op = control_flow_ops.no_op(name=self.name)
-          self.saveable = self._saveable_object_creator.create_variable_saveable_object(
-              self, self.op.name)
+          with ops.control_dependencies(save_deps):
+            self.saveable = self._saveable_object_creator.create_variable_saveable_object(
+                self, self.op.name)
           ops.add_to_collection(ops.GraphKeys.SAVEABLE_OBJECTS, self.saveable)
         else:
           self.saveable = self._saveable_object_creator.create_variable_saveable_object(
@@ -661,7 +983,7 @@ class Variable(base.Trackable):
   def restrict_policy(self):
     return self._restrict_policy
 
-  def _convert_anything_to_init(self, raw_init, dim):
+  def _convert_anything_to_init(self, raw_init, dim, set_initializer=True):
     init = raw_init
     valid_list = [
         init_ops.Initializer, init_ops_v2.Initializer,
@@ -672,7 +994,8 @@ class Variable(base.Trackable):
     valid_list = tuple(valid_list)
     while callable(init):
       if isinstance(init, valid_list):
-        self.initializer = init
+        if set_initializer:
+          self.initializer = init
         init = init(shape=[dim])
       else:
         try:
@@ -693,10 +1016,44 @@ class Variable(base.Trackable):
     init = math_ops.cast(init, dtype=self.value_dtype)
     return init
 
+  def _pad_rows(self, values):
+    """Pads `values` with zeros for the colocated slots, unless they are
+    whole rows already."""
+    if not self.colocated_slots:
+      return values
+    values = ops.convert_to_tensor(values, self.value_dtype)
+    if values.shape.rank is None or values.shape[-1] is None:
+      # Padded up to whole rows at run time, by nothing for whole rows.
+      paddings = array_ops.concat([
+          array_ops.zeros([array_ops.rank(values) - 1, 2], dtypes.int32),
+          [[0, self._row_dim - array_ops.shape(values)[-1]]]
+      ], 0)
+      return array_ops.pad(values, paddings)
+    if values.shape[-1] != self.dim:
+      return values
+    paddings = array_ops.zeros(array_ops.concat(
+        [array_ops.shape(values)[:-1], [self._row_dim - self.dim]], 0),
+                               dtype=self.value_dtype)
+    return array_ops.concat([values, paddings], -1)
+
+  def _colocated_slot_index(self, slot_name):
+    """Returns the index of the block of the rows holding the slot."""
+    if slot_name not in self._colocated_slot_names:
+      if len(self._colocated_slot_names) >= self.colocated_slots:
+        raise ValueError(
+            "Variable {} has room for {} colocated slots, which are taken by "
+            "{}, but slot {} is created.".format(self.name,
+                                                 self.colocated_slots,
+                                                 self._colocated_slot_names,
+                                                 slot_name))
+      self._colocated_slot_names.append(slot_name)
+    return self._colocated_slot_names.index(slot_name) + 1
+
   def _make_name(self, table_idx):
     return "{}_mht_{}of{}".format(self.name.replace("/", "_"), table_idx + 1,
                                   self.shard_num)
 
+  @_thaw_first
   def upsert(self, keys, values, name=None):
     """Insert or Update `keys` with `values`.
 
@@ -707,6 +1064,8 @@ class Variable(base.Trackable):
             key type.
           values: Values to be associated with keys.Must be a tensor of
             arrays with same shape as `keys` and match the table's value type.
+            With `colocated_slots` they may also be whole rows, otherwise the
+            slots of the keys are reset to zeros.
           name: A name for the operation (optional).
 
         Returns:
@@ -717,10 +1076,12 @@ class Variable(base.Trackable):
             types.
     """
 
+    values = self._pad_rows(values)
     partition_index = self.partition_fn(keys, self.shard_num)
-    keys_partitions, _ = make_partition(keys, partition_index, self.shard_num)
-    values_partitions, _ = make_partition(values, partition_index,
-                                          self.shard_num)
+    (keys_partitions,
+     values_partitions), _ = make_multi_partition([keys, values],
+                                                  partition_index,
+                                                  self.shard_num)
 
     ops_ = tf_utils.ListWrapper([])
     for idx in range(len(self.devices)):
@@ -731,11 +1092,14 @@ class Variable(base.Trackable):
 
     return control_flow_ops.group(ops_.as_list())
 
+  @_thaw_first
   def accum(self, keys, old_values, new_values, exists, name=None):
     """
     Insert `keys` with `values` if not exist, or accumulate a delta value
       `new_values - old_values` to 'keys'.
     This API will help relieve stale gradient problem in asynchronous training.
+    With `colocated_slots`, the values may also be whole rows, otherwise the
+    slots of the existing keys are kept.
 
     Args:
       keys: Keys to insert. Can be a tensor of any shape. Must match
@@ -755,33 +1119,106 @@ class Variable(base.Trackable):
       TypeError: when `keys` or `values` doesn't match the table data types.
     """
     exists = ops.convert_to_tensor(exists, dtypes.bool, name="original_exists")
-    exists = array_ops.reshape(exists, shape=[-1, 1])
-    exists_expanded = array_ops.repeat(exists, axis=-1, repeats=self.dim)
-    exists_expanded = array_ops.reshape(exists_expanded,
-                                        shape=array_ops.shape(old_values))
-    values_or_deltas = array_ops.where(exists_expanded,
-                                       new_values - old_values,
-                                       new_values,
-                                       name="values_or_deltas")
+    old_values = self._pad_rows(old_values)
+    new_values = self._pad_rows(new_values)
+    if self._write_buffer is not None:
+      return self._accum_write_behind(keys, old_values, new_values, exists,
+                                      name)
+    return self._accum_to_tables(keys, old_values, new_values, exists, name)
+
+  def _accum_to_tables(self, keys, old_values, new_values, exists, name=None):
+    if self.delta_dtype is not None:
+      return self._accum_quantized(keys, old_values, new_values, exists, name)
     partition_index = self.partition_fn(keys, self.shard_num)
-    keys_partitions, _ = make_partition(keys, partition_index, self.shard_num)
-    values_or_deltas_partitions, _ = make_partition(values_or_deltas,
-                                                    partition_index,
-                                                    self.shard_num)
-    exists_partitions, _ = make_partition(exists, partition_index,
-                                          self.shard_num)
+    (keys_partitions, old_values_partitions, new_values_partitions,
+     exists_partitions), _ = make_multi_partition(
+         [keys, old_values, new_values, exists], partition_index,
+         self.shard_num)
+
+    fused = self._freezable_table_indices()
+    ops_ = tf_utils.ListWrapper([])
+    for idx in range(len(self.devices)):
+      with ops.device(self.devices[idx]):
+        if idx in fused:
+          # The CPU cuckoo tables compute the deltas row by row.
+          ops_.as_list().append(self._tables[idx].accum_delta(
+              keys_partitions[idx],
+              old_values_partitions[idx],
+              new_values_partitions[idx],
+              exists_partitions[idx],
+              name=name))
+        else:
+          new_values_ = new_values_partitions[idx]
+          values_or_deltas = array_ops.where_v2(
+              array_ops.expand_dims(exists_partitions[idx], -1),
+              new_values_ - old_values_partitions[idx],
+              new_values_,
+              name="values_or_deltas")
+          ops_.as_list().append(self._tables[idx].accum(keys_partitions[idx],
+                                                        values_or_deltas,
+                                                        exists_partitions[idx],
+                                                        name=name))
+
+    return control_flow_ops.group(ops_.as_list())
+
+  def _accum_quantized(self, keys, old_values, new_values, exists, name):
+    """`accum` sending the deltas of the existing keys in `delta_dtype`."""
+    (missing_keys_partitions, missing_values_partitions, keys_partitions,
+     deltas_partitions,
+     scales_partitions) = self._partition_quantized(keys, old_values,
+                                                    new_values, exists)
 
     ops_ = tf_utils.ListWrapper([])
     for idx in range(len(self.devices)):
       with ops.device(self.devices[idx]):
+        ops_.as_list().append(self._tables[idx].accum(
+            missing_keys_partitions[idx],
+            missing_values_partitions[idx],
+            array_ops.zeros_like(missing_keys_partitions[idx], dtypes.bool),
+            name=name))
+        # Dequantized on the device of the table, after the transfer.
         ops_.as_list().append(self._tables[idx].accum(
             keys_partitions[idx],
-            values_or_deltas_partitions[idx],
-            exists_partitions[idx],
+            _dequantize_deltas(deltas_partitions[idx], scales_partitions[idx],
+                               self.value_dtype, self.dim),
+            array_ops.ones_like(keys_partitions[idx], dtypes.bool),
             name=name))
 
     return control_flow_ops.group(ops_.as_list())
 
+  def _partition_quantized(self, keys, old_values, new_values, exists):
+    """Partitions what `_accum_quantized` sends to the tables.
+
+    Returns:
+      The partitions of the missing keys, of their values, of the existing
+        keys, of their quantized deltas and of the int8 scales, a list of None
+        for the other delta dtypes.
+    """
+    keys = array_ops.reshape(keys, [-1])
+    exists = array_ops.reshape(exists, [-1])
+    old_values = array_ops.reshape(old_values, [-1, self._row_dim])
+    new_values = array_ops.reshape(new_values, [-1, self._row_dim])
+
+    missing = math_ops.logical_not(exists)
+    missing_keys = array_ops.boolean_mask(keys, missing)
+    (missing_keys_partitions, missing_values_partitions), _ = \
+        make_multi_partition(
+            [missing_keys,
+             array_ops.boolean_mask(new_values, missing)],
+            self.partition_fn(missing_keys, self.shard_num), self.shard_num)
+
+    existing_keys = array_ops.boolean_mask(keys, exists)
+    deltas, scales = _quantize_deltas(
+        array_ops.boolean_mask(new_values - old_values, exists),
+        self.delta_dtype, self.dim)
+    data = [existing_keys, deltas] + ([scales] if scales is not None else [])
+    partitions, _ = make_multi_partition(
+        data, self.partition_fn(existing_keys, self.shard_num), self.shard_num)
+    scales_partitions = (partitions[2] if scales is not None else [None] *
+                         self.shard_num)
+    return (missing_keys_partitions, missing_values_partitions, partitions[0],
+            partitions[1], scales_partitions)
+
   def restrict(self, num_reserved, **kwargs):
     """
     Restrict the size of self, also including features reside in commensal
@@ -802,6 +1239,7 @@ class Variable(base.Trackable):
       tf_logging.warning('Call restrict without setting restrict policy.')
       return None
 
+  @_thaw_first
   def remove(self, keys, name=None):
     """Removes `keys` and its associated values from the variable.
 
@@ -819,7 +1257,8 @@ class Variable(base.Trackable):
       TypeError: when `keys` do not match the table data types.
     """
     partition_index = self.partition_fn(keys, self.shard_num)
-    keys_partitions, _ = make_partition(keys, partition_index, self.shard_num)
+    (keys_partitions,), _ = make_multi_partition([keys], partition_index,
+                                                 self.shard_num)
 
     ops_ = tf_utils.ListWrapper([])
     for idx in range(len(self.devices)):
@@ -829,6 +1268,7 @@ class Variable(base.Trackable):
 
     return control_flow_ops.group(ops_.as_list())
 
+  @_thaw_first
   def clear(self, name=None):
     """clear all keys and values in the table.
 
@@ -844,25 +1284,209 @@ class Variable(base.Trackable):
         ops_.as_list().append(self._tables[idx].clear(name=name))
     return control_flow_ops.group(ops_.as_list())
 
+  def _accum_write_behind(self, keys, old_values, new_values, exists, name):
+    """`accum` buffering the deltas of the existing keys, see
+    `write_buffer_steps`."""
+    keys = array_ops.reshape(keys, [-1])
+    exists = array_ops.reshape(exists, [-1])
+    old_values = array_ops.reshape(old_values, [-1, self._row_dim])
+    new_values = array_ops.reshape(new_values, [-1, self._row_dim])
+
+    missing = math_ops.logical_not(exists)
+    insert_op = self._accum_to_tables(
+        array_ops.boolean_mask(keys, missing),
+        array_ops.boolean_mask(old_values, missing),
+        array_ops.boolean_mask(new_values, missing),
+        array_ops.boolean_mask(exists, missing), name)
+
+    buffer_op = self._write_buffer.insert_or_add(
+        array_ops.boolean_mask(keys, exists),
+        array_ops.boolean_mask(new_values - old_values, exists))
+
+    with ops.control_dependencies([buffer_op]):
+      accums = self._write_buffer_accums.assign_add(1)
+      should_flush = math_ops.equal(accums % self.write_buffer_steps, 0)
+      if self.write_buffer_keys > 0:
+        should_flush = math_ops.logical_or(
+            should_flush,
+            self._write_buffer.size() >= self.write_buffer_keys)
+      flush_op = cond(should_flush, self.flush_write_buffer,
+                      control_flow_ops.no_op)
+    return control_flow_ops.group([insert_op, flush_op])
+
+  def flush_write_buffer(self, name=None):
+    """Writes the deltas buffered by `accum` to the tables and empties the
+    buffer, see `write_buffer_steps`.
+
+    The buffer is emptied as its deltas are taken, so the deltas buffered by
+    concurrent accums of the worker are left for the next flush. Lookups
+    running while the taken deltas are written may miss them. Saving the
+    variable flushes the buffer first.
+
+    Args:
+      name: A name for the operation (optional).
+
+    Returns:
+      The created Operation.
+    """
+    if self._write_buffer is None:
+      return control_flow_ops.no_op()
+    with ops.name_scope(name, "flush_write_buffer"):
+      keys, deltas = self._write_buffer.export_and_clear()
+      return self._accum_to_tables(keys, array_ops.zeros_like(deltas), deltas,
+                                   array_ops.ones_like(keys, dtypes.bool))
+
+  def _add_buffered_deltas(self, keys, values):
+    """Adds the deltas `accum` buffered for `keys` to their looked up rows."""
+    if self._write_buffer is None:
+      return values
+    return values + self._write_buffer.lookup(keys)
+
+  @_thaw_first
+  def _apply_optimizer(self,
+                       keys,
+                       grads,
+                       init_rows,
+                       hyperparams,
+                       optimizer,
+                       name=None):
+    """Applies `optimizer` to the rows of `keys` inside the tables, see
+    `CuckooHashTable.apply_optimizer`. The gradients of repeated keys are
+    summed first, as the sparse optimizers do. Only for variables whose
+    tables are all `CuckooHashTable`s on CPU.
+    """
+    keys = array_ops.reshape(keys, [-1])
+    unique_keys, idx = array_ops.unique(keys)
+    num_unique = array_ops.size(unique_keys)
+    grads = math_ops.unsorted_segment_sum(
+        array_ops.reshape(grads, [-1, self.dim]), idx, num_unique)
+    first = math_ops.unsorted_segment_min(math_ops.range(array_ops.size(keys)),
+                                          idx, num_unique)
+    init_rows = array_ops.gather(
+        array_ops.reshape(init_rows, [-1, self._row_dim]), first)
+    partition_index = self.partition_fn(unique_keys, self.shard_num)
+    (keys_partitions, grads_partitions,
+     init_rows_partitions), _ = make_multi_partition(
+         [unique_keys, grads, init_rows], partition_index, self.shard_num)
+
+    ops_ = tf_utils.ListWrapper([])
+    for idx in range(len(self.devices)):
+      with ops.device(self.devices[idx]):
+        ops_.as_list().append(self._tables[idx].apply_optimizer(
+            keys_partitions[idx],
+            grads_partitions[idx],
+            init_rows_partitions[idx],
+            hyperparams,
+            optimizer,
+            name=name))
+    return control_flow_ops.group(ops_.as_list())
+
+  def freeze(self, name=None):
+    """Freezes the tables of the variable for serving.
+
+        Frozen tables serve lookups without taking their bucket locks and
+        reject writes until they are thawed. Only `CuckooHashTable`s on CPU
+        can be frozen, other tables are left as they are. The lookups built
+        in inference mode freeze the variable too, until `enable_train_mode`
+        thaws it. A variable frozen by this op is only thawed by `thaw`, the
+        writes built afterwards fail until then.
+
+        Args:
+          name: A name for the operation (optional).
+
+        Returns:
+          The created Operation.
+        """
+    self._thaw_before_write = False
+    ops_ = tf_utils.ListWrapper([])
+    for idx in self._freezable_table_indices():
+      with ops.device(self.devices[idx]):
+        ops_.as_list().append(self._tables[idx].freeze(name=name))
+    return control_flow_ops.group(ops_.as_list())
+
+  def thaw(self, name=None):
+    """Makes the tables frozen by `freeze` writable again.
+
+        Args:
+          name: A name for the operation (optional).
+
+        Returns:
+          The created Operation.
+        """
+    ops_ = tf_utils.ListWrapper([])
+    for idx in self._freezable_table_indices():
+      with ops.device(self.devices[idx]):
+        ops_.as_list().append(self._tables[idx].thaw(name=name))
+    return control_flow_ops.group(ops_.as_list())
+
+  def _freeze_for_inference(self):
+    """Freezes the tables for the lookups built in inference mode, which
+    `enable_train_mode` thaws."""
+    _inference_frozen_variables.add(self)
+    return self.freeze(name="freeze_for_inference")
+
+  def _freezable_table_indices(self):
+    return [
+        idx for idx in range(len(self.devices))
+        if isinstance(self._tables[idx], de.CuckooHashTable)
+        and self._tables[idx]._device_type != "GPU"
+    ]
+
+  def _init_missing_table_indices(self):
+    if self.initializer is None:
+      return []
+    return [
+        idx for idx in range(len(self.devices))
+        if isinstance(self._tables[idx], de.CuckooHashTable)
+        and self._tables[idx]._device_type != "GPU"
+    ]
+
   def _create_default_values_by_initializer(self, keys):
     if self.initializer is None:
       return None
+    keys_shape = array_ops.shape(array_ops.reshape(keys, [-1]))
+    return self._create_initial_values([keys_shape[0], self.dim])
+
+  def _create_initial_values(self, vals_shape):
+    # The initializer only makes the values, the slots start as zeros.
+    vals_shape = list(vals_shape[:-1]) + [self.dim]
     try:
-      keys_shape = array_ops.shape(array_ops.reshape(keys, [-1]))
-      vals_shape = [keys_shape[0], self.dim]
       init_op = self.initializer(vals_shape)
     except Exception as e:  # constant.initializer
       init_op = self.initializer([self.dim])
       tf_logging.warn(
           "Variable [{}] is not running on full-size initialization mode: {}".
           format(str(self.name), str(e)))
-    return init_op
+    return self._pad_rows(init_op)
+
+  def _lookup_shard(self, idx, keys, return_exists=False, name=None):
+    if idx in self._init_missing_table_indices():
+      # Only generate initial values for the keys missing in the table.
+      return self._tables[idx].lookup_or_init(
+          keys,
+          self._create_initial_values,
+          return_exists=return_exists,
+          name=name,
+      )
+
+    dynamic_default_values = self._create_default_values_by_initializer(keys)
+    if dynamic_default_values is not None:
+      dynamic_default_values = math_ops.cast(dynamic_default_values,
+                                             self.value_dtype)
+    return self._tables[idx].lookup(
+        keys,
+        dynamic_default_values=dynamic_default_values,
+        return_exists=return_exists,
+        name=name,
+    )
 
   def lookup(self, keys, return_exists=False, name=None):
     """
     Looks up `keys` in a Variable, outputs the corresponding values.
 
-    The `default_value` is used for keys not present in the table.
+    The `default_value` is used for keys not present in the table. Tables
+    that support `lookup_or_init` only call the initializer for the keys
+    they miss.
 
     Args:
       keys: Keys to look up. Can be a tensor of any shape. Must match the
@@ -879,27 +1503,26 @@ class Variable(base.Trackable):
           if keys are existing in the table.
           Only provided if `return_exists` is True.
     """
+    result = self._lookup_rows(keys, return_exists=return_exists, name=name)
+    if not self.colocated_slots:
+      return result
+    if return_exists:
+      return result[0][..., :self.dim], result[1]
+    return result[..., :self.dim]
+
+  def _lookup_rows(self, keys, return_exists=False, name=None):
+    """`lookup`, which returns whole rows with `colocated_slots`."""
     partition_index = self.partition_fn(keys, self.shard_num)
-    keys_partitions, keys_indices = make_partition(keys, partition_index,
-                                                   self.shard_num)
+    (keys_partitions,), keys_indices = make_multi_partition([keys],
+                                                            partition_index,
+                                                            self.shard_num)
 
     _values = []
     _exists = []
     for idx in range(len(self.devices)):
       with ops.device(self.devices[idx]):
-        dynamic_default_values = self._create_default_values_by_initializer(
-            keys_partitions[idx])
-        if dynamic_default_values is not None:
-          dynamic_default_values = math_ops.cast(dynamic_default_values,
-                                                 self.value_dtype)
-
-        ops_ = None
-        ops_ = self._tables[idx].lookup(
-            keys_partitions[idx],
-            dynamic_default_values=dynamic_default_values,
-            return_exists=return_exists,
-            name=name,
-        )
+        ops_ = self._lookup_shard(idx, keys_partitions[idx], return_exists,
+                                  name)
         if return_exists:
           _values.append(ops_[0])
           _exists.append(ops_[1])
@@ -907,15 +1530,19 @@ class Variable(base.Trackable):
           _values.append(ops_)
 
     if return_exists:
-      result = (_stitch(_values, keys_indices, use_fast=True),
+      result = (self._add_buffered_deltas(
+          keys, _stitch(_values, keys_indices, use_fast=True)),
                 _stitch(_exists, keys_indices, use_fast=True))
     else:
-      result = _stitch(_values, keys_indices, use_fast=True)
+      result = self._add_buffered_deltas(
+          keys, _stitch(_values, keys_indices, use_fast=True))
     return result
 
   def export(self, name=None):
     """Returns tensors of all keys and values in the table.
 
+    With `colocated_slots` the values are whole rows, slots included.
+
     Args:
       name: A name for the operation (optional).
 
@@ -934,6 +1561,56 @@ class Variable(base.Trackable):
         full_values.append(vals_)
     return array_ops.concat(full_keys, 0), array_ops.concat(full_values, 0)
 
+  def export_dataset(self, batch_size=65536, name=None):
+    """Returns a `tf.data.Dataset` of all keys and values in the table.
+
+    Unlike `export`, which concatenates every shard on one device, the shards
+    are read lazily one after another while the dataset is iterated, so the
+    memory used is bounded by `batch_size` instead of the table size. The
+    CPU `CuckooHashTable` shards are scanned by a cursor in their kernel
+    without being locked as a whole, a key written during the scan may be
+    missed or repeated, `freeze` the variable first for an exact snapshot.
+    The other shards are exported whole, one at a time, and rebatched.
+
+    Args:
+      batch_size: The most keys in an element of the dataset.
+      name: A name for the operation (optional).
+
+    Returns:
+      A `tf.data.Dataset` of `(keys, values)` pairs, with `keys` of shape
+        `[n]` and `values` of shape `[n, dim]`. `n` is positive and at most
+        `batch_size`, or the 4 slots of a cuckoo bucket when `batch_size` is
+        smaller.
+    """
+    chunked = self._freezable_table_indices()
+    dataset = None
+    for idx in range(len(self.devices)):
+      table = self._tables[idx]
+      if idx in chunked:
+
+        def _next_chunk(offset, _, table=table):
+          keys, values, next_offset = table.export_chunk(offset,
+                                                         batch_size,
+                                                         name=name)
+          return next_offset, (keys, values, offset)
+
+        shard_dataset = dataset_ops.Dataset.from_tensors(0).repeat()
+        shard_dataset = shard_dataset.scan(
+            constant_op.constant(0, dtypes.int64), _next_chunk)
+        shard_dataset = shard_dataset.take_while(
+            lambda keys, values, offset: offset >= 0)
+        shard_dataset = shard_dataset.filter(
+            lambda keys, values, offset: array_ops.size(keys) > 0)
+        shard_dataset = shard_dataset.map(lambda keys, values, offset:
+                                          (keys, values))
+      else:
+        shard_dataset = dataset_ops.Dataset.from_tensors(0).map(
+            lambda _, table=table: table.export(name=name))
+        shard_dataset = shard_dataset.unbatch().batch(batch_size)
+      dataset = (shard_dataset
+                 if dataset is None else dataset.concatenate(shard_dataset))
+    return dataset
+
   def save_to_file_system(self,
                           dirpath,
                           proc_size=1,
@@ -1075,7 +1752,8 @@ class Variable(base.Trackable):
       optimizer: An optimizer under `tf.keras.optimizers` or `tf.compat.v1.train`.
 
     Returns:
-      List of slot `Variable`s in optimizer.
+      List of slot `Variable`s in optimizer. Slots colocated in the rows of
+      the Variable are not listed.
     """
     if not isinstance(optimizer,
                       (Optimizer, OptimizerV2, tf.keras.optimizers.Optimizer)):
@@ -1087,7 +1765,8 @@ class Variable(base.Trackable):
         for name in snames:
           try:
             s = optimizer.get_slot(tw, name)
-            slots.append(s.params)
+            if s.params is not self:
+              slots.append(s.params)
           except:
             continue
     else:
@@ -1150,6 +1829,12 @@ class Variable(base.Trackable):
             variable=self,
             name=op_name)
 
+    flush_op = None
+    if self._write_buffer is not None:
+      # The tables are tracked by the variable, so eagerly their saveables are
+      # built after this flush.
+      flush_op = self.flush_write_buffer()
+
     g = ops.get_default_graph()
     if context.executing_eagerly() or g._functions:
       saveables = dict()
@@ -1159,7 +1844,6 @@ class Variable(base.Trackable):
           state_callback=lambda: self.name,
           restore_callback=lambda name: None)
       _get_saveable_object_creator(self, saveables)
-      return saveables
     else:
       saveables = dict()
       for table in self._tables:
@@ -1168,13 +1852,110 @@ class Variable(base.Trackable):
           # merge all tables saveable to one dict with their own name.
           saveables[saveable.keywords["name"]] = saveable
       _get_saveable_object_creator(self, saveables)
-      return saveables
+    if flush_op is not None and not context.executing_eagerly():
+      saveables = {
+          key: functools.partial(_after_flush, saveable, flush_op)
+          for key, saveable in saveables.items()
+      }
+    return saveables
 
   @property
   def trainable_store(self):
     return self._trainable_store
 
 
+def lookup_group(variables, keys_list, return_exists=False, name=None):
+  """Looks up `keys_list[i]` in `variables[i]` for every i.
+
+  The keys are partitioned over the shards of every Variable as
+  `Variable.lookup` does. Then the shards on CPU `CuckooHashTable`s sharing a
+  device, key and value type are looked up by a single op on that device,
+  instead of an op per shard, the other shards one by one.
+
+  Args:
+    variables: A list of `dynamic_embedding.Variable`s.
+    keys_list: A list of key tensors, with the same length as `variables`.
+    return_exists: if True, will return a additional Tensor for every
+      Variable which indicates if keys are existing in the table.
+    name: A name for the operation (optional).
+
+  Returns:
+    A list with the values of `keys_list[i]` in `variables[i]`, or the pair
+      of the values and the exists tensor if `return_exists` is True.
+
+  Raises:
+    ValueError: If `variables` and `keys_list` differ in length.
+  """
+  outputs = _lookup_rows_group(variables,
+                               keys_list,
+                               return_exists=return_exists,
+                               name=name)
+  for i, var in enumerate(variables):
+    if var.colocated_slots:
+      if return_exists:
+        outputs[i] = (outputs[i][0][..., :var.dim], outputs[i][1])
+      else:
+        outputs[i] = outputs[i][..., :var.dim]
+  return outputs
+
+
+def _lookup_rows_group(variables, keys_list, return_exists=False, name=None):
+  """`lookup_group`, which returns whole rows for Variables with
+  `colocated_slots`."""
+  if len(variables) != len(keys_list):
+    raise ValueError(
+        "variables and keys_list should have the same length: {} vs. {}".format(
+            len(variables), len(keys_list)))
+  with ops.name_scope(name, "lookup_group"):
+    partitions = []
+    for var, keys in zip(variables, keys_list):
+      partition_index = var.partition_fn(keys, var.shard_num)
+      (keys_partitions,), keys_indices = make_multi_partition([keys],
+                                                              partition_index,
+                                                              var.shard_num)
+      partitions.append((keys_partitions, keys_indices))
+
+    results = [[None] * len(var.devices) for var in variables]
+    groups = {}
+    for i, var in enumerate(variables):
+      fusable_indices = var._freezable_table_indices()
+      for idx in range(len(var.devices)):
+        if idx in fusable_indices:
+          group = (pydev.canonical_name(var.devices[idx]), var.key_dtype,
+                   var.value_dtype)
+          groups.setdefault(group, []).append((i, idx))
+          continue
+        with ops.device(var.devices[idx]):
+          ops_ = var._lookup_shard(idx, partitions[i][0][idx], return_exists)
+        results[i][idx] = ops_ if return_exists else (ops_, None)
+
+    for (device, _, _), members in groups.items():
+      with ops.device(device):
+        values, exists = cuckoo_hashtable_ops.find_group(
+            [variables[i]._tables[idx] for i, idx in members],
+            [partitions[i][0][idx] for i, idx in members])
+        for (i, idx), values_, exists_ in zip(members, values, exists):
+          var = variables[i]
+          if idx in var._init_missing_table_indices():
+            values_ = var._tables[idx]._init_missing(partitions[i][0][idx],
+                                                     values_, exists_,
+                                                     var._create_initial_values)
+          results[i][idx] = (values_, exists_)
+
+    outputs = []
+    for var, keys, (_,
+                    keys_indices), shard_results in zip(variables, keys_list,
+                                                        partitions, results):
+      values = var._add_buffered_deltas(
+          keys, _stitch([r[0] for r in shard_results], keys_indices))
+      if return_exists:
+        outputs.append(
+            (values, _stitch([r[1] for r in shard_results], keys_indices)))
+      else:
+        outputs.append(values)
+    return outputs
+
+
 @tf_export("dynamic_embedding.get_variable")
 def get_variable(
     name,  # unique
@@ -1191,6 +1972,10 @@ def get_variable(
     kv_creator=None,
     restrict_policy=None,
     bp_v2=False,
+    colocated_slots=0,
+    write_buffer_steps=0,
+    write_buffer_keys=0,
+    delta_dtype=None,
 ):
   """Gets an `Variable` object with this name if it exists,
          or create a new one.
@@ -1210,6 +1995,9 @@ def get_variable(
       def default_partition_fn(keys, shard_num):
         return tf.cast(keys % shard_num, dtype=tf.int32)
       ```
+      `tfra.dynamic_embedding.jump_hash_partition_fn` partitions keys by
+      consistent hash instead, so restoring the variable on a different
+      number of devices moves only the keys of the added or removed shards.
       shared_name: No used.
       initializer: The value to use if a key is missing in the hash table.
         which can a python number, numpy array or `tf.initializer` instances.
@@ -1234,6 +2022,17 @@ def get_variable(
         parameters by *adding delta* instead of *setting*, which solves the
         race condition problem among workers during backpropagation in
         large-scale distributed asynchronous training.
+      colocated_slots: The number of optimizer slots stored in the table rows
+        after the values, so they are looked up and written along with the
+        values. See `Variable`.
+      write_buffer_steps: If positive, the deltas `accum` adds to existing
+        keys are buffered on the worker and written to the tables every
+        `write_buffer_steps` accums. Requires `bp_v2`. See `Variable`.
+      write_buffer_keys: If positive, the buffer is also written once it
+        holds this many keys.
+      delta_dtype: If set to `tf.float16`, `tf.bfloat16` or `tf.int8`, the
+        deltas `accum` adds to existing keys are sent to the tables in this
+        dtype. Requires `bp_v2`. See `Variable`.
 
     Returns:
       A `Variable` object.
@@ -1265,6 +2064,10 @@ def get_variable(
         kv_creator=kv_creator,
         restrict_policy=restrict_policy,
         bp_v2=bp_v2,
+        colocated_slots=colocated_slots,
+        write_buffer_steps=write_buffer_steps,
+        write_buffer_keys=write_buffer_keys,
+        delta_dtype=delta_dtype,
     )
     scope_store._vars[full_name] = var_
   return scope_store._vars[full_name]
@@ -0,0 +1,229 @@
+# Copyright 2024 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Memory-mapped read-only Lookup operations."""
+# pylint: disable=g-bad-name
+
+import copy
+
+from tensorflow.python.eager import context
+from tensorflow.python.framework import ops
+from tensorflow.python.ops.lookup_ops import LookupInterface
+
+from tensorflow_recommenders_addons.utils.resource_loader import LazySO
+
+try:
+  mmap_ops = LazySO("dynamic_embedding/core/_mmap_table_ops.so").ops
+except:
+  mmap_ops = None
+
+
+class MmapTable(LookupInterface):
+  """A read-only table serving files written by `save_to_file_system`.
+
+    The `-keys` and `-values` files are memory mapped when the table resource
+    is created, so restoring a table costs little more than building an index
+    of the keys, and processes on the same host share the mapped pages.
+    Lookups read the values from the mapped file. `insert`, `accum`, `remove`
+    and `clear` are not supported.
+
+    Example usage:
+
+    ```python
+    table = tfra.dynamic_embedding.MmapTable(key_dtype=tf.int64,
+                                             value_dtype=tf.float32,
+                                             default_value=[0.0] * 8,
+                                             dirpath="/path/to/saved",
+                                             file_name="emb_mht_1of1")
+    out = table.lookup(query_keys)
+    ```
+    """
+
+  def __init__(
+      self,
+      key_dtype,
+      value_dtype,
+      default_value,
+      dirpath,
+      file_name,
+      name="MmapTable",
+      checkpoint=False,
+      device='',
+  ):
+    """Creates a `MmapTable` object over a saved key/value file pair.
+
+        Args:
+          key_dtype: the type of the key tensors.
+          value_dtype: the type of the value tensors.
+          default_value: The value to use if a key is missing in the table.
+          dirpath: The directory holding the saved files.
+          file_name: The key/value file name prefix, the files read are
+            `dirpath/file_name-keys` and `dirpath/file_name-values`.
+          name: A name for the operation (optional).
+          checkpoint: Must be False, a read-only table has nothing to save.
+          device: The device to place the table on.
+
+        Returns:
+          A `MmapTable` object.
+
+        Raises:
+          ValueError: If checkpoint is True.
+        """
+    if checkpoint:
+      raise ValueError("MmapTable is read-only and can not be checkpointed.")
+    self._default_value = ops.convert_to_tensor(default_value,
+                                                dtype=value_dtype)
+    self._value_shape = self._default_value.get_shape()
+    self._checkpoint = False
+    self._key_dtype = key_dtype
+    self._value_dtype = value_dtype
+    self._dirpath = dirpath
+    self._file_name = file_name
+    self._device = device
+    self._name = name
+    self._new_obj_trackable = None
+
+    self._shared_name = None
+    if context.executing_eagerly():
+      self._shared_name = "table_%d" % (ops.uid(),)
+    super(MmapTable, self).__init__(key_dtype, value_dtype)
+    self._resource_handle = self._create_resource()
+
+  def _create_resource(self):
+    with ops.device(self._device):
+      table_ref = mmap_ops.tfra_mmap_table_of_tensors(
+          shared_name=self._shared_name,
+          use_node_name_sharing=False,
+          key_dtype=self._key_dtype,
+          value_dtype=self._value_dtype,
+          value_shape=self._default_value.get_shape(),
+          dirpath=self._dirpath,
+          file_name=self._file_name,
+          name=self._name,
+      )
+
+    if context.executing_eagerly():
+      self._table_name = None
+    else:
+      self._table_name = table_ref.op.name.split("/")[-1]
+    return table_ref
+
+  def _map_resources(self, _):
+    """For implementing `Trackable`."""
+    new_obj = copy.copy(self)
+    if self._new_obj_trackable is None:
+      self._new_obj_trackable = new_obj
+    # pylint: disable=protected-access
+    with ops.device(self._resource_device):
+      new_resource = new_obj._create_resource()
+    new_obj._resource_handle = new_resource
+    # pylint: enable=protected-access
+    obj_map = {self: new_obj}
+    resource_map = {self.resource_handle: new_resource}
+    return obj_map, resource_map
+
+  @property
+  def name(self):
+    return self._table_name
+
+  def size(self, name=None):
+    """Compute the number of elements in this table.
+
+        Args:
+          name: A name for the operation (optional).
+
+        Returns:
+          A scalar tensor containing the number of elements in this table.
+        """
+    with ops.name_scope(name, "%s_Size" % self.name, [self.resource_handle]):
+      with ops.colocate_with(self.resource_handle):
+        return mmap_ops.tfra_mmap_table_size(self.resource_handle)
+
+  def lookup(self,
+             keys,
+             dynamic_default_values=None,
+             return_exists=False,
+             name=None):
+    """Looks up `keys` in a table, outputs the corresponding values.
+
+      The `default_value` is used for keys not present in the table.
+
+      Args:
+        keys: Keys to look up. Can be a tensor of any shape. Must match the
+          table's key_dtype.
+        dynamic_default_values: The values to use if a key is missing in the
+          table. If None (by default), the static default_value
+          `self._default_value` will be used.
+        return_exists: if True, will return a additional Tensor which indicates
+          if or not keys are existing in the table.
+        name: A name for the operation (optional).
+
+      Returns:
+        A tensor containing the values in the same shape as `keys` using the
+          table's value type.
+        exists:
+          A bool type Tensor of the same shape as `keys` which indicates
+            if keys are existing in the table.
+            Only provided if `return_exists` is True.
+    """
+    with ops.name_scope(
+        name,
+        "%s_lookup_table_find" % self.name,
+        (self.resource_handle, keys, self._default_value),
+    ):
+      keys = ops.convert_to_tensor(keys, dtype=self._key_dtype, name="keys")
+      default_value = (dynamic_default_values if dynamic_default_values
+                       is not None else self._default_value)
+      with ops.colocate_with(self.resource_handle, ignore_existing=True):
+        if return_exists:
+          values, exists = mmap_ops.tfra_mmap_table_find_with_exists(
+              self.resource_handle, keys, default_value)
+        else:
+          values = mmap_ops.tfra_mmap_table_find(self.resource_handle, keys,
+                                                 default_value)
+
+    return (values, exists) if return_exists else values
+
+  def insert(self, keys, values, name=None):
+    raise NotImplementedError("MmapTable is read-only.")
+
+  def accum(self, keys, values_or_deltas, exists, name=None):
+    raise NotImplementedError("MmapTable is read-only.")
+
+  def remove(self, keys, name=None):
+    raise NotImplementedError("MmapTable is read-only.")
+
+  def clear(self, name=None):
+    raise NotImplementedError("MmapTable is read-only.")
+
+  def export(self, name=None):
+    """Returns tensors of all keys and values in the table.
+
+        Args:
+          name: A name for the operation (optional).
+
+        Returns:
+          A pair of tensors with the first tensor containing all keys and the
+            second tensors containing all values in the table.
+        """
+    with ops.name_scope(name, "%s_lookup_table_export_values" % self.name,
+                        [self.resource_handle]):
+      with ops.colocate_with(self.resource_handle):
+        keys, values = mmap_ops.tfra_mmap_table_export(self.resource_handle,
+                                                       self._key_dtype,
+                                                       self._value_dtype)
+    return keys, values
+
+
+ops.NotDifferentiable("TfraMmapTableOfTensors")
@@ -94,6 +94,11 @@ class ShadowVariable(de.TrainableWrapper):
         ids: A Buffer to store the feature ids. If None, it use a private one.
         exists: A Buffer to indicate whether the feature ids exist in sparse domain.
           If None, it use a private one.
+        primary, slot_index, slot_default: Make the ShadowVariable a view of
+          an optimizer slot colocated in the rows of `params`, as for
+          TrainableWrapper.
+        dtype: The dtype of the ShadowVariable, which the values of `params`
+          are cast to. Default is the value dtype of `params`.
     """
     if not context.executing_eagerly():
       raise NotImplementedError('Currently ShadowVariable is only allowed'
@@ -127,8 +132,13 @@ class ShadowVariable(de.TrainableWrapper):
       kwargs.pop('model_mode')
     else:
       model_mode = de.ModelMode.CURRENT_SETTING
-    initial_value = array_ops.zeros(shape=(0, self.params.dim),
-                                    dtype=self.params.value_dtype)
+    colocation = {
+        k: kwargs.pop(k)
+        for k in ('primary', 'slot_index', 'slot_default')
+        if k in kwargs
+    }
+    dtype = kwargs.pop('dtype', None) or self.params.value_dtype
+    initial_value = array_ops.zeros(shape=(0, self.params.dim), dtype=dtype)
 
     if (distribute_strategy is not None) and (not isinstance(
         distribute_strategy, distribute_lib.StrategyBase)):
@@ -139,12 +149,13 @@ class ShadowVariable(de.TrainableWrapper):
                          self.ids,
                          max_norm=max_norm,
                          initial_value=initial_value,
-                         dtype=self.params.value_dtype,
+                         dtype=dtype,
                          trainable=trainable,
                          collections=collections,
                          model_mode=model_mode,
                          distribute_strategy=distribute_strategy,
-                         name=name)
+                         name=name,
+                         **colocation)
     exists = kwargs.get('exists', None)
     exists_name = self._name + '-exists'
     if exists is None:
@@ -161,14 +172,25 @@ class ShadowVariable(de.TrainableWrapper):
     self.params._trainable_store[name] = self
 
   def prefetch_values(self, update=False):
-    if self.params.bp_v2:
+    if self._primary is not None:
+      with ops.device(self._handle.device):
+        self.prefetch_values_op = self._primary._slot_values(self)
+    elif self.params.colocated_slots:
+      with ops.device(self._handle.device):
+        self._rows, self._rows_exists = self.params._lookup_rows(
+            self.ids, return_exists=True)
+        self.exists.assign(self._rows_exists)
+        self.prefetch_values_op = self.transform(
+            self._rows[..., :self.params.dim])
+    elif self.params.bp_v2:
       with ops.device(self._handle.device):
         r, exists = self.params.lookup(self.ids, return_exists=True)
         self.exists.assign(exists)
-        self.prefetch_values_op = self.transform(r)
+        self.prefetch_values_op = self.transform(self._from_params(r))
     else:
       with ops.device(self._handle.device):
-        self.prefetch_values_op = self.transform(self.params.lookup(self.ids))
+        self.prefetch_values_op = self.transform(
+            self._from_params(self.params.lookup(self.ids)))
     return self.prefetch_values_op
 
   def value(self, do_prefetch=False):
@@ -259,11 +281,42 @@ def embedding_lookup(
         with ops.control_dependencies([shadow_._reset_ids(ids)]):
           result = shadow_.read_value(do_prefetch=True)
       else:
-        result = shadow_.params.lookup(ids)
+        result = shadow_._from_params(shadow_.params.lookup(ids))
 
       return result
 
 
+def _embedding_lookup_prefetched(shadow_, ids, values, exists=None):
+  """Loads the `values` of `ids` looked up beforehand into `shadow_`, as
+  `embedding_lookup` does after looking them up.
+
+  Args:
+    shadow_: A ShadowVariable object, not a distributed one.
+    ids: A tensor with any shape as same dtype of params.key_dtype.
+    values: The values of `ids`, with shape [shape of ids] + [dim], or the
+      whole rows with `colocated_slots`.
+    exists: Whether `ids` exist in the sparse domain, only used with bp_v2 or
+      `colocated_slots`.
+
+  Returns:
+    A tensor with shape [shape of ids] + [dim].
+  """
+  if shadow_.params.colocated_slots:
+    shadow_._rows, shadow_._rows_exists = values, exists
+    values = values[..., :shadow_.params.dim]
+  values = shadow_._from_params(values)
+  if de.ModelMode.CURRENT_SETTING != de.ModelMode.TRAIN:
+    return values
+  updates = [
+      shadow_._reset_ids(ids),
+      shadow_.assign(shadow_.transform(values), read_value=False),
+  ]
+  if shadow_.params.bp_v2 or shadow_.params.colocated_slots:
+    updates.append(shadow_.exists.assign(exists))
+  with ops.control_dependencies(updates):
+    return shadow_.read_value(do_prefetch=False)
+
+
 def embedding_lookup_unique(
     shadow,
     ids,
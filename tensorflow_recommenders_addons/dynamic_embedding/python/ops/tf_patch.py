@@ -16,6 +16,7 @@
 """patch on tensorflow"""
 
 from tensorflow_recommenders_addons import dynamic_embedding as de
+from tensorflow_recommenders_addons.dynamic_embedding.python.ops.dynamic_embedding_optimizer import _apply_in_table
 
 try:
   from tensorflow.python.keras.initializers import initializers_v2 as kinit2
@@ -101,6 +102,11 @@ class _DenseDynamicEmbeddingTrainableProcessor(optimizer._OptimizableVariable):
         s0 = [_s.read_value() for _s in _slots]
         _before = [v0] + s0
 
+      with ops.control_dependencies(_before):
+        _apply_op = _apply_in_table(optimizer, self._v, g, _slots, v0, s0)
+      if _apply_op is not None:
+        return _apply_op
+
       if isinstance(g, IndexedSlices):
         if self._v.constraint is not None:
           raise RuntimeError(